@@ -0,0 +1,33 @@
+# backend/backfill_score_summaries.py
+# doctor_month_summaries を shift_assignments から全件作り直す
+#   python backfill_score_summaries.py             # 全病院
+#   python backfill_score_summaries.py <hospital>  # 1病院だけ
+import asyncio
+import sys
+import uuid
+
+from sqlalchemy import select
+
+from core.db import AsyncSessionLocal
+import models  # noqa: F401  全モデルを登録する
+from models.hospital import Hospital
+from services.score_summary import refresh_all_summaries
+
+
+async def backfill(hospital_ids=None):
+    async with AsyncSessionLocal() as db:
+        if hospital_ids is None:
+            hospital_ids = (await db.execute(select(Hospital.id).order_by(Hospital.id))).scalars().all()
+        print(f"🚀 {len(hospital_ids)} 病院の月別集計を作り直しています...")
+        total = 0
+        for hospital_id in hospital_ids:
+            # 病院ごとにコミットする（途中で止まっても終わった病院はそのまま）
+            written = await refresh_all_summaries(db, hospital_id)
+            await db.commit()
+            total += written
+            print(f"  {hospital_id}: {written} 行")
+    print(f"✅ 完了しました（{total} 行）")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill([uuid.UUID(arg) for arg in sys.argv[1:]] or None))
@@ -0,0 +1,81 @@
+"""solve() の早期終了（gap・表示上の差・改善の停滞）のベンチマーク
+
+tests/test_optimizer.py の入力（benchmarks.spacing_formulation と同じ）と合成病院のいくつかを、
+制限時間いっぱいまで解く（fixed）のと早期終了あり（adaptive。OPTIMIZER_RELATIVE_GAP_LIMIT /
+OPTIMIZER_STALL_SECONDS の設定値）で solve() し、所要時間・終了理由・目的値を並べ、最後に
+所要時間の中央値と、adaptive の目的値が fixed より悪かった件数を出す。
+
+    cd backend && python -m benchmarks.early_stopping [--time-limit 5] [--seeds 1 2 3] [--workers 8]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.spacing_formulation import FIXTURES as TEST_FIXTURES
+from benchmarks.synthetic_hospitals import SCENARIOS, generate_hospital
+from services.optimizer import OnCallOptimizer
+
+SYNTHETIC = ["d10_ext4", "d15_holiday_combined", "d30_unavail", "d50"]
+
+
+def _fixtures(seed: int) -> List[Tuple[str, Dict[str, Any]]]:
+    synthetic = [(s.name, generate_hospital(s, seed)) for s in SCENARIOS if s.name in SYNTHETIC]
+    return list(TEST_FIXTURES) + synthetic
+
+
+def run_fixture(kwargs: Dict[str, Any], adaptive: bool, time_limit: float, seed: int, workers: int) -> Dict[str, Any]:
+    opt = OnCallOptimizer(**kwargs)
+    opt.num_workers = workers
+    if not adaptive:
+        opt.relative_gap_limit = 0.0
+        opt.absolute_gap_limit = 0.0
+        opt.stall_seconds = 0.0
+    opt.build_model()
+    objectives: List[float] = []
+    opt.progress_callback = lambda event: objectives.append(event["objective"]) if event["stage"] == "solution" else None
+    started = time.perf_counter()
+    result = opt.solve(time_limit_seconds=time_limit, random_seed=seed)
+    return {
+        "seconds": time.perf_counter() - started,
+        "reason": result["solver_params"]["termination_reason"],
+        "objective": objectives[-1] if objectives else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--time-limit", type=float, default=5.0)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    seconds: Dict[str, List[float]] = {"fixed": [], "adaptive": []}
+    worse = 0
+    print("\t".join(["fixture", "seed", "fixed_s", "fixed_obj", "adaptive_s", "adaptive_obj", "reason"]))
+    for seed in args.seeds:
+        for name, kwargs in _fixtures(seed):
+            fixed = run_fixture(kwargs, False, args.time_limit, seed, args.workers)
+            adaptive = run_fixture(kwargs, True, args.time_limit, seed, args.workers)
+            seconds["fixed"].append(fixed["seconds"])
+            seconds["adaptive"].append(adaptive["seconds"])
+            if fixed["objective"] is not None and (
+                adaptive["objective"] is None or adaptive["objective"] > fixed["objective"]
+            ):
+                worse += 1
+            print("\t".join([
+                name, str(seed),
+                f"{fixed['seconds']:.2f}", "-" if fixed["objective"] is None else f"{fixed['objective']:.0f}",
+                f"{adaptive['seconds']:.2f}", "-" if adaptive["objective"] is None else f"{adaptive['objective']:.0f}",
+                adaptive["reason"],
+            ]))
+    print(
+        f"median seconds: fixed {statistics.median(seconds['fixed']):.2f}"
+        f" / adaptive {statistics.median(seconds['adaptive']):.2f}; adaptive worse in {worse} of {len(seconds['fixed'])}"
+    )
+
+
+if __name__ == "__main__":
+    main()
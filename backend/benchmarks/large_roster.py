@@ -0,0 +1,80 @@
+"""大人数モード（large_roster）のベンチマーク
+
+合成病院（benchmarks.synthetic_hospitals）の人数の多いシナリオを、これまでの1つのモデル（mono）と
+大人数モード（貪欲法の初期解から改善・window 方式）で solve() し、構築時間、最初の実行可能解まで
+（solve() の呼び出しから。大人数モードは初期解の構築を含む）の時間、全体の時間、状態、最終の目的値を並べて出す。
+
+    cd backend && python -m benchmarks.large_roster [--time-limit 10] [--seed 42] [--workers 8] [--only d100 d150]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Dict, List
+
+from benchmarks.synthetic_hospitals import SCENARIOS, HospitalSpec, generate_hospital
+from services.optimizer import OnCallOptimizer
+
+DEFAULT_SCENARIOS = ["d30_unavail", "d50", "d100", "d150"]
+
+
+def run_fixture(spec: HospitalSpec, large_roster: bool, time_limit: float, seed: int, workers: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    opt = OnCallOptimizer(large_roster=large_roster, **generate_hospital(spec, seed))
+    opt.num_workers = workers
+    opt.build_model()
+    build_seconds = time.perf_counter() - started
+
+    solutions: List[Dict[str, Any]] = []
+
+    def on_progress(event: Dict[str, Any]) -> None:
+        if event["stage"] == "solution":
+            solutions.append({**event, "at": time.perf_counter()})
+
+    opt.progress_callback = on_progress
+    started = time.perf_counter()
+    result = opt.solve(time_limit_seconds=time_limit, random_seed=seed)
+    solve_seconds = time.perf_counter() - started
+    last = solutions[-1] if solutions else None
+    return {
+        "build_seconds": build_seconds,
+        "construct_seconds": (result["solver_params"].get("large_roster") or {}).get("seconds"),
+        "first_seconds": solutions[0]["at"] - started if solutions else None,
+        "solve_seconds": solve_seconds,
+        "status": result.get("status", "NO_SOLUTION"),
+        "objective": last["objective"] if last else None,
+    }
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.0f}" if value >= 100 else f"{value:.2f}"
+    return str(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--time-limit", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--only", nargs="+", default=DEFAULT_SCENARIOS)
+    args = parser.parse_args()
+
+    columns = ["fixture", "mode", "build_s", "construct_s", "first_s", "solve_s", "status", "objective"]
+    print("\t".join(columns))
+    for spec in SCENARIOS:
+        if spec.name not in args.only:
+            continue
+        for large_roster in (False, True):
+            r = run_fixture(spec, large_roster, args.time_limit, args.seed, args.workers)
+            print("\t".join([
+                spec.name, "large" if large_roster else "mono",
+                _fmt(r["build_seconds"]), _fmt(r["construct_seconds"]), _fmt(r["first_seconds"]),
+                _fmt(r["solve_seconds"]), r["status"], _fmt(r["objective"]),
+            ]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""勤務間隔・理想間隔の組み方（pairwise / window）のベンチマーク
+
+tests/test_optimizer.py の入力と、常勤30名の月を両方の組み方で組み、
+モデルの大きさ（変数・制約数）、構築時間、求解時間、目的値と下界を並べて出す。
+
+    cd backend && python -m benchmarks.spacing_formulation [--time-limit 10] [--seed 42] [--workers 8]
+
+同じ乱数シード・同じ時間制限で解くので、目的値の差は組み方の違い（と探索の揺れ）による。
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Dict, List, Tuple
+
+from ortools.sat.python import cp_model
+
+from services.constraint_builder import SPACING_FORMULATIONS
+from services.optimizer import OnCallOptimizer
+
+# tests/test_optimizer.py で使っている入力（名前はテスト名から）
+FIXTURES: List[Tuple[str, Dict[str, Any]]] = [
+    ("weekday_only", dict(num_doctors=6, year=2024, month=4, holidays=[], score_max=100.0)),
+    ("sun_holiday", dict(num_doctors=8, year=2024, month=4, holidays=[29])),
+    ("unavailable", dict(num_doctors=6, year=2024, month=4, holidays=[], unavailable={0: [5]}, score_max=100.0)),
+    ("fixed_weekday", dict(num_doctors=8, year=2024, month=4, fixed_unavailable_weekdays={0: [0]})),
+    ("spacing_12", dict(num_doctors=12, year=2024, month=4, holidays=[29])),
+    ("month_cross", dict(num_doctors=10, year=2024, month=4, prev_month_last_day=31, prev_month_worked_days={0: [31]})),
+    ("score_bounds", dict(num_doctors=8, year=2024, month=4, score_min=2.0, score_max=2.0)),
+    ("sunhol_fairness", dict(num_doctors=10, year=2024, month=4, holidays=[29])),
+    ("interval_6", dict(num_doctors=14, year=2024, month=4, holidays=[29], hard_constraints={"interval_days": 6})),
+    # 医師数が多いとペアごとの変数・制約が目立つ
+    ("doctors_30", dict(num_doctors=30, year=2024, month=5, holidays=[3, 4, 6], score_min=0.0, score_max=10.0)),
+]
+
+
+def run_fixture(kwargs: Dict[str, Any], formulation: str, time_limit: float, seed: int, workers: int) -> Dict[str, Any]:
+    opt = OnCallOptimizer(spacing_formulation=formulation, **kwargs)
+    started = time.perf_counter()
+    opt.build_model()
+    build_seconds = time.perf_counter() - started
+
+    proto = opt.model.Proto()
+    solver = cp_model.CpSolver()
+    solver.parameters.random_seed = seed
+    solver, status = opt._run_solver(opt.model, time_limit, solver=solver, num_workers=workers)
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    return {
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "build_seconds": build_seconds,
+        "solve_seconds": solver.WallTime(),
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if solved else None,
+        "bound": solver.BestObjectiveBound() if solved else None,
+    }
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.0f}" if value >= 100 else f"{value:.2f}"
+    return str(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--time-limit", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    columns = ["fixture", "mode", "vars", "cons", "build_s", "solve_s", "status", "objective", "bound"]
+    print("\t".join(columns))
+    for name, kwargs in FIXTURES:
+        for formulation in SPACING_FORMULATIONS:
+            r = run_fixture(kwargs, formulation, args.time_limit, args.seed, args.workers)
+            print("\t".join([
+                name, formulation, str(r["variables"]), str(r["constraints"]),
+                _fmt(r["build_seconds"]), _fmt(r["solve_seconds"]), r["status"],
+                _fmt(r["objective"]), _fmt(r["bound"]),
+            ]))
+
+
+if __name__ == "__main__":
+    main()
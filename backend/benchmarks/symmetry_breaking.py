@@ -0,0 +1,74 @@
+"""入れ替え可能な医師の対称性の除去（symmetry_breaking）のベンチマーク
+
+外部枠の多い月（確定日あり・なし）と常勤だけの月を、対称性の除去なし/ありで解き、
+入れ替え可能な医師の組、求解時間、状態、目的値と下界をシードごとに並べて出す。
+
+    cd backend && python -m benchmarks.symmetry_breaking [--time-limit 20] [--seeds 1 2 3 4] [--workers 8]
+"""
+from __future__ import annotations
+
+import argparse
+from typing import Any, Dict, List, Tuple
+
+from ortools.sat.python import cp_model
+
+from services.optimizer import OnCallOptimizer
+
+
+def _with_externals(num_internal: int, num_external: int, fixed_nights: List[int]) -> Dict[str, Any]:
+    return dict(
+        num_doctors=num_internal + num_external, year=2024, month=5, holidays=[3, 4, 6],
+        score_min=0.5, score_max=6.0,
+        external_doctor_indices=set(range(num_internal, num_internal + num_external)),
+        external_fixed_dates=[{"date": f"2024-05-{day:02d}", "target_shift": "night"} for day in fixed_nights],
+    )
+
+
+FIXTURES: List[Tuple[str, Dict[str, Any]]] = [
+    ("ext6_fixed", _with_externals(10, 6, [2, 9, 16, 23, 30, 31])),
+    ("ext12_fixed", _with_externals(12, 12, [1, 3, 5, 8, 10, 12, 15, 17, 19, 22, 24, 26])),
+    ("ext20_fixed", _with_externals(14, 20, list(range(1, 21)))),
+    ("ext8_free", _with_externals(12, 8, [])),
+    ("ext20_free", _with_externals(15, 20, [])),
+    ("internal_10", dict(num_doctors=10, year=2024, month=4, holidays=[29])),
+]
+
+
+def run_fixture(kwargs: Dict[str, Any], symmetry_breaking: bool, time_limit: float, seed: int, workers: int) -> Dict[str, Any]:
+    opt = OnCallOptimizer(symmetry_breaking=symmetry_breaking, **kwargs)
+    opt.build_model()
+    solver = cp_model.CpSolver()
+    solver.parameters.random_seed = seed
+    solver, status = opt._run_solver(opt.model, time_limit, solver=solver, num_workers=workers)
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    return {
+        "classes": [len(members) for members in opt._doctor_classes],
+        "solve_seconds": solver.WallTime(),
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if solved else None,
+        "bound": solver.BestObjectiveBound() if solved else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--time-limit", type=float, default=20.0)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    print("\t".join(["fixture", "symmetry", "seed", "classes", "solve_s", "status", "objective", "bound"]))
+    for name, kwargs in FIXTURES:
+        for symmetry_breaking in (False, True):
+            for seed in args.seeds:
+                r = run_fixture(kwargs, symmetry_breaking, args.time_limit, seed, args.workers)
+                print("\t".join([
+                    name, "on" if symmetry_breaking else "off", str(seed), str(r["classes"]),
+                    f"{r['solve_seconds']:.2f}", r["status"],
+                    "-" if r["objective"] is None else f"{r['objective']:.0f}",
+                    "-" if r["bound"] is None else f"{r['bound']:.0f}",
+                ]))
+
+
+if __name__ == "__main__":
+    main()
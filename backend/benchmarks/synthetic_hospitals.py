@@ -0,0 +1,330 @@
+"""合成病院ベンチマーク（pre_validate → build_model → solve → diagnose）
+
+医師数（5〜150）・外部枠・不可日の密度・祝日の多い月・日当直モード（split / combined）・
+制約のきつさを変えた合成病院を乱数シードから決定的に作り、シナリオごとに
+
+- pre_validate / build_model / solve / diagnose（実行不可能なときだけ）の所要時間
+- 最初の実行可能解までの時間、最終の目的値・下界・ギャップ
+- 変数・制約数、ピークRSS（シナリオごとに別プロセスで測る）
+
+を JSON レポートに書き出す。2つのレポートを比べると、悪化したシナリオと指標に印を付ける。
+
+    cd backend && python -m benchmarks.synthetic_hospitals run --out base.json [--time-limit 10] [--seed 42] [--workers 8] [--only d30_unavail ...]
+    cd backend && python -m benchmarks.synthetic_hospitals compare base.json head.json [--threshold 0.2] [--fail-on-regression]
+"""
+from __future__ import annotations
+
+import argparse
+import calendar
+import datetime
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import ortools
+from ortools.sat.python import cp_model
+
+from services.optimizer import OnCallOptimizer
+
+# (年, 月, 祝日)。祝日の多い月はゴールデンウィーク
+NORMAL_MONTH = (2024, 6, [])
+HOLIDAY_HEAVY_MONTH = (2024, 5, [3, 4, 6])
+
+# きつさごとの勤務間隔・土曜当直の上限・スコア幅（平均スコア ± 幅）
+TIGHTNESS: Dict[str, Dict[str, float]] = {
+    "loose": {"interval_days": 3, "max_saturday_nights": 2, "score_width": 3.0},
+    "normal": {"interval_days": 4, "max_saturday_nights": 1, "score_width": 2.0},
+    "tight": {"interval_days": 5, "max_saturday_nights": 1, "score_width": 1.5},
+    # 間隔を詰めすぎて枠が埋まらない（diagnose を通すため）
+    "infeasible": {"interval_days": 7, "max_saturday_nights": 1, "score_width": 2.0},
+}
+
+
+@dataclass(frozen=True)
+class HospitalSpec:
+    name: str
+    num_doctors: int
+    num_external: int = 0
+    unavailable_density: float = 0.1
+    holiday_heavy: bool = False
+    combined: bool = False
+    tightness: str = "normal"
+
+
+SCENARIOS: List[HospitalSpec] = [
+    HospitalSpec("d5_loose", 5, tightness="loose"),
+    HospitalSpec("d8_infeasible", 8, tightness="infeasible"),
+    HospitalSpec("d10_ext4", 10, num_external=4),
+    HospitalSpec("d15_holiday_combined", 15, holiday_heavy=True, combined=True),
+    HospitalSpec("d20_holiday_split", 20, holiday_heavy=True),
+    HospitalSpec("d30_unavail", 30, unavailable_density=0.3),
+    HospitalSpec("d30_tight", 30, num_external=6, tightness="tight"),
+    HospitalSpec("d50", 50, num_external=10),
+    HospitalSpec("d100", 100, holiday_heavy=True),
+    HospitalSpec("d150", 150, num_external=20, unavailable_density=0.2),
+]
+
+
+def _month_score_total(year: int, month: int, holidays: List[int], combined: bool) -> float:
+    """1か月の枠スコアの合計（既定のシフトスコア）"""
+    total = 0.0
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        weekday = datetime.date(year, month, day).weekday()
+        if weekday == 6 or day in holidays:
+            total += 1.5 if combined else 0.5 + 1.0
+        elif weekday == 5:
+            total += 1.5
+        else:
+            total += 1.0
+    return total
+
+
+def generate_hospital(spec: HospitalSpec, seed: int) -> Dict[str, Any]:
+    """spec と seed から OnCallOptimizer の引数を決定的に作る"""
+    rng = random.Random(f"{spec.name}:{seed}")
+    year, month, holidays = HOLIDAY_HEAVY_MONTH if spec.holiday_heavy else NORMAL_MONTH
+    num_days = calendar.monthrange(year, month)[1]
+    profile = TIGHTNESS[spec.tightness]
+    num_internal = spec.num_doctors - spec.num_external
+
+    # スコア上下限は常勤の平均スコアの前後（人数が多いと平均は1回分を下回る）
+    average = (_month_score_total(year, month, holidays, spec.combined) - spec.num_external) / num_internal
+    width = profile["score_width"]
+    score_min = round(max(0.0, average - width), 1)
+    score_max = round(average + width, 1)
+
+    unavailable: Dict[int, List[Dict[str, Any]]] = {}
+    fixed_unavailable_weekdays: Dict[int, List[Dict[str, Any]]] = {}
+    per_doctor = int(round(spec.unavailable_density * num_days))
+    for d in range(num_internal):
+        entries = []
+        for day in sorted(rng.sample(range(1, num_days + 1), per_doctor)):
+            entries.append({
+                "date": f"{year}-{month:02d}-{day:02d}",
+                "target_shift": rng.choice(["all", "all", "night", "day"]),
+                "is_soft_penalty": rng.random() < 0.25,
+            })
+        if entries:
+            unavailable[d] = entries
+        if rng.random() < spec.unavailable_density:
+            fixed_unavailable_weekdays[d] = [{"day_of_week": rng.randrange(5), "target_shift": "night"}]
+
+    external = set(range(num_internal, spec.num_doctors))
+    fixed_days = sorted(rng.sample(range(1, num_days + 1), spec.num_external // 2))
+    return dict(
+        num_doctors=spec.num_doctors, year=year, month=month, holidays=list(holidays),
+        unavailable=unavailable, fixed_unavailable_weekdays=fixed_unavailable_weekdays,
+        score_min=score_min, score_max=score_max,
+        past_sat_counts=[rng.randrange(4) for _ in range(spec.num_doctors)],
+        past_sunhol_counts=[rng.randrange(4) for _ in range(spec.num_doctors)],
+        hard_constraints={
+            "interval_days": int(profile["interval_days"]),
+            "max_saturday_nights": int(profile["max_saturday_nights"]),
+            "holiday_shift_mode": "combined" if spec.combined else "split",
+        },
+        external_doctor_indices=external,
+        external_fixed_dates=[{"date": f"{year}-{month:02d}-{day:02d}", "target_shift": "night"} for day in fixed_days],
+    )
+
+
+class _FirstSolutionTimer(cp_model.CpSolverSolutionCallback):
+    def __init__(self) -> None:
+        super().__init__()
+        self.first_seconds: Optional[float] = None
+        self.solution_count = 0
+
+    def on_solution_callback(self) -> None:
+        if self.first_seconds is None:
+            self.first_seconds = self.WallTime()
+        self.solution_count += 1
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS はバイト
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(spec: HospitalSpec, time_limit: float, seed: int, workers: int) -> Dict[str, Any]:
+    kwargs = generate_hospital(spec, seed)
+    opt = OnCallOptimizer(**kwargs)
+    result: Dict[str, Any] = {"spec": asdict(spec)}
+
+    started = time.perf_counter()
+    pre_errors = opt.pre_validate()
+    result["pre_validate_seconds"] = time.perf_counter() - started
+    result["pre_check_errors"] = [e.get("id") for e in pre_errors]
+
+    started = time.perf_counter()
+    opt.build_model()
+    result["build_seconds"] = time.perf_counter() - started
+    proto = opt.model.Proto()
+    result["variables"] = len(proto.variables)
+    result["constraints"] = len(proto.constraints)
+
+    timer = _FirstSolutionTimer()
+    solver = cp_model.CpSolver()
+    solver.parameters.random_seed = seed
+    solver, status = opt._run_solver(opt.model, time_limit, solver=solver, callback=timer, num_workers=workers)
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    objective = solver.ObjectiveValue() if solved else None
+    bound = solver.BestObjectiveBound() if solved else None
+    result.update({
+        "status": solver.StatusName(status),
+        "solve_seconds": solver.WallTime(),
+        "first_feasible_seconds": timer.first_seconds,
+        "solution_count": timer.solution_count,
+        "objective": objective,
+        "bound": bound,
+        "gap": None if objective is None else (objective - bound) / max(1.0, abs(objective)),
+    })
+
+    # 時間切れ（UNKNOWN）は診断しない。実行不可能と分かったとき・事前チェックで止まる入力だけ
+    if status == cp_model.INFEASIBLE or pre_errors:
+        started = time.perf_counter()
+        diagnosis = opt.diagnose(time_limit_seconds=time_limit)
+        result["diagnose_seconds"] = time.perf_counter() - started
+        result["diagnosis"] = {
+            "phase_completed": diagnosis.get("phase_completed"),
+            "conflict_groups": len(diagnosis.get("conflict_groups") or []),
+            "solvable_removals": len(diagnosis.get("solvable_removals") or []),
+        }
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def run(specs: List[HospitalSpec], time_limit: float, seed: int, workers: int) -> Dict[str, Any]:
+    scenarios = []
+    for spec in specs:
+        # ピークRSSをシナリオごとに測るため、1シナリオ1プロセス
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            r = pool.submit(run_scenario, spec, time_limit, seed, workers).result()
+        print(
+            f"{spec.name}\tvars={r['variables']}\tcons={r['constraints']}\tstatus={r['status']}"
+            f"\tfirst={_fmt(r['first_feasible_seconds'])}s\tobjective={_fmt(r['objective'])}"
+            f"\tgap={_fmt(r['gap'])}\trss={r['peak_rss_mb']:.0f}MB",
+            file=sys.stderr,
+        )
+        scenarios.append(r)
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "time_limit_seconds": time_limit,
+            "seed": seed,
+            "workers": workers,
+            "python": platform.python_version(),
+            "ortools": ortools.__version__,
+            "machine": platform.machine(),
+        },
+        "scenarios": scenarios,
+    }
+
+
+# (指標, 悪化の向き)。+1 は大きいほど悪い
+COMPARED_METRICS: List[Tuple[str, int]] = [
+    ("first_feasible_seconds", 1),
+    ("solve_seconds", 1),
+    ("objective", 1),
+    ("gap", 1),
+    ("build_seconds", 1),
+    ("variables", 1),
+    ("constraints", 1),
+    ("peak_rss_mb", 1),
+]
+# 揺れの範囲とみなす絶対差（秒・目的値・MB など）
+_NOISE_FLOOR: Dict[str, float] = {
+    "first_feasible_seconds": 0.2, "solve_seconds": 0.5, "build_seconds": 0.1,
+    "objective": 1.0, "gap": 0.02, "peak_rss_mb": 20.0,
+}
+_SOLVED = ("OPTIMAL", "FEASIBLE")
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """シナリオ名で突き合わせ、指標ごとの before/after と悪化の印を返す"""
+    base_by_name = {s["spec"]["name"]: s for s in base["scenarios"]}
+    rows = []
+    for h in head["scenarios"]:
+        name = h["spec"]["name"]
+        b = base_by_name.get(name)
+        if b is None:
+            continue
+        regressions = []
+        if b["status"] in _SOLVED and h["status"] not in _SOLVED:
+            regressions.append("status")
+        metrics = {}
+        for metric, direction in COMPARED_METRICS:
+            before, after = b.get(metric), h.get(metric)
+            metrics[metric] = (before, after)
+            if before is None or after is None:
+                continue
+            delta = (after - before) * direction
+            if delta > _NOISE_FLOOR.get(metric, 0.0) and delta > threshold * abs(before):
+                regressions.append(metric)
+        rows.append({"name": name, "status": (b["status"], h["status"]), "metrics": metrics, "regressions": regressions})
+    return rows
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.0f}" if abs(value) >= 100 else f"{value:.2f}"
+    return str(value)
+
+
+def _print_comparison(rows: List[Dict[str, Any]]) -> None:
+    columns = ["scenario", "status"] + [metric for metric, _ in COMPARED_METRICS] + ["regressions"]
+    print("\t".join(columns))
+    for row in rows:
+        cells = [row["name"], "→".join(row["status"])]
+        for metric, _ in COMPARED_METRICS:
+            before, after = row["metrics"][metric]
+            mark = "!" if metric in row["regressions"] else ""
+            cells.append(f"{_fmt(before)}→{_fmt(after)}{mark}")
+        cells.append(",".join(row["regressions"]) or "-")
+        print("\t".join(cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="シナリオを解いて JSON レポートを書く")
+    run_parser.add_argument("--out", required=True)
+    run_parser.add_argument("--time-limit", type=float, default=10.0)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--workers", type=int, default=8)
+    run_parser.add_argument("--only", nargs="+", default=None, help="シナリオ名で絞る")
+
+    compare_parser = sub.add_parser("compare", help="2つのレポートを比べる")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="悪化とみなす相対差")
+    compare_parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        specs = [s for s in SCENARIOS if args.only is None or s.name in args.only]
+        report = run(specs, args.time_limit, args.seed, args.workers)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    rows = compare(base, head, args.threshold)
+    _print_comparison(rows)
+    if args.fail_on_regression and any(row["regressions"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,45 @@ class Settings(BaseModel):
     database_url: str = os.getenv("DATABASE_URL", "")
     jwt_secret_key: str = os.getenv("JWT_SECRET_KEY", "change-me-in-production")
 
+    # CP-SATソルバー実行プール（services/solver_pool.py）
+    # 0 を指定するとプロセスを使わずスレッドで実行する（テスト・省メモリ環境用）
+    solver_max_workers: int = int(os.getenv("SOLVER_MAX_WORKERS", "2"))
+    solver_max_pending_jobs: int = int(os.getenv("SOLVER_MAX_PENDING_JOBS", "16"))
+    solver_job_timeout_seconds: float = float(os.getenv("SOLVER_JOB_TIMEOUT_SECONDS", "120"))
+    # 診断は求解を何度も繰り返すため別枠（_diagnose_try_settings だけで最大 10 回 × 5 秒）
+    solver_diagnose_timeout_seconds: float = float(os.getenv("SOLVER_DIAGNOSE_TIMEOUT_SECONDS", "600"))
+    # 実行中ジョブの CP-SAT num_workers 合計の上限（未指定ならサーバーのCPU数）
+    solver_core_budget: int = int(os.getenv("SOLVER_CORE_BUDGET", str(os.cpu_count() or 2)))
+    # プラン（hospitals.plan）別の1ジョブあたり num_workers 上限
+    solver_free_plan_max_cores: int = int(os.getenv("SOLVER_FREE_PLAN_MAX_CORES", "2"))
+    solver_pro_plan_max_cores: int = int(os.getenv("SOLVER_PRO_PLAN_MAX_CORES", "8"))
+
+    # 非同期最適化ジョブ（services/optimize_jobs.py）
+    optimize_job_max_concurrent_per_hospital: int = int(os.getenv("OPTIMIZE_JOB_MAX_CONCURRENT_PER_HOSPITAL", "1"))
+    optimize_job_max_active_per_hospital: int = int(os.getenv("OPTIMIZE_JOB_MAX_ACTIVE_PER_HOSPITAL", "4"))
+    optimize_job_retention_seconds: float = float(os.getenv("OPTIMIZE_JOB_RETENTION_SECONDS", "3600"))
+
+    # 最適化結果キャッシュ（services/optimize_cache.py）
+    optimize_cache_max_entries: int = int(os.getenv("OPTIMIZE_CACHE_MAX_ENTRIES", "256"))
+    optimize_cache_ttl_seconds: float = float(os.getenv("OPTIMIZE_CACHE_TTL_SECONDS", "600"))
+
+    # 病院ごとの設定キャッシュ（services/settings_service.py の SettingsCache。プロセスごと）
+    settings_cache_max_entries: int = int(os.getenv("SETTINGS_CACHE_MAX_ENTRIES", "4096"))
+    settings_cache_ttl_seconds: float = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "300"))
+
+    # 勤務間隔・理想間隔の組み方（services/constraint_builder.py の SPACING_*）: pairwise / window
+    optimizer_spacing_formulation: str = os.getenv("OPTIMIZER_SPACING_FORMULATION", "pairwise")
+    # 入れ替え可能な医師（外部医師・同じ設定の常勤）を最初に入る枠の順に並べる制約を足すか
+    optimizer_symmetry_breaking: bool = os.getenv("OPTIMIZER_SYMMETRY_BREAKING", "false").strip().lower() in ("1", "true", "yes", "on")
+    # num_alternatives 指定時、代替案どうしが最低限違う枠の割合（埋まる枠数に対する比率）
+    optimizer_alternative_min_diff_ratio: float = float(os.getenv("OPTIMIZER_ALTERNATIVE_MIN_DIFF_RATIO", "0.15"))
+    # solve() の早期終了: 下界との相対差がこれ以下なら止める（0 で無効）
+    optimizer_relative_gap_limit: float = float(os.getenv("OPTIMIZER_RELATIVE_GAP_LIMIT", "0.01"))
+    # solve() の早期終了: 改善解がこの秒数出なければ止める（0 で無効）
+    optimizer_stall_seconds: float = float(os.getenv("OPTIMIZER_STALL_SECONDS", "2.0"))
+    # この人数以上の月は大人数モード（貪欲法の初期解から改善・window 方式）で解く。0 で無効
+    optimizer_large_roster_threshold: int = int(os.getenv("OPTIMIZER_LARGE_ROSTER_THRESHOLD", "60"))
+
 @lru_cache
 def get_settings() -> Settings:
     """Return cached application settings."""
@@ -1,5 +1,8 @@
 # backend/main.py
+import asyncio
 import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -17,11 +20,24 @@ import routers.shared_entry as shared_entry_router
 import routers.admin as admin_router
 import routers.guide as guide_router
 import routers.billing as billing_router
+from services.optimize_jobs import shutdown_job_queue
+from services.solver_pool import get_solver_pool, shutdown_solver_pool
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # チャネル用の Manager プロセスは起動に時間がかかるため、リクエスト処理の前にスレッドで起動しておく
+    await asyncio.to_thread(get_solver_pool().start)
+    yield
+    # 実行中のジョブを止めてから、ソルバーのワーカープロセスを残さない
+    await shutdown_job_queue()
+    shutdown_solver_pool()
+
+
 limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title=settings.project_name)
+app = FastAPI(title=settings.project_name, lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
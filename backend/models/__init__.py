@@ -6,6 +6,7 @@ Current core entities:
 - UnavailableDay: 医師ごとの不可日・固定不可曜日
 - Holiday: 休日マスタ
 - SystemSetting: 最適化ルール設定
+- DoctorMonthSummary: 医師×月の確定シフト集計
 """
 
 from .doctor import Doctor
@@ -15,6 +16,7 @@ from .transfer_code import TransferCode
 from .unavailable_day import UnavailableDay
 from .guide_insight import GuideInsight
 from .usage_event import UsageEvent
+from .doctor_month_summary import DoctorMonthSummary
 
 __all__ = [
     "Doctor",
@@ -24,4 +26,5 @@ __all__ = [
     "TransferCode",
     "GuideInsight",
     "UsageEvent",
+    "DoctorMonthSummary",
 ]
\ No newline at end of file
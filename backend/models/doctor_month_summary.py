@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.db import Base
+
+
+class DoctorMonthSummary(Base):
+    """医師×月の確定シフトの集計（shift_assignments から services/score_summary.py が作り直す）
+
+    スコアは病院の shift_scores 設定で変わるので、種類ごとの回数だけを持ち、読むときに掛け合わせる。
+    """
+
+    __tablename__ = "doctor_month_summaries"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    hospital_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("hospitals.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    doctor_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("doctors.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    month: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # 平日の当直・土曜の当直・日祝の日直・日祝の当直（うち同じ医師の日直がない＝日当直を1人で通したもの）
+    weekday_nights: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    saturday_nights: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sunhol_days: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sunhol_nights: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sunhol_combined: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    shift_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+    __table_args__ = (
+        UniqueConstraint("doctor_id", "year", "month", name="uq_doctor_month_summaries_doctor_month"),
+        Index("ix_doctor_month_summaries_hospital_month", "hospital_id", "year", "month"),
+    )
@@ -4,7 +4,7 @@ from __future__ import annotations
 import uuid
 from datetime import date
 
-from sqlalchemy import Date, ForeignKey, String
+from sqlalchemy import Date, ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -20,6 +20,12 @@ class ShiftAssignment(Base):
     # どの日付のシフトか
     date: Mapped[date] = mapped_column(Date, nullable=False)
 
+    # 医師の病院（doctors.hospital_id の非正規化）。病院の月のシフトを医師IDの一覧なしに引くため
+    hospital_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("hospitals.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
     # どの医師のシフトか（Doctorテーブルとの紐付け）
     # ★変更: ondelete="CASCADE" を追加（Doctor削除時にDBが連鎖削除）
     doctor_id: Mapped[uuid.UUID] = mapped_column(
@@ -34,4 +40,9 @@ class ShiftAssignment(Base):
     # ★変更: back_populates を追加して Doctor.shift_assignments と双方向に
     doctor: Mapped["Doctor"] = relationship(
         back_populates="shift_assignments",
-    )
\ No newline at end of file
+    )
+
+    __table_args__ = (
+        Index("ix_shift_assignments_hospital_date", "hospital_id", "date"),
+        Index("ix_shift_assignments_doctor_date", "doctor_id", "date"),
+    )
@@ -14,6 +14,8 @@ from models.doctor import Doctor
 from models.guide_insight import GuideInsight
 from models.hospital import Hospital
 from models.usage_event import UsageEvent
+from services.settings_service import get_settings_cache
+from services.usage_service import SOLVER_EVENT_TYPES, summarize_solver_telemetry
 from schemas.guide_insight import (
     CategoryCount,
     FeatureRequestRanking,
@@ -343,6 +345,58 @@ async def list_events(
     ]
 
 
+@router.get("/usage/solver-telemetry")
+async def solver_telemetry(
+    _: uuid.UUID = Depends(require_superadmin),
+    db: AsyncSession = Depends(get_db),
+    event_type: str | None = Query(None),
+    days: int = Query(30, ge=1, le=365),
+    slowest: int = Query(20, ge=1, le=200),
+):
+    """ソルバーの計測値（生成・修正・期間生成・診断の metadata.solver）の病院別集計と遅いジョブ"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    stmt = (
+        select(
+            UsageEvent.id,
+            UsageEvent.hospital_id,
+            UsageEvent.event_type,
+            UsageEvent.created_at,
+            UsageEvent.metadata_["solver"].label("solver"),
+            Hospital.name.label("hospital_name"),
+        )
+        .join(Hospital, UsageEvent.hospital_id == Hospital.id)
+        .where(
+            UsageEvent.created_at >= since,
+            UsageEvent.event_type.in_([event_type] if event_type else list(SOLVER_EVENT_TYPES)),
+            UsageEvent.metadata_.has_key("solver"),
+        )
+    )
+    rows = (await db.execute(stmt)).all()
+
+    return summarize_solver_telemetry(
+        [
+            {
+                "id": str(row.id),
+                "hospital_id": str(row.hospital_id),
+                "hospital_name": row.hospital_name,
+                "event_type": row.event_type,
+                "created_at": row.created_at.isoformat(),
+                "solver": row.solver,
+            }
+            for row in rows
+        ],
+        slowest=slowest,
+    )
+
+
+@router.get("/settings-cache")
+async def settings_cache_stats(
+    _: uuid.UUID = Depends(require_superadmin),
+):
+    """このプロセスの設定キャッシュの件数・ヒット/ミス数"""
+    return get_settings_cache().stats()
+
+
 @router.get("/usage/hospital/{hospital_id}")
 async def hospital_usage_detail(
     hospital_id: uuid.UUID,
@@ -14,7 +14,6 @@ from core.auth import create_access_token, get_current_hospital
 from core.db import get_db
 from models.doctor import Doctor
 from models.hospital import Hospital
-from models.shift import ShiftAssignment
 from models.system_setting import SystemSetting
 from models.transfer_code import TransferCode
 from models.unavailable_day import UnavailableDay
@@ -27,6 +26,9 @@ from services.auth_service import (
     update_password,
     verify_password,
 )
+from services.schedule_repository import bulk_insert_assignments
+from services.score_summary import refresh_all_summaries
+from services.settings_service import invalidate_hospital_settings
 from services.usage_service import log_event
 
 router = APIRouter(prefix="/api/auth", tags=["Auth"])
@@ -295,6 +297,7 @@ async def delete_account(
     # Hospital削除（CASCADE: doctors → shifts, unavailable_days）
     await db.delete(hospital)
     await db.commit()
+    invalidate_hospital_settings(hospital_id)
 
     return {"message": "アカウントを削除しました"}
 
@@ -378,6 +381,7 @@ async def transfer_import(
 
     # ── データコピー ──
     doctors_count = 0
+    shift_rows = []
     for src_doc in src_doctors:
         new_doc = Doctor(
             hospital_id=hospital_id,
@@ -402,15 +406,14 @@ async def transfer_import(
                 is_soft_penalty=ud.is_soft_penalty,
             ))
 
-        for sa in src_doc.shift_assignments:
-            db.add(ShiftAssignment(
-                doctor_id=new_doc.id,
-                date=sa.date,
-                shift_type=sa.shift_type,
-            ))
+        shift_rows.extend((sa.date, sa.shift_type, new_doc.id) for sa in src_doc.shift_assignments)
 
         doctors_count += 1
 
+    # 引き継ぎ先のシフトは医師の削除で消えているので、全件を1文で追加する
+    await bulk_insert_assignments(db, hospital_id=hospital_id, rows=shift_rows)
+    await refresh_all_summaries(db, hospital_id)
+
     for s in src_settings:
         db.add(SystemSetting(
             hospital_id=hospital_id,
@@ -421,5 +424,6 @@ async def transfer_import(
     # 使用済みコード削除
     await db.delete(tc)
     await db.commit()
+    invalidate_hospital_settings(hospital_id)
 
     return {"message": f"データを取り込みました（医師{doctors_count}名）", "doctors_count": doctors_count}
@@ -6,15 +6,15 @@ from __future__ import annotations
 import calendar
 import time
 from collections import defaultdict
-from datetime import date
+from datetime import date, timedelta
 from typing import Any, Dict, List, Optional
 
-import jpholiday
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
 from schemas.optimize import ConstraintDiagnostic, DiagnosticInfo
-from services.optimizer import OnCallOptimizer
+from services.holiday_service import national_holiday_calendar
+from services.solver_pool import JOB_KIND_SOLVE, PLAN_FREE, SolverJob, SolverJobError, get_solver_pool
 
 router = APIRouter(prefix="/api/demo", tags=["Demo"])
 
@@ -64,15 +64,13 @@ async def demo_optimize(req: DemoOptimizeRequest, request: Request):
     _check_rate_limit(client_ip)
 
     try:
-        # 祝日が未指定なら jpholiday から自動取得
+        # 祝日が未指定なら国民の祝日を使う
         holidays = req.holidays
         if not holidays:
             num_days = calendar.monthrange(req.year, req.month)[1]
-            holidays = [
-                d
-                for d in range(1, num_days + 1)
-                if jpholiday.is_holiday(date(req.year, req.month, d))
-            ]
+            holidays = national_holiday_calendar(
+                date(req.year, req.month, 1), date(req.year, req.month, num_days) + timedelta(days=1),
+            ).month_holidays(req.year, req.month)
 
         hard_constraints: Dict[str, Any] = {
             "interval_days": req.interval_days,
@@ -87,7 +85,7 @@ async def demo_optimize(req: DemoOptimizeRequest, request: Request):
         def _int_keys(d: Optional[Dict[str, float]]) -> Dict[int, float]:
             return {int(k): v for k, v in (d or {}).items()}
 
-        optimizer = OnCallOptimizer(
+        optimizer_kwargs: Dict[str, Any] = dict(
             num_doctors=req.num_doctors,
             year=req.year,
             month=req.month,
@@ -112,8 +110,20 @@ async def demo_optimize(req: DemoOptimizeRequest, request: Request):
             shift_scores=req.shift_scores,
         )
 
-        # Pre-validation
-        pre_errors = optimizer.pre_validate()
+        # Pre-validation + 構築・求解はソルバープール側で実行
+        pool = get_solver_pool()
+        solve_result = await pool.run(
+            SolverJob(
+                kind=JOB_KIND_SOLVE,
+                optimizer_kwargs=optimizer_kwargs,
+                time_limit_seconds=3.0,
+                # デモは無料プラン相当のコア数で実行する
+                max_num_workers=pool.max_cores_for_plan(PLAN_FREE),
+            )
+        )
+        # デモは利用ログを残さないので計測値は捨てる
+        solve_result.pop("telemetry", None)
+        pre_errors = solve_result.get("pre_check_errors")
         if pre_errors:
             _undo_rate_limit(client_ip)
             return {
@@ -124,9 +134,6 @@ async def demo_optimize(req: DemoOptimizeRequest, request: Request):
                 ).model_dump(),
             }
 
-        optimizer.build_model()
-        solve_result = optimizer.solve(time_limit_seconds=3.0)
-
         if not solve_result.get("success"):
             _undo_rate_limit(client_ip)
             return {
@@ -163,6 +170,9 @@ async def demo_optimize(req: DemoOptimizeRequest, request: Request):
 
     except HTTPException:
         raise
+    except SolverJobError as e:
+        _undo_rate_limit(client_ip)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         _undo_rate_limit(client_ip)
         raise HTTPException(status_code=500, detail=str(e))
@@ -8,13 +8,14 @@ from datetime import date
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from pydantic import BaseModel
-from sqlalchemy import delete, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.auth import get_current_hospital
 from core.db import get_db
 from models.doctor import Doctor
-from models.shift import ShiftAssignment
+from services.schedule_repository import replace_month_assignments
+from services.score_summary import refresh_month_summaries
 from services.usage_service import log_event
 
 router = APIRouter(prefix="/api/import", tags=["Import"])
@@ -265,20 +266,7 @@ async def confirm_import(
     start_date = date(body.year, body.month, 1)
     end_date = date(body.year, body.month, days_in_month)
 
-    existing_doctors = await db.execute(
-        select(Doctor.id).where(Doctor.hospital_id == hospital_id)
-    )
-    doc_ids = [row[0] for row in existing_doctors.all()]
-    if doc_ids:
-        await db.execute(
-            delete(ShiftAssignment).where(
-                ShiftAssignment.doctor_id.in_(doc_ids),
-                ShiftAssignment.date >= start_date,
-                ShiftAssignment.date <= end_date,
-            )
-        )
-
-    saved_count = 0
+    rows = []
     for shift in body.shifts:
         day = shift.get("day")
         if not day or day < 1 or day > days_in_month:
@@ -289,20 +277,16 @@ async def confirm_import(
         night_name = shift.get("night_shift")
 
         if day_name and day_name in name_to_id:
-            db.add(ShiftAssignment(
-                doctor_id=name_to_id[day_name],
-                date=shift_date,
-                shift_type="day",
-            ))
-            saved_count += 1
+            rows.append((shift_date, "day", name_to_id[day_name]))
 
         if night_name and night_name in name_to_id:
-            db.add(ShiftAssignment(
-                doctor_id=name_to_id[night_name],
-                date=shift_date,
-                shift_type="night",
-            ))
-            saved_count += 1
+            rows.append((shift_date, "night", name_to_id[night_name]))
+
+    await replace_month_assignments(
+        db, hospital_id=hospital_id, start_date=start_date, end_date=end_date, rows=rows,
+    )
+    await refresh_month_summaries(db, hospital_id, [(body.year, body.month)])
+    saved_count = len(rows)
 
     await db.commit()
     return {"message": f"スケジュールを保存しました（{saved_count}件）", "saved_count": saved_count}
@@ -1,21 +1,36 @@
+import asyncio
+import calendar
+import datetime
+import json
 import uuid
+from dataclasses import dataclass, field
 
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.auth import get_current_hospital
-from core.db import get_db
+from core.db import AsyncSessionLocal, get_db
 from models.doctor import Doctor
+from models.hospital import Hospital
+from models.shift import ShiftAssignment
 from schemas.optimize import (
     ConstraintDiagnostic, ConflictGroup, DiagnosticInfo,
-    DiagnoseResponse, DiagnoseResult, OptimizeRequest, OptimizeResponse,
+    DiagnoseResponse, DiagnoseResult, OptimizeHorizonRequest, OptimizeHorizonResponse,
+    OptimizeJobStatus, OptimizeRequest, OptimizeResponse,
+)
+from services.holiday_service import load_month_holidays
+from services.optimize_cache import fingerprint_seed, get_result_cache, optimization_fingerprint
+from services.optimize_jobs import OptimizeJobError, get_job_queue
+from services.optimizer_history import load_history_totals, past_total_scores_from_totals
+from services.settings_service import get_draft_schedule, get_optimizer_config
+from services.solver_pool import (
+    JOB_KIND_DIAGNOSE, JOB_KIND_HORIZON, JOB_KIND_REPAIR, JOB_KIND_SOLVE, PLAN_FREE,
+    SolverJob, SolverJobError, get_solver_pool,
 )
-from services.optimizer import OnCallOptimizer
-from services.optimizer_history import build_past_total_scores
-from services.settings_service import get_optimizer_config
 from services.usage_service import log_event
 
 router = APIRouter(prefix="/api/optimize", tags=["Optimize"])
@@ -73,493 +88,798 @@ def _normalize_fixed_weekday_item(item: Any) -> Optional[Dict[str, Any]]:
     }
 
 
-@router.post("/", response_model=OptimizeResponse)
-async def generate_schedule(
+@dataclass
+class _PreparedOptimization:
+    """DBから読み込んだ医師情報と、ソルバーに渡すインデックス化済みの入力"""
+
+    doctors: List[Doctor]
+    idx_to_uuid: Dict[int, str]
+    idx_to_name: Dict[int, str]
+    uuid_to_idx: Dict[str, int]
+    optimizer_kwargs: Dict[str, Any]
+    plan: str = PLAN_FREE
+    # warm_start 時の解のヒント（locked_shifts と同じ形）と、その出どころ（"draft" / "saved"）
+    solution_hints: List[Dict[str, Any]] = field(default_factory=list)
+    warm_start_source: Optional[str] = None
+    num_alternatives: int = 1
+
+
+# 保存済みシフトの shift_type は「日直」「当直」で保存されている
+_DAY_SHIFT_VALUES = {"日直", "day", "day_shift"}
+
+
+async def _load_warm_start_hints(
     req: OptimizeRequest,
-    hospital_id: uuid.UUID = Depends(get_current_hospital),
-    db: AsyncSession = Depends(get_db),
-):
-    try:
-        # --- 内部（常勤）医師を取得 ---
-        result = await db.execute(
-            select(Doctor)
-            .where(
-                Doctor.hospital_id == hospital_id,
-                Doctor.is_active.is_(True),
-                Doctor.is_external.is_(False),
-            )
-            .order_by(Doctor.id)
-        )
-        internal_doctors = list(result.scalars().all())
+    hospital_id: uuid.UUID,
+    db: AsyncSession,
+    uuid_to_idx: Dict[str, int],
+) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """当月のドラフト（なければ保存済みシフト）を医師インデックス基準のヒントにする
+
+    今回の対象外の医師（休止中・num_doctors 外）の枠はヒントにしない。
+    """
+    draft = await get_draft_schedule(db, hospital_id, req.year, req.month)
+    if draft and draft.get("schedule"):
+        hints = [
+            {"date": int(row["day"]), "shift_type": shift_type, "doctor_idx": uuid_to_idx[str(row[key])]}
+            for row in draft["schedule"]
+            if isinstance(row, dict) and row.get("day")
+            for key, shift_type in (("day_shift", "day"), ("night_shift", "night"))
+            if row.get(key) is not None and str(row[key]) in uuid_to_idx
+        ]
+        return "draft", hints
+
+    hints = await _load_saved_assignments(req, db, uuid_to_idx)
+    return ("saved", hints) if hints else (None, [])
 
-        if len(internal_doctors) < req.num_doctors:
-            raise HTTPException(status_code=400, detail="num_doctors exceeds registered active doctors")
 
-        internal_doctors = internal_doctors[: req.num_doctors]
+async def _load_saved_assignments(
+    req: OptimizeRequest,
+    db: AsyncSession,
+    uuid_to_idx: Dict[str, int],
+) -> List[Dict[str, Any]]:
+    """当月の保存済みシフト（ShiftAssignment）を医師インデックス基準の割り当て（locked_shifts と同じ形）にする"""
+    start_date = datetime.date(req.year, req.month, 1)
+    end_date = datetime.date(req.year, req.month, calendar.monthrange(req.year, req.month)[1])
+    result = await db.execute(
+        select(ShiftAssignment.date, ShiftAssignment.shift_type, ShiftAssignment.doctor_id)
+        .where(
+            ShiftAssignment.date >= start_date,
+            ShiftAssignment.date <= end_date,
+            ShiftAssignment.doctor_id.in_([uuid.UUID(k) for k in uuid_to_idx]),
+        )
+        .order_by(ShiftAssignment.date)
+    )
+    return [
+        {
+            "date": row.date.isoformat(),
+            "shift_type": "day" if row.shift_type in _DAY_SHIFT_VALUES else "night",
+            "doctor_idx": uuid_to_idx[str(row.doctor_id)],
+        }
+        for row in result.all()
+    ]
 
-        # --- 外部（ダミー）医師の確保 ---
-        hc = req.hard_constraints if isinstance(req.hard_constraints, dict) else {}
-        external_slot_count = int(hc.get("external_slot_count", 0) or 0)
-        external_fixed_dates_raw = list(hc.get("external_fixed_dates", []) or [])
-        required_external = max(external_slot_count, len(external_fixed_dates_raw))
 
-        ext_result = await db.execute(
-            select(Doctor)
-            .where(
-                Doctor.hospital_id == hospital_id,
-                Doctor.is_external.is_(True),
-            )
-            .order_by(Doctor.name)
+async def _prepare_optimization(
+    req: OptimizeRequest,
+    hospital_id: uuid.UUID,
+    db: AsyncSession,
+    *,
+    ensure_external_doctors: bool = True,
+) -> _PreparedOptimization:
+    """OptimizeRequest を OnCallOptimizer の引数（医師インデックス基準）に変換する"""
+    # --- 内部（常勤）医師を取得 ---
+    result = await db.execute(
+        select(Doctor)
+        .where(
+            Doctor.hospital_id == hospital_id,
+            Doctor.is_active.is_(True),
+            Doctor.is_external.is_(False),
         )
-        existing_external = list(ext_result.scalars().all())
-
-        # 31人に満たない場合は自動作成
-        if len(existing_external) < 31:
-            for n in range(len(existing_external) + 1, 32):
-                new_ext = Doctor(
-                    name=f"外部{n}",
-                    hospital_id=hospital_id,
-                    is_external=True,
-                    experience_years=0,
-                )
-                db.add(new_ext)
-                existing_external.append(new_ext)
-            await db.commit()
-
-        # 必要分だけ使う
-        external_doctors = existing_external[:required_external] if required_external > 0 else []
-
-        # --- 内部 + 外部を結合してインデックス付け ---
-        doctors = list(internal_doctors) + list(external_doctors)
-        num_internal = len(internal_doctors)
-        total_doctors = len(doctors)
-
-        idx_to_uuid: Dict[int, str] = {i: str(d.id) for i, d in enumerate(doctors)}
-        uuid_to_idx: Dict[str, int] = {str(d.id): i for i, d in enumerate(doctors)}
-        external_doctor_indices: set[int] = set(range(num_internal, total_doctors))
-        external_uuid_set = {str(d.id) for d in external_doctors}
-
-        def _key_to_idx(key: Any) -> int:
-            k = str(key)
-
-            if k.isdigit():
-                idx = int(k)
-                if 0 <= idx < total_doctors:
-                    return idx
-                raise HTTPException(status_code=400, detail=f"doctor index out of range: {k}")
-
-            if k in uuid_to_idx:
-                return uuid_to_idx[k]
-
-            raise HTTPException(status_code=400, detail=f"unknown doctor key: {k}")
-
-        def _remap_keys(src: Dict[str, Any]) -> Dict[int, Any]:
-            out: Dict[int, Any] = {}
-            for k, v in src.items():
-                out[_key_to_idx(k)] = v
-            return out
-
-        # Load shift_scores from optimizer config
-        optimizer_cfg = await get_optimizer_config(db, hospital_id)
-        shift_scores = optimizer_cfg.get("shift_scores")
-
-        historical_past_total_scores = await build_past_total_scores(
-            db,
-            hospital_id=hospital_id,
-            doctor_ids=[doctor.id for doctor in internal_doctors],
-            target_year=req.year,
-            target_month=req.month,
-            shift_scores=shift_scores,
+        .order_by(Doctor.id)
+    )
+    internal_doctors = list(result.scalars().all())
+
+    if len(internal_doctors) < req.num_doctors:
+        raise HTTPException(status_code=400, detail="num_doctors exceeds registered active doctors")
+
+    internal_doctors = internal_doctors[: req.num_doctors]
+
+    # --- 外部（ダミー）医師の確保 ---
+    hc = req.hard_constraints if isinstance(req.hard_constraints, dict) else {}
+    external_slot_count = int(hc.get("external_slot_count", 0) or 0)
+    external_fixed_dates_raw = list(hc.get("external_fixed_dates", []) or [])
+    required_external = max(external_slot_count, len(external_fixed_dates_raw))
+
+    ext_result = await db.execute(
+        select(Doctor)
+        .where(
+            Doctor.hospital_id == hospital_id,
+            Doctor.is_external.is_(True),
         )
-        merged_past_total_scores: Dict[str, float] = {
-            str(doctor_id): score
-            for doctor_id, score in historical_past_total_scores.items()
-        }
-        merged_past_total_scores.update(req.past_total_scores)
+        .order_by(Doctor.name)
+    )
+    existing_external = list(ext_result.scalars().all())
+
+    # 31人に満たない場合は自動作成
+    if ensure_external_doctors and len(existing_external) < 31:
+        for n in range(len(existing_external) + 1, 32):
+            new_ext = Doctor(
+                name=f"外部{n}",
+                hospital_id=hospital_id,
+                is_external=True,
+                experience_years=0,
+            )
+            db.add(new_ext)
+            existing_external.append(new_ext)
+        await db.commit()
 
-        # 外部医師UUIDを除外してリマップ（月マタギ間隔チェック対象外）
-        prev_month_internal_only = {
-            k: v for k, v in req.prev_month_worked_days.items()
-            if k not in external_uuid_set
+    # 必要分だけ使う
+    external_doctors = existing_external[:required_external] if required_external > 0 else []
+
+    # --- 内部 + 外部を結合してインデックス付け ---
+    doctors = list(internal_doctors) + list(external_doctors)
+    num_internal = len(internal_doctors)
+    total_doctors = len(doctors)
+
+    idx_to_uuid: Dict[int, str] = {i: str(d.id) for i, d in enumerate(doctors)}
+    uuid_to_idx: Dict[str, int] = {str(d.id): i for i, d in enumerate(doctors)}
+    idx_to_name: Dict[int, str] = {i: d.name for i, d in enumerate(doctors)}
+    external_doctor_indices: set[int] = set(range(num_internal, total_doctors))
+    external_uuid_set = {str(d.id) for d in external_doctors}
+
+    def _key_to_idx(key: Any) -> int:
+        k = str(key)
+
+        if k.isdigit():
+            idx = int(k)
+            if 0 <= idx < total_doctors:
+                return idx
+            raise HTTPException(status_code=400, detail=f"doctor index out of range: {k}")
+
+        if k in uuid_to_idx:
+            return uuid_to_idx[k]
+
+        raise HTTPException(status_code=400, detail=f"unknown doctor key: {k}")
+
+    def _remap_keys(src: Dict[str, Any]) -> Dict[int, Any]:
+        out: Dict[int, Any] = {}
+        for k, v in src.items():
+            out[_key_to_idx(k)] = v
+        return out
+
+    # Load shift_scores from optimizer config
+    optimizer_cfg = await get_optimizer_config(db, hospital_id)
+    shift_scores = optimizer_cfg.get("shift_scores")
+
+    # 直前2か月の回数（doctor_month_summaries）から過去スコアと土曜・日祝回数を出す
+    history_totals = await load_history_totals(
+        db,
+        hospital_id=hospital_id,
+        doctor_ids=[doctor.id for doctor in internal_doctors],
+        target_year=req.year,
+        target_month=req.month,
+    )
+    historical_past_total_scores = past_total_scores_from_totals(history_totals, shift_scores)
+    # 送られてこない（全員0の）ときだけ集計表の値で埋める
+    past_sat_counts = req.past_sat_counts
+    if not any(past_sat_counts):
+        past_sat_counts = [history_totals[doctor.id].saturday_nights for doctor in internal_doctors]
+    past_sunhol_counts = req.past_sunhol_counts
+    if not any(past_sunhol_counts):
+        past_sunhol_counts = [history_totals[doctor.id].sunhol_works for doctor in internal_doctors]
+    merged_past_total_scores: Dict[str, float] = {
+        str(doctor_id): score
+        for doctor_id, score in historical_past_total_scores.items()
+    }
+    merged_past_total_scores.update(req.past_total_scores)
+
+    # 外部医師UUIDを除外してリマップ（月マタギ間隔チェック対象外）
+    prev_month_internal_only = {
+        k: v for k, v in req.prev_month_worked_days.items()
+        if k not in external_uuid_set
+    }
+    formatted_prev_month = _remap_keys(prev_month_internal_only)
+    formatted_min_score = _remap_keys(req.min_score_by_doctor)
+    formatted_max_score = _remap_keys(req.max_score_by_doctor)
+    formatted_target_score = _remap_keys(req.target_score_by_doctor)
+    formatted_past_total_scores = _remap_keys(merged_past_total_scores)
+    formatted_sat_prev = _remap_keys(req.sat_prev)
+
+    locked_shifts_idx = [
+        {
+            "date": _serialize_scalar(locked.date),
+            "shift_type": locked.shift_type,
+            "doctor_idx": _key_to_idx(locked.doctor_id),
+        }
+        for locked in req.locked_shifts
+    ]
+
+    # 前月シフトからも外部医師を除外
+    previous_month_shifts_filtered = [
+        shift for shift in (req.previous_month_shifts or [])
+        if str(shift.doctor_id) not in external_uuid_set
+    ]
+    previous_month_shifts_idx = [
+        {
+            "date": _serialize_scalar(shift.date),
+            "shift_type": shift.shift_type,
+            "doctor_idx": _key_to_idx(shift.doctor_id),
         }
-        formatted_prev_month = _remap_keys(prev_month_internal_only)
-        formatted_min_score = _remap_keys(req.min_score_by_doctor)
-        formatted_max_score = _remap_keys(req.max_score_by_doctor)
-        formatted_target_score = _remap_keys(req.target_score_by_doctor)
-        formatted_past_total_scores = _remap_keys(merged_past_total_scores)
-        formatted_sat_prev = _remap_keys(req.sat_prev)
-
-        locked_shifts_idx = [
-            {
-                "date": _serialize_scalar(locked.date),
-                "shift_type": locked.shift_type,
-                "doctor_idx": _key_to_idx(locked.doctor_id),
-            }
-            for locked in req.locked_shifts
+        for shift in previous_month_shifts_filtered
+    ]
+
+    _u = _remap_keys(req.unavailable)
+    formatted_unavailable: Dict[int, Any] = {
+        idx: [
+            normalized
+            for item in (items or [])
+            for normalized in [_normalize_unavailable_item(item)]
+            if normalized is not None
         ]
+        for idx, items in _u.items()
+    }
 
-        # 前月シフトからも外部医師を除外
-        previous_month_shifts_filtered = [
-            shift for shift in (req.previous_month_shifts or [])
-            if str(shift.doctor_id) not in external_uuid_set
-        ]
-        previous_month_shifts_idx = [
-            {
-                "date": _serialize_scalar(shift.date),
-                "shift_type": shift.shift_type,
-                "doctor_idx": _key_to_idx(shift.doctor_id),
-            }
-            for shift in previous_month_shifts_filtered
+    _fw = _remap_keys(req.fixed_unavailable_weekdays)
+    formatted_fixed_weekdays: Dict[int, Any] = {
+        idx: [
+            normalized
+            for item in (items or [])
+            for normalized in [_normalize_fixed_weekday_item(item)]
+            if normalized is not None
         ]
+        for idx, items in _fw.items()
+    }
 
-        _u = _remap_keys(req.unavailable)
-        formatted_unavailable: Dict[int, Any] = {
-            idx: [
-                normalized
-                for item in (items or [])
-                for normalized in [_normalize_unavailable_item(item)]
-                if normalized is not None
-            ]
-            for idx, items in _u.items()
-        }
+    weights_dict = (
+        req.objective_weights.model_dump()
+        if hasattr(req.objective_weights, "model_dump")
+        else req.objective_weights.dict()
+    )
 
-        _fw = _remap_keys(req.fixed_unavailable_weekdays)
-        formatted_fixed_weekdays: Dict[int, Any] = {
-            idx: [
-                normalized
-                for item in (items or [])
-                for normalized in [_normalize_fixed_weekday_item(item)]
-                if normalized is not None
-            ]
-            for idx, items in _fw.items()
-        }
+    # 祝日を送ってこなければ病院の祝日カレンダー（国民の祝日 + 手動祝日 − 除外）を使う
+    holidays = (
+        req.holidays if "holidays" in req.model_fields_set
+        else await load_month_holidays(db, hospital_id, req.year, req.month)
+    )
 
-        weights_dict = (
-            req.objective_weights.model_dump()
-            if hasattr(req.objective_weights, "model_dump")
-            else req.objective_weights.dict()
-        )
+    optimizer_kwargs: Dict[str, Any] = dict(
+        num_doctors=total_doctors,
+        year=req.year,
+        month=req.month,
+        holidays=holidays,
+        unavailable=formatted_unavailable,
+        fixed_unavailable_weekdays=formatted_fixed_weekdays,
+        prev_month_worked_days=formatted_prev_month,
+        prev_month_last_day=req.prev_month_last_day,
+        previous_month_shifts=previous_month_shifts_idx,
+        score_min=req.score_min,
+        score_max=req.score_max,
+        past_sat_counts=past_sat_counts,
+        past_sunhol_counts=past_sunhol_counts,
+        min_score_by_doctor=formatted_min_score,
+        max_score_by_doctor=formatted_max_score,
+        target_score_by_doctor=formatted_target_score,
+        past_total_scores=formatted_past_total_scores,
+        sat_prev=formatted_sat_prev,
+        objective_weights=weights_dict,
+        hard_constraints=req.hard_constraints,
+        locked_shifts=locked_shifts_idx,
+        shift_scores=shift_scores,
+        external_doctor_indices=external_doctor_indices,
+        external_fixed_dates=external_fixed_dates_raw,
+    )
 
-        optimizer = OnCallOptimizer(
-            num_doctors=total_doctors,
-            year=req.year,
-            month=req.month,
-            holidays=req.holidays,
-            unavailable=formatted_unavailable,
-            fixed_unavailable_weekdays=formatted_fixed_weekdays,
-            prev_month_worked_days=formatted_prev_month,
-            prev_month_last_day=req.prev_month_last_day,
-            previous_month_shifts=previous_month_shifts_idx,
-            score_min=req.score_min,
-            score_max=req.score_max,
-            past_sat_counts=req.past_sat_counts,
-            past_sunhol_counts=req.past_sunhol_counts,
-            min_score_by_doctor=formatted_min_score,
-            max_score_by_doctor=formatted_max_score,
-            target_score_by_doctor=formatted_target_score,
-            past_total_scores=formatted_past_total_scores,
-            sat_prev=formatted_sat_prev,
-            objective_weights=weights_dict,
-            hard_constraints=req.hard_constraints,
-            locked_shifts=locked_shifts_idx,
-            shift_scores=shift_scores,
-            external_doctor_indices=external_doctor_indices,
-            external_fixed_dates=external_fixed_dates_raw,
-        )
+    # ソルバーに割り当てるコア数の上限はプランで決まる
+    plan = (
+        await db.execute(select(Hospital.plan).where(Hospital.id == hospital_id))
+    ).scalar_one_or_none() or PLAN_FREE
+
+    warm_start_source: Optional[str] = None
+    solution_hints: List[Dict[str, Any]] = []
+    if req.warm_start:
+        warm_start_source, solution_hints = await _load_warm_start_hints(req, hospital_id, db, uuid_to_idx)
+
+    return _PreparedOptimization(
+        doctors=doctors,
+        idx_to_uuid=idx_to_uuid,
+        idx_to_name=idx_to_name,
+        uuid_to_idx=uuid_to_idx,
+        optimizer_kwargs=optimizer_kwargs,
+        plan=plan,
+        solution_hints=solution_hints,
+        warm_start_source=warm_start_source,
+        num_alternatives=req.num_alternatives,
+    )
 
-        # Pre-validation: fast arithmetic checks before solving
-        pre_errors = optimizer.pre_validate()
-        if pre_errors:
-            diagnostics = DiagnosticInfo(
-                pre_check_errors=[ConstraintDiagnostic(**e) for e in pre_errors]
-            )
-            await log_event(db, hospital_id, "generate", {
-                "year": req.year, "month": req.month,
-                "doctor_count": len(doctors), "status": "pre_check_failed",
-            })
-            await db.commit()
-            return OptimizeResponse(
-                success=False,
-                message="制約の設定に問題があります",
-                diagnostics=diagnostics,
-            )
 
-        optimizer.build_model()
-        solve_result = optimizer.solve()
+def _map_solve_result(solve_result: Dict[str, Any], prepared: _PreparedOptimization) -> Dict[str, Any]:
+    """solve() の医師インデックスを UUID（+名前）に置き換える"""
+    idx_to_uuid = prepared.idx_to_uuid
 
-        if not solve_result.get("success"):
-            await log_event(db, hospital_id, "generate", {
-                "year": req.year, "month": req.month,
-                "doctor_count": len(doctors), "status": "infeasible",
-            })
-            await db.commit()
-            return OptimizeResponse(
-                success=False,
-                message=solve_result.get("message", "スケジュールを生成できませんでした"),
-            )
+    if isinstance(solve_result.get("schedule"), list):
+        for row in solve_result["schedule"]:
+            if row.get("day_shift") is not None:
+                try:
+                    idx = int(row["day_shift"])
+                    row["day_shift"] = idx_to_uuid.get(idx, row["day_shift"])
+                except Exception:
+                    pass
 
-        if isinstance(solve_result.get("schedule"), list):
-            for row in solve_result["schedule"]:
-                if row.get("day_shift") is not None:
-                    try:
-                        idx = int(row["day_shift"])
-                        row["day_shift"] = idx_to_uuid.get(idx, row["day_shift"])
-                    except Exception:
-                        pass
-
-                if row.get("night_shift") is not None:
-                    try:
-                        idx = int(row["night_shift"])
-                        row["night_shift"] = idx_to_uuid.get(idx, row["night_shift"])
-                    except Exception:
-                        pass
-
-        if isinstance(solve_result.get("scores"), dict):
-            new_scores: Dict[str, float] = {}
-            for k, v in solve_result["scores"].items():
+            if row.get("night_shift") is not None:
                 try:
-                    idx = int(k)
-                    new_scores[idx_to_uuid.get(idx, str(k))] = v
+                    idx = int(row["night_shift"])
+                    row["night_shift"] = idx_to_uuid.get(idx, row["night_shift"])
                 except Exception:
-                    new_scores[str(k)] = v
-            solve_result["scores"] = new_scores
-
-        # Map soft unavail violations from index to UUID + name
-        if solve_result.get("soft_unavail_violations"):
-            idx_to_name: Dict[int, str] = {i: d.name for i, d in enumerate(doctors)}
-            mapped = []
-            for v in solve_result["soft_unavail_violations"]:
-                d_idx = v["doctor_idx"]
-                mapped.append({
-                    "doctor_id": idx_to_uuid.get(d_idx, str(d_idx)),
-                    "doctor_name": idx_to_name.get(d_idx, f"医師{d_idx + 1}"),
-                    "day": v["day"],
-                    "shift_type": v["shift_type"],
-                })
-            solve_result["soft_unavail_violations"] = mapped
-
-        await log_event(db, hospital_id, "generate", {
+                    pass
+
+    if isinstance(solve_result.get("scores"), dict):
+        new_scores: Dict[str, float] = {}
+        for k, v in solve_result["scores"].items():
+            try:
+                idx = int(k)
+                new_scores[idx_to_uuid.get(idx, str(k))] = v
+            except Exception:
+                new_scores[str(k)] = v
+        solve_result["scores"] = new_scores
+
+    # Map soft unavail violations from index to UUID + name
+    if solve_result.get("soft_unavail_violations"):
+        mapped = []
+        for v in solve_result["soft_unavail_violations"]:
+            d_idx = v["doctor_idx"]
+            mapped.append({
+                "doctor_id": idx_to_uuid.get(d_idx, str(d_idx)),
+                "doctor_name": prepared.idx_to_name.get(d_idx, f"医師{d_idx + 1}"),
+                "day": v["day"],
+                "shift_type": v["shift_type"],
+            })
+        solve_result["soft_unavail_violations"] = mapped
+
+    for alternative in solve_result.get("alternatives") or []:
+        _map_solve_result(alternative, prepared)
+
+    repair = solve_result.get("repair")
+    if repair and repair.get("changed"):
+        for change in repair["changed"]:
+            for key in ("before", "after"):
+                if change.get(key) is not None:
+                    change[key] = idx_to_uuid.get(change[key], change[key])
+
+    return solve_result
+
+
+async def _finish_generate(
+    solve_result: Dict[str, Any],
+    prepared: _PreparedOptimization,
+    req: OptimizeRequest,
+    hospital_id: uuid.UUID,
+    db: AsyncSession,
+    event: str = "generate",
+) -> Dict[str, Any]:
+    """ワーカーの solve 結果を OptimizeResponse の形に整え、利用ログを記録する"""
+    doctors = prepared.doctors
+    # 段階ごとの所要時間とソルバーの計測値は利用ログだけに残す（応答には含めない）
+    telemetry = solve_result.pop("telemetry", None)
+
+    # Pre-validation: fast arithmetic checks before solving
+    pre_errors = solve_result.get("pre_check_errors")
+    if pre_errors:
+        diagnostics = DiagnosticInfo(
+            pre_check_errors=[ConstraintDiagnostic(**e) for e in pre_errors]
+        )
+        await log_event(db, hospital_id, event, {
+            "year": req.year, "month": req.month,
+            "doctor_count": len(doctors), "status": "pre_check_failed", "solver": telemetry,
+        })
+        await db.commit()
+        return OptimizeResponse(
+            success=False,
+            message="制約の設定に問題があります",
+            diagnostics=diagnostics,
+        ).model_dump()
+
+    if not solve_result.get("success"):
+        await log_event(db, hospital_id, event, {
             "year": req.year, "month": req.month,
-            "doctor_count": len(doctors), "status": "success",
+            "doctor_count": len(doctors), "status": "infeasible", "solver": telemetry,
         })
         await db.commit()
-        return solve_result
+        return OptimizeResponse(
+            success=False,
+            message=solve_result.get("message", "スケジュールを生成できませんでした"),
+            solver_params=solve_result.get("solver_params"),
+        ).model_dump()
+
+    solve_result = _map_solve_result(solve_result, prepared)
+    if solve_result.get("warm_start") is not None:
+        solve_result["warm_start"]["source"] = prepared.warm_start_source
+
+    await log_event(db, hospital_id, event, {
+        "year": req.year, "month": req.month,
+        "doctor_count": len(doctors), "status": "success", "solver": telemetry,
+    })
+    await db.commit()
+    return solve_result
+
+
+async def _finish_diagnose(
+    job_result: Dict[str, Any],
+    req: OptimizeRequest,
+    hospital_id: uuid.UUID,
+    db: AsyncSession,
+) -> DiagnoseResponse:
+    """ワーカーの diagnose 結果を DiagnoseResponse に整え、利用ログを記録する"""
+    diag_result = job_result["diagnosis"]
+    phase_completed = diag_result.get("phase_completed", 2)
+
+    # Phase 3: Gemini AI explanation (optional — skip if no API key)
+    # Phase 3 (Gemini AI) は現在スキップ — ソルバー側の診断で十分なため
+    # 将来再有効化する場合は以下のコメントを外す
+    ai_explanation = None
+    # gemini_api_key = os.getenv("GEMINI_API_KEY", "")
+    # if gemini_api_key and diag_result.get("conflict_groups"):
+    #     try:
+    #         ai_explanation = _call_gemini_diagnosis(
+    #             year=req.year, month=req.month,
+    #             num_doctors=req.num_doctors,
+    #             num_days=calendar.monthrange(req.year, req.month)[1],
+    #             holidays=req.holidays,
+    #             conflict_groups=diag_result["conflict_groups"],
+    #             specific_violations=diag_result["specific_violations"],
+    #             human_insights=diag_result["human_insights"],
+    #             gemini_api_key=gemini_api_key,
+    #         )
+    #         phase_completed = 3
+    #     except Exception:
+    #         pass
+
+    await log_event(db, hospital_id, "diagnose", {
+        "year": req.year, "month": req.month, "solver": job_result.get("telemetry"),
+    })
+    await db.commit()
+
+    return DiagnoseResponse(
+        success=True,
+        phase_completed=phase_completed,
+        result=DiagnoseResult(
+            conflict_groups=[ConflictGroup(**g) for g in diag_result["conflict_groups"]],
+            specific_violations=diag_result["specific_violations"],
+            solvable_removals=diag_result.get("solvable_removals", []),
+            human_insights=diag_result["human_insights"],
+            ai_explanation=ai_explanation,
+        ),
+    )
+
+
+# 修正は影響を受けた日の近傍だけを解くので、通常は1秒未満で最適になる（上限はその保険）
+_REPAIR_TIME_LIMIT_SECONDS = 2.0
+
+
+def _build_solver_job(kind: str, prepared: _PreparedOptimization) -> SolverJob:
+    max_num_workers = get_solver_pool().max_cores_for_plan(prepared.plan)
+    if kind == JOB_KIND_DIAGNOSE:
+        return SolverJob(
+            kind=JOB_KIND_DIAGNOSE,
+            optimizer_kwargs=prepared.optimizer_kwargs,
+            doctor_names=prepared.idx_to_name,
+            max_num_workers=max_num_workers,
+        )
+    if kind == JOB_KIND_REPAIR:
+        return SolverJob(
+            kind=JOB_KIND_REPAIR,
+            optimizer_kwargs=prepared.optimizer_kwargs,
+            time_limit_seconds=_REPAIR_TIME_LIMIT_SECONDS,
+            max_num_workers=max_num_workers,
+            solution_hints=prepared.solution_hints,
+        )
+    return SolverJob(
+        kind=JOB_KIND_SOLVE,
+        optimizer_kwargs=prepared.optimizer_kwargs,
+        max_num_workers=max_num_workers,
+        solution_hints=prepared.solution_hints,
+        num_alternatives=prepared.num_alternatives,
+    )
+
+
+async def _run_deterministic(
+    job: SolverJob,
+    prepared: _PreparedOptimization,
+    hospital_id: uuid.UUID,
+) -> Dict[str, Any]:
+    """正規化済み入力のフィンガープリントで結果キャッシュを引き、なければ固定シードで解く"""
+    fingerprint = optimization_fingerprint(
+        hospital_id,
+        optimizer_kwargs=prepared.optimizer_kwargs,
+        idx_to_uuid=prepared.idx_to_uuid,
+        solution_hints=job.solution_hints,
+        time_limit_seconds=job.time_limit_seconds,
+        num_alternatives=job.num_alternatives,
+    )
+    job.random_seed = fingerprint_seed(fingerprint)
+    solve_result, cached = await get_result_cache().get_or_compute(
+        hospital_id, fingerprint, lambda: get_solver_pool().run(job),
+    )
+    solve_result["cached"] = cached
+    if cached:
+        # キャッシュから返した結果ではソルバーを動かしていないので、計測値を利用ログに残さない
+        solve_result.pop("telemetry", None)
+    return solve_result
+
+
+@router.post("/", response_model=OptimizeResponse)
+async def generate_schedule(
+    req: OptimizeRequest,
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        prepared = await _prepare_optimization(req, hospital_id, db)
+
+        # 構築・求解はソルバープール側で実行（イベントループを塞がない）
+        job = _build_solver_job(JOB_KIND_SOLVE, prepared)
+        if req.deterministic:
+            solve_result = await _run_deterministic(job, prepared, hospital_id)
+        else:
+            solve_result = await get_solver_pool().run(job)
+        return await _finish_generate(solve_result, prepared, req, hospital_id, db)
 
     except HTTPException:
         raise
+    except SolverJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/diagnose", response_model=DiagnoseResponse)
-async def diagnose_constraints(
+@router.post("/repair", response_model=OptimizeResponse)
+async def repair_schedule(
     req: OptimizeRequest,
     hospital_id: uuid.UUID = Depends(get_current_hospital),
     db: AsyncSession = Depends(get_db),
 ):
-    """P1-2 Phase2: Diagnose why the model is infeasible."""
-    import os
+    """公開（保存）済みの月を、今の入力（追加の不可日など）に合わせて最小の変更で直す。
 
+    変更した枠は repair.changed に {day, shift_type, before, after}（医師ID）で返す。
+    """
     try:
-        # --- 内部（常勤）医師を取得 ---
-        result = await db.execute(
-            select(Doctor)
-            .where(
-                Doctor.hospital_id == hospital_id,
-                Doctor.is_active.is_(True),
-                Doctor.is_external.is_(False),
-            )
-            .order_by(Doctor.id)
-        )
-        internal_doctors = list(result.scalars().all())
+        prepared = await _prepare_optimization(req, hospital_id, db)
+        prepared.solution_hints = await _load_saved_assignments(req, db, prepared.uuid_to_idx)
+        if not prepared.solution_hints:
+            raise HTTPException(status_code=404, detail="この月の保存済みシフトがありません")
 
-        if len(internal_doctors) < req.num_doctors:
-            raise HTTPException(status_code=400, detail="num_doctors exceeds registered active doctors")
+        solve_result = await get_solver_pool().run(_build_solver_job(JOB_KIND_REPAIR, prepared))
+        return await _finish_generate(solve_result, prepared, req, hospital_id, db, event="repair")
 
-        internal_doctors = internal_doctors[: req.num_doctors]
+    except HTTPException:
+        raise
+    except SolverJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # --- 外部（ダミー）医師 ---
-        hc_diag = req.hard_constraints if isinstance(req.hard_constraints, dict) else {}
-        ext_slot_count_diag = int(hc_diag.get("external_slot_count", 0) or 0)
-        ext_fixed_dates_diag = list(hc_diag.get("external_fixed_dates", []) or [])
-        required_ext = max(ext_slot_count_diag, len(ext_fixed_dates_diag))
 
-        ext_result = await db.execute(
-            select(Doctor).where(
-                Doctor.hospital_id == hospital_id, Doctor.is_external.is_(True),
-            ).order_by(Doctor.name)
-        )
-        existing_ext = list(ext_result.scalars().all())
-        external_doctors = existing_ext[:required_ext] if required_ext > 0 else []
-
-        doctors = list(internal_doctors) + list(external_doctors)
-        num_internal = len(internal_doctors)
-        total_doctors = len(doctors)
-
-        idx_to_uuid: Dict[int, str] = {i: str(d.id) for i, d in enumerate(doctors)}
-        uuid_to_idx: Dict[str, int] = {str(d.id): i for i, d in enumerate(doctors)}
-        idx_to_name: Dict[int, str] = {i: d.name for i, d in enumerate(doctors)}
-        external_doctor_indices: set[int] = set(range(num_internal, total_doctors))
-        external_uuid_set = {str(d.id) for d in external_doctors}
-
-        def _key_to_idx(key: Any) -> int:
-            k = str(key)
-            if k.isdigit():
-                idx = int(k)
-                if 0 <= idx < total_doctors:
-                    return idx
-                raise HTTPException(status_code=400, detail=f"doctor index out of range: {k}")
-            if k in uuid_to_idx:
-                return uuid_to_idx[k]
-            raise HTTPException(status_code=400, detail=f"unknown doctor key: {k}")
-
-        def _remap_keys(src: Dict[str, Any]) -> Dict[int, Any]:
-            out: Dict[int, Any] = {}
-            for k, v in src.items():
-                out[_key_to_idx(k)] = v
-            return out
-
-        optimizer_cfg = await get_optimizer_config(db, hospital_id)
-        shift_scores = optimizer_cfg.get("shift_scores")
-
-        historical_past_total_scores = await build_past_total_scores(
-            db, hospital_id=hospital_id,
-            doctor_ids=[doctor.id for doctor in internal_doctors],
-            target_year=req.year, target_month=req.month,
-            shift_scores=shift_scores,
-        )
-        merged_past_total_scores: Dict[str, float] = {
-            str(doctor_id): score for doctor_id, score in historical_past_total_scores.items()
-        }
-        merged_past_total_scores.update(req.past_total_scores)
-
-        prev_month_internal = {k: v for k, v in req.prev_month_worked_days.items() if k not in external_uuid_set}
-        formatted_prev_month = _remap_keys(prev_month_internal)
-        formatted_min_score = _remap_keys(req.min_score_by_doctor)
-        formatted_max_score = _remap_keys(req.max_score_by_doctor)
-        formatted_target_score = _remap_keys(req.target_score_by_doctor)
-        formatted_past_total_scores = _remap_keys(merged_past_total_scores)
-        formatted_sat_prev = _remap_keys(req.sat_prev)
-
-        locked_shifts_idx = [
-            {
-                "date": _serialize_scalar(locked.date),
-                "shift_type": locked.shift_type,
-                "doctor_idx": _key_to_idx(locked.doctor_id),
-            }
-            for locked in req.locked_shifts
-        ]
+# 複数月の一括生成の制限時間は 月数 × これ
+_HORIZON_TIME_LIMIT_PER_MONTH_SECONDS = 5.0
 
-        prev_shifts_filtered = [s for s in (req.previous_month_shifts or []) if str(s.doctor_id) not in external_uuid_set]
-        previous_month_shifts_idx = [
-            {
-                "date": _serialize_scalar(shift.date),
-                "shift_type": shift.shift_type,
-                "doctor_idx": _key_to_idx(shift.doctor_id),
-            }
-            for shift in prev_shifts_filtered
-        ]
 
-        _u = _remap_keys(req.unavailable)
-        formatted_unavailable: Dict[int, Any] = {
-            idx: [
-                normalized
-                for item in (items or [])
-                for normalized in [_normalize_unavailable_item(item)]
-                if normalized is not None
-            ]
-            for idx, items in _u.items()
-        }
+async def _finish_horizon(
+    solve_result: Dict[str, Any],
+    prepared: _PreparedOptimization,
+    req: OptimizeHorizonRequest,
+    hospital_id: uuid.UUID,
+    db: AsyncSession,
+) -> Dict[str, Any]:
+    """ワーカーの horizon 結果を OptimizeHorizonResponse の形に整え、利用ログを記録する"""
+    first = req.months[0]
+    log_payload = {
+        "year": first.year, "month": first.month, "num_months": len(req.months),
+        "doctor_count": len(prepared.doctors),
+        "solver": solve_result.pop("telemetry", None),
+    }
 
-        _fw = _remap_keys(req.fixed_unavailable_weekdays)
-        formatted_fixed_weekdays: Dict[int, Any] = {
-            idx: [
-                normalized
-                for item in (items or [])
-                for normalized in [_normalize_fixed_weekday_item(item)]
-                if normalized is not None
-            ]
-            for idx, items in _fw.items()
-        }
+    pre_errors = solve_result.get("pre_check_errors")
+    if pre_errors:
+        await log_event(db, hospital_id, "generate_horizon", {**log_payload, "status": "pre_check_failed"})
+        await db.commit()
+        return OptimizeHorizonResponse(
+            success=False,
+            message="制約の設定に問題があります",
+            diagnostics=DiagnosticInfo(pre_check_errors=[ConstraintDiagnostic(**e) for e in pre_errors]),
+        ).model_dump()
+
+    if not solve_result.get("success"):
+        await log_event(db, hospital_id, "generate_horizon", {**log_payload, "status": "infeasible"})
+        await db.commit()
+        return OptimizeHorizonResponse(
+            success=False,
+            message=solve_result.get("message", "スケジュールを生成できませんでした"),
+            solver_params=solve_result.get("solver_params"),
+        ).model_dump()
+
+    for month_result in solve_result["months"]:
+        _map_solve_result(month_result, prepared)
+    solve_result["cumulative_scores"] = {
+        prepared.idx_to_uuid.get(int(k), str(k)): v for k, v in solve_result["cumulative_scores"].items()
+    }
 
-        weights_dict = (
-            req.objective_weights.model_dump()
-            if hasattr(req.objective_weights, "model_dump")
-            else req.objective_weights.dict()
-        )
+    await log_event(db, hospital_id, "generate_horizon", {**log_payload, "status": "success"})
+    await db.commit()
+    return solve_result
 
-        optimizer = OnCallOptimizer(
-            num_doctors=total_doctors,
-            year=req.year, month=req.month,
-            holidays=req.holidays,
-            unavailable=formatted_unavailable,
-            fixed_unavailable_weekdays=formatted_fixed_weekdays,
-            prev_month_worked_days=formatted_prev_month,
-            prev_month_last_day=req.prev_month_last_day,
-            previous_month_shifts=previous_month_shifts_idx,
-            score_min=req.score_min, score_max=req.score_max,
-            past_sat_counts=req.past_sat_counts,
-            past_sunhol_counts=req.past_sunhol_counts,
-            min_score_by_doctor=formatted_min_score,
-            max_score_by_doctor=formatted_max_score,
-            target_score_by_doctor=formatted_target_score,
-            past_total_scores=formatted_past_total_scores,
-            sat_prev=formatted_sat_prev,
-            objective_weights=weights_dict,
-            hard_constraints=req.hard_constraints,
-            locked_shifts=locked_shifts_idx,
-            shift_scores=shift_scores,
-            external_doctor_indices=external_doctor_indices,
-            external_fixed_dates=ext_fixed_dates_diag,
+
+@router.post("/horizon", response_model=OptimizeHorizonResponse)
+async def generate_horizon(
+    req: OptimizeHorizonRequest,
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+    db: AsyncSession = Depends(get_db),
+):
+    """連続する2〜6か月を1つのモデルでまとめて生成する（月の境目の勤務間隔・累積の公平性を直接扱う）"""
+    try:
+        prepared_months = [await _prepare_optimization(month_req, hospital_id, db) for month_req in req.months]
+        prepared = prepared_months[0]
+        if any(p.idx_to_uuid != prepared.idx_to_uuid for p in prepared_months[1:]):
+            raise HTTPException(status_code=400, detail="月ごとに対象の医師（人数・外部医師枠）をそろえてください")
+
+        job = SolverJob(
+            kind=JOB_KIND_HORIZON,
+            optimizer_kwargs={"months": [p.optimizer_kwargs for p in prepared_months]},
+            time_limit_seconds=_HORIZON_TIME_LIMIT_PER_MONTH_SECONDS * len(prepared_months),
+            max_num_workers=get_solver_pool().max_cores_for_plan(prepared.plan),
         )
+        solve_result = await get_solver_pool().run(job)
+        return await _finish_horizon(solve_result, prepared, req, hospital_id, db)
+
+    except HTTPException:
+        raise
+    except SolverJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Run Phase 1 + 2 diagnosis
-        diag_result = optimizer.diagnose(doctor_names=idx_to_name)
-        phase_completed = diag_result.get("phase_completed", 2)
-
-        # Phase 3: Gemini AI explanation (optional — skip if no API key)
-        # Phase 3 (Gemini AI) は現在スキップ — ソルバー側の診断で十分なため
-        # 将来再有効化する場合は以下のコメントを外す
-        ai_explanation = None
-        # gemini_api_key = os.getenv("GEMINI_API_KEY", "")
-        # if gemini_api_key and diag_result.get("conflict_groups"):
-        #     try:
-        #         ai_explanation = _call_gemini_diagnosis(
-        #             year=req.year, month=req.month,
-        #             num_doctors=req.num_doctors, num_days=optimizer.num_days,
-        #             holidays=req.holidays,
-        #             conflict_groups=diag_result["conflict_groups"],
-        #             specific_violations=diag_result["specific_violations"],
-        #             human_insights=diag_result["human_insights"],
-        #             gemini_api_key=gemini_api_key,
-        #         )
-        #         phase_completed = 3
-        #     except Exception:
-        #         pass
-
-        await log_event(db, hospital_id, "diagnose", {
-            "year": req.year, "month": req.month,
-        })
-        await db.commit()
 
-        return DiagnoseResponse(
-            success=True,
-            phase_completed=phase_completed,
-            result=DiagnoseResult(
-                conflict_groups=[ConflictGroup(**g) for g in diag_result["conflict_groups"]],
-                specific_violations=diag_result["specific_violations"],
-                solvable_removals=diag_result.get("solvable_removals", []),
-                human_insights=diag_result["human_insights"],
-                ai_explanation=ai_explanation,
-            ),
+@router.post("/diagnose", response_model=DiagnoseResponse)
+async def diagnose_constraints(
+    req: OptimizeRequest,
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+    db: AsyncSession = Depends(get_db),
+):
+    """P1-2 Phase2: Diagnose why the model is infeasible."""
+    try:
+        prepared = await _prepare_optimization(
+            req, hospital_id, db, ensure_external_doctors=False,
         )
 
+        # Run Phase 1 + 2 diagnosis
+        job_result = await get_solver_pool().run(_build_solver_job(JOB_KIND_DIAGNOSE, prepared))
+        return await _finish_diagnose(job_result, req, hospital_id, db)
+
     except HTTPException:
         raise
+    except SolverJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ── ストリーミング生成 ──
+# CP-SAT は制限時間より早く最初の実行可能解を見つけることが多いので、改善解を見つけ次第
+# NDJSON で1行ずつ返す。最後の行が POST /api/optimize/ と同じ最終結果になる。
+
+_STREAM_POLL_SECONDS = 0.1
+
+
+def _ndjson_line(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+
+@router.post("/stream")
+async def stream_schedule(
+    req: OptimizeRequest,
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+    db: AsyncSession = Depends(get_db),
+):
+    """改善解ごとに {"type": "solution", objective, best_bound, elapsed_seconds, schedule, scores} を返し、
+    最後に {"type": "result", ...OptimizeResponse} か {"type": "error", status_code, detail} を返す。
+    クライアントが切断したら探索を止める。
+    """
+    prepared = await _prepare_optimization(req, hospital_id, db)
+    pool = get_solver_pool()
+    # ストリーム開始後はステータスコードを変えられないので、混雑はここで 503 にする
+    if pool.pending_jobs >= pool.max_pending_jobs:
+        raise HTTPException(status_code=503, detail="ソルバーが混雑しています。しばらくしてから再度お試しください")
+
+    job = _build_solver_job(JOB_KIND_SOLVE, prepared)
+    job.stream_solutions = True
+    job.channel = await asyncio.to_thread(pool.open_channel)
+
+    async def _lines() -> AsyncIterator[str]:
+        task = asyncio.create_task(pool.run(job))
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=_STREAM_POLL_SECONDS)
+                for event in await asyncio.to_thread(job.channel.drain_progress):
+                    if event.get("stage") != "solution" or "schedule" not in event:
+                        continue
+                    solution = {k: v for k, v in event.items() if k != "stage"}
+                    yield _ndjson_line({"type": "solution", **_map_solve_result(solution, prepared)})
+
+            try:
+                raw = task.result()
+            except SolverJobError as e:
+                yield _ndjson_line({"type": "error", "status_code": e.status_code, "detail": str(e)})
+                return
+
+            # リクエストのセッションはストリーム中に閉じられうるので、結果の記録は新しいセッションで行う
+            async with AsyncSessionLocal() as stream_db:
+                final = await _finish_generate(raw, prepared, req, hospital_id, stream_db)
+            yield _ndjson_line({"type": "result", **final})
+        finally:
+            # 切断で生成が閉じられた場合: pool.run のキャンセル経由でワーカーの探索も止まる
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+# ── 非同期ジョブ API ──
+# 生成・診断をバックグラウンドで実行し、ジョブIDで状態・途中経過・結果を取得する
+
+
+@router.post("/jobs", response_model=OptimizeJobStatus, status_code=202)
+async def submit_optimize_job(
+    req: OptimizeRequest,
+    kind: str = Query(JOB_KIND_SOLVE, pattern=f"^({JOB_KIND_SOLVE}|{JOB_KIND_DIAGNOSE})$"),
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+    db: AsyncSession = Depends(get_db),
+):
+    """生成（kind=solve）または診断（kind=diagnose）のジョブを受け付けて即座に返す"""
+    prepared = await _prepare_optimization(
+        req, hospital_id, db, ensure_external_doctors=kind == JOB_KIND_SOLVE,
+    )
+
+    async def finalize(raw: Dict[str, Any]) -> Dict[str, Any]:
+        # リクエストのセッションは応答後に閉じるので、結果の記録は新しいセッションで行う
+        async with AsyncSessionLocal() as job_db:
+            if kind == JOB_KIND_DIAGNOSE:
+                response = await _finish_diagnose(raw, req, hospital_id, job_db)
+                return response.model_dump()
+            return await _finish_generate(raw, prepared, req, hospital_id, job_db)
+
+    try:
+        record = await get_job_queue().submit(
+            hospital_id, _build_solver_job(kind, prepared), finalize,
+        )
+    except OptimizeJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return record.to_dict()
+
+
+@router.get("/jobs/{job_id}", response_model=OptimizeJobStatus)
+async def get_optimize_job(
+    job_id: str,
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+):
+    try:
+        record = get_job_queue().get(hospital_id, job_id)
+    except OptimizeJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return record.to_dict()
+
+
+@router.delete("/jobs/{job_id}", response_model=OptimizeJobStatus)
+async def cancel_optimize_job(
+    job_id: str,
+    hospital_id: uuid.UUID = Depends(get_current_hospital),
+):
+    """待機中なら即取り消し、実行中なら CP-SAT の探索を止める（完了済みはそのまま返す）"""
+    try:
+        record = await get_job_queue().cancel(hospital_id, job_id)
+    except OptimizeJobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return record.to_dict()
+
+
 def _call_gemini_diagnosis(
     year: int,
     month: int,
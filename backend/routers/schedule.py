@@ -21,12 +21,17 @@ from models.hospital import Hospital
 from models.shift import ShiftAssignment
 from services.settings_service import (
     get_draft_schedule,
+    get_optimizer_config,
     get_published_months_by_doctor_token,
     upsert_draft_schedule,
     delete_draft_schedule,
 )
 
 from fastapi.responses import Response
+from services.holiday_service import load_holiday_calendar
+from services.optimize_cache import invalidate_hospital_results
+from services.schedule_repository import replace_month_assignments
+from services.score_summary import counts_of, load_month_summaries, refresh_month_summaries, summary_score
 from services.usage_service import log_event
 from sqlalchemy.orm import selectinload
 
@@ -207,14 +212,13 @@ async def get_public_schedule(
     doctor_name_map = {str(d.id): ("外部" if d.is_external else d.name) for d in all_doctors}
 
     start_date, end_date = _month_bounds(year, month)
-    hospital_doctor_ids = [d.id for d in all_doctors]
 
     shift_result = await db.execute(
         select(ShiftAssignment)
         .where(
+            ShiftAssignment.hospital_id == doctor.hospital_id,
             ShiftAssignment.date >= start_date,
             ShiftAssignment.date < end_date,
-            ShiftAssignment.doctor_id.in_(hospital_doctor_ids),
         )
         .order_by(ShiftAssignment.date)
     )
@@ -326,54 +330,35 @@ async def save_schedule(
                 )
 
         start_date, end_date = _month_bounds(req.year, req.month)
-
-        # hospital_id経由でフィルタ（shift_assignmentsはdoctorに紐づく）
-        hospital_doctor_ids = (
-            await db.execute(
-                select(Doctor.id).where(Doctor.hospital_id == hospital_id)
-            )
-        ).scalars().all()
-
-        await db.execute(
-            delete(ShiftAssignment).where(
-                ShiftAssignment.date >= start_date,
-                ShiftAssignment.date < end_date,
-                ShiftAssignment.doctor_id.in_(hospital_doctor_ids),
-            )
-        )
-
-        new_assignments = []
+        rows = []
         for item in req.schedule:
             current_date = datetime.date(req.year, req.month, item.day)
-
             if item.day_shift is not None:
-                new_assignments.append(
-                    ShiftAssignment(
-                        date=current_date,
-                        doctor_id=item.day_shift,
-                        shift_type=DAY_SHIFT_LABEL,
-                    )
-                )
-
+                rows.append((current_date, DAY_SHIFT_LABEL, item.day_shift))
             if item.night_shift is not None:
-                new_assignments.append(
-                    ShiftAssignment(
-                        date=current_date,
-                        doctor_id=item.night_shift,
-                        shift_type=NIGHT_SHIFT_LABEL,
-                    )
-                )
-
-        db.add_all(new_assignments)
+                rows.append((current_date, NIGHT_SHIFT_LABEL, item.night_shift))
+
+        # 今の月との差分だけを書く（変更のない枠には触れない）
+        counts = await replace_month_assignments(
+            db,
+            hospital_id=hospital_id,
+            start_date=start_date,
+            end_date=end_date - datetime.timedelta(days=1),
+            rows=rows,
+        )
+        await refresh_month_summaries(db, hospital_id, [(req.year, req.month)])
         await log_event(db, hospital_id, "schedule_save", {
-            "year": req.year, "month": req.month,
+            "year": req.year, "month": req.month, **counts,
         })
         await db.commit()
+        # 保存済みシフトは過去スコア・warm start の入力になる
+        invalidate_hospital_results(hospital_id)
 
         return {
             "success": True,
             "message": "\u30b7\u30d5\u30c8\u3092\u30c7\u30fc\u30bf\u30d9\u30fc\u30b9\u306b\u4fdd\u5b58\u3057\u307e\u3057\u305f\uff01",
-            "saved_count": len(new_assignments),
+            "saved_count": len(rows),
+            **counts,
         }
 
     except HTTPException:
@@ -398,18 +383,12 @@ async def get_schedule_range(
         )
 
     try:
-        hospital_doctor_ids = (
-            await db.execute(
-                select(Doctor.id).where(Doctor.hospital_id == hospital_id)
-            )
-        ).scalars().all()
-
         result = await db.execute(
             select(ShiftAssignment)
             .where(
+                ShiftAssignment.hospital_id == hospital_id,
                 ShiftAssignment.date >= start_date,
                 ShiftAssignment.date <= end_date,
-                ShiftAssignment.doctor_id.in_(hospital_doctor_ids),
             )
             .order_by(
                 ShiftAssignment.date,
@@ -444,19 +423,16 @@ async def delete_schedule(
     """管理者用：指定月のシフトをDBから完全削除する。フロントエンドには非公開。"""
     try:
         start_date, end_date = _month_bounds(year, month)
-        hospital_doctor_ids = (
-            await db.execute(
-                select(Doctor.id).where(Doctor.hospital_id == hospital_id)
-            )
-        ).scalars().all()
         await db.execute(
             delete(ShiftAssignment).where(
+                ShiftAssignment.hospital_id == hospital_id,
                 ShiftAssignment.date >= start_date,
                 ShiftAssignment.date < end_date,
-                ShiftAssignment.doctor_id.in_(hospital_doctor_ids),
             )
         )
+        await refresh_month_summaries(db, hospital_id, [(year, month)])
         await db.commit()
+        invalidate_hospital_results(hospital_id)
         return {"success": True, "message": f"{year}年{month}月のシフトを削除しました"}
     except Exception as e:
         await db.rollback()
@@ -514,12 +490,14 @@ async def remove_draft(
 @router.get("/stats")
 async def get_schedule_stats(
     year: int = Query(...),
+    include_shifts: bool = Query(True, description="false なら月別集計だけを返し、シフト1件ずつの一覧は省く"),
     hospital_id: uuid.UUID = Depends(get_current_hospital),
     db: AsyncSession = Depends(get_db),
 ):
-    """年間のシフトデータを集計して返す。"""
-    import jpholiday
+    """年間のシフトデータを集計して返す。
 
+    monthly_summaries は doctor_month_summaries（医師×月の回数）と現在の shift_scores から作る。
+    """
     # 医師一覧
     doctors_result = await db.execute(
         select(Doctor)
@@ -533,29 +511,31 @@ async def get_schedule_stats(
     start_date = datetime.date(year, 1, 1)
     end_date = datetime.date(year, 12, 31)
 
-    doctor_ids = [d.id for d in doctors]
-    if not doctor_ids:
-        return {"doctors": [], "shifts": [], "holidays": []}
+    if not doctors:
+        return {"doctors": [], "shifts": [], "holidays": [], "monthly_summaries": []}
 
-    shifts_result = await db.execute(
-        select(ShiftAssignment)
-        .where(
-            ShiftAssignment.date >= start_date,
-            ShiftAssignment.date <= end_date,
-            ShiftAssignment.doctor_id.in_(doctor_ids),
+    shifts = []
+    if include_shifts:
+        shifts_result = await db.execute(
+            select(ShiftAssignment)
+            .where(
+                ShiftAssignment.hospital_id == hospital_id,
+                ShiftAssignment.date >= start_date,
+                ShiftAssignment.date <= end_date,
+            )
+            .order_by(ShiftAssignment.date)
         )
-        .order_by(ShiftAssignment.date)
+        # 集計は在籍中の医師のシフトだけ
+        shifts = [s for s in shifts_result.scalars().all() if str(s.doctor_id) in doctor_map]
+
+    summaries = await load_month_summaries(
+        db, hospital_id, (year, 1), (year + 1, 1), doctor_ids=[d.id for d in doctors],
     )
-    shifts = shifts_result.scalars().all()
+    shift_scores = (await get_optimizer_config(db, hospital_id)).get("shift_scores")
 
-    # 祝日一覧
-    holiday_dates = set()
-    for m in range(1, 13):
-        days_in_month = _calendar.monthrange(year, m)[1]
-        for d in range(1, days_in_month + 1):
-            dt = datetime.date(year, m, d)
-            if jpholiday.is_holiday(dt):
-                holiday_dates.add(dt.isoformat())
+    # 祝日一覧（病院の手動祝日・除外を反映）
+    holiday_calendar = await load_holiday_calendar(db, hospital_id, start_date, datetime.date(year + 1, 1, 1))
+    holiday_dates = {d.isoformat() for d in holiday_calendar.holidays}
 
     return {
         "doctors": [{"id": str(d.id), "name": d.name, "is_external": d.is_external} for d in doctors],
@@ -567,6 +547,15 @@ async def get_schedule_stats(
             }
             for s in shifts
         ],
+        "monthly_summaries": [
+            {
+                "doctor_id": str(summary.doctor_id),
+                "month": summary.month,
+                **counts_of(summary).as_dict(),
+                "score": summary_score(counts_of(summary), shift_scores),
+            }
+            for summary in summaries
+        ],
         "holidays": sorted(holiday_dates),
     }
 
@@ -594,14 +583,13 @@ async def _fetch_export_data(
     doctor_map = {d.id: ("外部" if d.is_external else d.name) for d in doctors_result.scalars().all()}
 
     start_date, end_date = _month_bounds(year, month)
-    hospital_doctor_ids = list(doctor_map.keys())
 
     result = await db.execute(
         select(ShiftAssignment)
         .where(
+            ShiftAssignment.hospital_id == hospital_id,
             ShiftAssignment.date >= start_date,
             ShiftAssignment.date < end_date,
-            ShiftAssignment.doctor_id.in_(hospital_doctor_ids) if hospital_doctor_ids else ShiftAssignment.doctor_id.is_(None),
         )
         .order_by(ShiftAssignment.date)
     )
@@ -621,17 +609,8 @@ async def _fetch_export_data(
 
     rows = sorted(schedule.values(), key=lambda r: r["day"])
 
-    # Determine holidays (weekday-based only; custom holidays require settings)
-    try:
-        import jpholiday
-        holiday_dates = {
-            h[0] for h in jpholiday.between(
-                datetime.date(year, month, 1),
-                datetime.date(year, month, days_in_month),
-            )
-        }
-    except Exception:
-        holiday_dates = set()
+    # 祝日（病院の手動祝日・除外を反映）
+    holiday_dates = (await load_holiday_calendar(db, hospital_id, start_date, end_date)).holidays
 
     return hospital_name, doctor_map, rows, holiday_dates
 
@@ -1181,18 +1160,12 @@ async def get_schedule(
 ):
     try:
         start_date, end_date = _month_bounds(year, month)
-        hospital_doctor_ids = (
-            await db.execute(
-                select(Doctor.id).where(Doctor.hospital_id == hospital_id)
-            )
-        ).scalars().all()
-
         result = await db.execute(
             select(ShiftAssignment)
             .where(
+                ShiftAssignment.hospital_id == hospital_id,
                 ShiftAssignment.date >= start_date,
                 ShiftAssignment.date < end_date,
-                ShiftAssignment.doctor_id.in_(hospital_doctor_ids),
             )
             .order_by(ShiftAssignment.date)
         )
@@ -14,6 +14,7 @@ from schemas.settings import (
     OptimizerConfigRequest,
     SystemSettingUpsertRequest,
 )
+from services.score_summary import refresh_month_summaries
 from services.settings_service import (
     get_custom_holidays,
     get_optimizer_config,
@@ -64,6 +65,10 @@ async def api_upsert_custom_holidays(
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
+    # 日祝の判定が変わるので、その年の集計を作り直す
+    await refresh_month_summaries(db, hospital_id, [(req.year, month) for month in range(1, 13)])
+    await db.commit()
+
     saved = await get_custom_holidays(db, hospital_id, req.year)
     return {
         "year": req.year,
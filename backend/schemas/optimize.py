@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 from typing import Any, Dict, List, Optional, Union
 from uuid import UUID
 
@@ -105,6 +105,12 @@ class OptimizeRequest(BaseModel):
     objective_weights: ObjectiveWeights = Field(default_factory=ObjectiveWeights)
     hard_constraints: Dict[str, Any] = Field(default_factory=dict)
     locked_shifts: List[LockedShift] = Field(default_factory=list)
+    # True なら当月のドラフト（なければ保存済みシフト）を解のヒントにして再生成を速く・安定させる
+    warm_start: bool = False
+    # True なら入力から決まる固定シードで解き、同じ入力の再送にはキャッシュ済みの結果を返す
+    deterministic: bool = False
+    # 2 以上なら、同じ制限時間の中で互いに十分違う代替案をこの件数まで alternatives に返す
+    num_alternatives: int = Field(1, ge=1, le=5)
 
     @field_validator("past_sat_counts", "past_sunhol_counts", mode="before")
     @classmethod
@@ -191,6 +197,20 @@ class SoftUnavailViolation(BaseModel):
     shift_type: str
 
 
+class ScheduleAlternative(BaseModel):
+    """num_alternatives 指定時の代替案1件（rank 1 は schedule / scores と同じ最良解）"""
+    rank: int
+    status: str
+    objective: int
+    # 目的関数の項ごとの {weight, value, penalty}（キーは ObjectiveWeights の名前）
+    objective_breakdown: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    # rank 1 の案と担当医師が違う枠の数
+    diff_slots: int = 0
+    schedule: List[Dict[str, Any]]
+    scores: Dict[str, float]
+    soft_unavail_violations: List[SoftUnavailViolation] = Field(default_factory=list)
+
+
 class OptimizeResponse(BaseModel):
     success: bool
     status: Optional[str] = None
@@ -199,3 +219,71 @@ class OptimizeResponse(BaseModel):
     scores: Optional[Dict[str, float]] = None
     diagnostics: Optional[DiagnosticInfo] = None
     soft_unavail_violations: Optional[List[SoftUnavailViolation]] = None
+    # 実際に使った CP-SAT パラメータ（num_workers, random_seed など）
+    solver_params: Optional[Dict[str, Any]] = None
+    # warm_start 時のヒントの出どころと、最終解にどれだけ残ったか
+    warm_start: Optional[Dict[str, Any]] = None
+    # deterministic 指定時、結果キャッシュから返したら True
+    cached: Optional[bool] = None
+    alternatives: Optional[List[ScheduleAlternative]] = None
+    # /api/optimize/repair: 影響を受けた日・探索した近傍・変更した枠（before/after は医師ID）
+    repair: Optional[Dict[str, Any]] = None
+
+
+# ── 複数月の一括生成 ──
+
+class OptimizeHorizonRequest(BaseModel):
+    """POST /api/optimize/horizon: 連続する2〜6か月分の OptimizeRequest（先頭の月から順に）
+
+    前月の状態（prev_month_* / previous_month_shifts / sat_prev）と過去実績（past_*）は先頭の月のものを使う。
+    """
+    months: List[OptimizeRequest] = Field(min_length=2, max_length=6)
+
+    @model_validator(mode="after")
+    def validate_consecutive_months(self) -> "OptimizeHorizonRequest":
+        for prev, cur in zip(self.months, self.months[1:]):
+            expected = (prev.year + 1, 1) if prev.month == 12 else (prev.year, prev.month + 1)
+            if (cur.year, cur.month) != expected:
+                raise ValueError("months must be consecutive")
+        return self
+
+
+class HorizonMonthResult(BaseModel):
+    year: int
+    month: int
+    # /api/schedule/save にそのまま渡せる形
+    schedule: List[Dict[str, Any]]
+    scores: Dict[str, float]
+    objective_breakdown: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    soft_unavail_violations: Optional[List[SoftUnavailViolation]] = None
+
+
+class OptimizeHorizonResponse(BaseModel):
+    success: bool
+    status: Optional[str] = None
+    message: Optional[str] = None
+    months: Optional[List[HorizonMonthResult]] = None
+    # 期間の累積スコア（先頭の月の past_total_scores を含む）
+    cumulative_scores: Optional[Dict[str, float]] = None
+    objective: Optional[int] = None
+    # 月をまたぐ項（累積の公平性・境目の理想間隔・土曜当直の連続）の内訳
+    objective_breakdown: Optional[Dict[str, Dict[str, int]]] = None
+    diagnostics: Optional[DiagnosticInfo] = None
+    solver_params: Optional[Dict[str, Any]] = None
+
+
+# ── 非同期最適化ジョブ ──
+
+class OptimizeJobStatus(BaseModel):
+    """GET /api/optimize/jobs/{job_id} のレスポンス"""
+    job_id: str
+    kind: str  # "solve" or "diagnose"
+    status: str  # "queued" / "running" / "succeeded" / "failed" / "cancelled"
+    cancel_requested: bool = False
+    progress: Dict[str, Any] = Field(default_factory=dict)  # 最新の進捗イベント（stage 等）
+    partial_result: Dict[str, Any] = Field(default_factory=dict)  # 完了前に分かった途中経過
+    result: Optional[Dict[str, Any]] = None  # OptimizeResponse / DiagnoseResponse と同じ形
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
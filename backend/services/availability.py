@@ -0,0 +1,182 @@
+"""医師×日の勤務可否行列（不可日・固定不可曜日を一度だけ正規化する）
+
+不可日（日付指定）と固定不可曜日は、pre_validate・build_model・診断・インサイトのそれぞれで
+同じ入力を正規化し直し、固定不可曜日は毎回その月の日付に展開していた。医師数と不可日が多いと
+「日 × 医師 × 不可日エントリ」の三重ループになる。
+
+ここでは OnCallOptimizer の入力を一度だけ正規化し、NumPy の bool 配列にまとめる。
+
+- by_date:      [医師, 日-1, シフト(日直/当直), 種別(ハード/ソフト)] 日付指定の不可日
+- weekday_rules:[医師, 曜日(0-7), シフト, 種別] 固定不可曜日（7 は日曜以外の祝日）
+- by_weekday:   weekday_rules をカレンダーで日付に展開したもの（by_date と同じ形）
+- blocked:      by_date | by_weekday
+
+respect_unavailable_days（不可日をハードにするか）は入力そのものではないので、ここでは扱わない。
+ハード/ソフトの区別はエントリの is_soft_penalty のままで、使う側がフラグを見て読み替える。
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from services.constraint_builder import CalendarTemplate
+
+SHIFT_DAY = 0
+SHIFT_NIGHT = 1
+SHIFT_NAMES = ("day", "night")
+
+KIND_HARD = 0
+KIND_SOFT = 1
+
+NUM_FIXED_WEEKDAYS = 8
+
+_TARGET_SHIFT_INDICES = {
+    "all": (SHIFT_DAY, SHIFT_NIGHT),
+    "day": (SHIFT_DAY,),
+    "night": (SHIFT_NIGHT,),
+}
+
+Normalizer = Callable[[Any], Optional[Dict[str, Any]]]
+
+
+def _target_shift(mask: np.ndarray) -> str:
+    """シフト軸の bool 2要素を target_shift（all/day/night）に戻す"""
+    if mask[SHIFT_DAY] and mask[SHIFT_NIGHT]:
+        return "all"
+    return "day" if mask[SHIFT_DAY] else "night"
+
+
+def _doctor_index(raw: Any, num_doctors: int) -> Optional[int]:
+    try:
+        d = int(raw)
+    except (TypeError, ValueError):
+        return None
+    if 0 <= d < num_doctors:
+        return d
+    return None
+
+
+@dataclass(frozen=True)
+class AvailabilityMatrix:
+    """医師×日×シフト×種別の不可フラグ（True＝その枠に入れたくない）"""
+
+    calendar: CalendarTemplate
+    by_date: np.ndarray
+    weekday_rules: np.ndarray
+    by_weekday: np.ndarray
+    # 日付指定と固定不可曜日を合わせた不可フラグ [医師, 日-1, シフト, 種別]
+    blocked: np.ndarray
+
+    @property
+    def num_doctors(self) -> int:
+        return int(self.by_date.shape[0])
+
+    def hard(self, shift: int) -> np.ndarray:
+        """ハード不可 [医師, 日-1]"""
+        return self.blocked[:, :, shift, KIND_HARD]
+
+    def any_kind(self, shift: int) -> np.ndarray:
+        """ハード・ソフトを問わず不可 [医師, 日-1]"""
+        return self.blocked[:, :, shift, :].any(axis=-1)
+
+    def is_hard_blocked(self, d: int, day: int, shift: str) -> bool:
+        return bool(self.blocked[d, day - 1, SHIFT_NAMES.index(shift), KIND_HARD])
+
+    def available_counts(self, shift: int, *, include_soft: bool = False) -> np.ndarray:
+        """日ごとの勤務可能な医師数 [日-1]（include_soft=True ならソフト不可も不可として数える）"""
+        blocked = self.any_kind(shift) if include_soft else self.hard(shift)
+        return self.num_doctors - blocked.sum(axis=0)
+
+    def hard_date_entries(self) -> Iterator[Tuple[int, int, str]]:
+        """日付指定のハード不可を (医師, 日, target_shift) で返す（同じ日の複数エントリはまとめる）"""
+        cells = self.by_date[:, :, :, KIND_HARD]
+        for d, i in np.argwhere(cells.any(axis=2)):
+            yield int(d), int(i) + 1, _target_shift(cells[d, i])
+
+    def hard_weekday_rules(self) -> Iterator[Tuple[int, int, str]]:
+        """固定不可曜日のハード不可を (医師, 曜日, target_shift) で返す"""
+        rules = self.weekday_rules[:, :, :, KIND_HARD]
+        for d, w in np.argwhere(rules.any(axis=2)):
+            yield int(d), int(w), _target_shift(rules[d, w])
+
+    def hard_cells(self) -> Iterator[Tuple[int, int, str]]:
+        """ハード不可の枠を (医師, 日, シフト) で返す（日付指定と固定不可曜日の重なりは1つにまとめる）"""
+        for d, i, s in np.argwhere(self.blocked[:, :, :, KIND_HARD]):
+            yield int(d), int(i) + 1, SHIFT_NAMES[s]
+
+    def soft_cells(self, *, all_soft: bool = False) -> Iterator[Tuple[int, int, str]]:
+        """ソフト不可の枠を (医師, 日, シフト) で返す（ハード不可の枠は除く）
+
+        all_soft=True（respect_unavailable_days=False）のときはハード指定もソフトとして返す。
+        """
+        blocked = self.blocked
+        if all_soft:
+            cells = blocked.any(axis=-1)
+        else:
+            cells = blocked[:, :, :, KIND_SOFT] & ~blocked[:, :, :, KIND_HARD]
+        for d, i, s in np.argwhere(cells):
+            yield int(d), int(i) + 1, SHIFT_NAMES[s]
+
+
+def _fill(
+    out: np.ndarray,
+    entries: Dict[Any, Iterable[Any]],
+    normalize: Normalizer,
+    key: str,
+    offset: int,
+) -> None:
+    num_doctors, size = out.shape[:2]
+    for raw_d, items in entries.items():
+        d = _doctor_index(raw_d, num_doctors)
+        if d is None:
+            continue
+        for item in items:
+            normalized = normalize(item)
+            if normalized is None:
+                continue
+            pos = normalized[key] - offset
+            if not 0 <= pos < size:
+                continue
+            kind = KIND_SOFT if normalized["is_soft_penalty"] else KIND_HARD
+            for s in _TARGET_SHIFT_INDICES[normalized["target_shift"]]:
+                out[d, pos, s, kind] = True
+
+
+def weekday_day_mask(cal: CalendarTemplate) -> np.ndarray:
+    """[曜日(0-7), 日-1] の bool 配列（その日がその固定不可曜日に当たるか）"""
+    mask = np.zeros((NUM_FIXED_WEEKDAYS, cal.num_days), dtype=bool)
+    for w, days in enumerate(cal.fixed_weekday_days):
+        for day in days:
+            mask[w, day - 1] = True
+    return mask
+
+
+def build_availability(
+    cal: CalendarTemplate,
+    num_doctors: int,
+    unavailable: Dict[Any, List[Any]],
+    fixed_unavailable_weekdays: Dict[Any, List[Any]],
+    normalize_unavailable: Normalizer,
+    normalize_fixed_weekday: Normalizer,
+) -> AvailabilityMatrix:
+    """不可日・固定不可曜日の入力を一度だけ正規化して AvailabilityMatrix を作る"""
+    by_date = np.zeros((num_doctors, cal.num_days, 2, 2), dtype=bool)
+    _fill(by_date, unavailable, normalize_unavailable, "date", 1)
+
+    weekday_rules = np.zeros((num_doctors, NUM_FIXED_WEEKDAYS, 2, 2), dtype=bool)
+    _fill(weekday_rules, fixed_unavailable_weekdays, normalize_fixed_weekday, "day_of_week", 0)
+
+    # [医師, 曜日, シフト, 種別] × [曜日, 日] -> [医師, 日, シフト, 種別]
+    by_weekday = np.einsum(
+        "dwsk,wn->dnsk", weekday_rules.astype(np.int32), weekday_day_mask(cal).astype(np.int32)
+    ) > 0
+
+    return AvailabilityMatrix(
+        calendar=cal,
+        by_date=by_date,
+        weekday_rules=weekday_rules,
+        by_weekday=by_weekday,
+        blocked=by_date | by_weekday,
+    )
@@ -0,0 +1,411 @@
+"""制約モデルの共通部品（生成モデルと診断モデルで同じものを使う）
+
+build_model（生成）と DiagnosisEngine（診断）は同じハード制約を組む必要があり、
+pre_validate や診断の統計も同じカレンダー情報（土曜・日祝・固定不可曜日に当たる日）を使う。
+ここにまとめておくことで、両モデルの制約がずれないようにする。
+
+- CalendarTemplate: (年, 月, 祝日, 日当直モード) ごとのカレンダー情報。calendar_template() が LRU で保持する
+- HardLimits: ハード制約の別名キー（interval_days / min_interval_days ...）を解決した値
+- add_shift_vars / add_structural_constraints: シフト変数と、緩和しない構造上の制約（全枠充足・外部医師・同日重複）
+- add_spacing_gap / add_spacing_windows: 勤務間隔（2日ペアごと / 窓ごとの AtMostOne）
+- add_first_slot_order: 入れ替え可能な医師（外部医師・同じ設定の常勤）の対称性の除去
+- month_cross_blocks / add_cross_month_spacing: 月の境目の勤務間隔（前月を定数として / 複数月モデルで変数どうしに）
+- *_expr: 月ごとの回数上限・スコアの式
+"""
+from __future__ import annotations
+
+import calendar
+import datetime
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+# ハード制約の別名キー（先に見つかったものを使う）
+INTERVAL_DAYS_KEYS = ("interval_days", "min_interval_days", "spacing_days", "min_gap_days", "work_interval_days")
+MAX_SATURDAY_NIGHTS_KEYS = ("max_saturday_nights", "max_sat_nights", "sat_night_max", "saturday_night_max")
+MAX_SUNHOL_DAYS_KEYS = ("max_sunhol_days", "sunhol_day_max", "max_holiday_days", "max_sunday_holiday_days")
+MAX_SUNHOL_WORKS_KEYS = ("max_sunhol_works", "sunhol_work_max", "max_holiday_works", "max_sunday_holiday_works")
+MAX_WEEKEND_HOLIDAY_WORKS_KEYS = (
+    "max_weekend_holiday_works", "weekend_holiday_work_max", "weekend_hol_work_max",
+    "max_weekend_holiday_count", "weekend_holiday_total_max", "weekend_hol_total_max", "max_shifts",
+)
+MAX_WEEKEND_HOLIDAY_WORKS_FLAG_KEYS = ("strict_weekend_hol_max",)
+
+# 固定不可曜日の 7 は「日曜以外の祝日」（フロントエンドの DnD と同じ意味）
+FIXED_WEEKDAY_HOLIDAY = 7
+
+WEEKDAYS_JA = ["月", "火", "水", "木", "金", "土", "日"]
+
+CALENDAR_CACHE_SIZE = 256
+
+# 勤務間隔と理想間隔ペナルティの組み方（OnCallOptimizer の spacing_formulation）
+# pairwise: 間隔 k ごとの2日ペア制約と、ペアごとの BoolVar（従来の組み方）
+# window:   連続 (間隔+1) 日の窓ごとの AtMostOne と、医師×日ごとに1つの集約ペナルティ
+SPACING_PAIRWISE = "pairwise"
+SPACING_WINDOW = "window"
+SPACING_FORMULATIONS = (SPACING_PAIRWISE, SPACING_WINDOW)
+
+
+@dataclass(frozen=True)
+class HardLimits:
+    """ハード制約の解決済みの値（None はその制限なし）"""
+
+    combined_mode: bool
+    prevent_sunhol_consecutive: bool
+    respect_unavailable_days: bool
+    spacing_days: Optional[int]
+    max_saturday_nights: Optional[int]
+    max_sunhol_days: Optional[int]
+    max_sunhol_works: Optional[int]
+    max_weekend_holiday_works: Optional[int]
+
+
+@dataclass(frozen=True)
+class ShiftWeights:
+    """シフト1回あたりのスコア（×10 の整数）"""
+
+    weekday_night: int
+    sat_night: int
+    sunhol_day: int
+    sunhol_night: int
+    day_night: int
+
+
+@dataclass(frozen=True)
+class CalendarTemplate:
+    """1か月分のカレンダー情報（日付は 1 始まり）"""
+
+    year: int
+    month: int
+    combined_mode: bool
+    num_days: int
+    holidays: FrozenSet[int]
+    weekdays: Tuple[int, ...]  # weekdays[day - 1] = date.weekday()
+    saturdays: Tuple[int, ...]
+    sundays: Tuple[int, ...]
+    sunhol_days: Tuple[int, ...]
+    weekend_days: Tuple[int, ...]  # 土曜 + 日祝（土日祝上限の対象日）
+    day_slot_days: Tuple[int, ...]  # 日直枠がある日（分割モードの日祝）
+    fixed_weekday_days: Tuple[FrozenSet[int], ...]  # 固定不可曜日 0..7 に当たる日
+
+    @property
+    def days(self) -> range:
+        return range(1, self.num_days + 1)
+
+    def is_holiday(self, day: int) -> bool:
+        return day in self.holidays
+
+    def is_saturday(self, day: int) -> bool:
+        return self.weekdays[day - 1] == 5
+
+    def is_sunday(self, day: int) -> bool:
+        return self.weekdays[day - 1] == 6
+
+    def is_sunday_or_holiday(self, day: int) -> bool:
+        return self.weekdays[day - 1] == 6 or day in self.holidays
+
+    def has_day_slot(self, day: int) -> bool:
+        return self.is_sunday_or_holiday(day) and not self.combined_mode
+
+    def matches_fixed_weekday(self, day: int, day_of_week: int) -> bool:
+        if not 0 <= day_of_week < len(self.fixed_weekday_days):
+            return False
+        return day in self.fixed_weekday_days[day_of_week]
+
+    def weekday_ja(self, day: int) -> str:
+        return WEEKDAYS_JA[self.weekdays[day - 1]]
+
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def calendar_template(year: int, month: int, holidays: Tuple[int, ...], combined_mode: bool) -> CalendarTemplate:
+    """(年, 月, 祝日, 日当直モード) ごとのカレンダー情報を作る（同じ月の再計算は LRU で省く）"""
+    num_days = calendar.monthrange(year, month)[1]
+    days = range(1, num_days + 1)
+    holiday_set = frozenset(holidays)
+    weekdays = tuple(datetime.date(year, month, day).weekday() for day in days)
+    saturdays = tuple(day for day in days if weekdays[day - 1] == 5)
+    sundays = tuple(day for day in days if weekdays[day - 1] == 6)
+    sunhol_days = tuple(day for day in days if weekdays[day - 1] == 6 or day in holiday_set)
+    weekend_days = tuple(sorted(set(saturdays) | set(sunhol_days)))
+    fixed_weekday_days = tuple(
+        frozenset(day for day in days if weekdays[day - 1] == dow) for dow in range(7)
+    ) + (frozenset(day for day in days if day in holiday_set and weekdays[day - 1] != 6),)
+    return CalendarTemplate(
+        year=year,
+        month=month,
+        combined_mode=combined_mode,
+        num_days=num_days,
+        holidays=holiday_set,
+        weekdays=weekdays,
+        saturdays=saturdays,
+        sundays=sundays,
+        sunhol_days=sunhol_days,
+        weekend_days=weekend_days,
+        day_slot_days=() if combined_mode else sunhol_days,
+        fixed_weekday_days=fixed_weekday_days,
+    )
+
+
+def holiday_key(holidays: Iterable[object]) -> Tuple[int, ...]:
+    """祝日リストを calendar_template のキーにする（整数以外は日付に一致しないので捨てる）"""
+    return tuple(sorted({h for h in holidays if isinstance(h, int) and not isinstance(h, bool)}))
+
+
+# ----------------------------------------------------------------------
+# 変数と構造上の制約
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class ShiftVars:
+    """(医師, 日) -> BoolVar"""
+
+    night: Dict[Tuple[int, int], cp_model.IntVar]
+    day: Dict[Tuple[int, int], cp_model.IntVar]
+    work: Dict[Tuple[int, int], cp_model.IntVar]
+
+
+def add_shift_vars(model: cp_model.CpModel, num_doctors: int, cal: CalendarTemplate) -> ShiftVars:
+    shifts = ShiftVars(night={}, day={}, work={})
+    for d in range(num_doctors):
+        for day in cal.days:
+            night = model.NewBoolVar(f"night_d{d}_day{day}")
+            day_shift = model.NewBoolVar(f"day_d{d}_day{day}")
+            work = model.NewBoolVar(f"work_d{d}_day{day}")
+            model.Add(work == night + day_shift)
+            shifts.night[(d, day)] = night
+            shifts.day[(d, day)] = day_shift
+            shifts.work[(d, day)] = work
+    return shifts
+
+
+def add_structural_constraints(
+    model: cp_model.CpModel,
+    cal: CalendarTemplate,
+    shifts: ShiftVars,
+    num_doctors: int,
+    external_indices: Iterable[int],
+    external_fixed_dates: Dict[int, str],
+    prevent_sunhol_consecutive: bool,
+) -> None:
+    """緩和しない制約: 全枠に1人・外部医師確定日・外部医師は月1回・同日の日直と当直の重複禁止"""
+    doctors = range(num_doctors)
+    ext_indices = sorted(external_indices)
+    ext_set = set(ext_indices)
+    int_indices = [d for d in doctors if d not in ext_set]
+
+    for day in cal.days:
+        ext_target = external_fixed_dates.get(day) if ext_indices else None
+        if ext_target and ext_target not in ("all", "day", "night"):
+            continue
+        # 外部医師確定日: 対象の枠は外部医師のいずれかを割当、内部医師は割当不可
+        night_external = ext_target in ("all", "night")
+        day_external = ext_target in ("all", "day")
+
+        model.AddExactlyOne(shifts.night[(d, day)] for d in (ext_indices if night_external else doctors))
+        if night_external:
+            for d in int_indices:
+                model.Add(shifts.night[(d, day)] == 0)
+        if cal.has_day_slot(day):
+            model.AddExactlyOne(shifts.day[(d, day)] for d in (ext_indices if day_external else doctors))
+            if day_external:
+                for d in int_indices:
+                    model.Add(shifts.day[(d, day)] == 0)
+        else:
+            for d in doctors:
+                model.Add(shifts.day[(d, day)] == 0)
+
+    # 外部医師は当月ちょうど1回勤務（枠数分を必ず外部が担当）
+    for d in ext_indices:
+        model.Add(sum(shifts.work[(d, day)] for day in cal.days) == 1)
+
+    if prevent_sunhol_consecutive:
+        for d in doctors:
+            for day in cal.days:
+                model.Add(shifts.night[(d, day)] + shifts.day[(d, day)] <= 1)
+
+
+def slot_index(day: int, shift: str) -> int:
+    """枠の通し番号（1日の日直 -> 0, 1日の当直 -> 1, 2日の日直 -> 2 ...）"""
+    return 2 * (day - 1) + (1 if shift == "night" else 0)
+
+
+def add_first_slot_order(
+    model: cp_model.CpModel,
+    cal: CalendarTemplate,
+    shifts: ShiftVars,
+    doctor_classes: Iterable[List[int]],
+    exactly_once: Iterable[int] = (),
+) -> None:
+    """入れ替え可能な医師の組ごとに「最初に入る枠」が医師番号順になるよう並べる（対称性の除去）
+
+    同じ組の医師は入れ替えても制約・目的値が変わらないので、どの解も組の中で並べ替えればこの順にできる。
+    1つの枠には1人しか入らないので、勤務がある医師同士の最初の枠は必ず異なる（勤務なしは 2×日数）。
+    """
+    sentinel = 2 * cal.num_days
+    once = set(exactly_once)
+    for members in doctor_classes:
+        previous = None
+        for d in members:
+            slots = []
+            for day in cal.days:
+                slots.append((slot_index(day, "night"), shifts.night[(d, day)]))
+                if cal.has_day_slot(day):
+                    slots.append((slot_index(day, "day"), shifts.day[(d, day)]))
+            if d in once:
+                # 月1回だけ入る医師（外部医師）は、入る枠の番号がそのまま線形式になる
+                first = sum(index * var for index, var in slots)
+            else:
+                # 入ればその枠の番号、入らなければ sentinel の最小値
+                first = model.NewIntVar(0, sentinel, f"first_slot_d{d}")
+                model.AddMinEquality(first, [sentinel - (sentinel - index) * var for index, var in slots])
+            if previous is not None:
+                model.Add(previous < first if d in once else previous <= first)
+            previous = first
+
+
+def add_spacing_gap(
+    model: cp_model.CpModel,
+    cal: CalendarTemplate,
+    shifts: ShiftVars,
+    num_doctors: int,
+    gap: int,
+    enforce: Optional[cp_model.IntVar] = None,
+) -> None:
+    """同じ医師が gap 日差の2日に入らない（enforce があればそのリテラルが真のときだけ）"""
+    for d in range(num_doctors):
+        for day in range(1, cal.num_days - gap + 1):
+            ct = model.Add(shifts.work[(d, day)] + shifts.work[(d, day + gap)] <= 1)
+            if enforce is not None:
+                ct.OnlyEnforceIf(enforce)
+
+
+def add_spacing_windows(
+    model: cp_model.CpModel,
+    cal: CalendarTemplate,
+    shifts: ShiftVars,
+    num_doctors: int,
+    spacing_days: int,
+) -> None:
+    """同じ医師は連続 spacing_days+1 日の窓に1回まで（add_spacing_gap を k=1..spacing_days で並べたのと同値）
+
+    間隔 k<=spacing_days の2日はどちらも、どれかの窓（最後の窓は月末で止める）に収まる。
+    制約数は 医師 × 日 × 間隔 から 医師 × 日 に減る。
+    """
+    if spacing_days <= 0:
+        return
+    width = min(spacing_days + 1, cal.num_days)
+    for d in range(num_doctors):
+        for start in range(1, cal.num_days - width + 2):
+            model.AddAtMostOne(shifts.work[(d, day)] for day in range(start, start + width))
+
+
+def month_cross_blocks(
+    prev_month_worked_days: Dict[int, List[int]],
+    prev_last: Optional[int],
+    spacing_days: Optional[int],
+    num_days: int,
+) -> Dict[int, Dict[int, int]]:
+    """前月末の勤務で塞がる月初の日: 医師 -> {日: その日を塞ぐのに必要な最小の勤務間隔}
+
+    前月最終日から dist 日前の勤務は、勤務間隔 v のとき月初 v+1-dist 日までを塞ぐ。
+    """
+    blocks: Dict[int, Dict[int, int]] = {}
+    if spacing_days is None or prev_last is None:
+        return blocks
+    for d, prev_days in prev_month_worked_days.items():
+        for prev_day in prev_days:
+            dist_to_start = (prev_last - int(prev_day)) + 1
+            if not 1 <= dist_to_start <= spacing_days:
+                continue
+            for day in range(1, min(spacing_days + 1 - dist_to_start, num_days) + 1):
+                needed = day + dist_to_start - 1
+                doctor_blocks = blocks.setdefault(d, {})
+                doctor_blocks[day] = min(doctor_blocks.get(day, needed), needed)
+    return blocks
+
+
+def add_cross_month_spacing(
+    model: cp_model.CpModel,
+    prev_cal: CalendarTemplate,
+    prev_shifts: ShiftVars,
+    cal: CalendarTemplate,
+    shifts: ShiftVars,
+    num_doctors: int,
+    spacing_days: Optional[int],
+) -> None:
+    """同じモデルで続けて解く2か月の境目にも勤務間隔を課す（月末〜翌月初をまたぐ窓ごとの AtMostOne）
+
+    1つの月を解くときの month_cross_blocks（前月末の勤務を定数として塞ぐ）を、変数どうしの制約にしたもの。
+    """
+    if not spacing_days or spacing_days <= 0:
+        return
+    width = spacing_days + 1
+    for d in range(num_doctors):
+        for start in range(max(prev_cal.num_days - spacing_days + 1, 1), prev_cal.num_days + 1):
+            tail = [prev_shifts.work[(d, day)] for day in range(start, prev_cal.num_days + 1)]
+            head_len = min(width - len(tail), cal.num_days)
+            model.AddAtMostOne(tail + [shifts.work[(d, day)] for day in range(1, head_len + 1)])
+
+
+def unavailable_shift_vars(shifts: ShiftVars, d: int, day: int, target_shift: str) -> List[cp_model.IntVar]:
+    """不可日の target_shift（all/day/night）で塞ぐ変数"""
+    out = []
+    if target_shift in ("day", "all"):
+        out.append(shifts.day[(d, day)])
+    if target_shift in ("night", "all"):
+        out.append(shifts.night[(d, day)])
+    return out
+
+
+def locked_shift_var(cal: CalendarTemplate, shifts: ShiftVars, d: int, day: int, shift: str) -> cp_model.IntVar:
+    """ロックで 1 に固定する変数（日当直モードの日祝の日直ロックは当直として扱う）"""
+    if shift == "night" or (cal.combined_mode and cal.is_sunday_or_holiday(day)):
+        return shifts.night[(d, day)]
+    return shifts.day[(d, day)]
+
+
+# ----------------------------------------------------------------------
+# 式
+# ----------------------------------------------------------------------
+
+
+def saturday_night_expr(cal: CalendarTemplate, shifts: ShiftVars, d: int):
+    return sum(shifts.night[(d, day)] for day in cal.saturdays)
+
+
+def sunhol_day_expr(cal: CalendarTemplate, shifts: ShiftVars, d: int):
+    return sum(shifts.day[(d, day)] for day in cal.sunhol_days)
+
+
+def sunhol_work_expr(cal: CalendarTemplate, shifts: ShiftVars, d: int):
+    return sum(shifts.day[(d, day)] + shifts.night[(d, day)] for day in cal.sunhol_days)
+
+
+def weekend_holiday_work_expr(cal: CalendarTemplate, shifts: ShiftVars, d: int):
+    """土曜当直 + 日祝の日直・当直の回数"""
+    return sum(
+        shifts.day[(d, day)] + shifts.night[(d, day)]
+        if cal.is_sunday_or_holiday(day)
+        else shifts.night[(d, day)]
+        for day in cal.weekend_days
+    )
+
+
+def score_expr(cal: CalendarTemplate, shifts: ShiftVars, d: int, weights: ShiftWeights):
+    """医師 d の当月スコア（×10）"""
+    expr = 0
+    for day in cal.days:
+        if cal.is_sunday_or_holiday(day):
+            if cal.combined_mode:
+                expr += shifts.night[(d, day)] * weights.day_night
+            else:
+                expr += shifts.day[(d, day)] * weights.sunhol_day
+                expr += shifts.night[(d, day)] * weights.sunhol_night
+        elif cal.is_saturday(day):
+            expr += shifts.night[(d, day)] * weights.sat_night
+        else:
+            expr += shifts.night[(d, day)] * weights.weekday_night
+    return expr
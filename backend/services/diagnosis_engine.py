@@ -0,0 +1,338 @@
+"""制約診断エンジン（1つの CP-SAT モデルに仮定リテラルで問い合わせる）
+
+生成が INFEASIBLE のとき、診断は「どの設定を緩めれば解けるか」を何十回も問い合わせる。
+試行ごとに OnCallOptimizer を作り直すと、そのたびに全変数・全制約を Python で組み直すことになる。
+ここでは build_model と同じハード制約を constraint_builder の部品で一度だけ組み、緩和できる制約ごとに有効化リテラル
+（OnlyEnforceIf）を付けておく。問い合わせは「有効にするリテラル」を仮定（assumptions）として
+渡した複製モデルを解くだけなので、診断の時間は問い合わせの数で決まり、モデル構築では決まらない。
+
+有効化リテラルの単位（group_id は診断結果の conflict_groups にそのまま出る）:
+- 勤務間隔: interval_global（間隔 k 日ごとのリテラル k=1..現在値。間隔 v は k<=v だけを仮定する）
+- 前月末勤務による月初ブロック: cross_month_d{医師}（勤務間隔のリテラルと両方が真のときだけ効く）
+- 土曜当直上限・土日祝合算上限: sat_cap_d{医師} / wh_cap_d{医師}（上限値ごとのリテラルを持つ）
+- 日祝日直上限・日祝合計上限: sunhol_day_cap_d{医師} / sunhol_work_cap_d{医師}
+- スコア下限・上限: score_min_d{医師} / score_max_d{医師}（外部医師には build_model と同じく付けない）
+- ロック・不可日: locked_d{医師}_day{日}_{シフト} / unavail_d{医師}_day{日} / fixdow_d{医師}_dow{曜日}
+
+仮定しないリテラルはソルバーが自由に偽にできるので、「仮定しない＝その制約を外す」になる。
+目的関数は持たない（可否だけを問う）。ソフト制約（ソフト不可日など）は可否に関係しないので組まない。
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+from services.constraint_builder import (
+    add_shift_vars,
+    add_spacing_gap,
+    add_structural_constraints,
+    locked_shift_var,
+    month_cross_blocks,
+    saturday_night_expr,
+    score_expr,
+    sunhol_day_expr,
+    sunhol_work_expr,
+    unavailable_shift_vars,
+    weekend_holiday_work_expr,
+)
+
+if TYPE_CHECKING:
+    from services.optimizer import OnCallOptimizer
+
+# 管理者設定の名前（_diagnose_try_settings の overrides のキー）-> 上限値ごとのリテラルを持つ制約群
+SETTING_INTERVAL_DAYS = "interval_days"
+SETTING_MAX_SATURDAY_NIGHTS = "max_saturday_nights"
+SETTING_MAX_WEEKEND_HOLIDAY_WORKS = "max_weekend_holiday_works"
+
+_FIXED_WEEKDAY_LABELS_JA = ["月曜", "火曜", "水曜", "木曜", "金曜", "土曜", "日曜", "祝日(日曜以外)"]
+
+
+class DiagnosisEngine:
+    """OnCallOptimizer の入力からハード制約だけの診断モデルを一度だけ組む"""
+
+    def __init__(self, optimizer: "OnCallOptimizer", doctor_names: Optional[Dict[int, str]] = None) -> None:
+        self.opt = optimizer
+        self.doctor_names = doctor_names or {}
+        self.model = cp_model.CpModel()
+        # group_id -> {"literals", "category", "setting", "doctor_idx", "doctor_name", "description_ja"}
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        # 上限値ごとのリテラル: setting -> {(doctor_idx, value): literal}（勤務間隔は doctor_idx=None）
+        self._levels: Dict[str, Dict[Tuple[Optional[int], int], cp_model.IntVar]] = {}
+        # 上限値がこれ以上なら制約として意味がない（土曜の数・土日祝の枠数）
+        self._level_limits: Dict[str, int] = {}
+
+        limits = optimizer.hard_limits()
+        self.limits = limits
+        self.spacing_days = limits.spacing_days
+        self.max_saturday_nights = limits.max_saturday_nights
+        self.max_sunhol_days = limits.max_sunhol_days
+        self.max_sunhol_works = limits.max_sunhol_works
+        self.max_weekend_holiday_works = limits.max_weekend_holiday_works
+        self._build()
+
+    # ------------------------------------------------------------------
+    # モデル構築
+    # ------------------------------------------------------------------
+
+    def _doctor_label(self, d: int) -> str:
+        return self.doctor_names.get(d, f"医師{d+1}")
+
+    def _date_label(self, day: int) -> str:
+        return f"{self.opt.month}/{day}（{self.opt.calendar.weekday_ja(day)}）"
+
+    def _group_literal(
+        self,
+        group_id: str,
+        category: str,
+        doctor_idx: Optional[int],
+        description_ja: str,
+        setting: Optional[str] = None,
+    ) -> cp_model.IntVar:
+        """group_id のリテラルを返す（同じ group_id の制約は同じリテラルで有効化する）"""
+        group = self.groups.get(group_id)
+        if group is None:
+            group = {
+                "literals": [self.model.NewBoolVar(f"assume_{group_id}")],
+                "category": category,
+                "setting": setting,
+                "doctor_idx": doctor_idx,
+                "doctor_name": self.doctor_names.get(doctor_idx) if doctor_idx is not None else None,
+                "description_ja": description_ja,
+            }
+            self.groups[group_id] = group
+        return group["literals"][0]
+
+    def _level_literal(self, setting: str, doctor_idx: Optional[int], value: int) -> cp_model.IntVar:
+        levels = self._levels.setdefault(setting, {})
+        key = (doctor_idx, value)
+        if key not in levels:
+            suffix = f"_d{doctor_idx}" if doctor_idx is not None else ""
+            levels[key] = self.model.NewBoolVar(f"level_{setting}{suffix}_{value}")
+        return levels[key]
+
+    def _build(self) -> None:
+        opt = self.opt
+        model = self.model
+        cal = opt.calendar
+        limits = self.limits
+        doctors = range(opt.num_doctors)
+
+        # --- 常に有効（構造上の制約。build_model と同じ部品） ---
+        shifts = add_shift_vars(model, opt.num_doctors, cal)
+        self.shifts = shifts
+        add_structural_constraints(
+            model, cal, shifts, opt.num_doctors,
+            opt.external_doctor_indices, opt.external_fixed_dates,
+            limits.prevent_sunhol_consecutive,
+        )
+
+        # build_model のソフト制約 is_3rd（0..1 の整数変数）が暗黙に課している日祝3回までの上限
+        for d in doctors:
+            model.Add(sunhol_work_expr(cal, shifts, d) <= 3)
+
+        # --- ロック ---
+        for d, day, shift in opt._iter_locked_shifts():
+            shift_label = "当直" if shift == "night" else "日直"
+            lit = self._group_literal(
+                f"locked_d{d}_day{day}_{shift}", "locked", d,
+                f"{self._doctor_label(d)}の{self._date_label(day)}{shift_label}ロック",
+            )
+            model.Add(locked_shift_var(cal, shifts, d, day, shift) == 1).OnlyEnforceIf(lit)
+
+        # --- 不可日（ハードのみ。日付指定は医師×日、固定不可曜日は医師×曜日ごと） ---
+        def block(d: int, day: int, shift_type: str, lit: cp_model.IntVar) -> None:
+            for var in unavailable_shift_vars(shifts, d, day, shift_type):
+                model.Add(var == 0).OnlyEnforceIf(lit)
+
+        if limits.respect_unavailable_days:
+            availability = opt.availability
+            for d, day, target_shift in availability.hard_date_entries():
+                lit = self._group_literal(
+                    f"unavail_d{d}_day{day}", "unavailable", d,
+                    f"{self._doctor_label(d)}の{self._date_label(day)}不可日",
+                )
+                block(d, day, target_shift, lit)
+
+            for d, target_dow, target_shift in availability.hard_weekday_rules():
+                dow_label = (
+                    _FIXED_WEEKDAY_LABELS_JA[target_dow]
+                    if target_dow < len(_FIXED_WEEKDAY_LABELS_JA) else f"曜日{target_dow}"
+                )
+                lit = self._group_literal(
+                    f"fixdow_d{d}_dow{target_dow}", "unavailable", d,
+                    f"{self._doctor_label(d)}の{dow_label}固定不可",
+                )
+                for day in sorted(cal.fixed_weekday_days[target_dow]):
+                    block(d, day, target_shift, lit)
+
+        # --- 勤務間隔（間隔 k 日ごとのリテラル） ---
+        spacing = self.spacing_days
+        if spacing is not None:
+            interval_lits = [self._level_literal(SETTING_INTERVAL_DAYS, None, k) for k in range(1, spacing + 1)]
+            self.groups["interval_global"] = {
+                "literals": interval_lits,
+                "category": "interval",
+                "setting": SETTING_INTERVAL_DAYS,
+                "doctor_idx": None,
+                "doctor_name": None,
+                "description_ja": f"勤務間隔 {spacing}日ルール",
+            }
+            for k, lit in enumerate(interval_lits, start=1):
+                add_spacing_gap(model, cal, shifts, opt.num_doctors, k, enforce=lit)
+
+            # 前月末勤務: 塞ぐのに必要な間隔のリテラルと医師ごとのリテラルが両方真のときだけ効く
+            prev_month_worked_days, prev_last = opt._build_previous_month_state()
+            cross_blocks = month_cross_blocks(prev_month_worked_days, prev_last, spacing, opt.num_days)
+            for d, blocked in cross_blocks.items():
+                lit = self._group_literal(
+                    f"cross_month_d{d}", "cross_month", d,
+                    f"{self._doctor_label(d)}の前月末勤務による月初ブロック（{min(blocked)}〜{max(blocked)}日）",
+                )
+                for day, needed in blocked.items():
+                    model.Add(shifts.work[(d, day)] == 0).OnlyEnforceIf([lit, interval_lits[needed - 1]])
+
+        # --- 月ごとの回数上限 ---
+        self._add_capped(
+            SETTING_MAX_SATURDAY_NIGHTS, "sat_cap", self.max_saturday_nights, len(cal.saturdays),
+            lambda d: saturday_night_expr(cal, shifts, d),
+            lambda d, v: f"{self._doctor_label(d)}の土曜当直上限（月{v}回）",
+        )
+        self._add_capped(
+            None, "sunhol_day_cap", self.max_sunhol_days, 2 * len(cal.sunhol_days),
+            lambda d: sunhol_day_expr(cal, shifts, d),
+            lambda d, v: f"{self._doctor_label(d)}の日祝日直上限（月{v}回）",
+        )
+        self._add_capped(
+            None, "sunhol_work_cap", self.max_sunhol_works, 2 * len(cal.sunhol_days),
+            lambda d: sunhol_work_expr(cal, shifts, d),
+            lambda d, v: f"{self._doctor_label(d)}の日祝合計上限（月{v}回）",
+        )
+        self._add_capped(
+            SETTING_MAX_WEEKEND_HOLIDAY_WORKS, "wh_cap", self.max_weekend_holiday_works,
+            len(cal.weekend_days) + len(cal.sunhol_days),
+            lambda d: weekend_holiday_work_expr(cal, shifts, d),
+            lambda d, v: f"{self._doctor_label(d)}の土日祝合計上限（月{v}回）",
+        )
+
+        # --- スコア下限・上限（外部医師は対象外） ---
+        weights = opt.shift_weights
+        for d in sorted(opt.internal_doctor_indices):
+            doc_score = model.NewIntVar(0, 2000, f"diag_score_d{d}")
+            model.Add(doc_score == score_expr(cal, shifts, d, weights))
+
+            d_min, d_max = opt._score_bounds(d)
+            lit_min = self._group_literal(
+                f"score_min_d{d}", "score", d,
+                f"{self._doctor_label(d)}のスコア下限（{d_min/10:.1f}点）", setting="score_min",
+            )
+            model.Add(doc_score >= d_min).OnlyEnforceIf(lit_min)
+            lit_max = self._group_literal(
+                f"score_max_d{d}", "score", d,
+                f"{self._doctor_label(d)}のスコア上限（{d_max/10:.1f}点）", setting="score_max",
+            )
+            model.Add(doc_score <= d_max).OnlyEnforceIf(lit_max)
+
+    def _add_capped(
+        self,
+        setting: Optional[str],
+        prefix: str,
+        current: Optional[int],
+        limit: int,
+        expr_for,
+        describe,
+    ) -> None:
+        """医師ごとの回数上限。setting があれば current 以上 limit 未満の上限値ごとにリテラルを持つ"""
+        if current is None:
+            return
+        values = range(current, limit) if setting is not None else [current]
+        if setting is not None:
+            self._level_limits[setting] = limit
+        for d in range(self.opt.num_doctors):
+            expr = expr_for(d)
+            for value in values:
+                if setting is not None:
+                    lit = self._level_literal(setting, d, value)
+                else:
+                    lit = self._group_literal(f"{prefix}_d{d}", "cap", d, describe(d, value))
+                self.model.Add(expr <= value).OnlyEnforceIf(lit)
+            if setting is not None and current < limit:
+                self.groups[f"{prefix}_d{d}"] = {
+                    "literals": [self._levels[setting][(d, current)]],
+                    "category": "cap",
+                    "setting": setting,
+                    "doctor_idx": d,
+                    "doctor_name": self.doctor_names.get(d),
+                    "description_ja": describe(d, current),
+                }
+
+    # ------------------------------------------------------------------
+    # 問い合わせ
+    # ------------------------------------------------------------------
+
+    def _setting_literals(self, setting: str, raw_value: Any) -> List[cp_model.IntVar]:
+        """管理者設定を raw_value にしたときに仮定するリテラル（None/0 は制限なし）"""
+        value = self.opt._coerce_positive_int(raw_value)
+        if value is None:
+            return []
+        levels = self._levels.get(setting, {})
+        if setting == SETTING_INTERVAL_DAYS:
+            # 間隔は現在値より緩める方向にしか問い合わせない
+            if value > (self.spacing_days or 0):
+                raise ValueError(f"{setting}={value} は診断モデルの範囲外です")
+            return [levels[(None, k)] for k in range(1, value + 1)]
+        if setting not in self._level_limits:
+            raise ValueError(f"{setting} は現在の設定で有効になっていません")
+        if value >= self._level_limits[setting]:
+            # 上限として意味がない値（枠数以上）
+            return []
+        lits = []
+        for d in range(self.opt.num_doctors):
+            lit = levels.get((d, value))
+            if lit is None:
+                raise ValueError(f"{setting}={value} は診断モデルの範囲外です")
+            lits.append(lit)
+        return lits
+
+    def assumptions(
+        self,
+        overrides: Optional[Dict[str, Any]] = None,
+        remove_score_min: bool = False,
+        remove_score_max: bool = False,
+        exclude_groups: Iterable[str] = (),
+    ) -> List[cp_model.IntVar]:
+        """現在の設定から overrides だけ変えた状態で有効にするリテラル
+
+        overrides のキーは interval_days / max_saturday_nights / max_weekend_holiday_works
+        （値 None・0 はその制限を外す）。exclude_groups の group_id は仮定しない（外す）。
+        """
+        overrides = overrides or {}
+        excluded = set(exclude_groups)
+        removed_settings = set(overrides)
+        if remove_score_min:
+            removed_settings.add("score_min")
+        if remove_score_max:
+            removed_settings.add("score_max")
+
+        lits: List[cp_model.IntVar] = []
+        for group_id, group in self.groups.items():
+            if group_id in excluded or group["setting"] in removed_settings:
+                continue
+            lits.extend(group["literals"])
+        for setting, raw_value in overrides.items():
+            lits.extend(self._setting_literals(setting, raw_value))
+        return lits
+
+    def model_with(self, assumptions: List[cp_model.IntVar]) -> cp_model.CpModel:
+        """仮定を付けた複製モデルを返す（元のモデルは並列の問い合わせで共有するので書き換えない）"""
+        model = self.model.Clone()
+        model.AddAssumptions(assumptions)
+        return model
+
+    def groups_in_core(self, core: Iterable[int]) -> List[Tuple[str, Dict[str, Any]]]:
+        """SufficientAssumptionsForInfeasibility() の結果に含まれる group を返す"""
+        core_set = set(core)
+        return [
+            (group_id, group) for group_id, group in self.groups.items()
+            if any(lit.Index() in core_set for lit in group["literals"])
+        ]
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import calendar
+import uuid
 from dataclasses import dataclass
-from datetime import date
-from typing import List, Optional
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
 import jpholiday
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.holiday import Holiday
+from services.settings_service import get_custom_holidays
 
 
 @dataclass(frozen=True)
@@ -26,6 +30,114 @@ def get_jp_holidays_for_year(year: int) -> List[HolidayItem]:
     return items
 
 
+@lru_cache(maxsize=None)
+def national_holiday_dates(year: int) -> FrozenSet[date]:
+    """指定年の国民の祝日（jpholiday）。年ごとにプロセスで一度だけ計算する"""
+    return frozenset(d for d, _ in jpholiday.year_holidays(year))
+
+
+def _months(start_date: date, end_date: date) -> List[Tuple[int, int]]:
+    months = []
+    year, month = start_date.year, start_date.month
+    while date(year, month, 1) < end_date:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class HolidayCalendar:
+    """期間 [start_date, end_date) の祝日カレンダー（国民の祝日 + 病院の手動祝日 − 除外した祝日）
+
+    月ごとに祝日と日祝（日曜または祝日）のビットマップ（日 d は bit d-1）を持ち、判定は O(1)。
+    期間外の日は国民の祝日だけで判定する。
+    """
+
+    def __init__(self, start_date: date, end_date: date, holidays: Iterable[date]) -> None:
+        self.start_date = start_date
+        self.end_date = end_date
+        self._holiday_bits: Dict[Tuple[int, int], int] = {}
+        self._sunhol_bits: Dict[Tuple[int, int], int] = {}
+        for year, month in _months(start_date, end_date):
+            first_weekday, num_days = calendar.monthrange(year, month)
+            # monthrange の曜日は月曜=0。最初の日曜から7日おき
+            sundays = range(1 + (6 - first_weekday) % 7, num_days + 1, 7)
+            self._holiday_bits[(year, month)] = 0
+            self._sunhol_bits[(year, month)] = sum(1 << (day - 1) for day in sundays)
+        for d in holidays:
+            if start_date <= d < end_date:
+                self._holiday_bits[(d.year, d.month)] |= 1 << (d.day - 1)
+                self._sunhol_bits[(d.year, d.month)] |= 1 << (d.day - 1)
+
+    def _bit(self, bits: Dict[Tuple[int, int], int], d: date) -> Optional[bool]:
+        if not (self.start_date <= d < self.end_date):
+            return None
+        return bool(bits[(d.year, d.month)] >> (d.day - 1) & 1)
+
+    def is_holiday(self, d: date) -> bool:
+        inside = self._bit(self._holiday_bits, d)
+        return d in national_holiday_dates(d.year) if inside is None else inside
+
+    def is_sunday_or_holiday(self, d: date) -> bool:
+        inside = self._bit(self._sunhol_bits, d)
+        return d.weekday() == 6 or d in national_holiday_dates(d.year) if inside is None else inside
+
+    def month_holiday_bitmap(self, year: int, month: int) -> int:
+        return self._holiday_bits.get((year, month), 0)
+
+    def month_sunhol_bitmap(self, year: int, month: int) -> int:
+        return self._sunhol_bits.get((year, month), 0)
+
+    def month_holidays(self, year: int, month: int) -> List[int]:
+        """月の祝日の日（OnCallOptimizer の holidays と同じ形）"""
+        bits = self.month_holiday_bitmap(year, month)
+        return [day for day in range(1, bits.bit_length() + 1) if bits >> (day - 1) & 1]
+
+    @property
+    def holidays(self) -> set[date]:
+        """期間内の祝日の日付"""
+        return {
+            date(year, month, day)
+            for year, month in self._holiday_bits
+            for day in self.month_holidays(year, month)
+        }
+
+
+def national_holiday_calendar(start_date: date, end_date: date) -> HolidayCalendar:
+    """病院の設定を含まない国民の祝日だけのカレンダー（デモなど病院のない場面用）"""
+    holidays = [d for year in range(start_date.year, end_date.year + 1) for d in national_holiday_dates(year)]
+    return HolidayCalendar(start_date, end_date, holidays)
+
+
+def _parse_custom_dates(values: Iterable[object]) -> set[date]:
+    parsed: set[date] = set()
+    for raw in values:
+        try:
+            parsed.add(date.fromisoformat(str(raw)))
+        except ValueError:
+            continue
+    return parsed
+
+
+async def load_holiday_calendar(
+    db: AsyncSession, hospital_id: uuid.UUID, start_date: date, end_date: date
+) -> HolidayCalendar:
+    """病院の祝日カレンダー（年ごとの custom_holidays 設定は設定キャッシュから読む）"""
+    holidays: set[date] = set()
+    for year in range(start_date.year, (end_date - timedelta(days=1)).year + 1):
+        custom = await get_custom_holidays(db, hospital_id, year)
+        manual = _parse_custom_dates(custom.get("manual_holidays", []))
+        ignored = _parse_custom_dates(custom.get("ignored_holidays", []))
+        holidays |= (national_holiday_dates(year) | manual) - ignored
+    return HolidayCalendar(start_date, end_date, holidays)
+
+
+async def load_month_holidays(db: AsyncSession, hospital_id: uuid.UUID, year: int, month: int) -> List[int]:
+    """病院のその月の祝日の日"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return (await load_holiday_calendar(db, hospital_id, start, end)).month_holidays(year, month)
+
+
 async def ensure_holidays_for_year(db: AsyncSession, year: int) -> int:
     """
     指定年のHolidayがDBに1件も無ければ、jpholidayから取得して一括INSERTする。
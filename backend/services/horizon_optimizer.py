@@ -0,0 +1,327 @@
+"""複数月（2〜6か月）をまとめて1つの CP-SAT モデルで解く（ロードマップ P2-9）
+
+1か月ずつ生成すると、月の境目は前月の確定シフトを定数として扱う（month_cross_blocks・sat_prev）しかなく、
+土曜・日祝・スコアの累積の公平性も past_* の近似になる。ここでは各月の OnCallOptimizer に
+同じ CpModel を渡して build_model() を並べ、月をまたぐ部分だけを変数どうしの制約・目的関数にする。
+
+- 勤務間隔: 月の境目にまたがる窓ごとの AtMostOne（add_cross_month_spacing）。2か月目以降は前月の状態を渡さない
+- 理想間隔・土曜当直の連続: 境目をまたぐ分を期間全体のペナルティとして足す
+- 累積の公平性（past_sat_gap / past_sunhol_gap / score_balance）: 各月の同名の項を外し、
+  期間開始時点の過去実績 + 期間内の合計の最大−最小で置き換える
+
+出力は月ごとの schedule / scores（/api/schedule/save にそのまま渡せる形）。
+入れ替え可能な医師の出力の並べ替えは月ごとに独立には行えない（累積が変わる）ので行わない。
+"""
+from __future__ import annotations
+
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+from services.constraint_builder import (
+    ShiftVars,
+    add_cross_month_spacing,
+    saturday_night_expr,
+    sunhol_work_expr,
+)
+from services.optimizer import OnCallOptimizer, _SolutionProgressCallback, _solver_stats
+
+MIN_HORIZON_MONTHS = 2
+MAX_HORIZON_MONTHS = 6
+
+# 期間全体の累積で置き換える目的関数の項（ObjectiveWeights の名前）
+CUMULATIVE_TERMS = ("past_sat_gap", "past_sunhol_gap", "score_balance")
+
+# 前月の状態。期間内の2か月目以降は前の月の変数そのものを使うので渡さない
+_CARRY_IN_KWARGS = ("prev_month_worked_days", "prev_month_last_day", "previous_month_shifts", "sat_prev")
+
+
+def _next_month(year: int, month: int) -> Tuple[int, int]:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class HorizonOptimizer:
+    """連続する複数月を1つのモデルで解く。months は月ごとの OnCallOptimizer の引数（先頭の月から順に）"""
+
+    def __init__(self, months: List[Dict[str, Any]]) -> None:
+        if not MIN_HORIZON_MONTHS <= len(months) <= MAX_HORIZON_MONTHS:
+            raise ValueError(f"months must have {MIN_HORIZON_MONTHS}-{MAX_HORIZON_MONTHS} entries")
+        for prev, cur in zip(months, months[1:]):
+            if _next_month(int(prev["year"]), int(prev["month"])) != (int(cur["year"]), int(cur["month"])):
+                raise ValueError("months must be consecutive")
+            if int(prev["num_doctors"]) != int(cur["num_doctors"]):
+                raise ValueError("num_doctors must be the same in every month")
+
+        self.model = cp_model.CpModel()
+        self.months: List[OnCallOptimizer] = []
+        self._month_kwargs: List[Dict[str, Any]] = []
+        for i, kwargs in enumerate(months):
+            month_kwargs = dict(kwargs)
+            # 組の並べ替えは月ごとに独立にはできないので、対称性の除去もしない
+            month_kwargs["symmetry_breaking"] = False
+            if i > 0:
+                for key in _CARRY_IN_KWARGS:
+                    month_kwargs.pop(key, None)
+            opt = OnCallOptimizer(**month_kwargs)
+            opt.model = self.model
+            self.months.append(opt)
+            self._month_kwargs.append(month_kwargs)
+        self.num_doctors = self.months[0].num_doctors
+
+        # ソルバープールから設定される（OnCallOptimizer と同じ）
+        self.progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.num_workers: Optional[int] = None
+
+        self._objective_terms: Dict[str, Tuple[int, Any]] = {}
+        self._cumulative_scores: List[Any] = []
+
+    @property
+    def _lead(self) -> OnCallOptimizer:
+        # 求解・キャンセル・進捗通知は先頭の月の OnCallOptimizer を通す
+        return self.months[0]
+
+    def cancel(self) -> None:
+        self._lead.cancel()
+
+    def pre_validate(self) -> List[Dict[str, Any]]:
+        """月ごとの pre_validate。current_value に対象の年月を付ける"""
+        errors: List[Dict[str, Any]] = []
+        for opt in self.months:
+            for error in opt.pre_validate():
+                label = f"{opt.year}年{opt.month}月"
+                current = error.get("current_value")
+                errors.append({**error, "current_value": f"{label}: {current}" if current else label})
+        return errors
+
+    def build_model(self) -> None:
+        for opt in self.months:
+            opt.build_model()
+            opt._doctor_classes = []
+            opt._output_order = []
+            for name in CUMULATIVE_TERMS:
+                opt._objective_terms.pop(name, None)
+
+        lead = self._lead
+        w = lead.objective_weights
+        doctors = range(self.num_doctors)
+        model = self.model
+        spacing_days = lead.hard_limits().spacing_days
+
+        # 月ごとの「土曜当直あり」（土曜当直が2か月続いたら、1か月ずつ解くときの sat_prev の代わりに罰する）
+        sat_worked: List[List[Any]] = []
+        if w.sat_consec > 0:
+            for opt in self.months:
+                row = []
+                for d in doctors:
+                    sat = model.NewBoolVar(f"horizon_sat_{opt.year}_{opt.month}_d{d}")
+                    model.AddMaxEquality(sat, [opt.night_shifts[(d, day)] for day in opt.calendar.saturdays])
+                    row.append(sat)
+                sat_worked.append(row)
+
+        ideal_gap_penalties = []
+        sat_consec_penalties = []
+        for i, (prev, cur) in enumerate(zip(self.months, self.months[1:])):
+            prev_shifts = self._shift_vars(prev)
+            cur_shifts = self._shift_vars(cur)
+            add_cross_month_spacing(
+                model, prev.calendar, prev_shifts, cur.calendar, cur_shifts, self.num_doctors, spacing_days,
+            )
+
+            # 理想間隔: 境目をまたぐ (間隔, 間隔+extra] 日の2回勤務に、月内と同じ段階の重みを付ける
+            base = spacing_days if spacing_days is not None else 4
+            extra = max(w.ideal_gap_extra, 0)
+            if extra > 0 and w.ideal_gap_weight > 0:
+                for d in doctors:
+                    for prev_day in range(max(prev.num_days - base - extra + 1, 1), prev.num_days + 1):
+                        for k in range(1, extra + 1):
+                            day = prev_day + base + k - prev.num_days
+                            if not 1 <= day <= cur.num_days:
+                                continue
+                            both = model.NewBoolVar(f"horizon_igap_{cur.month}_d{d}_p{prev_day}_k{k}")
+                            model.Add(prev.work[(d, prev_day)] + cur.work[(d, day)] - 1 <= both)
+                            ideal_gap_penalties.append(both * (extra - k + 1))
+
+            for d in doctors if sat_worked else ():
+                both = model.NewBoolVar(f"horizon_sat_consec_{cur.month}_d{d}")
+                model.Add(sat_worked[i][d] + sat_worked[i + 1][d] - 1 <= both)
+                sat_consec_penalties.append(both)
+
+        # 累積の公平性: 期間開始時点の過去実績 + 期間内の合計
+        sat_totals = []
+        sunhol_totals = []
+        score_totals = []
+        for d in doctors:
+            sat_total = model.NewIntVar(0, 999, f"horizon_sat_total_d{d}")
+            model.Add(sat_total == lead._get_past(lead.past_sat_counts, d) + sum(
+                saturday_night_expr(opt.calendar, self._shift_vars(opt), d) for opt in self.months
+            ))
+            sat_totals.append(sat_total)
+            sunhol_total = model.NewIntVar(0, 999, f"horizon_sunhol_total_d{d}")
+            model.Add(sunhol_total == lead._get_past(lead.past_sunhol_counts, d) + sum(
+                sunhol_work_expr(opt.calendar, self._shift_vars(opt), d) for opt in self.months
+            ))
+            sunhol_totals.append(sunhol_total)
+            score_total = model.NewIntVar(0, 1000000, f"horizon_score_total_d{d}")
+            model.Add(score_total == int(round(lead.past_total_scores.get(d, 0.0) * 10)) + sum(
+                opt.doctor_scores[d] for opt in self.months
+            ))
+            score_totals.append(score_total)
+        self._cumulative_scores = score_totals
+
+        ideal_gap_sum = model.NewIntVar(0, 100000, "horizon_ideal_gap_sum")
+        model.Add(ideal_gap_sum == sum(ideal_gap_penalties))
+        sat_consec_sum = model.NewIntVar(0, 1000, "horizon_sat_consec_sum")
+        model.Add(sat_consec_sum == sum(sat_consec_penalties))
+
+        self._objective_terms = {
+            "past_sat_gap": (w.past_sat_gap, self._spread(sat_totals, "horizon_sat")),
+            "past_sunhol_gap": (w.past_sunhol_gap, self._spread(sunhol_totals, "horizon_sunhol")),
+            "score_balance": (w.score_balance, self._spread(score_totals, "horizon_score")),
+            "ideal_gap_weight": (w.ideal_gap_weight // max(w.ideal_gap_extra, 1), ideal_gap_sum),
+            "sat_consec": (w.sat_consec, sat_consec_sum),
+        }
+        model.Minimize(
+            sum(
+                weight * expr
+                for terms in [opt._objective_terms for opt in self.months] + [self._objective_terms]
+                for weight, expr in terms.values()
+            )
+        )
+
+    @staticmethod
+    def _shift_vars(opt: OnCallOptimizer) -> ShiftVars:
+        return ShiftVars(night=opt.night_shifts, day=opt.day_shifts, work=opt.work)
+
+    def _spread(self, values: List[Any], name: str) -> Any:
+        """最大−最小の IntVar"""
+        hi = self.model.NewIntVar(0, 1000000, f"{name}_max")
+        lo = self.model.NewIntVar(0, 1000000, f"{name}_min")
+        self.model.AddMaxEquality(hi, values)
+        self.model.AddMinEquality(lo, values)
+        spread = self.model.NewIntVar(0, 1000000, f"{name}_gap")
+        self.model.Add(spread == hi - lo)
+        return spread
+
+    def _add_carry_forward_hints(self, time_limit_seconds: float, seed: int) -> int:
+        """1か月ずつ（前の月の結果を前月の状態として渡して）実行可能解を探し、期間モデルのヒントにする
+
+        期間モデルは最初の実行可能解までが長い（月数に対して急に伸びる）ので、従来どおりの
+        月ごとの繰り越しで作った解から探索を始める。途中の月で解けなければそこまでをヒントにする。
+        ヒントにできた月数を返す。
+        """
+        per_month = time_limit_seconds / len(self.months)
+        carry: Dict[str, Any] = {}
+        hinted = 0
+        fixed = self.model.clone()
+        fixed.ClearObjective()
+        for opt, kwargs in zip(self.months, self._month_kwargs):
+            single = OnCallOptimizer(**{**kwargs, **carry})
+            single.build_model()
+            single.model.ClearObjective()
+            solver = cp_model.CpSolver()
+            solver.parameters.random_seed = seed
+            solver, status = self._lead._run_solver(single.model, per_month, solver=solver)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                break
+            for key, var in single.night_shifts.items():
+                fixed.Add(opt.night_shifts[key] == solver.Value(var))
+            for key, var in single.day_shifts.items():
+                fixed.Add(opt.day_shifts[key] == solver.Value(var))
+            hinted += 1
+            days = range(1, single.num_days + 1)
+            carry = {
+                "prev_month_worked_days": {
+                    d: [day for day in days if solver.Value(single.work[(d, day)])] for d in range(self.num_doctors)
+                },
+                "prev_month_last_day": single.num_days,
+                "sat_prev": {
+                    d: any(solver.Value(single.night_shifts[(d, day)]) for day in single.calendar.saturdays)
+                    for d in range(self.num_doctors)
+                },
+            }
+
+        # シフト変数だけのヒントでは補助変数（スコア・公平性の差など）が埋まらず、期間モデルが
+        # ヒントをそのまま解として採れない。シフトを固定したモデルで残りの変数も決めて全変数をヒントにする
+        if hinted:
+            solver = cp_model.CpSolver()
+            solver, status = self._lead._run_solver(fixed, max(per_month, 1.0), solver=solver)
+            if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                for i in range(len(self.model.Proto().variables)):
+                    var = self.model.GetIntVarFromProtoIndex(i)
+                    self.model.AddHint(var, solver.Value(var))
+        return hinted
+
+    def solve(self, time_limit_seconds: float = 10.0, random_seed: Optional[int] = None) -> Dict[str, Any]:
+        """期間全体を解き、月ごとの schedule / scores と期間の累積スコア・目的値の内訳を返す
+
+        制限時間の 1/3 までを月ごとの繰り越しによる初期解（ヒント）に使い、残りで期間全体を最適化する。
+        """
+        lead = self._lead
+        lead.num_workers = self.num_workers
+        lead.progress_callback = self.progress_callback
+        seed = int(random_seed) if random_seed is not None else random.SystemRandom().randint(1, 2**31 - 1)
+
+        lead._report_progress("hinting", num_months=len(self.months))
+        started = time.monotonic()
+        hinted_months = self._add_carry_forward_hints(time_limit_seconds / 3, seed)
+        remaining = max(float(time_limit_seconds) - (time.monotonic() - started), 1.0)
+
+        solver = cp_model.CpSolver()
+        solver.parameters.random_seed = seed
+        if hinted_months:
+            # 対称性の検出による presolve の変形はヒントを実行不能にし、修復に何秒もかかる。
+            # 繰り越しの解をそのまま最初の解として採らせる
+            solver.parameters.symmetry_level = 0
+        lead._report_progress("solving", time_limit_seconds=remaining, num_months=len(self.months))
+        callback = None
+        if self.progress_callback is not None:
+            callback = _SolutionProgressCallback(lead._report_progress)
+        solver, status = lead._run_solver(self.model, remaining, solver=solver, callback=callback)
+        solver_params = {
+            "num_workers": int(solver.parameters.num_workers),
+            "random_seed": seed,
+            "max_time_in_seconds": float(time_limit_seconds),
+            "wall_time_seconds": round(time.monotonic() - started, 3),
+            "hinted_months": hinted_months,
+            **_solver_stats(self.model, solver, status),
+        }
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return {
+                "success": False,
+                "message": "現在の設定では期間全体の解が見つかりませんでした。ルールや不可日を見直してください。",
+                "solver_params": solver_params,
+            }
+
+        months = []
+        for opt in self.months:
+            solution = opt._extract_solution(solver.Value)
+            entry: Dict[str, Any] = {
+                "year": opt.year,
+                "month": opt.month,
+                "schedule": solution["schedule"],
+                "scores": solution["scores"],
+                "objective_breakdown": opt._objective_breakdown(solver.Value),
+            }
+            violations = opt._soft_unavail_violations(solver.Value)
+            if violations:
+                entry["soft_unavail_violations"] = violations
+            months.append(entry)
+
+        breakdown: Dict[str, Dict[str, int]] = {}
+        for name, (weight, expr) in self._objective_terms.items():
+            if weight:
+                value = int(solver.Value(expr))
+                breakdown[name] = {"weight": int(weight), "value": value, "penalty": int(weight) * value}
+
+        return {
+            "success": True,
+            "status": "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE",
+            "months": months,
+            # 期間の累積スコア（期間開始時点の過去実績を含む）
+            "cumulative_scores": {d: solver.Value(var) / 10.0 for d, var in enumerate(self._cumulative_scores)},
+            "objective": int(round(solver.ObjectiveValue())),
+            "objective_breakdown": breakdown,
+            "solver_params": solver_params,
+        }
@@ -0,0 +1,163 @@
+"""最適化結果キャッシュ（同一入力の再送をソルバーに回さない）
+
+フロントエンドの再試行・ダブルクリック・「同じ設定でもう一度」は同じ OptimizeRequest を
+何度も送ってくる。ここでは正規化済みのソルバー入力（医師インデックス対応・不可日・
+ハード制約・重み・シフト点数・過去スコア・ヒント）から決定的なフィンガープリントを作り、
+determinism を求められた生成の結果をフィンガープリント単位で保持する。
+
+- 保持件数: OPTIMIZE_CACHE_MAX_ENTRIES（超えたら最も古く使われたものから捨てる）
+- 保持期間: OPTIMIZE_CACHE_TTL_SECONDS
+- シフト保存・設定保存で病院単位に破棄する（invalidate_hospital）
+- 同じフィンガープリントの生成が実行中なら、その結果を待って共有する
+
+キャッシュはこのプロセスのメモリ上にあり、uvicorn ワーカー間では共有しない。
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import datetime
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.config import get_settings
+
+# フィンガープリントの形式を変えたら上げる（古いキーと衝突させない）
+_FINGERPRINT_VERSION = 1
+
+
+def _canonical(value: Any) -> Any:
+    """JSON にしたとき順序が入力の並びに依存しない形へ変換する"""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True, default=str))
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return _canonical(value.model_dump())
+    return value
+
+
+def optimization_fingerprint(hospital_id: uuid.UUID, **inputs: Any) -> str:
+    """正規化済みのソルバー入力から決定的なフィンガープリント（sha256 hex）を作る"""
+    payload = {
+        "version": _FINGERPRINT_VERSION,
+        "hospital_id": str(hospital_id),
+        "inputs": _canonical(inputs),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def fingerprint_seed(fingerprint: str) -> int:
+    """フィンガープリントから CP-SAT の random_seed（1〜2^31-1）を決める"""
+    return int(fingerprint[:8], 16) % (2**31 - 1) + 1
+
+
+class OptimizeResultCache:
+    """フィンガープリント -> ワーカーの solve 結果 dict（TTL + LRU）"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: "OrderedDict[str, Tuple[uuid.UUID, float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            return None
+        _, stored_at, result = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[fingerprint]
+            return None
+        self._entries.move_to_end(fingerprint)
+        # 呼び出し側は UUID 置換などで結果を書き換えるのでコピーを返す
+        return copy.deepcopy(result)
+
+    def put(self, hospital_id: uuid.UUID, fingerprint: str, result: Dict[str, Any]) -> None:
+        self._entries[fingerprint] = (hospital_id, time.monotonic(), copy.deepcopy(result))
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_hospital(self, hospital_id: uuid.UUID) -> None:
+        stale = [fp for fp, (owner, _, _) in self._entries.items() if owner == hospital_id]
+        for fp in stale:
+            del self._entries[fp]
+
+    async def get_or_compute(
+        self,
+        hospital_id: uuid.UUID,
+        fingerprint: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """キャッシュにあればそれを、なければ compute() の結果を返す（2つ目は命中したか）
+
+        成功した結果だけを保持する。実行中の同じフィンガープリントがあればその完了を待つ。
+        """
+        cached = self.get(fingerprint)
+        if cached is not None:
+            return cached, True
+
+        pending = self._inflight.get(fingerprint)
+        if pending is not None:
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # 先行リクエストが取り消されたら自分で計算し直す
+                return await self.get_or_compute(hospital_id, fingerprint, compute)
+            return copy.deepcopy(result), True
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[fingerprint] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 待っている相手がいなくても "exception was never retrieved" を出さない
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(fingerprint, None)
+
+        if result.get("success"):
+            self.put(hospital_id, fingerprint, result)
+        future.set_result(copy.deepcopy(result))
+        return result, False
+
+
+_cache: Optional[OptimizeResultCache] = None
+
+
+def get_result_cache() -> OptimizeResultCache:
+    """アプリ全体で共有する結果キャッシュを返す"""
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        _cache = OptimizeResultCache(
+            max_entries=settings.optimize_cache_max_entries,
+            ttl_seconds=settings.optimize_cache_ttl_seconds,
+        )
+    return _cache
+
+
+def invalidate_hospital_results(hospital_id: uuid.UUID) -> None:
+    """シフト・設定の保存時に呼ぶ（キャッシュ未作成なら何もしない）"""
+    if _cache is not None:
+        _cache.invalidate_hospital(hospital_id)
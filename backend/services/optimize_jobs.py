@@ -0,0 +1,288 @@
+"""最適化ジョブ管理（非同期ジョブ API 用）
+
+POST /api/optimize/ は求解が終わるまで HTTP 接続を握り続け、診断（/diagnose）は
+数十秒かかることもあるため、プロキシのタイムアウトに掛かりやすい。
+ここでは受け付けたジョブを待ち行列に積んで即座にジョブIDを返し、
+ソルバープールでの実行状況・途中経過・結果をジョブIDで参照できるようにする。
+
+- 病院ごとの同時実行数: OPTIMIZE_JOB_MAX_CONCURRENT_PER_HOSPITAL（超えた分は queued で待つ）
+- 病院ごとの受付上限: OPTIMIZE_JOB_MAX_ACTIVE_PER_HOSPITAL（queued + running。超えたら 429）
+- 終了したジョブは OPTIMIZE_JOB_RETENTION_SECONDS 経過後に破棄する
+- ソルバープールが混雑していても失敗にはせず、空きが出るまで queued のまま待つ
+- キャンセルは待機中なら即時、実行中なら CP-SAT の探索を止めてから cancelled になる
+- partial_result: 求解は改善解ごとの目的値・下界・経過秒、診断は各フェーズの途中結果
+
+LocalJobQueue はジョブをこのプロセスのメモリ上で管理する（uvicorn ワーカー1つ・テスト用）。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from core.config import get_settings
+from services.solver_pool import SolverJob, SolverJobError, SolverPool, get_solver_pool
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = {JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED}
+
+# ワーカーから届いた結果 dict を API レスポンス（UUID 化・利用ログ記録済み）に変換する
+JobFinalizer = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class OptimizeJobError(Exception):
+    """ジョブ操作に失敗した（status_code はルーターで HTTP ステータスに使う）"""
+
+    status_code = 400
+
+
+class OptimizeJobNotFound(OptimizeJobError):
+    status_code = 404
+
+
+class OptimizeJobLimitError(OptimizeJobError):
+    """病院ごとの受付上限に達している"""
+
+    status_code = 429
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class OptimizeJobRecord:
+    """1ジョブの状態。progress は最新の進捗イベント、partial_result はこれまでの途中経過"""
+
+    id: str
+    hospital_id: uuid.UUID
+    kind: str
+    status: str = JOB_STATUS_QUEUED
+    created_at: datetime = field(default_factory=_utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    progress: Dict[str, Any] = field(default_factory=dict)
+    partial_result: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def apply_progress(self, event: Dict[str, Any]) -> None:
+        self.progress = dict(event)
+        self.partial_result.update({k: v for k, v in event.items() if k != "stage"})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "progress": self.progress,
+            "partial_result": self.partial_result,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+@dataclass
+class _JobHandle:
+    record: OptimizeJobRecord
+    job: SolverJob
+    task: Optional[asyncio.Task] = None
+
+
+class LocalJobQueue:
+    """プロセス内メモリのジョブ待ち行列"""
+
+    PROGRESS_POLL_SECONDS = 0.25
+
+    def __init__(
+        self,
+        pool: Optional[SolverPool] = None,
+        max_concurrent_per_hospital: int = 1,
+        max_active_per_hospital: int = 4,
+        retention_seconds: float = 3600.0,
+    ) -> None:
+        self._pool = pool
+        self.max_concurrent_per_hospital = max(1, int(max_concurrent_per_hospital))
+        self.max_active_per_hospital = max(1, int(max_active_per_hospital))
+        self.retention_seconds = float(retention_seconds)
+        self._jobs: Dict[str, _JobHandle] = {}
+        self._hospital_slots: Dict[uuid.UUID, asyncio.Semaphore] = {}
+
+    @property
+    def pool(self) -> SolverPool:
+        return self._pool if self._pool is not None else get_solver_pool()
+
+    def _slots_for(self, hospital_id: uuid.UUID) -> asyncio.Semaphore:
+        slots = self._hospital_slots.get(hospital_id)
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_concurrent_per_hospital)
+            self._hospital_slots[hospital_id] = slots
+        return slots
+
+    def _purge_finished(self) -> None:
+        now = _utcnow()
+        expired = [
+            job_id for job_id, handle in self._jobs.items()
+            if handle.record.is_finished
+            and handle.record.finished_at is not None
+            and (now - handle.record.finished_at).total_seconds() > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def active_jobs(self, hospital_id: uuid.UUID) -> List[OptimizeJobRecord]:
+        return [
+            handle.record for handle in self._jobs.values()
+            if handle.record.hospital_id == hospital_id and not handle.record.is_finished
+        ]
+
+    async def submit(
+        self,
+        hospital_id: uuid.UUID,
+        job: SolverJob,
+        finalize: JobFinalizer,
+    ) -> OptimizeJobRecord:
+        """ジョブを受け付けて queued の状態を返す（実行はバックグラウンド）"""
+        self._purge_finished()
+        if len(self.active_jobs(hospital_id)) >= self.max_active_per_hospital:
+            raise OptimizeJobLimitError("実行中・待機中の生成ジョブが多すぎます。完了を待ってから再度お試しください")
+
+        record = OptimizeJobRecord(id=uuid.uuid4().hex, hospital_id=hospital_id, kind=job.kind)
+        # Manager 経由のチャネル作成は IPC でブロックするためスレッドで行う
+        job.channel = await asyncio.to_thread(self.pool.open_channel)
+        handle = _JobHandle(record=record, job=job)
+        self._jobs[record.id] = handle
+        handle.task = asyncio.create_task(self._run(handle, finalize))
+        return record
+
+    def get(self, hospital_id: uuid.UUID, job_id: str) -> OptimizeJobRecord:
+        handle = self._jobs.get(job_id)
+        # 他病院のジョブは存在しないものとして扱う
+        if handle is None or handle.record.hospital_id != hospital_id:
+            raise OptimizeJobNotFound("ジョブが見つかりません")
+        return handle.record
+
+    async def cancel(self, hospital_id: uuid.UUID, job_id: str) -> OptimizeJobRecord:
+        record = self.get(hospital_id, job_id)
+        if record.is_finished:
+            return record
+
+        handle = self._jobs[job_id]
+        record.cancel_requested = True
+        if record.status == JOB_STATUS_QUEUED and handle.task is not None:
+            handle.task.cancel()
+            try:
+                await handle.task
+            except asyncio.CancelledError:
+                pass
+            # 最初のステップ前に取り消されたタスクは _run を通らないため、ここで確定させる
+            if record.status == JOB_STATUS_QUEUED:
+                record.status = JOB_STATUS_CANCELLED
+                record.finished_at = _utcnow()
+        elif handle.job.channel is not None:
+            # 実行中: ワーカーの探索を止める。結果が返ったら _run が cancelled にする
+            await asyncio.to_thread(handle.job.channel.request_stop)
+        return record
+
+    def _drain_progress(self, handle: _JobHandle) -> List[Dict[str, Any]]:
+        channel = handle.job.channel
+        if channel is None:
+            return []
+        try:
+            return channel.drain_progress()
+        except Exception:
+            logger.debug("failed to read solver progress (job=%s)", handle.record.id, exc_info=True)
+            return []
+
+    async def _collect_progress(self, handle: _JobHandle) -> None:
+        # Manager 経由の読み出しは IPC なのでスレッドで行い、反映はイベントループ側で行う
+        for event in await asyncio.to_thread(self._drain_progress, handle):
+            handle.record.apply_progress(event)
+
+    async def _poll_progress(self, handle: _JobHandle) -> None:
+        while True:
+            await asyncio.sleep(self.PROGRESS_POLL_SECONDS)
+            await self._collect_progress(handle)
+
+    async def _run(self, handle: _JobHandle, finalize: JobFinalizer) -> None:
+        record = handle.record
+        try:
+            async with self._slots_for(record.hospital_id):
+                record.status = JOB_STATUS_RUNNING
+                record.started_at = _utcnow()
+                poller = asyncio.create_task(self._poll_progress(handle))
+                try:
+                    # 同期エンドポイントと違い、混雑時は失敗させずに空きを待つ
+                    raw = await self.pool.run(handle.job, wait_for_capacity=True)
+                finally:
+                    poller.cancel()
+                    await self._collect_progress(handle)
+
+                if raw.get("cancelled"):
+                    record.status = JOB_STATUS_CANCELLED
+                else:
+                    record.result = await finalize(raw)
+                    record.status = JOB_STATUS_SUCCEEDED
+        except asyncio.CancelledError:
+            record.status = JOB_STATUS_CANCELLED
+            raise
+        except SolverJobError as e:
+            record.status = JOB_STATUS_FAILED
+            record.error = str(e)
+        except Exception as e:
+            logger.exception("optimize job failed (job=%s, kind=%s)", record.id, record.kind)
+            record.status = JOB_STATUS_FAILED
+            record.error = str(e)
+        finally:
+            record.finished_at = _utcnow()
+
+    async def shutdown(self) -> None:
+        tasks = [h.task for h in self._jobs.values() if h.task is not None and not h.task.done()]
+        for handle in self._jobs.values():
+            if not handle.record.is_finished and handle.job.channel is not None:
+                await asyncio.to_thread(handle.job.channel.request_stop)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_queue: Optional[LocalJobQueue] = None
+
+
+def get_job_queue() -> LocalJobQueue:
+    """アプリ全体で共有するジョブ待ち行列を返す"""
+    global _queue
+    if _queue is None:
+        settings = get_settings()
+        _queue = LocalJobQueue(
+            max_concurrent_per_hospital=settings.optimize_job_max_concurrent_per_hospital,
+            max_active_per_hospital=settings.optimize_job_max_active_per_hospital,
+            retention_seconds=settings.optimize_job_retention_seconds,
+        )
+    return _queue
+
+
+async def shutdown_job_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.shutdown()
+        _queue = None
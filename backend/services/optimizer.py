@@ -1,13 +1,128 @@
 # backend/services/optimizer.py
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 
 from ortools.sat.python import cp_model
+import numpy as np
 import calendar
 import datetime
+import math
+import os
 import random
+import threading
+import time
+
+from core.config import get_settings
+from services.availability import (
+    KIND_HARD,
+    SHIFT_DAY,
+    SHIFT_NIGHT,
+    AvailabilityMatrix,
+    build_availability,
+)
+from services.constraint_builder import (
+    INTERVAL_DAYS_KEYS,
+    MAX_SATURDAY_NIGHTS_KEYS,
+    MAX_SUNHOL_DAYS_KEYS,
+    MAX_SUNHOL_WORKS_KEYS,
+    MAX_WEEKEND_HOLIDAY_WORKS_FLAG_KEYS,
+    MAX_WEEKEND_HOLIDAY_WORKS_KEYS,
+    SPACING_FORMULATIONS,
+    SPACING_WINDOW,
+    CalendarTemplate,
+    HardLimits,
+    ShiftVars,
+    ShiftWeights,
+    add_shift_vars,
+    add_spacing_gap,
+    add_first_slot_order,
+    add_spacing_windows,
+    add_structural_constraints,
+    calendar_template,
+    holiday_key,
+    locked_shift_var,
+    month_cross_blocks,
+    saturday_night_expr,
+    score_expr,
+    slot_index,
+    sunhol_day_expr,
+    sunhol_work_expr,
+    unavailable_shift_vars,
+    weekend_holiday_work_expr,
+)
+from services.diagnosis_engine import DiagnosisEngine
+from services.roster_construction import greedy_assignment
+
+
+class SolveCancelled(Exception):
+    """cancel() によって CP-SAT の探索が中断された"""
+
+
+class _SolutionProgressCallback(cp_model.CpSolverSolutionCallback):
+    """改善解が見つかるたびに目的値・下界・経過時間を進捗として通知する
+
+    extract を渡すと、その時点の解（solve() と同じ schedule / scores の形）も載せる。
+    gap_limits=(相対, 絶対) を渡すと、下界との差がどちらか以下になった時点で探索を止める
+    （CP-SAT の relative/absolute_gap_limit は解のコールバックがあると制限時間まで効かない）。
+    """
+
+    def __init__(
+        self,
+        report: Callable[..., None],
+        extract: Optional[Callable[[Callable[[Any], int]], Dict[str, Any]]] = None,
+        gap_limits: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        super().__init__()
+        self._report = report
+        self._extract = extract
+        self._gap_limits = gap_limits
+        self.solution_count = 0
+        self.objective: Optional[float] = None
+        # 最後に改善解が見つかった時刻（time.monotonic()。早期終了の判定に使う）
+        self.last_solution_at: Optional[float] = None
+        self.gap_reached = False
+
+    def within_gap(self, bound: float) -> bool:
+        if self._gap_limits is None or self.objective is None:
+            return False
+        relative, absolute = self._gap_limits
+        gap = abs(self.objective - bound)
+        return gap <= absolute or gap / max(1.0, abs(self.objective)) <= relative
+
+    def on_solution_callback(self) -> None:
+        self.solution_count += 1
+        self.last_solution_at = time.monotonic()
+        self.objective = self.ObjectiveValue()
+        payload: Dict[str, Any] = {
+            "objective": self.objective,
+            "best_bound": self.BestObjectiveBound(),
+            "elapsed_seconds": round(self.WallTime(), 3),
+            "solution_count": self.solution_count,
+        }
+        if self._extract is not None:
+            payload.update(self._extract(self.Value))
+        self._report("solution", **payload)
+        if self.within_gap(self.BestObjectiveBound()):
+            self.gap_reached = True
+            self.StopSearch()
+
+
+def _solver_stats(model: cp_model.CpModel, solver: cp_model.CpSolver, status: int) -> Dict[str, Any]:
+    """CP-SAT の1回の実行の計測値（solver_params に載せ、利用ログの metadata.solver にも残る）"""
+    proto = model.Proto()
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    return {
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if solved else None,
+        "best_bound": solver.BestObjectiveBound() if solved else None,
+        "num_conflicts": int(solver.NumConflicts()),
+        "num_branches": int(solver.NumBranches()),
+        "num_variables": len(proto.variables),
+        "num_constraints": len(proto.constraints),
+    }
 
 
 @dataclass
@@ -72,6 +187,9 @@ class OnCallOptimizer:
         shift_scores: Optional[Dict[str, float]] = None,
         external_doctor_indices: Optional[set[int]] = None,
         external_fixed_dates: Optional[List] = None,
+        spacing_formulation: Optional[str] = None,
+        symmetry_breaking: Optional[bool] = None,
+        large_roster: Optional[bool] = None,
     ):
         self.num_doctors = num_doctors
         self.year = year
@@ -109,6 +227,22 @@ class OnCallOptimizer:
             if value is not None:
                 self.hard_constraints[key] = value
 
+        # 大人数モード（未指定なら OPTIMIZER_LARGE_ROSTER_THRESHOLD 以上の人数で有効）
+        if large_roster is None:
+            threshold = get_settings().optimizer_large_roster_threshold
+            large_roster = threshold > 0 and num_doctors >= threshold
+        self.large_roster = bool(large_roster)
+        # 勤務間隔・理想間隔の組み方（未指定なら大人数モードは window、それ以外は OPTIMIZER_SPACING_FORMULATION）
+        default_formulation = SPACING_WINDOW if self.large_roster else get_settings().optimizer_spacing_formulation
+        formulation = str(spacing_formulation or default_formulation).strip().lower()
+        if formulation not in SPACING_FORMULATIONS:
+            raise ValueError(f"unknown spacing_formulation: {formulation!r}")
+        self.spacing_formulation = formulation
+        # 入れ替え可能な医師の対称性の除去（未指定なら OPTIMIZER_SYMMETRY_BREAKING）
+        self.symmetry_breaking = bool(
+            get_settings().optimizer_symmetry_breaking if symmetry_breaking is None else symmetry_breaking
+        )
+
         # locked_shifts are normalized to doctor_idx at the router boundary.
         self.locked_shifts = locked_shifts or []
 
@@ -166,6 +300,10 @@ class OnCallOptimizer:
             soft_unavailable=1000,  # 固定値: ソフト化した不可日はほぼハード制約として扱う
         )
 
+        self._calendar: Optional[CalendarTemplate] = None
+        self._calendar_key: Optional[Tuple[Tuple[int, ...], bool]] = None
+        self._availability: Optional[AvailabilityMatrix] = None
+
         self.model = cp_model.CpModel()
 
         self.night_shifts: Dict[Tuple[int, int], cp_model.IntVar] = {}
@@ -176,17 +314,157 @@ class OnCallOptimizer:
         self.max_score: Optional[cp_model.IntVar] = None
         self.min_score: Optional[cp_model.IntVar] = None
 
+        # 実行制御: ジョブAPIからの進捗通知・キャンセル（別スレッドから cancel() される）
+        self.progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._cancel_requested = False
+        # 実行中の CP-SAT（診断の試行は並列に走るので複数ありうる）
+        self._active_solvers: set = set()
+        self._active_solvers_lock = threading.Lock()
+        # CP-SAT の並列ワーカー数（None なら OR-Tools の既定。ソルバープールが負荷に応じて設定する）
+        self.num_workers: Optional[int] = None
+
+        # warm start: add_solution_hints() で与えたヒント（(shift, day) -> doctor_idx。モデル上の医師番号）
+        self._solution_hints: Dict[Tuple[str, int], int] = {}
+        self._solution_hint_input_count = 0
+
+        # 入れ替え可能な医師の組（build_model で設定）と、出力で各組の解を割り当てる順
+        # （既定は医師番号順。ヒントがあればヒントで最初に入る枠の順）
+        self._doctor_classes: List[List[int]] = []
+        self._output_order: List[List[int]] = []
+
+        # 目的関数の項（build_model で設定）
+        self._objective_terms: Dict[str, Tuple[int, Any]] = {}
+
+        # solve() の早期終了（既定は設定値。absolute_gap_limit=None なら目的関数の重みから決める）
+        settings = get_settings()
+        self.relative_gap_limit = max(float(settings.optimizer_relative_gap_limit), 0.0)
+        self.absolute_gap_limit: Optional[float] = None
+        self.stall_seconds = max(float(settings.optimizer_stall_seconds), 0.0)
+        # solve() の監視スレッドが改善の停滞で探索を止めたか
+        self._stalled = False
+        # _run_solver を通った CP-SAT の実行回数（診断の段階ごとの試行回数に使う）
+        self._solver_runs = 0
+
+        # 診断: ハード制約だけのモデルを一度組み、試行は仮定リテラルで問い合わせる
+        self._diagnosis: Optional[DiagnosisEngine] = None
+
+    def cancel(self) -> None:
+        """実行中および以降の CP-SAT 探索を中断する。"""
+        self._cancel_requested = True
+        with self._active_solvers_lock:
+            solvers = list(self._active_solvers)
+        for solver in solvers:
+            solver.StopSearch()
+
+    def _report_progress(self, stage: str, **payload: Any) -> None:
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback({"stage": stage, **payload})
+        except Exception:
+            # 進捗通知の失敗で求解を止めない
+            pass
+
+    def _run_solver(
+        self,
+        model: cp_model.CpModel,
+        time_limit_seconds: float,
+        solver: Optional[cp_model.CpSolver] = None,
+        callback: Optional[cp_model.CpSolverSolutionCallback] = None,
+        num_workers: Optional[int] = None,
+    ) -> Tuple[cp_model.CpSolver, int]:
+        """キャンセル可能な形で CP-SAT を実行する（診断の試行ソルブもすべてここを通す）。
+
+        num_workers を省略すると self.num_workers を使う。複数スレッドから同時に呼んでよい。
+        """
+        if self._cancel_requested:
+            raise SolveCancelled()
+        if solver is None:
+            solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = float(time_limit_seconds)
+        workers = num_workers if num_workers is not None else self.num_workers
+        if workers:
+            solver.parameters.num_workers = int(workers)
+        with self._active_solvers_lock:
+            self._active_solvers.add(solver)
+            self._solver_runs += 1
+        try:
+            status = solver.Solve(model, callback)
+        finally:
+            with self._active_solvers_lock:
+                self._active_solvers.discard(solver)
+        if self._cancel_requested:
+            raise SolveCancelled()
+        return solver, status
+
+    @property
+    def calendar(self) -> CalendarTemplate:
+        """この月のカレンダー情報（年・月・祝日・日当直モードが同じなら共有のテンプレート）"""
+        key = (holiday_key(self.holidays), self._is_combined_mode())
+        if self._calendar is None or self._calendar_key != key:
+            self._calendar = calendar_template(self.year, self.month, *key)
+            self._calendar_key = key
+        return self._calendar
+
+    @property
+    def availability(self) -> AvailabilityMatrix:
+        """不可日・固定不可曜日を一度だけ正規化した医師×日の不可フラグ（カレンダーが変わったら作り直す）"""
+        cal = self.calendar
+        if self._availability is None or self._availability.calendar is not cal:
+            self._availability = build_availability(
+                cal,
+                self.num_doctors,
+                self.unavailable,
+                self.fixed_unavailable_weekdays,
+                self._normalize_unavailable_entry,
+                self._normalize_fixed_weekday_entry,
+            )
+        return self._availability
+
+    def _is_combined_mode(self) -> bool:
+        return str(self.hard_constraints.get("holiday_shift_mode", "split")).strip().lower() == "combined"
+
+    def hard_limits(self) -> HardLimits:
+        """ハード制約の別名キーを解決した値（build_model・診断・事前チェックで共通）"""
+        combined_mode = self._is_combined_mode()
+        return HardLimits(
+            combined_mode=combined_mode,
+            prevent_sunhol_consecutive=not combined_mode and not self._is_explicitly_disabled(
+                self.hard_constraints.get("prevent_sunhol_consecutive", True)
+            ),
+            respect_unavailable_days=not self._is_explicitly_disabled(
+                self.hard_constraints.get("respect_unavailable_days", True)
+            ),
+            spacing_days=self._get_hard_constraint_value(4, *INTERVAL_DAYS_KEYS),
+            max_saturday_nights=self._get_hard_constraint_value(1, *MAX_SATURDAY_NIGHTS_KEYS),
+            max_sunhol_days=self._get_hard_constraint_value(None, *MAX_SUNHOL_DAYS_KEYS),
+            max_sunhol_works=self._get_hard_constraint_value(None, *MAX_SUNHOL_WORKS_KEYS),
+            max_weekend_holiday_works=self._get_hard_constraint_value(
+                None, *MAX_WEEKEND_HOLIDAY_WORKS_KEYS, flag_keys=MAX_WEEKEND_HOLIDAY_WORKS_FLAG_KEYS,
+            ),
+        )
+
+    @property
+    def shift_weights(self) -> ShiftWeights:
+        return ShiftWeights(
+            weekday_night=self.W_WEEKDAY_NIGHT,
+            sat_night=self.W_SAT_NIGHT,
+            sunhol_day=self.W_SUNHOL_DAY,
+            sunhol_night=self.W_SUNHOL_NIGHT,
+            day_night=self.W_DAY_NIGHT,
+        )
+
     def is_holiday(self, day: int) -> bool:
-        return day in self.holidays
+        return self.calendar.is_holiday(day)
 
     def is_saturday(self, day: int) -> bool:
-        return datetime.date(self.year, self.month, day).weekday() == 5
+        return self.calendar.is_saturday(day)
 
     def is_sunday(self, day: int) -> bool:
-        return datetime.date(self.year, self.month, day).weekday() == 6
+        return self.calendar.is_sunday(day)
 
     def is_sunday_or_holiday(self, day: int) -> bool:
-        return self.is_sunday(day) or self.is_holiday(day)
+        return self.calendar.is_sunday_or_holiday(day)
 
     def _get_past(self, arr: List[int], d: int) -> int:
         return arr[d] if d < len(arr) else 0
@@ -220,6 +498,65 @@ class OnCallOptimizer:
             return day
         return None
 
+    def _iter_locked_shifts(self) -> List[Tuple[int, int, str]]:
+        """locked_shifts のうち有効なものを (doctor_idx, day, "day"/"night") で返す"""
+        out: List[Tuple[int, int, str]] = []
+        for item in self.locked_shifts:
+            if not isinstance(item, dict):
+                continue
+            doctor_idx = item.get("doctor_idx")
+            if doctor_idx is None:
+                continue
+            try:
+                d = int(doctor_idx)
+            except (TypeError, ValueError):
+                continue
+            if d < 0 or d >= self.num_doctors:
+                continue
+            day = self._parse_locked_day(item.get("date"))
+            if day is None:
+                continue
+            shift = self._normalize_shift_type(item.get("shift_type"))
+            if shift is None:
+                continue
+            out.append((d, day, shift))
+        return out
+
+    def _score_bounds(self, doctor_idx: int) -> Tuple[int, int]:
+        """医師ごとのスコア下限・上限（×10 の整数）"""
+        d_min = int(round(self.min_score_by_doctor.get(doctor_idx, self.score_min_float) * 10))
+        d_max = int(round(self.max_score_by_doctor.get(doctor_idx, self.score_max_float) * 10))
+        return d_min, d_max
+
+    def _interchangeable_doctor_classes(self) -> List[List[int]]:
+        """入れ替えても制約・目的値が変わらない医師の組（2人以上のものだけ、医師番号順）
+
+        外部医師同士はふつう全員が同じ組になる。常勤は不可日・固定不可曜日・スコア上下限・目標スコア・
+        過去の実績・前月末の勤務がすべて同じときだけ同じ組にする。ロックのある医師は組にしない。
+        """
+        availability = self.availability
+        prev_month_worked_days, _ = self._build_previous_month_state()
+        locked = {d for d, _, _ in self._iter_locked_shifts()}
+
+        classes: Dict[Tuple[Any, ...], List[int]] = {}
+        for d in range(self.num_doctors):
+            if d in locked:
+                continue
+            key = (
+                d in self.external_doctor_indices,
+                availability.by_date[d].tobytes(),
+                availability.weekday_rules[d].tobytes(),
+                self._score_bounds(d),
+                self.target_score_by_doctor.get(d),
+                self.past_total_scores.get(d, 0.0),
+                self._get_past(self.past_sat_counts, d),
+                self._get_past(self.past_sunhol_counts, d),
+                bool(self.sat_prev.get(d, False)),
+                tuple(sorted(prev_month_worked_days.get(d, ()))),
+            )
+            classes.setdefault(key, []).append(d)
+        return [members for members in classes.values() if len(members) > 1]
+
     def _normalize_shift_type(self, raw_shift_type: Any) -> Optional[str]:
         s = str(raw_shift_type).strip().lower()
         if s in {"night", "night_shift"}:
@@ -295,10 +632,8 @@ class OnCallOptimizer:
         }
 
     def _matches_fixed_unavailable_weekday(self, day: int, day_of_week: int) -> bool:
-        if day_of_week == 7:
-            # Match frontend DnD semantics: 7 means holiday-only, excluding Sundays.
-            return self.is_holiday(day) and not self.is_sunday(day)
-        return datetime.date(self.year, self.month, day).weekday() == day_of_week
+        # 7 は日曜以外の祝日（フロントエンドの DnD と同じ意味）
+        return self.calendar.matches_fixed_weekday(day, day_of_week)
 
     def _parse_previous_month_day(self, raw_date: Any) -> Optional[int]:
         prev_year = self.year if self.month > 1 else self.year - 1
@@ -462,21 +797,16 @@ class OnCallOptimizer:
         Each dict: {id, name_ja, current_value?, suggestion_ja?}
         """
         errors: List[Dict[str, Any]] = []
-        days = range(1, self.num_days + 1)
-
-        holiday_shift_mode = str(self.hard_constraints.get("holiday_shift_mode", "split")).strip().lower()
-        combined_mode = holiday_shift_mode == "combined"
-        respect_unavailable_days = not self._is_explicitly_disabled(
-            self.hard_constraints.get("respect_unavailable_days", True)
-        )
-        spacing_days = self._get_hard_constraint_value(
-            4, "interval_days", "min_interval_days", "spacing_days",
-            "min_gap_days", "work_interval_days",
-        )
+        cal = self.calendar
+        days = cal.days
+        limits = self.hard_limits()
+        combined_mode = limits.combined_mode
+        respect_unavailable_days = limits.respect_unavailable_days
+        spacing_days = limits.spacing_days
 
         # --- Check 1: doctors vs slots with spacing ---
         # Total slots: night every day + day on sun/holidays (split mode)
-        sunhol_days = [day for day in days if self.is_sunday_or_holiday(day)]
+        sunhol_days = cal.sunhol_days
         night_slots = self.num_days
         day_slots = 0 if combined_mode else len(sunhol_days)
         total_slots = night_slots + day_slots
@@ -510,47 +840,27 @@ class OnCallOptimizer:
 
         # --- Check 2: sun/holiday staffing ---
         # For each sun/holiday, check that enough doctors are available
-        for day in sunhol_days:
-            available_night = set(range(self.num_doctors))
-            available_day = set(range(self.num_doctors))
+        # 不可フラグ [医師, 日-1]（respect_unavailable_days=False なら誰も塞がない）
+        availability = self.availability
+        if respect_unavailable_days:
+            hard_night = availability.hard(SHIFT_NIGHT)
+            hard_day = availability.hard(SHIFT_DAY)
+        else:
+            hard_night = hard_day = np.zeros((self.num_doctors, self.num_days), dtype=bool)
+        night_counts = self.num_doctors - hard_night.sum(axis=0)
+        day_counts = self.num_doctors - hard_day.sum(axis=0)
+        # 日直・当直のどちらかに入れる医師数
+        either_counts = self.num_doctors - (hard_night & hard_day).sum(axis=0)
 
-            if respect_unavailable_days:
-                for d in range(self.num_doctors):
-                    for item in self.unavailable.get(d, []):
-                        normalized = self._normalize_unavailable_entry(item)
-                        if normalized is None:
-                            continue
-                        if normalized["date"] != day:
-                            continue
-                        if normalized["is_soft_penalty"]:
-                            continue
-                        ts = normalized["target_shift"]
-                        if ts in ("all", "night"):
-                            available_night.discard(d)
-                        if ts in ("all", "day"):
-                            available_day.discard(d)
-
-                    for item in self.fixed_unavailable_weekdays.get(d, []):
-                        normalized = self._normalize_fixed_weekday_entry(item)
-                        if normalized is None:
-                            continue
-                        if not self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                            continue
-                        if normalized["is_soft_penalty"]:
-                            continue
-                        ts = normalized["target_shift"]
-                        if ts in ("all", "night"):
-                            available_night.discard(d)
-                        if ts in ("all", "day"):
-                            available_day.discard(d)
+        for day in sunhol_days:
+            available_night = int(night_counts[day - 1])
+            available_day = int(day_counts[day - 1])
 
-            needed = 1 if combined_mode else 2  # night + day
             date_str = f"{self.year}/{self.month}/{day}"
-            dt = datetime.date(self.year, self.month, day)
-            weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][dt.weekday()]
+            weekday_ja = cal.weekday_ja(day)
 
             if combined_mode:
-                if len(available_night) < 1:
+                if available_night < 1:
                     errors.append({
                         "id": "insufficient_doctors_for_day",
                         "name_ja": "勤務可能な医師の不足",
@@ -560,14 +870,14 @@ class OnCallOptimizer:
             else:
                 # Need at least 1 for night, 1 for day, and they must be different
                 # (if prevent_consecutive is on)
-                if len(available_night) < 1:
+                if available_night < 1:
                     errors.append({
                         "id": "insufficient_doctors_for_day",
                         "name_ja": "勤務可能な医師の不足",
                         "current_value": f"{date_str}（{weekday_ja}）: 当直可能0名",
                         "suggestion_ja": "→ この日の不可日を減らすか、勤務可能な医師を増やしてください",
                     })
-                if len(available_day) < 1:
+                if available_day < 1:
                     errors.append({
                         "id": "insufficient_doctors_for_day",
                         "name_ja": "勤務可能な医師の不足",
@@ -575,8 +885,7 @@ class OnCallOptimizer:
                         "suggestion_ja": "→ この日の不可日を減らすか、勤務可能な医師を増やしてください",
                     })
                 # Need at least 2 distinct doctors for day+night on same day
-                available_either = available_night | available_day
-                if len(available_either) < 2 and len(available_night) >= 1 and len(available_day) >= 1:
+                if int(either_counts[day - 1]) < 2 and available_night >= 1 and available_day >= 1:
                     errors.append({
                         "id": "insufficient_doctors_for_day",
                         "name_ja": "勤務可能な医師の不足",
@@ -590,30 +899,8 @@ class OnCallOptimizer:
                 continue  # already checked above
             if not respect_unavailable_days:
                 continue
-            available_night = set(range(self.num_doctors))
-            for d in range(self.num_doctors):
-                for item in self.unavailable.get(d, []):
-                    normalized = self._normalize_unavailable_entry(item)
-                    if normalized is None:
-                        continue
-                    if normalized["date"] != day or normalized["is_soft_penalty"]:
-                        continue
-                    if normalized["target_shift"] in ("all", "night"):
-                        available_night.discard(d)
-                for item in self.fixed_unavailable_weekdays.get(d, []):
-                    normalized = self._normalize_fixed_weekday_entry(item)
-                    if normalized is None:
-                        continue
-                    if not self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                        continue
-                    if normalized["is_soft_penalty"]:
-                        continue
-                    if normalized["target_shift"] in ("all", "night"):
-                        available_night.discard(d)
-
-            if len(available_night) < 1:
-                dt = datetime.date(self.year, self.month, day)
-                weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][dt.weekday()]
+            if night_counts[day - 1] < 1:
+                weekday_ja = cal.weekday_ja(day)
                 errors.append({
                     "id": "insufficient_doctors_for_day",
                     "name_ja": "勤務可能な医師の不足",
@@ -704,88 +991,56 @@ class OnCallOptimizer:
             if not respect_unavailable_days:
                 continue
 
+            shift_idx = SHIFT_NIGHT if shift == "night" else SHIFT_DAY
             # Check date-based unavailable
-            for ua_item in self.unavailable.get(d, []):
-                normalized = self._normalize_unavailable_entry(ua_item)
-                if normalized is None:
-                    continue
-                if normalized["date"] != day or normalized["is_soft_penalty"]:
-                    continue
-                ts = normalized["target_shift"]
-                if ts == "all" or ts == shift:
-                    dt = datetime.date(self.year, self.month, day)
-                    weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][dt.weekday()]
-                    errors.append({
-                        "id": "locked_vs_unavailable",
-                        "name_ja": "ロック済みシフトと不可日の衝突",
-                        "current_value": f"{self.year}/{self.month}/{day}（{weekday_ja}）の{('日直' if shift == 'day' else '当直')}がロックされていますが、医師{d + 1}の不可日です",
-                        "suggestion_ja": "→ ロックを解除するか、不可日を外してください",
-                    })
+            if availability.by_date[d, day - 1, shift_idx, KIND_HARD]:
+                weekday_ja = cal.weekday_ja(day)
+                errors.append({
+                    "id": "locked_vs_unavailable",
+                    "name_ja": "ロック済みシフトと不可日の衝突",
+                    "current_value": f"{self.year}/{self.month}/{day}（{weekday_ja}）の{('日直' if shift == 'day' else '当直')}がロックされていますが、医師{d + 1}の不可日です",
+                    "suggestion_ja": "→ ロックを解除するか、不可日を外してください",
+                })
 
             # Check fixed weekday unavailable
-            for fw_item in self.fixed_unavailable_weekdays.get(d, []):
-                normalized = self._normalize_fixed_weekday_entry(fw_item)
-                if normalized is None:
-                    continue
-                if not self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                    continue
-                if normalized["is_soft_penalty"]:
-                    continue
-                ts = normalized["target_shift"]
-                if ts == "all" or ts == shift:
-                    dt = datetime.date(self.year, self.month, day)
-                    weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][dt.weekday()]
-                    errors.append({
-                        "id": "locked_vs_unavailable",
-                        "name_ja": "ロック済みシフトと不可曜日の衝突",
-                        "current_value": f"{self.year}/{self.month}/{day}（{weekday_ja}）の{('日直' if shift == 'day' else '当直')}がロックされていますが、医師{d + 1}の不可曜日です",
-                        "suggestion_ja": "→ ロックを解除するか、不可曜日を外してください",
-                    })
+            if availability.by_weekday[d, day - 1, shift_idx, KIND_HARD]:
+                weekday_ja = cal.weekday_ja(day)
+                errors.append({
+                    "id": "locked_vs_unavailable",
+                    "name_ja": "ロック済みシフトと不可曜日の衝突",
+                    "current_value": f"{self.year}/{self.month}/{day}（{weekday_ja}）の{('日直' if shift == 'day' else '当直')}がロックされていますが、医師{d + 1}の不可曜日です",
+                    "suggestion_ja": "→ ロックを解除するか、不可曜日を外してください",
+                })
 
         # --- Check 5: month-cross spacing blocks early days ---
         prev_month_worked_days, prev_last = self._build_previous_month_state()
         if spacing_days is not None and spacing_days > 0 and prev_last is not None:
-            # Build set of blocked (doctor, day) pairs from previous month spillover
-            cross_blocked: Dict[int, set] = {}  # day -> set of blocked doctor indices
-            for d, prev_days_set in prev_month_worked_days.items():
-                for prev_day in prev_days_set:
-                    dist_to_start = (prev_last - int(prev_day)) + 1
-                    if 1 <= dist_to_start <= spacing_days:
-                        block_until = spacing_days + 1 - dist_to_start
-                        for day in range(1, min(block_until, self.num_days) + 1):
-                            cross_blocked.setdefault(day, set()).add(d)
+            # Build blocked (doctor, day) pairs from previous month spillover
+            cross_blocked = np.zeros((self.num_doctors, self.num_days), dtype=bool)
+            for d, blocked in month_cross_blocks(prev_month_worked_days, prev_last, spacing_days, self.num_days).items():
+                if 0 <= d < self.num_doctors:
+                    cross_blocked[d, [day - 1 for day in blocked]] = True
+
+            # Also subtract unavailable doctors
+            cross_night_counts = self.num_doctors - (cross_blocked | hard_night).sum(axis=0)
+            cross_day_counts = self.num_doctors - (cross_blocked | hard_day).sum(axis=0)
 
             for day in range(1, min(spacing_days + 1, self.num_days + 1)):
-                blocked_docs = cross_blocked.get(day, set())
-                if not blocked_docs:
+                if not cross_blocked[:, day - 1].any():
                     continue
 
-                # Count available doctors for night shift on this day
-                available_night = set(range(self.num_doctors)) - blocked_docs
-                available_day = set(range(self.num_doctors)) - blocked_docs
-
-                # Also subtract unavailable doctors
-                if respect_unavailable_days:
-                    for d_idx in list(available_night):
-                        if self._is_doctor_unavailable_on_day(d_idx, day, "night"):
-                            available_night.discard(d_idx)
-                    for d_idx in list(available_day):
-                        if self._is_doctor_unavailable_on_day(d_idx, day, "day"):
-                            available_day.discard(d_idx)
-
-                dt = datetime.date(self.year, self.month, day)
-                weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][dt.weekday()]
+                weekday_ja = cal.weekday_ja(day)
                 date_str = f"{self.year}/{self.month}/{day}"
 
-                if len(available_night) < 1:
+                if cross_night_counts[day - 1] < 1:
                     errors.append({
                         "id": "cross_month_blocked",
                         "name_ja": "前月の勤務間隔による月初の人手不足",
                         "current_value": f"{date_str}（{weekday_ja}）: 前月末の勤務間隔により当直可能な医師が0名",
                         "suggestion_ja": "→ 勤務間隔を短くするか、前月末のシフトを調整してください",
                     })
-                if self.is_sunday_or_holiday(day) and not combined_mode:
-                    if len(available_day) < 1:
+                if cal.has_day_slot(day):
+                    if cross_day_counts[day - 1] < 1:
                         errors.append({
                             "id": "cross_month_blocked",
                             "name_ja": "前月の勤務間隔による月初の人手不足",
@@ -794,18 +1049,8 @@ class OnCallOptimizer:
                         })
 
         # --- Check 6: weekend/holiday work cap vs required slots ---
-        max_weekend_holiday_works = self._get_hard_constraint_value(
-            None,
-            "max_weekend_holiday_works",
-            "weekend_holiday_work_max",
-            "weekend_hol_work_max",
-            "max_weekend_holiday_count",
-            "weekend_holiday_total_max",
-            "weekend_hol_total_max",
-            "max_shifts",
-            flag_keys=("strict_weekend_hol_max",),
-        )
-        saturdays = [day for day in days if self.is_saturday(day)]
+        max_weekend_holiday_works = limits.max_weekend_holiday_works
+        saturdays = cal.saturdays
 
         if max_weekend_holiday_works is not None:
             # Total weekend/holiday slots that need filling
@@ -827,13 +1072,7 @@ class OnCallOptimizer:
                 })
 
         # --- Check 7: saturday night cap vs saturday count ---
-        max_saturday_nights = self._get_hard_constraint_value(
-            1,
-            "max_saturday_nights",
-            "max_sat_nights",
-            "sat_night_max",
-            "saturday_night_max",
-        )
+        max_saturday_nights = limits.max_saturday_nights
         if max_saturday_nights is not None and len(saturdays) > 0:
             total_sat_capacity = max_saturday_nights * self.num_doctors
             if total_sat_capacity < len(saturdays):
@@ -850,322 +1089,112 @@ class OnCallOptimizer:
 
     def _is_doctor_unavailable_on_day(self, doctor_idx: int, day: int, shift: str) -> bool:
         """Check if a doctor is hard-unavailable on a specific day for a specific shift."""
-        for item in self.unavailable.get(doctor_idx, []):
-            normalized = self._normalize_unavailable_entry(item)
-            if normalized is None:
-                continue
-            if normalized["date"] != day or normalized["is_soft_penalty"]:
-                continue
-            ts = normalized["target_shift"]
-            if ts == "all" or ts == shift:
-                return True
-        for item in self.fixed_unavailable_weekdays.get(doctor_idx, []):
-            normalized = self._normalize_fixed_weekday_entry(item)
-            if normalized is None:
-                continue
-            if not self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                continue
-            if normalized["is_soft_penalty"]:
-                continue
-            ts = normalized["target_shift"]
-            if ts == "all" or ts == shift:
-                return True
-        return False
+        return self.availability.is_hard_blocked(doctor_idx, day, shift)
 
     def build_model(self) -> None:
         doctors = range(self.num_doctors)
-        days = range(1, self.num_days + 1)
-        holiday_shift_mode = str(self.hard_constraints.get("holiday_shift_mode", "split")).strip().lower()
-        combined_mode = holiday_shift_mode == "combined"
-        prevent_sunhol_consecutive = not combined_mode and not self._is_explicitly_disabled(
-            self.hard_constraints.get("prevent_sunhol_consecutive", True)
-        )
-        respect_unavailable_days = not self._is_explicitly_disabled(
-            self.hard_constraints.get("respect_unavailable_days", True)
-        )
-
-        spacing_days = self._get_hard_constraint_value(
-            4,
-            "interval_days",
-            "min_interval_days",
-            "spacing_days",
-            "min_gap_days",
-            "work_interval_days",
-        )
-        max_saturday_nights = self._get_hard_constraint_value(
-            1,
-            "max_saturday_nights",
-            "max_sat_nights",
-            "sat_night_max",
-            "saturday_night_max",
-        )
-        max_sunhol_days = self._get_hard_constraint_value(
-            None,
-            "max_sunhol_days",
-            "sunhol_day_max",
-            "max_holiday_days",
-            "max_sunday_holiday_days",
-        )
-        max_sunhol_works = self._get_hard_constraint_value(
-            None,
-            "max_sunhol_works",
-            "sunhol_work_max",
-            "max_holiday_works",
-            "max_sunday_holiday_works",
-        )
-        max_weekend_holiday_works = self._get_hard_constraint_value(
-            None,
-            "max_weekend_holiday_works",
-            "weekend_holiday_work_max",
-            "weekend_hol_work_max",
-            "max_weekend_holiday_count",
-            "weekend_holiday_total_max",
-            "weekend_hol_total_max",
-            "max_shifts",
-            flag_keys=("strict_weekend_hol_max",),
-        )
-
-        def weekend_holiday_work_expr(doctor_idx: int):
-            return sum(
-                self.day_shifts[(doctor_idx, day)] + self.night_shifts[(doctor_idx, day)]
-                if self.is_sunday_or_holiday(day)
-                else self.night_shifts[(doctor_idx, day)]
-                for day in days
-                if self.is_sunday_or_holiday(day) or self.is_saturday(day)
-            )
+        cal = self.calendar
+        days = cal.days
+        limits = self.hard_limits()
+        spacing_days = limits.spacing_days
+        max_saturday_nights = limits.max_saturday_nights
+        max_weekend_holiday_works = limits.max_weekend_holiday_works
+        saturdays = cal.saturdays
+        sunhol_days = cal.sunhol_days
 
         # 1) vars
-        for d in doctors:
-            for day in days:
-                self.night_shifts[(d, day)] = self.model.NewBoolVar(f"night_d{d}_day{day}")
-                self.day_shifts[(d, day)] = self.model.NewBoolVar(f"day_d{d}_day{day}")
-                self.work[(d, day)] = self.model.NewBoolVar(f"work_d{d}_day{day}")
-                self.model.Add(self.work[(d, day)] == self.night_shifts[(d, day)] + self.day_shifts[(d, day)])
+        shifts = add_shift_vars(self.model, self.num_doctors, cal)
+        self.night_shifts = shifts.night
+        self.day_shifts = shifts.day
+        self.work = shifts.work
 
         # 2) slot fulfillment — 全スロットに必ず1人配置（外部医師含む）
-        ext_indices = self.external_doctor_indices
-        int_indices = self.internal_doctor_indices
-        for day in days:
-            ext_target = self.external_fixed_dates.get(day)
-            if ext_target and ext_indices:
-                # 外部医師確定日: 外部医師を割当、内部医師は割当不可
-                if ext_target == "all":
-                    # 当直: 外部医師のいずれかを割当
-                    self.model.AddExactlyOne(self.night_shifts[(d, day)] for d in ext_indices)
-                    for d in int_indices:
-                        self.model.Add(self.night_shifts[(d, day)] == 0)
-                    # 日直: 日祝のみ
-                    if self.is_sunday_or_holiday(day) and not combined_mode:
-                        self.model.AddExactlyOne(self.day_shifts[(d, day)] for d in ext_indices)
-                        for d in int_indices:
-                            self.model.Add(self.day_shifts[(d, day)] == 0)
-                    else:
-                        for d in doctors:
-                            self.model.Add(self.day_shifts[(d, day)] == 0)
-                elif ext_target == "day":
-                    # 日直のみ外部 → 当直は通常通り
-                    self.model.AddExactlyOne(self.night_shifts[(d, day)] for d in doctors)
-                    if self.is_sunday_or_holiday(day) and not combined_mode:
-                        self.model.AddExactlyOne(self.day_shifts[(d, day)] for d in ext_indices)
-                        for d in int_indices:
-                            self.model.Add(self.day_shifts[(d, day)] == 0)
-                    else:
-                        for d in doctors:
-                            self.model.Add(self.day_shifts[(d, day)] == 0)
-                elif ext_target == "night":
-                    # 当直のみ外部 → 日直は通常通り
-                    self.model.AddExactlyOne(self.night_shifts[(d, day)] for d in ext_indices)
-                    for d in int_indices:
-                        self.model.Add(self.night_shifts[(d, day)] == 0)
-                    if self.is_sunday_or_holiday(day) and not combined_mode:
-                        self.model.AddExactlyOne(self.day_shifts[(d, day)] for d in doctors)
-                    else:
-                        for d in doctors:
-                            self.model.Add(self.day_shifts[(d, day)] == 0)
-            else:
-                # 通常: 必ず1人配置（内部+外部から）
-                self.model.AddExactlyOne(self.night_shifts[(d, day)] for d in doctors)
-                if self.is_sunday_or_holiday(day) and not combined_mode:
-                    self.model.AddExactlyOne(self.day_shifts[(d, day)] for d in doctors)
-                else:
-                    for d in doctors:
-                        self.model.Add(self.day_shifts[(d, day)] == 0)
-
         # 2b) 外部医師は当月ちょうど1回勤務（枠数分を必ず外部が担当）
-        for d in ext_indices:
-            self.model.Add(sum(self.work[(d, day)] for day in days) == 1)
-
         # 3) hard: prevent same-day day/night double assignment
-        if prevent_sunhol_consecutive:
-            for d in doctors:
-                for day in days:
-                    self.model.Add(self.night_shifts[(d, day)] + self.day_shifts[(d, day)] <= 1)
+        add_structural_constraints(
+            self.model, cal, shifts, self.num_doctors,
+            self.external_doctor_indices, self.external_fixed_dates,
+            limits.prevent_sunhol_consecutive,
+        )
+        ext_indices = self.external_doctor_indices
 
         # 3.5) hard: enforce locked shifts fixed at the router boundary
-        for item in self.locked_shifts:
-            if not isinstance(item, dict):
-                continue
-
-            doctor_idx = item.get("doctor_idx")
-            if doctor_idx is None:
-                continue
-            try:
-                d = int(doctor_idx)
-            except (TypeError, ValueError):
-                continue
-            if d < 0 or d >= self.num_doctors:
-                continue
+        for d, day, shift in self._iter_locked_shifts():
+            self.model.Add(locked_shift_var(cal, shifts, d, day, shift) == 1)
 
-            day = self._parse_locked_day(item.get("date"))
-            if day is None:
-                continue
-
-            shift = self._normalize_shift_type(item.get("shift_type"))
-            if shift is None:
-                continue
-
-            if shift == "night":
-                self.model.Add(self.night_shifts[(d, day)] == 1)
-            else:
-                # In combined mode, "day" locks on sun/holiday are treated as "night" (combined)
-                if combined_mode and self.is_sunday_or_holiday(day):
-                    self.model.Add(self.night_shifts[(d, day)] == 1)
-                else:
-                    self.model.Add(self.day_shifts[(d, day)] == 1)
+        # 3.6) 入れ替え可能な医師（外部医師・同じ設定の常勤）。symmetry_breaking なら最初に入る枠の順に並べる
+        self._doctor_classes = self._interchangeable_doctor_classes()
+        self._output_order = [list(members) for members in self._doctor_classes]
+        if self.symmetry_breaking:
+            add_first_slot_order(self.model, cal, shifts, self._doctor_classes, exactly_once=ext_indices)
 
         # === apply unavailable constraints ===
+        # 4)+5) 日付指定の不可日と固定不可曜日は availability で枠（医師・日・シフト）ごとにまとめてある
+        # When respect_unavailable_days=False, all entries become soft penalties
+        # (the soft_unavailable weight then controls how strongly they are respected)
+        availability = self.availability
         soft_unavail_penalties = []
         # Track metadata for each soft penalty var: (doctor_idx, day, shift_type)
         self._soft_unavail_vars_meta: list[tuple] = []
 
-        # 4) hard/soft: apply date-based unavailable constraints
-        # When respect_unavailable_days=False, all entries become soft penalties
-        # (the soft_unavailable weight then controls how strongly they are respected)
-        for d, items in self.unavailable.items():
-            for item in items:
-                normalized = self._normalize_unavailable_entry(item)
-                if normalized is None:
-                    continue
-
-                day = normalized["date"]
-                shift_type = normalized["target_shift"]
-                # Force soft when global respect flag is off
-                is_soft = normalized["is_soft_penalty"] or not respect_unavailable_days
-
-                vars_to_constrain = []
-                if shift_type in ["day", "all"]:
-                    vars_to_constrain.append(self.day_shifts[(d, day)])
-                if shift_type in ["night", "all"]:
-                    vars_to_constrain.append(self.night_shifts[(d, day)])
-
-                for var in vars_to_constrain:
-                    if is_soft:
-                        p_var = self.model.NewBoolVar(f"soft_unavail_d{d}_day{day}_{shift_type}")
-                        self.model.Add(p_var == var)
-                        soft_unavail_penalties.append(p_var)
-                        self._soft_unavail_vars_meta.append((d, day, shift_type, p_var))
-                    else:
-                        self.model.Add(var == 0)
-
-        # 5) fixed unavailable weekdays
-        for d, items in self.fixed_unavailable_weekdays.items():
-            for item in items:
-                normalized = self._normalize_fixed_weekday_entry(item)
-                if normalized is None:
-                    continue
+        if limits.respect_unavailable_days:
+            for d, day, shift_type in availability.hard_cells():
+                for var in unavailable_shift_vars(shifts, d, day, shift_type):
+                    self.model.Add(var == 0)
 
-                target_dow = normalized["day_of_week"]
-                shift_type = normalized["target_shift"]
-                is_soft = normalized["is_soft_penalty"] or not respect_unavailable_days
-
-                for day in days:
-                    if not self._matches_fixed_unavailable_weekday(day, target_dow):
-                        continue
-
-                    vars_to_constrain = []
-                    if shift_type in ["day", "all"]:
-                        vars_to_constrain.append(self.day_shifts[(d, day)])
-                    if shift_type in ["night", "all"]:
-                        vars_to_constrain.append(self.night_shifts[(d, day)])
-
-                    for var in vars_to_constrain:
-                        if is_soft:
-                            p_var = self.model.NewBoolVar(f"soft_dow_d{d}_day{day}_{shift_type}")
-                            self.model.Add(p_var == var)
-                            soft_unavail_penalties.append(p_var)
-                            self._soft_unavail_vars_meta.append((d, day, shift_type, p_var))
-                        else:
-                            self.model.Add(var == 0)
+        # ソフト不可は枠ごとにペナルティ1つ（同じ枠に複数エントリがあっても二重に数えない）
+        for d, day, shift_type in availability.soft_cells(all_soft=not limits.respect_unavailable_days):
+            (var,) = unavailable_shift_vars(shifts, d, day, shift_type)
+            p_var = self.model.NewBoolVar(f"soft_unavail_d{d}_day{day}_{shift_type}")
+            self.model.Add(p_var == var)
+            soft_unavail_penalties.append(p_var)
+            self._soft_unavail_vars_meta.append((d, day, shift_type, p_var))
 
         # 7) hard: spacing rule
         if spacing_days is not None:
-            for d in doctors:
-                for day in days:
-                    for k in range(1, spacing_days + 1):
-                        if day + k <= self.num_days:
-                            self.model.Add(self.work[(d, day)] + self.work[(d, day + k)] <= 1)
+            if self.spacing_formulation == SPACING_WINDOW:
+                add_spacing_windows(self.model, cal, shifts, self.num_doctors, spacing_days)
+            else:
+                for k in range(1, spacing_days + 1):
+                    add_spacing_gap(self.model, cal, shifts, self.num_doctors, k)
 
         # 8) hard: month-cross spacing rule
         prev_month_worked_days, prev_last = self._build_previous_month_state()
-        if spacing_days is not None and prev_last is not None:
-            for d, prev_days in prev_month_worked_days.items():
-                for prev_day in prev_days:
-                    dist_to_start = (prev_last - int(prev_day)) + 1
-                    if 1 <= dist_to_start <= spacing_days:
-                        block_until = spacing_days + 1 - dist_to_start
-                        for day in range(1, block_until + 1):
-                            if 1 <= day <= self.num_days:
-                                self.model.Add(self.work[(d, day)] == 0)
-
-        saturdays = [day for day in days if self.is_saturday(day)]
-        sunhol_days = [day for day in days if self.is_sunday_or_holiday(day)]
+        for d, blocked in month_cross_blocks(prev_month_worked_days, prev_last, spacing_days, self.num_days).items():
+            for day in blocked:
+                self.model.Add(self.work[(d, day)] == 0)
 
         # 9) hard: saturday night monthly cap
         if max_saturday_nights is not None:
             for d in doctors:
-                self.model.Add(sum(self.night_shifts[(d, day)] for day in saturdays) <= max_saturday_nights)
+                self.model.Add(saturday_night_expr(cal, shifts, d) <= max_saturday_nights)
 
         # 10) hard: sun/holiday day-shift monthly cap
-        if max_sunhol_days is not None:
+        if limits.max_sunhol_days is not None:
             for d in doctors:
-                self.model.Add(sum(self.day_shifts[(d, day)] for day in sunhol_days) <= max_sunhol_days)
+                self.model.Add(sunhol_day_expr(cal, shifts, d) <= limits.max_sunhol_days)
 
         # 10.5) hard: sun/holiday total-work monthly cap
-        if max_sunhol_works is not None:
+        if limits.max_sunhol_works is not None:
             for d in doctors:
-                self.model.Add(
-                    sum(self.day_shifts[(d, day)] + self.night_shifts[(d, day)] for day in sunhol_days) <= max_sunhol_works
-                )
+                self.model.Add(sunhol_work_expr(cal, shifts, d) <= limits.max_sunhol_works)
 
         # 10.6) hard: combined saturday-night + sun/holiday-work monthly cap
         if max_weekend_holiday_works is not None:
             for d in doctors:
-                self.model.Add(weekend_holiday_work_expr(d) <= max_weekend_holiday_works)
+                self.model.Add(weekend_holiday_work_expr(cal, shifts, d) <= max_weekend_holiday_works)
 
         # 11) hard: compute monthly scores and enforce per-doctor min/max
         #     外部医師はスコア制約の対象外
+        weights = self.shift_weights
         doctor_scores: List[cp_model.IntVar] = []
         for d in doctors:
-            score_expr = 0
-            for day in days:
-                if self.is_sunday_or_holiday(day):
-                    if combined_mode:
-                        score_expr += self.night_shifts[(d, day)] * self.W_DAY_NIGHT
-                    else:
-                        score_expr += self.day_shifts[(d, day)] * self.W_SUNHOL_DAY
-                        score_expr += self.night_shifts[(d, day)] * self.W_SUNHOL_NIGHT
-                elif self.is_saturday(day):
-                    score_expr += self.night_shifts[(d, day)] * self.W_SAT_NIGHT
-                else:
-                    score_expr += self.night_shifts[(d, day)] * self.W_WEEKDAY_NIGHT
-
             doc_score = self.model.NewIntVar(0, 2000, f"score_d{d}")
-            self.model.Add(doc_score == score_expr)
+            self.model.Add(doc_score == score_expr(cal, shifts, d, weights))
 
             # 外部医師にはスコアmin/max制約を適用しない
             if d not in ext_indices:
-                d_min = int(round(self.min_score_by_doctor.get(d, self.score_min_float) * 10))
-                d_max = int(round(self.max_score_by_doctor.get(d, self.score_max_float) * 10))
+                d_min, d_max = self._score_bounds(d)
                 self.model.Add(doc_score >= d_min)
                 self.model.Add(doc_score <= d_max)
 
@@ -1185,7 +1214,22 @@ class OnCallOptimizer:
         # Build weighted sum: each step k (1..extra) gets weight (extra - k + 1)
         # e.g. extra=3: +1 day → weight 3, +2 → weight 2, +3 → weight 1
         ideal_gap_penalties: list = []
-        if ideal_extra > 0 and w.ideal_gap_weight > 0:
+        if ideal_extra > 0 and w.ideal_gap_weight > 0 and self.spacing_formulation == SPACING_WINDOW:
+            # 窓ごとに集約: day に勤務したら (day+base, day+base+extra] の勤務の重み付き和を1つの整数変数で受ける。
+            # 最小化で pen は「勤務した日ならその和、しない日なら 0」になり、ペアごとの BoolVar と同じ値になる
+            for d in doctors:
+                for day in days:
+                    window = [
+                        (self.work[(d, day + _base + k)], ideal_extra - k + 1)
+                        for k in range(1, ideal_extra + 1)
+                        if day + _base + k <= self.num_days
+                    ]
+                    if not window:
+                        continue
+                    pen = self.model.NewIntVar(0, sum(weight for _, weight in window), f"igap_d{d}_day{day}")
+                    self.model.Add(pen >= sum(var * weight for var, weight in window)).OnlyEnforceIf(self.work[(d, day)])
+                    ideal_gap_penalties.append(pen)
+        elif ideal_extra > 0 and w.ideal_gap_weight > 0:
             for d in doctors:
                 for day in days:
                     for k in range(1, ideal_extra + 1):
@@ -1334,7 +1378,7 @@ class OnCallOptimizer:
         if max_weekend_holiday_works is None:
             for d in doctors:
                 weekend_hol_total = self.model.NewIntVar(0, 62, f"weekend_hol_count_d{d}")
-                self.model.Add(weekend_hol_total == weekend_holiday_work_expr(d))
+                self.model.Add(weekend_hol_total == weekend_holiday_work_expr(cal, shifts, d))
                 is_3rd_weekend_hol = self.model.NewBoolVar(f"is_3rd_weekend_hol_d{d}")
                 self.model.Add(weekend_hol_total >= 3).OnlyEnforceIf(is_3rd_weekend_hol)
                 self.model.Add(weekend_hol_total <= 2).OnlyEnforceIf(is_3rd_weekend_hol.Not())
@@ -1349,86 +1393,644 @@ class OnCallOptimizer:
         else:
             self.model.Add(soft_unavail_sum == 0)
 
-        self.model.Minimize(
-            w.month_fairness * fairness
-            + w.sat_month_fairness * sat_month_gap
-            + w.past_sat_gap * sat_gap
-            + w.past_sunhol_gap * sunhol_gap
-            + w.sunhol_fairness * sunhol_month_gap
-            + (w.ideal_gap_weight // max(ideal_extra, 1)) * ideal_gap_sum
-            + w.sat_consec * (sat_consec_sum + sat_nth_sum)
-            + w.score_balance * score_balance_gap
-            + w.target * target_sum
-            + w.sunhol_3rd * sunhol_3rd_sum
-            + w.weekend_hol_3rd * weekend_hol_3rd_sum
-            + w.soft_unavailable * soft_unavail_sum
-        )
+        # 目的関数の項（ObjectiveWeights の名前 -> (重み, 式)）。代替案の objective_breakdown にも使う
+        self._objective_terms = {
+            "month_fairness": (w.month_fairness, fairness),
+            "sat_month_fairness": (w.sat_month_fairness, sat_month_gap),
+            "past_sat_gap": (w.past_sat_gap, sat_gap),
+            "past_sunhol_gap": (w.past_sunhol_gap, sunhol_gap),
+            "sunhol_fairness": (w.sunhol_fairness, sunhol_month_gap),
+            "ideal_gap_weight": (w.ideal_gap_weight // max(ideal_extra, 1), ideal_gap_sum),
+            "sat_consec": (w.sat_consec, sat_consec_sum + sat_nth_sum),
+            "score_balance": (w.score_balance, score_balance_gap),
+            "target": (w.target, target_sum),
+            "sunhol_3rd": (w.sunhol_3rd, sunhol_3rd_sum),
+            "weekend_hol_3rd": (w.weekend_hol_3rd, weekend_hol_3rd_sum),
+            "soft_unavailable": (w.soft_unavailable, soft_unavail_sum),
+        }
+        self.model.Minimize(sum(weight * expr for weight, expr in self._objective_terms.values()))
         self.max_score = max_score
         self.min_score = min_score
 
-    def solve(self, time_limit_seconds: float = 5.0, random_seed: Optional[int] = None) -> Dict:
-        holiday_shift_mode = str(self.hard_constraints.get("holiday_shift_mode", "split")).strip().lower()
-        combined_mode = holiday_shift_mode == "combined"
+    def _normalize_assignments(self, items: List[Dict[str, Any]]) -> Dict[Tuple[str, int], int]:
+        """割り当ての一覧（locked_shifts と同じ形）を (shift, day) -> doctor_idx にする
+
+        範囲外の医師・日付、平日の日直は読み飛ばし、同じ枠が重複したら先の方を使う。
+        combined モードの日祝は当直側の変数だけで表すので shift を "night" にそろえる。
+        """
+        combined_mode = self._is_combined_mode()
+
+        assigned: Dict[Tuple[str, int], int] = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                d = int(item.get("doctor_idx"))
+            except (TypeError, ValueError):
+                continue
+            if d < 0 or d >= self.num_doctors:
+                continue
+            day = self._parse_locked_day(item.get("date"))
+            shift = self._normalize_shift_type(item.get("shift_type"))
+            if day is None or shift is None:
+                continue
+            if shift == "day":
+                if not self.is_sunday_or_holiday(day):
+                    continue
+                if combined_mode:
+                    shift = "night"
+            assigned.setdefault((shift, day), d)
+        return assigned
+
+    def add_solution_hints(self, hints: List[Dict[str, Any]]) -> None:
+        """前回の割り当て（ドラフト・保存済みシフト）を CP-SAT の解のヒントとして与える。
+
+        build_model() の後に呼ぶ。hints は locked_shifts と同じ形（date / shift_type / doctor_idx）。
+        範囲外の医師・日付、平日の日直は読み飛ばし、同じ枠が重複したら先の方を使う。
+        """
+        hinted = self._normalize_assignments(hints)
+
+        # 入れ替え可能な医師の組では、出力の割り当て順をヒントで最初に入る枠の順にする
+        # （ヒントどおりの解なら同じ医師の割り当てとして返る）。対称性の除去をしているときは
+        # ヒント自体もモデル上の並び（組の医師番号順＝最初に入る枠の順）に置き換える
+        first_hinted: Dict[int, int] = {}
+        for (shift, day), d in hinted.items():
+            first_hinted[d] = min(first_hinted.get(d, 2 * self.num_days), slot_index(day, shift))
+        self._output_order = [
+            sorted(members, key=lambda d: (first_hinted.get(d, 2 * self.num_days), d))
+            for members in self._doctor_classes
+        ]
+        if self.symmetry_breaking:
+            to_model = {
+                original_d: model_d
+                for members, ordered in zip(self._doctor_classes, self._output_order)
+                for model_d, original_d in zip(members, ordered)
+            }
+            hinted = {slot: to_model.get(d, d) for slot, d in hinted.items()}
+
+        for (shift, day), hinted_doctor in hinted.items():
+            shift_vars = self.night_shifts if shift == "night" else self.day_shifts
+            for d in range(self.num_doctors):
+                self.model.AddHint(shift_vars[(d, day)], 1 if d == hinted_doctor else 0)
+
+        self._solution_hints = hinted
+        self._solution_hint_input_count = len(hints)
+
+    def _solution_hint_report(self, value: Callable[[Any], int]) -> Dict[str, Any]:
+        """ヒントのうち最終解にそのまま残った枠の数"""
+        kept = sum(
+            1 for (shift, day), d in self._solution_hints.items()
+            if value((self.night_shifts if shift == "night" else self.day_shifts)[(d, day)])
+        )
+        applied = len(self._solution_hints)
+        return {
+            "hinted": self._solution_hint_input_count,
+            "applied": applied,
+            "kept": kept,
+            "kept_ratio": round(kept / applied, 3) if applied else 0.0,
+        }
+
+    def _output_doctor_map(
+        self,
+        value: Callable[[Any], int],
+        output_order: Optional[List[List[int]]] = None,
+    ) -> Dict[int, int]:
+        """解の医師番号 -> 出力する医師番号（入れ替え可能な組の中だけで並べ替える）
+
+        組ごとに、解で最初に入る枠の順に並べた医師を _output_order（省略時）の順の医師に割り当てる。
+        同じ解なら対称性の除去の有無・ソルバーの探索順によらず同じ出力になる。
+        """
+        sentinel = 2 * self.num_days
+        out: Dict[int, int] = {}
+        orders = self._output_order if output_order is None else output_order
+        for members, order in zip(self._doctor_classes, orders):
+            def first_slot(d: int) -> int:
+                return min(
+                    (
+                        slot_index(day, shift)
+                        for day in range(1, self.num_days + 1)
+                        for shift, shift_vars in (("day", self.day_shifts), ("night", self.night_shifts))
+                        if value(shift_vars[(d, day)])
+                    ),
+                    default=sentinel,
+                )
+
+            solved = sorted(members, key=lambda d: (first_slot(d), d))
+            for solved_d, output_d in zip(solved, order):
+                if solved_d != output_d:
+                    out[solved_d] = output_d
+        return out
+
+    def _extract_solution(self, value: Callable[[Any], int]) -> Dict[str, Any]:
+        """解の値（solver.Value または解コールバックの Value）から schedule / scores を組み立てる"""
+        combined_mode = self._is_combined_mode()
+        out = self._output_doctor_map(value)
+
+        schedule = []
+        for day in range(1, self.num_days + 1):
+            day_data = {
+                "day": day,
+                "is_sunhol": self.is_sunday_or_holiday(day),
+                "day_shift": None,
+                "night_shift": None,
+            }
+            day_data["night_shift"] = next(
+                (out.get(d, d) for d in range(self.num_doctors) if value(self.night_shifts[(d, day)])), None
+            )
+
+            if self.is_sunday_or_holiday(day):
+                if combined_mode:
+                    # Combined mode: same doctor handles both day and night (日当直)
+                    day_data["day_shift"] = day_data["night_shift"]
+                else:
+                    day_data["day_shift"] = next(
+                        (out.get(d, d) for d in range(self.num_doctors) if value(self.day_shifts[(d, day)])), None
+                    )
+            schedule.append(day_data)
+
+        scores = dict(sorted((out.get(d, d), value(self.doctor_scores[d]) / 10.0) for d in range(self.num_doctors)))
+        return {"schedule": schedule, "scores": scores}
+
+    def _soft_unavail_violations(self, value: Callable[[Any], int]) -> List[Dict[str, Any]]:
+        """解で破られたソフト不可（出力の医師番号）"""
+        output_doctor = self._output_doctor_map(value)
+        return [
+            {"doctor_idx": output_doctor.get(d_idx, d_idx), "day": day, "shift_type": shift_type}
+            for d_idx, day, shift_type, p_var in getattr(self, "_soft_unavail_vars_meta", [])
+            if value(p_var) == 1
+        ]
+
+    def _objective_breakdown(self, value: Callable[[Any], int]) -> Dict[str, Dict[str, int]]:
+        """目的関数の項ごとの値と重み付きペナルティ（重み 0 の項は省く）"""
+        breakdown: Dict[str, Dict[str, int]] = {}
+        for name, (weight, expr) in self._objective_terms.items():
+            if not weight:
+                continue
+            term_value = int(value(expr))
+            breakdown[name] = {"weight": int(weight), "value": term_value, "penalty": int(weight) * term_value}
+        return breakdown
+
+    def _assigned_slots(self, value: Callable[[Any], int]) -> List[Tuple[str, int, int]]:
+        """解で埋まった枠を (シフト, 日, 医師番号) で返す（combined モードの日祝は当直側のみ）
+
+        医師番号は入れ替え可能な組の中で「最初に入る枠の順＝医師番号順」に並べ替えたもの
+        （add_first_slot_order を課したモデルでの表し方）。
+        """
+        combined_mode = self._is_combined_mode()
+        canonical = self._output_doctor_map(value, self._doctor_classes)
+        slots: List[Tuple[str, int, int]] = []
+        for day in range(1, self.num_days + 1):
+            shifts = [("night", self.night_shifts)]
+            if self.is_sunday_or_holiday(day) and not combined_mode:
+                shifts.append(("day", self.day_shifts))
+            for shift, shift_vars in shifts:
+                for d in range(self.num_doctors):
+                    if value(shift_vars[(d, day)]):
+                        slots.append((shift, day, canonical.get(d, d)))
+                        break
+        return slots
+
+    def _add_diversity_constraint(
+        self,
+        model: cp_model.CpModel,
+        slots: List[Tuple[str, int, int]],
+        min_diff_slots: int,
+    ) -> None:
+        """既出の解と min_diff_slots 枠以上違う割り当てだけを許す（ハミング距離の制約）"""
+        same = [(self.night_shifts if shift == "night" else self.day_shifts)[(d, day)] for shift, day, d in slots]
+        model.Add(sum(same) <= len(slots) - min_diff_slots)
+
+    def _result_entry(self, value: Callable[[Any], int], status: int, objective: float) -> Dict[str, Any]:
+        """代替案1件分（schedule / scores / 目的値の内訳 / 破ったソフト不可）"""
+        solution = self._extract_solution(value)
+        return {
+            "status": "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE",
+            "objective": int(round(objective)),
+            "objective_breakdown": self._objective_breakdown(value),
+            "schedule": solution["schedule"],
+            "scores": solution["scores"],
+            "soft_unavail_violations": self._soft_unavail_violations(value),
+        }
 
+    def _solve_alternatives(
+        self,
+        best_solver: cp_model.CpSolver,
+        best_status: int,
+        num_alternatives: int,
+        time_limit_seconds: float,
+        seed: int,
+    ) -> List[Dict[str, Any]]:
+        """最良解から互いに min_diff_slots 枠以上違う解を順に探し、最良解を先頭に並べて返す
+
+        同じモデルのコピーに「既出の解とのハミング距離」の制約を足しながら解き直す。
+        入れ替え可能な医師の並べ替えだけの解（出力は同じ）を数えないよう、コピーには
+        symmetry_breaking の設定によらず組の中の並び順の制約を課し、既出の解もその並びで表す。
+        2件目以降は最良解をヒントにする（品質を保ったまま、必要な枠だけ組み替えた解から探す）。
+        制限時間は残りを未求解の件数で等分し、早く終わった分は後の件へ回す。
+        これ以上違う解がなければ、そこまでの件数を返す。
+        """
+        best_slots = self._assigned_slots(best_solver.Value)
+        min_diff_slots = max(
+            1, math.ceil(len(best_slots) * get_settings().optimizer_alternative_min_diff_ratio)
+        )
+        best = self._result_entry(best_solver.Value, best_status, best_solver.ObjectiveValue())
+        alternatives = [{"rank": 1, "diff_slots": 0, **best}]
+
+        model = self.model.clone()
+        if not self.symmetry_breaking:
+            add_first_slot_order(
+                model, self.calendar,
+                ShiftVars(night=self.night_shifts, day=self.day_shifts, work=self.work),
+                self._doctor_classes, exactly_once=self.external_doctor_indices,
+            )
+        model.ClearHints()
+        for shift, day, d in best_slots:
+            shift_vars = self.night_shifts if shift == "night" else self.day_shifts
+            for other in range(self.num_doctors):
+                model.AddHint(shift_vars[(other, day)], 1 if other == d else 0)
+        self._add_diversity_constraint(model, best_slots, min_diff_slots)
+
+        remaining = float(time_limit_seconds)
+        for rank in range(2, num_alternatives + 1):
+            solver = cp_model.CpSolver()
+            solver.parameters.random_seed = seed
+            solver.parameters.repair_hint = True
+            solver, status = self._run_solver(
+                model, remaining / (num_alternatives - rank + 1), solver=solver,
+            )
+            remaining = max(remaining - solver.WallTime(), 0.0)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                break
+            entry = self._result_entry(solver.Value, status, solver.ObjectiveValue())
+            entry["diff_slots"] = sum(
+                1
+                for a, b in zip(best["schedule"], entry["schedule"])
+                for key in ("day_shift", "night_shift")
+                if a[key] != b[key]
+            )
+            alternatives.append({"rank": rank, **entry})
+            self._add_diversity_constraint(model, self._assigned_slots(solver.Value), min_diff_slots)
+        return alternatives
+
+    def _add_construction_hint(self, time_limit_seconds: float, seed: int) -> Dict[str, Any]:
+        """大人数モード: 貪欲法で全枠を埋めた解（roster_construction）を CP-SAT のヒントにする
+
+        シフト変数だけのヒントでは補助変数（スコア・公平性の差など）が埋まらず、CP-SAT がヒントを
+        そのまま最初の解として採れない。シフトを固定したモデルで残りの変数も決め、全変数をヒントにする。
+        埋まらない枠があるか、固定したモデルが解けない（スコア下限など貪欲法で守れない制約）ときは
+        埋めた枠のシフト変数だけをヒントにする。
+        """
+        started = time.monotonic()
+        assignment = greedy_assignment(self)
+        cal = self.calendar
+        total_slots = cal.num_days + len(cal.day_slot_days)
+
+        complete = False
+        if len(assignment) == total_slots:
+            fixed = self.model.clone()
+            fixed.ClearObjective()
+            for shift, shift_vars in (("night", self.night_shifts), ("day", self.day_shifts)):
+                for (d, day), var in shift_vars.items():
+                    fixed.Add(var == (1 if assignment.get((shift, day)) == d else 0))
+            solver = cp_model.CpSolver()
+            solver.parameters.random_seed = seed
+            solver, status = self._run_solver(fixed, time_limit_seconds, solver=solver)
+            complete = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+        if complete:
+            for i in range(len(self.model.Proto().variables)):
+                var = self.model.GetIntVarFromProtoIndex(i)
+                self.model.AddHint(var, solver.Value(var))
+        else:
+            for (shift, day), assigned in assignment.items():
+                shift_vars = self.night_shifts if shift == "night" else self.day_shifts
+                for d in range(self.num_doctors):
+                    self.model.AddHint(shift_vars[(d, day)], 1 if d == assigned else 0)
+        return {
+            "filled_slots": len(assignment),
+            "total_slots": total_slots,
+            "complete_hint": complete,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+
+    def _visible_gap_limit(self) -> int:
+        """これ以下の改善は画面に出ない、という目的値の差（早期終了の absolute_gap_limit）
+
+        目的値の各項は整数（スコアは 0.1 刻みを ×10）なので、どの項も1単位は改善できない差
+        （重みが最小の項の重み未満）なら、それ以上探しても表示上の違いはまず出ない。
+        """
+        weights = [int(weight) for weight, _ in self._objective_terms.values() if weight > 0]
+        return max(min(weights) - 1, 0) if weights else 0
+
+    def _stop_when_stalled(
+        self,
+        solver: cp_model.CpSolver,
+        callback: _SolutionProgressCallback,
+        stall_seconds: float,
+        done: threading.Event,
+    ) -> None:
+        """改善解が出なくなったら探索を止める（solve() の監視スレッド）
+
+        最後の改善から stall_seconds 秒、かつその改善までにかかった時間と同じだけ待っても次が出なければ止める
+        （遅れて改善が続く難しい月を早く切り上げすぎないように）。
+        """
+        started = time.monotonic()
+        while not done.wait(0.05):
+            last = callback.last_solution_at
+            if last is not None and time.monotonic() - last >= max(stall_seconds, last - started):
+                self._stalled = True
+                solver.StopSearch()
+                return
+
+    def _termination_reason(
+        self, solver: cp_model.CpSolver, status: int, callback: _SolutionProgressCallback,
+    ) -> str:
+        if status == cp_model.INFEASIBLE:
+            return "infeasible"
+        if status == cp_model.OPTIMAL and solver.ObjectiveValue() <= solver.BestObjectiveBound() + 1e-6:
+            return "optimal"
+        # 下界と一致していない OPTIMAL は CP-SAT 自身が gap の条件で止めた
+        if callback.gap_reached or status == cp_model.OPTIMAL:
+            return "gap_limit"
+        if self._stalled:
+            return "no_improvement"
+        return "time_limit"
+
+    def solve(
+        self,
+        time_limit_seconds: float = 5.0,
+        random_seed: Optional[int] = None,
+        stream_solutions: bool = False,
+        num_alternatives: int = 1,
+    ) -> Dict:
+        """求解する。stream_solutions=True なら改善解ごとの schedule / scores も進捗として通知する。
+
+        num_alternatives > 1 なら、制限時間の中で互いに十分違う解を最大その件数まで探し、
+        目的値の内訳付きで alternatives に入れる（先頭は schedule / scores と同じ最良解）。
+        """
+        num_alternatives = max(1, int(num_alternatives))
+        # 代替案を探すときは最良解に等分の時間を割り当て、残りを代替案に回す
+        first_limit = float(time_limit_seconds) / num_alternatives
         solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = float(time_limit_seconds)
         seed = int(random_seed) if random_seed is not None else random.SystemRandom().randint(1, 2**31 - 1)
         solver.parameters.random_seed = seed
         if hasattr(solver.parameters, "randomize_search"):
             solver.parameters.randomize_search = True
-        status = solver.Solve(self.model)
+        if self._solution_hints:
+            # ロックや不可日の変更で矛盾したヒントは捨てずに近い実行可能解へ直させる
+            solver.parameters.repair_hint = True
+        construction = None
+        if self.large_roster and not self._solution_hints:
+            # 大人数: presolve の probing と最初の実行可能解までが長いので、貪欲法の解から改善させる
+            self._report_progress("constructing")
+            construction = self._add_construction_hint(first_limit / 4, seed)
+            first_limit = max(first_limit - construction["seconds"], 1.0)
+            solver.parameters.cp_model_probing_level = 0
+            if construction["complete_hint"]:
+                # 対称性の検出による presolve の変形でヒントが実行不能にならないように
+                solver.parameters.symmetry_level = 0
+        # 早期終了: 下界との差が十分小さい・表示上の違いが出ない・改善が止まったら制限時間を待たない
+        solver.parameters.relative_gap_limit = self.relative_gap_limit
+        solver.parameters.absolute_gap_limit = float(
+            self._visible_gap_limit() if self.absolute_gap_limit is None else self.absolute_gap_limit
+        )
+        self._report_progress("solving", time_limit_seconds=float(time_limit_seconds))
+        callback = _SolutionProgressCallback(
+            self._report_progress,
+            extract=self._extract_solution if stream_solutions and self.progress_callback is not None else None,
+            gap_limits=(solver.parameters.relative_gap_limit, solver.parameters.absolute_gap_limit),
+        )
 
-        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-            schedule = []
-            for day in range(1, self.num_days + 1):
-                day_data = {
-                    "day": day,
-                    "is_sunhol": self.is_sunday_or_holiday(day),
-                    "day_shift": None,
-                    "night_shift": None,
-                }
-                day_data["night_shift"] = next(
-                    (d for d in range(self.num_doctors) if solver.Value(self.night_shifts[(d, day)])), None
-                )
+        def on_bound(bound: float) -> None:
+            # 解が変わらず下界だけ上がって差が縮んだとき
+            if callback.within_gap(bound):
+                callback.gap_reached = True
+                solver.StopSearch()
+
+        solver.best_bound_callback = on_bound
+        self._stalled = False
+        done = threading.Event()
+        stall_seconds = self.stall_seconds
+        if stall_seconds > 0:
+            threading.Thread(
+                target=self._stop_when_stalled, args=(solver, callback, stall_seconds, done), daemon=True,
+            ).start()
+        try:
+            solver, status = self._run_solver(self.model, first_limit, solver=solver, callback=callback)
+        finally:
+            done.set()
+        termination_reason = self._termination_reason(solver, status, callback)
+        # 実際に使ったパラメータ（num_workers=0 は OR-Tools の既定＝全コア）
+        solver_params = {
+            "num_workers": int(solver.parameters.num_workers),
+            "random_seed": seed,
+            "randomize_search": bool(getattr(solver.parameters, "randomize_search", False)),
+            "max_time_in_seconds": float(solver.parameters.max_time_in_seconds),
+            "wall_time_seconds": round(solver.WallTime(), 3),
+            "termination_reason": termination_reason,
+            "relative_gap_limit": float(solver.parameters.relative_gap_limit),
+            "absolute_gap_limit": float(solver.parameters.absolute_gap_limit),
+            "stall_seconds": stall_seconds,
+            **_solver_stats(self.model, solver, status),
+        }
+        if construction is not None:
+            solver_params["large_roster"] = construction
 
-                if self.is_sunday_or_holiday(day):
-                    if combined_mode:
-                        # Combined mode: same doctor handles both day and night (日当直)
-                        day_data["day_shift"] = day_data["night_shift"]
-                    else:
-                        day_data["day_shift"] = next(
-                            (d for d in range(self.num_doctors) if solver.Value(self.day_shifts[(d, day)])), None
-                        )
-                schedule.append(day_data)
-
-            scores = {d: solver.Value(self.doctor_scores[d]) / 10.0 for d in range(self.num_doctors)}
-
-            # Check which soft unavailable constraints were violated
-            soft_unavail_violations = []
-            for d_idx, day, shift_type, p_var in getattr(self, "_soft_unavail_vars_meta", []):
-                if solver.Value(p_var) == 1:
-                    soft_unavail_violations.append({
-                        "doctor_idx": d_idx,
-                        "day": day,
-                        "shift_type": shift_type,
-                    })
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            solution = self._extract_solution(solver.Value)
+            soft_unavail_violations = self._soft_unavail_violations(solver.Value)
 
             result = {
                 "success": True,
-                "status": "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE",
-                "schedule": schedule,
-                "scores": scores,
+                "status": "OPTIMAL" if termination_reason == "optimal" else "FEASIBLE",
+                "schedule": solution["schedule"],
+                "scores": solution["scores"],
+                "solver_params": solver_params,
             }
             if soft_unavail_violations:
                 result["soft_unavail_violations"] = soft_unavail_violations
+            if self._solution_hints:
+                result["warm_start"] = self._solution_hint_report(solver.Value)
+            if num_alternatives > 1:
+                self._report_progress("alternatives", num_alternatives=num_alternatives)
+                result["alternatives"] = self._solve_alternatives(
+                    solver, status, num_alternatives,
+                    max(float(time_limit_seconds) - solver.WallTime() - (construction or {}).get("seconds", 0.0), 0.0),
+                    seed,
+                )
             return result
 
         return {
             "success": False,
             "message": "現在の設定では解が見つかりませんでした。ルールや不可日を見直してください。",
+            "solver_params": solver_params,
         }
 
 
+    # ── 公開済みの月の最小変更修正 ──
+
+    def _repair_affected_days(self, baseline: Dict[Tuple[str, int], int]) -> List[int]:
+        """今の入力では元の割り当てのままにできない日（空いた枠・ハード不可・ロック・前月からの間隔）"""
+        combined_mode = self._is_combined_mode()
+        limits = self.hard_limits()
+        affected: set = set()
+
+        for day in range(1, self.num_days + 1):
+            if ("night", day) not in baseline:
+                affected.add(day)
+            if self.is_sunday_or_holiday(day) and not combined_mode and ("day", day) not in baseline:
+                affected.add(day)
+
+        if limits.respect_unavailable_days:
+            for (shift, day), d in baseline.items():
+                shifts = ("day", "night") if combined_mode and self.is_sunday_or_holiday(day) else (shift,)
+                if any(self._is_doctor_unavailable_on_day(d, day, s) for s in shifts):
+                    affected.add(day)
+
+        for d, day, shift in self._iter_locked_shifts():
+            if shift == "day" and combined_mode:
+                shift = "night"
+            if baseline.get((shift, day)) != d:
+                affected.add(day)
+
+        prev_month_worked_days, prev_last = self._build_previous_month_state()
+        for d, blocked in month_cross_blocks(prev_month_worked_days, prev_last, limits.spacing_days, self.num_days).items():
+            affected.update(day for (_, day), worked in baseline.items() if worked == d and day in blocked)
+
+        return sorted(affected)
+
+    def repair(
+        self,
+        baseline: List[Dict[str, Any]],
+        time_limit_seconds: float = 2.0,
+        random_seed: Optional[int] = None,
+        radius_days: Optional[int] = None,
+    ) -> Dict:
+        """保存済みの割り当て baseline をできるだけ変えずに、今の入力（不可日の追加など）に合わせて直す。
+
+        build_model() の全ハード制約を満たす解のうち、変更した枠の数が最小のものを返す（同数なら目的関数で選ぶ）。
+        探索は影響を受けた日（_repair_affected_days）の前後 radius_days 日（既定は勤務間隔）だけに絞り、
+        それ以外の枠は元の割り当てに固定する（LNS の近傍）。近傍で解けなければ半径を倍にして広げ、
+        最後は月全体を対象にする。
+
+        build_model() はこの中で呼ぶ。公開済みの割り当てをそのまま返すため対称性の除去と
+        入れ替え可能な医師の出力の並べ替えは行わない。
+        """
+        self.symmetry_breaking = False
+        self.build_model()
+        # 入れ替え可能な医師でも、公開済みの月では誰が入るかが変わればそれは変更
+        self._doctor_classes = []
+        self._output_order = []
+
+        assigned = self._normalize_assignments(baseline)
+        affected = self._repair_affected_days(assigned)
+        spacing_days = self.hard_limits().spacing_days
+        radius = max(int(radius_days if radius_days is not None else (spacing_days or 1)), 1)
+        seed = int(random_seed) if random_seed is not None else random.SystemRandom().randint(1, 2**31 - 1)
+        self._report_progress("repairing", affected_days=affected, time_limit_seconds=float(time_limit_seconds))
+
+        def slot_var(shift: str, day: int, d: int) -> Any:
+            return (self.night_shifts if shift == "night" else self.day_shifts)[(d, day)]
+
+        remaining = float(time_limit_seconds)
+        wall_time = 0.0
+        while True:
+            free_all = radius >= self.num_days
+            free_days = set(range(1, self.num_days + 1)) if free_all else {
+                day
+                for center in affected
+                for day in range(max(center - radius, 1), min(center + radius, self.num_days) + 1)
+            }
+            model = self.model.clone()
+            model.ClearHints()
+            kept = []
+            for (shift, day), d in assigned.items():
+                var = slot_var(shift, day, d)
+                if day in free_days:
+                    kept.append(var)
+                    model.AddHint(var, 1)
+                else:
+                    model.Add(var == 1)
+            # 1) 変更枠数の最小化
+            model.Minimize(len(kept) - sum(kept))
+            solver = cp_model.CpSolver()
+            solver.parameters.random_seed = seed
+            solver.parameters.repair_hint = True
+            solver, status = self._run_solver(model, remaining, solver=solver)
+            remaining = max(remaining - solver.WallTime(), 0.0)
+            wall_time += solver.WallTime()
+            if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) or free_all or remaining <= 0:
+                break
+            # 近傍が狭すぎて固定した枠と両立しない: 広げてやり直す
+            radius *= 2
+
+        repair_info: Dict[str, Any] = {
+            "affected_days": affected,
+            "radius_days": None if free_all else radius,
+            "neighborhood_days": len(free_days),
+            "baseline_slots": len(assigned),
+        }
+        solver_params = {
+            "num_workers": int(solver.parameters.num_workers),
+            "random_seed": seed,
+            "max_time_in_seconds": float(time_limit_seconds),
+            "wall_time_seconds": round(wall_time, 3),
+        }
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            solver_params.update(_solver_stats(model, solver, status))
+            return {
+                "success": False,
+                "message": "今の設定では元のシフトを直す解が見つかりませんでした。ルールや不可日を見直してください。",
+                "solver_params": solver_params,
+                "repair": repair_info,
+            }
+
+        # 2) 変更枠数を保ったまま元の目的関数で選び直す（残り時間があれば）
+        changes = int(round(solver.ObjectiveValue()))
+        if status == cp_model.OPTIMAL and remaining > 0 and self._objective_terms:
+            model.Add(len(kept) - sum(kept) <= changes)
+            model.Minimize(sum(weight * expr for weight, expr in self._objective_terms.values()))
+            model.ClearHints()
+            for var in self.night_shifts.values():
+                model.AddHint(var, solver.Value(var))
+            for var in self.day_shifts.values():
+                model.AddHint(var, solver.Value(var))
+            refined = cp_model.CpSolver()
+            refined.parameters.random_seed = seed
+            refined, refined_status = self._run_solver(model, remaining, solver=refined)
+            wall_time += refined.WallTime()
+            solver_params["wall_time_seconds"] = round(wall_time, 3)
+            if refined_status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                solver, status = refined, refined_status
+        solver_params.update(_solver_stats(model, solver, status))
+
+        solution = self._extract_solution(solver.Value)
+        # combined モードの日祝は day_shift も night_shift と同じ医師なので当直側だけ数える
+        keys = (("night_shift", "night"),) if self._is_combined_mode() else (("day_shift", "day"), ("night_shift", "night"))
+        changed = []
+        for row in solution["schedule"]:
+            day = row["day"]
+            for key, shift in keys:
+                if row[key] is None:
+                    continue
+                before = assigned.get((shift, day))
+                if before != row[key]:
+                    changed.append({"day": day, "shift_type": shift, "before": before, "after": row[key]})
+        repair_info["changed"] = changed
+        repair_info["num_changed"] = len(changed)
+
+        result = {
+            "success": True,
+            "status": "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE",
+            "schedule": solution["schedule"],
+            "scores": solution["scores"],
+            "solver_params": solver_params,
+            "repair": repair_info,
+        }
+        soft_unavail_violations = self._soft_unavail_violations(solver.Value)
+        if soft_unavail_violations:
+            result["soft_unavail_violations"] = soft_unavail_violations
+        return result
+
     # ── P1-2 Phase 2: Constraint Diagnosis ──────────────────────
 
     def diagnose(
@@ -1445,12 +2047,21 @@ class OnCallOptimizer:
           - phase_completed: int (1, 2, or 3)
         """
         self.doctor_names = doctor_names or {i: f"医師{i+1}" for i in range(self.num_doctors)}
+        self._diagnosis = None
+
+        phases: Dict[str, Dict[str, Any]] = {}
 
         # Phase 1: Build diagnosis model with assumptions → find conflicting groups
-        conflict_groups, assumption_map, diag_model = self._diagnose_phase1(time_limit_seconds)
+        self._report_progress("diagnose_phase1")
+        conflict_groups, assumption_map, diag_model = self._timed_phase(
+            phases, "phase1", lambda: self._diagnose_phase1(time_limit_seconds),
+        )
+        self._report_progress("diagnose_phase1_done", conflict_groups=conflict_groups)
         if not conflict_groups:
             # Phase 1 で特定できなかった場合でも、管理者設定の探索は実行
-            solvable_removals = self._diagnose_try_settings(time_limit_per_try=2.0)
+            solvable_removals = self._timed_phase(
+                phases, "try_settings", lambda: self._diagnose_try_settings(time_limit_per_try=2.0),
+            )
             staffing_violations = self._diagnose_staffing_shortage()
 
             specific = staffing_violations or (
@@ -1462,16 +2073,21 @@ class OnCallOptimizer:
                 "solvable_removals": solvable_removals,
                 "human_insights": self._build_human_insights(),
                 "phase_completed": 1,
+                "telemetry": {"phases": phases},
             }
 
         # Phase 2a: 管理者設定を変えて解けるか試行 → 最小変更値を探索
-        solvable_removals = self._diagnose_try_settings(
-            time_limit_per_try=min(time_limit_seconds, 2.0),
+        self._report_progress("diagnose_try_settings")
+        solvable_removals = self._timed_phase(
+            phases, "try_settings",
+            lambda: self._diagnose_try_settings(time_limit_per_try=min(time_limit_seconds, 2.0)),
         )
 
         # Phase 2b: 不可日の最小解除セットを検証
-        min_removals = self._diagnose_minimum_unavail_removals(
-            conflict_groups, time_limit=min(time_limit_seconds, 10.0),
+        self._report_progress("diagnose_unavail_removals", solvable_removals=solvable_removals)
+        min_removals = self._timed_phase(
+            phases, "unavail_removals",
+            lambda: self._diagnose_minimum_unavail_removals(conflict_groups, time_limit=min(time_limit_seconds, 10.0)),
         )
         if min_removals:
             solvable_removals.extend(min_removals)
@@ -1483,65 +2099,42 @@ class OnCallOptimizer:
             "solvable_removals": solvable_removals,
             "human_insights": self._build_human_insights(),
             "phase_completed": 2,
+            "telemetry": {"phases": phases},
+        }
+
+    def _timed_phase(self, phases: Dict[str, Dict[str, Any]], name: str, run: Callable[[], Any]) -> Any:
+        """診断の1段階を実行し、所要時間と CP-SAT の試行回数を phases[name] に記録する"""
+        runs_before = self._solver_runs
+        started = time.perf_counter()
+        value = run()
+        phases[name] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "trials": self._solver_runs - runs_before,
         }
+        return value
 
     def _diagnose_staffing_shortage(self) -> List[str]:
         """日別に当直・日直可能な医師数を計算し、人手不足の日を特定する。"""
         doctors = range(self.num_doctors)
-        days = range(1, self.num_days + 1)
-        weekday_ja = ["月", "火", "水", "木", "金", "土", "日"]
-
-        holiday_shift_mode = str(self.hard_constraints.get("holiday_shift_mode", "split")).strip().lower()
-        combined_mode = holiday_shift_mode == "combined"
-        spacing_days = self._get_hard_constraint_value(
-            4, "interval_days", "min_interval_days", "spacing_days", "min_gap_days", "work_interval_days"
-        )
+        cal = self.calendar
+        days = cal.days
+        spacing_days = self.hard_limits().spacing_days
 
         violations: List[str] = []
         critical_days: List[Dict[str, Any]] = []
 
-        for day in days:
-            date_obj = datetime.date(self.year, self.month, day)
-            dow_label = weekday_ja[date_obj.weekday()]
-            is_sunhol = self.is_sunday_or_holiday(day)
-            needs_day_shift = is_sunhol and not combined_mode
-
-            night_available: List[str] = []
-            day_available: List[str] = []
+        # 個別不可日・固定不可曜日（ソフト指定も含めて不可とみなす）
+        availability = self.availability
+        night_blocked = availability.any_kind(SHIFT_NIGHT)
+        day_blocked = availability.any_kind(SHIFT_DAY)
+        doc_names = [self.doctor_names.get(d, f"医師{d+1}") for d in doctors]
 
-            for d in doctors:
-                night_blocked = False
-                day_blocked = False
+        for day in days:
+            dow_label = cal.weekday_ja(day)
+            needs_day_shift = cal.has_day_slot(day)
 
-                # 個別不可日チェック
-                for item in self.unavailable.get(d, []):
-                    normalized = self._normalize_unavailable_entry(item)
-                    if normalized is None:
-                        continue
-                    if normalized["date"] == day:
-                        shift = normalized["target_shift"]
-                        if shift in ("all", "night"):
-                            night_blocked = True
-                        if shift in ("all", "day"):
-                            day_blocked = True
-
-                # 固定不可曜日チェック
-                for item in self.fixed_unavailable_weekdays.get(d, []):
-                    normalized = self._normalize_fixed_weekday_entry(item)
-                    if normalized is None:
-                        continue
-                    if self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                        shift = normalized["target_shift"]
-                        if shift in ("all", "night"):
-                            night_blocked = True
-                        if shift in ("all", "day"):
-                            day_blocked = True
-
-                doc_name = self.doctor_names.get(d, f"医師{d+1}")
-                if not night_blocked:
-                    night_available.append(doc_name)
-                if not day_blocked:
-                    day_available.append(doc_name)
+            night_available = [doc_names[d] for d in np.flatnonzero(~night_blocked[:, day - 1])]
+            day_available = [doc_names[d] for d in np.flatnonzero(~day_blocked[:, day - 1])]
 
             if len(night_available) == 0:
                 violations.append(
@@ -1575,322 +2168,37 @@ class OnCallOptimizer:
 
         return violations
 
+    def _diagnosis_engine(self) -> DiagnosisEngine:
+        """診断モデル（ハード制約＋有効化リテラル）を一度だけ組んで使い回す"""
+        if self._diagnosis is None:
+            self._diagnosis = DiagnosisEngine(self, getattr(self, "doctor_names", None))
+        return self._diagnosis
+
     def _diagnose_phase1(
         self, time_limit_seconds: float = 5.0
-    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], cp_model.CpModel]:
-        """Phase 1: Build model with assumption literals, find MUS (minimal unsatisfiable subset)."""
-        model = cp_model.CpModel()
-        doctors = range(self.num_doctors)
-        days = range(1, self.num_days + 1)
-
-        holiday_shift_mode = str(self.hard_constraints.get("holiday_shift_mode", "split")).strip().lower()
-        combined_mode = holiday_shift_mode == "combined"
-        prevent_sunhol_consecutive = not combined_mode and not self._is_explicitly_disabled(
-            self.hard_constraints.get("prevent_sunhol_consecutive", True)
-        )
-        respect_unavailable_days = not self._is_explicitly_disabled(
-            self.hard_constraints.get("respect_unavailable_days", True)
-        )
-
-        spacing_days = self._get_hard_constraint_value(4, "interval_days", "min_interval_days", "spacing_days", "min_gap_days", "work_interval_days")
-        max_saturday_nights = self._get_hard_constraint_value(1, "max_saturday_nights", "max_sat_nights", "sat_night_max", "saturday_night_max")
-        max_sunhol_days = self._get_hard_constraint_value(None, "max_sunhol_days", "sunhol_day_max", "max_holiday_days", "max_sunday_holiday_days")
-        max_sunhol_works = self._get_hard_constraint_value(None, "max_sunhol_works", "sunhol_work_max", "max_holiday_works", "max_sunday_holiday_works")
-        max_weekend_holiday_works = self._get_hard_constraint_value(
-            None, "max_weekend_holiday_works", "weekend_holiday_work_max", "weekend_hol_work_max",
-            "max_weekend_holiday_count", "weekend_holiday_total_max", "weekend_hol_total_max", "max_shifts",
-            flag_keys=("strict_weekend_hol_max",),
-        )
-
-        # --- Create variables (same as build_model) ---
-        night_shifts: Dict[Tuple[int, int], cp_model.IntVar] = {}
-        day_shifts: Dict[Tuple[int, int], cp_model.IntVar] = {}
-        work: Dict[Tuple[int, int], cp_model.IntVar] = {}
-
-        for d in doctors:
-            for day in days:
-                night_shifts[(d, day)] = model.NewBoolVar(f"night_d{d}_day{day}")
-                day_shifts[(d, day)] = model.NewBoolVar(f"day_d{d}_day{day}")
-                work[(d, day)] = model.NewBoolVar(f"work_d{d}_day{day}")
-                model.Add(work[(d, day)] == night_shifts[(d, day)] + day_shifts[(d, day)])
-
-        # --- Slot fulfillment (NOT wrapped — always enforced) ---
-        ext_idx_diag = self.external_doctor_indices
-        int_idx_diag = self.internal_doctor_indices
-        for day in days:
-            ext_target = self.external_fixed_dates.get(day)
-            if ext_target and ext_idx_diag:
-                if ext_target == "all":
-                    model.AddExactlyOne(night_shifts[(d, day)] for d in ext_idx_diag)
-                    for d in int_idx_diag:
-                        model.Add(night_shifts[(d, day)] == 0)
-                    if self.is_sunday_or_holiday(day) and not combined_mode:
-                        model.AddExactlyOne(day_shifts[(d, day)] for d in ext_idx_diag)
-                        for d in int_idx_diag:
-                            model.Add(day_shifts[(d, day)] == 0)
-                    else:
-                        for d in doctors:
-                            model.Add(day_shifts[(d, day)] == 0)
-                elif ext_target == "day":
-                    model.AddExactlyOne(night_shifts[(d, day)] for d in doctors)
-                    if self.is_sunday_or_holiday(day) and not combined_mode:
-                        model.AddExactlyOne(day_shifts[(d, day)] for d in ext_idx_diag)
-                        for d in int_idx_diag:
-                            model.Add(day_shifts[(d, day)] == 0)
-                    else:
-                        for d in doctors:
-                            model.Add(day_shifts[(d, day)] == 0)
-                elif ext_target == "night":
-                    model.AddExactlyOne(night_shifts[(d, day)] for d in ext_idx_diag)
-                    for d in int_idx_diag:
-                        model.Add(night_shifts[(d, day)] == 0)
-                    if self.is_sunday_or_holiday(day) and not combined_mode:
-                        model.AddExactlyOne(day_shifts[(d, day)] for d in doctors)
-                    else:
-                        for d in doctors:
-                            model.Add(day_shifts[(d, day)] == 0)
-            else:
-                model.AddExactlyOne(night_shifts[(d, day)] for d in doctors)
-                if self.is_sunday_or_holiday(day) and not combined_mode:
-                    model.AddExactlyOne(day_shifts[(d, day)] for d in doctors)
-                else:
-                    for d in doctors:
-                        model.Add(day_shifts[(d, day)] == 0)
-
-        # External doctors: exactly 1 shift per month (diagnostic mode)
-        for d in ext_idx_diag:
-            model.Add(sum(work[(d, day)] for day in days) == 1)
-
-        # --- Prevent same-day double (NOT wrapped — structural) ---
-        if prevent_sunhol_consecutive:
-            for d in doctors:
-                for day in days:
-                    model.Add(night_shifts[(d, day)] + day_shifts[(d, day)] <= 1)
-
-        # --- Build assumption-wrapped constraints ---
-        assumption_map: Dict[str, Dict[str, Any]] = {}  # assumption_name -> metadata
-
-        def make_assumption(group_id: str, category: str, doctor_idx: Optional[int], description_ja: str):
-            lit = model.NewBoolVar(f"assume_{group_id}")
-            assumption_map[group_id] = {
-                "literal": lit,
-                "category": category,
-                "doctor_idx": doctor_idx,
-                "doctor_name": self.doctor_names.get(doctor_idx) if doctor_idx is not None else None,
-                "description_ja": description_ja,
-            }
-            return lit
-
-        # A) Locked shifts
-        for item in self.locked_shifts:
-            if not isinstance(item, dict):
-                continue
-            doctor_idx = item.get("doctor_idx")
-            if doctor_idx is None:
-                continue
-            try:
-                d = int(doctor_idx)
-            except (TypeError, ValueError):
-                continue
-            if d < 0 or d >= self.num_doctors:
-                continue
-            day = self._parse_locked_day(item.get("date"))
-            if day is None:
-                continue
-            shift = self._normalize_shift_type(item.get("shift_type"))
-            if shift is None:
-                continue
-
-            shift_label = "当直" if shift == "night" else "日直"
-            group_id = f"locked_d{d}_day{day}_{shift}"
-            date_obj = datetime.date(self.year, self.month, day)
-            weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][date_obj.weekday()]
-            lit = make_assumption(group_id, "locked", d, f"{self.doctor_names.get(d, f'医師{d+1}')}の{self.month}/{day}（{weekday_ja}）{shift_label}ロック")
-
-            if shift == "night":
-                model.Add(night_shifts[(d, day)] == 1).OnlyEnforceIf(lit)
-            else:
-                if combined_mode and self.is_sunday_or_holiday(day):
-                    model.Add(night_shifts[(d, day)] == 1).OnlyEnforceIf(lit)
-                else:
-                    model.Add(day_shifts[(d, day)] == 1).OnlyEnforceIf(lit)
-
-        # B) Unavailable days (hard only)
-        for d, items in self.unavailable.items():
-            for item in items:
-                normalized = self._normalize_unavailable_entry(item)
-                if normalized is None:
-                    continue
-                is_soft = normalized["is_soft_penalty"] or not respect_unavailable_days
-                if is_soft:
-                    continue  # skip soft in diagnosis
-
-                day = normalized["date"]
-                shift_type = normalized["target_shift"]
-                date_obj = datetime.date(self.year, self.month, day)
-                weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][date_obj.weekday()]
-                group_id = f"unavail_d{d}_day{day}"
-                lit = make_assumption(group_id, "unavailable", d,
-                    f"{self.doctor_names.get(d, f'医師{d+1}')}の{self.month}/{day}（{weekday_ja}）不可日")
-
-                if shift_type in ["day", "all"]:
-                    model.Add(day_shifts[(d, day)] == 0).OnlyEnforceIf(lit)
-                if shift_type in ["night", "all"]:
-                    model.Add(night_shifts[(d, day)] == 0).OnlyEnforceIf(lit)
-
-        # C) Fixed weekday unavailable (hard only)
-        weekday_names_ja = ["月曜", "火曜", "水曜", "木曜", "金曜", "土曜", "日曜", "祝日(日曜以外)"]
-        for d, items in self.fixed_unavailable_weekdays.items():
-            for item in items:
-                normalized = self._normalize_fixed_weekday_entry(item)
-                if normalized is None:
-                    continue
-                is_soft = normalized["is_soft_penalty"] or not respect_unavailable_days
-                if is_soft:
-                    continue
-
-                target_dow = normalized["day_of_week"]
-                shift_type = normalized["target_shift"]
-                dow_label = weekday_names_ja[target_dow] if target_dow < len(weekday_names_ja) else f"曜日{target_dow}"
-                group_id = f"fixdow_d{d}_dow{target_dow}"
-                lit = make_assumption(group_id, "unavailable", d,
-                    f"{self.doctor_names.get(d, f'医師{d+1}')}の{dow_label}固定不可")
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], cp_model.CpModel]:
+        """Phase 1: 現在の設定すべてを仮定して解き、競合する制約群（MUS）を見つける。"""
+        engine = self._diagnosis_engine()
+        model = engine.model_with(engine.assumptions())
 
-                for day in days:
-                    if not self._matches_fixed_unavailable_weekday(day, target_dow):
-                        continue
-                    if shift_type in ["day", "all"]:
-                        model.Add(day_shifts[(d, day)] == 0).OnlyEnforceIf(lit)
-                    if shift_type in ["night", "all"]:
-                        model.Add(night_shifts[(d, day)] == 0).OnlyEnforceIf(lit)
-
-        # D) Spacing rule (global)
-        if spacing_days is not None:
-            lit = make_assumption("interval_global", "interval", None, f"勤務間隔 {spacing_days}日ルール")
-            for d in doctors:
-                for day in days:
-                    for k in range(1, spacing_days + 1):
-                        if day + k <= self.num_days:
-                            model.Add(work[(d, day)] + work[(d, day + k)] <= 1).OnlyEnforceIf(lit)
-
-        # E) Month-cross spacing
-        prev_month_worked_days, prev_last = self._build_previous_month_state()
-        if spacing_days is not None and prev_last is not None:
-            for d, prev_days_list in prev_month_worked_days.items():
-                blocked_days = []
-                for prev_day in prev_days_list:
-                    dist_to_start = (prev_last - int(prev_day)) + 1
-                    if 1 <= dist_to_start <= spacing_days:
-                        block_until = spacing_days + 1 - dist_to_start
-                        for bd in range(1, block_until + 1):
-                            if 1 <= bd <= self.num_days:
-                                blocked_days.append(bd)
-                if blocked_days:
-                    group_id = f"cross_month_d{d}"
-                    lit = make_assumption(group_id, "cross_month", d,
-                        f"{self.doctor_names.get(d, f'医師{d+1}')}の前月末勤務による月初ブロック（{min(blocked_days)}〜{max(blocked_days)}日）")
-                    for bd in blocked_days:
-                        model.Add(work[(d, bd)] == 0).OnlyEnforceIf(lit)
-
-        saturdays = [day for day in days if self.is_saturday(day)]
-        sunhol_days = [day for day in days if self.is_sunday_or_holiday(day)]
-
-        # F) Saturday night cap (per doctor)
-        if max_saturday_nights is not None:
-            for d in doctors:
-                group_id = f"sat_cap_d{d}"
-                lit = make_assumption(group_id, "cap", d,
-                    f"{self.doctor_names.get(d, f'医師{d+1}')}の土曜当直上限（月{max_saturday_nights}回）")
-                model.Add(sum(night_shifts[(d, day)] for day in saturdays) <= max_saturday_nights).OnlyEnforceIf(lit)
-
-        # G) Sun/holiday day cap (per doctor)
-        if max_sunhol_days is not None:
-            for d in doctors:
-                group_id = f"sunhol_day_cap_d{d}"
-                lit = make_assumption(group_id, "cap", d,
-                    f"{self.doctor_names.get(d, f'医師{d+1}')}の日祝日直上限（月{max_sunhol_days}回）")
-                model.Add(sum(day_shifts[(d, day)] for day in sunhol_days) <= max_sunhol_days).OnlyEnforceIf(lit)
-
-        # H) Sun/holiday total work cap (per doctor)
-        if max_sunhol_works is not None:
-            for d in doctors:
-                group_id = f"sunhol_work_cap_d{d}"
-                lit = make_assumption(group_id, "cap", d,
-                    f"{self.doctor_names.get(d, f'医師{d+1}')}の日祝合計上限（月{max_sunhol_works}回）")
-                model.Add(sum(day_shifts[(d, day)] + night_shifts[(d, day)] for day in sunhol_days) <= max_sunhol_works).OnlyEnforceIf(lit)
-
-        # I) Weekend/holiday total cap (per doctor)
-        if max_weekend_holiday_works is not None:
-            for d in doctors:
-                group_id = f"wh_cap_d{d}"
-                wh_expr = sum(
-                    day_shifts[(d, day)] + night_shifts[(d, day)]
-                    if self.is_sunday_or_holiday(day)
-                    else night_shifts[(d, day)]
-                    for day in days
-                    if self.is_sunday_or_holiday(day) or self.is_saturday(day)
-                )
-                lit = make_assumption(group_id, "cap", d,
-                    f"{self.doctor_names.get(d, f'医師{d+1}')}の土日祝合計上限（月{max_weekend_holiday_works}回）")
-                model.Add(wh_expr <= max_weekend_holiday_works).OnlyEnforceIf(lit)
-
-        # J) Score min/max (per doctor)
-        for d in doctors:
-            score_expr = 0
-            for day in days:
-                if self.is_sunday_or_holiday(day):
-                    if combined_mode:
-                        score_expr += night_shifts[(d, day)] * self.W_DAY_NIGHT
-                    else:
-                        score_expr += day_shifts[(d, day)] * self.W_SUNHOL_DAY
-                        score_expr += night_shifts[(d, day)] * self.W_SUNHOL_NIGHT
-                elif self.is_saturday(day):
-                    score_expr += night_shifts[(d, day)] * self.W_SAT_NIGHT
-                else:
-                    score_expr += night_shifts[(d, day)] * self.W_WEEKDAY_NIGHT
-
-            doc_score = model.NewIntVar(0, 2000, f"diag_score_d{d}")
-            model.Add(doc_score == score_expr)
-
-            d_min = int(round(self.min_score_by_doctor.get(d, self.score_min_float) * 10))
-            d_max = int(round(self.max_score_by_doctor.get(d, self.score_max_float) * 10))
-
-            lit_min = make_assumption(f"score_min_d{d}", "score", d,
-                f"{self.doctor_names.get(d, f'医師{d+1}')}のスコア下限（{d_min/10:.1f}点）")
-            model.Add(doc_score >= d_min).OnlyEnforceIf(lit_min)
-
-            lit_max = make_assumption(f"score_max_d{d}", "score", d,
-                f"{self.doctor_names.get(d, f'医師{d+1}')}のスコア上限（{d_max/10:.1f}点）")
-            model.Add(doc_score <= d_max).OnlyEnforceIf(lit_max)
-
-        # --- Solve with assumptions ---
-        solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = float(time_limit_seconds)
-
-        all_assumptions = [info["literal"] for info in assumption_map.values()]
-        model.AddAssumptions(all_assumptions)
-
-        status = solver.Solve(model)
+        solver, status = self._run_solver(model, time_limit_seconds)
 
         if status == cp_model.INFEASIBLE:
-            sufficient = solver.SufficientAssumptionsForInfeasibility()
-            sufficient_set = set(sufficient)
-
-            conflict_groups = []
-            for group_id, info in assumption_map.items():
-                if info["literal"].Index() in sufficient_set:
-                    conflict_groups.append({
-                        "group_id": group_id,
-                        "category": info["category"],
-                        "doctor_name": info["doctor_name"],
-                        "description_ja": info["description_ja"],
-                    })
+            conflict_groups = [
+                {
+                    "group_id": group_id,
+                    "category": info["category"],
+                    "doctor_name": info["doctor_name"],
+                    "description_ja": info["description_ja"],
+                }
+                for group_id, info in engine.groups_in_core(solver.SufficientAssumptionsForInfeasibility())
+            ]
             if conflict_groups:
-                return conflict_groups, assumption_map, model
+                return conflict_groups, engine.groups, model
             # INFEASIBLEだがsufficient_setが空 → フォールバックへ
 
         # 解けた（人手不足ではない）orタイムアウトor原因不明 → 人手不足チェックへ
-        return [], assumption_map, model
+        return [], engine.groups, model
 
     def _diagnose_try_settings(
         self,
@@ -1904,27 +2212,14 @@ class OnCallOptimizer:
         3. 組み合わせ探索: 単独で解けなかった場合、2設定の組み合わせを試す
         """
         # --- 共通: カレンダー情報 ---
-        num_wh_days = sum(
-            1 for day in range(1, self.num_days + 1)
-            if self.is_sunday_or_holiday(day) or self.is_saturday(day)
-        )
-        num_sats = sum(
-            1 for day in range(1, self.num_days + 1)
-            if self.is_saturday(day)
-        )
+        num_wh_days = len(self.calendar.weekend_days)
+        num_sats = len(self.calendar.saturdays)
 
         # --- 現在の設定値を取得 ---
-        current_interval = self._get_hard_constraint_value(
-            4, "interval_days", "min_interval_days", "spacing_days", "min_gap_days", "work_interval_days"
-        )
-        current_wh_max = self._get_hard_constraint_value(
-            None, "max_weekend_holiday_works", "weekend_holiday_work_max", "weekend_hol_work_max",
-            "max_weekend_holiday_count", "weekend_holiday_total_max", "weekend_hol_total_max", "max_shifts",
-            flag_keys=("strict_weekend_hol_max",),
-        )
-        current_sat_max = self._get_hard_constraint_value(
-            1, "max_saturday_nights", "max_sat_nights", "sat_night_max", "saturday_night_max"
-        )
+        limits = self.hard_limits()
+        current_interval = limits.spacing_days
+        current_wh_max = limits.max_weekend_holiday_works
+        current_sat_max = limits.max_saturday_nights
         # スコア上限: 全医師の max_score のうち最小値を代表値として使用
         has_score_max = bool(self.max_score_by_doctor) or self.score_max_float is not None
 
@@ -1990,68 +2285,64 @@ class OnCallOptimizer:
                 "is_score_min": True,
             })
 
+        engine = self._diagnosis_engine()
+
         def try_solve_with(
             overrides: Dict[str, Any],
             remove_score_max: bool = False,
             remove_score_min: bool = False,
+            solver: Optional[cp_model.CpSolver] = None,
+            num_workers: Optional[int] = None,
         ) -> bool:
-            """設定を変えてモデル再構築→ソルブ。"""
-            hc = dict(self.hard_constraints)
-            hc.update(overrides)
-            kwargs: Dict[str, Any] = dict(
-                num_doctors=self.num_doctors,
-                year=self.year,
-                month=self.month,
-                holidays=self.holidays,
-                unavailable=self.unavailable,
-                fixed_unavailable_weekdays=self.fixed_unavailable_weekdays,
-                prev_month_worked_days=self.prev_month_worked_days,
-                prev_month_last_day=self.prev_month_last_day,
-                previous_month_shifts=self.previous_month_shifts,
-                hard_constraints=hc,
-                locked_shifts=self.locked_shifts,
-                external_doctor_indices=self.external_doctor_indices,
+            """設定を変えた仮定で診断モデルを解く。"""
+            assumptions = engine.assumptions(
+                overrides, remove_score_min=remove_score_min, remove_score_max=remove_score_max,
+            )
+            _, status = self._run_solver(
+                engine.model_with(assumptions), time_limit_per_try, solver=solver, num_workers=num_workers,
             )
-            if remove_score_min:
-                # スコア下限を外す: min=0、上限と個別上限はそのまま
-                kwargs["score_min"] = 0.0
-                kwargs["score_max"] = self.score_max_float
-                kwargs["max_score_by_doctor"] = self.max_score_by_doctor
-            elif remove_score_max:
-                # スコア上限を外す: max=99、下限はそのまま、個別上限も全解除
-                kwargs["score_min"] = self.score_min_float
-                kwargs["score_max"] = 99.0
-                kwargs["min_score_by_doctor"] = self.min_score_by_doctor
-                kwargs["max_score_by_doctor"] = {}
-            else:
-                # 通常: 全パラメータそのまま
-                kwargs["score_min"] = self.score_min_float
-                kwargs["score_max"] = self.score_max_float
-                kwargs["min_score_by_doctor"] = self.min_score_by_doctor
-                kwargs["max_score_by_doctor"] = self.max_score_by_doctor
-            trial = OnCallOptimizer(**kwargs)
-            trial.build_model()
-            solver = cp_model.CpSolver()
-            solver.parameters.max_time_in_seconds = time_limit_per_try
-            status = solver.Solve(trial.model)
             return status in (cp_model.FEASIBLE, cp_model.OPTIMAL)
 
+        def run_trials(
+            groups: List[List[Tuple[Dict[str, Any], bool, bool]]],
+            stop_at_first_feasible: bool = False,
+        ) -> List[List[bool]]:
+            return self._run_trials_in_parallel(
+                groups,
+                lambda spec, solver, workers: try_solve_with(
+                    spec[0], remove_score_max=spec[1], remove_score_min=spec[2],
+                    solver=solver, num_workers=workers,
+                ),
+                stop_at_first_feasible=stop_at_first_feasible,
+            )
+
         # --- 単独探索 ---
         single_results: List[Dict[str, Any]] = []
         solvable_alone: List[str] = []  # 単独で解けた設定名（組み合わせ探索で除外用）
 
-        for setting in settings_to_try:
+        # Step 1: 各設定を外して解けるか（全設定を並列に試す）
+        removable_results = run_trials([
+            [(s["removed_override"], s.get("is_score_max", False), s.get("is_score_min", False))]
+            for s in settings_to_try
+        ])
+        # Step 2: 外して解けた設定の search_range を並列に試し、最小変更値を決める
+        searched = [
+            s for s, (ok,) in zip(settings_to_try, removable_results)
+            if ok and not s.get("is_score_max") and not s.get("is_score_min")
+        ]
+        search_results = run_trials(
+            [[({s["name"]: v}, False, False) for v in s["search_range"]] for s in searched],
+            stop_at_first_feasible=True,
+        )
+        search_results_by_name = {s["name"]: r for s, r in zip(searched, search_results)}
+
+        for setting, (removable_ok,) in zip(settings_to_try, removable_results):
             name = setting["name"]
             current = setting["current"]
             is_score_max = setting.get("is_score_max", False)
             is_score_min = setting.get("is_score_min", False)
 
-            # Step 1: 設定を外して解けるか
-            if not try_solve_with(
-                setting["removed_override"],
-                remove_score_max=is_score_max,
-                remove_score_min=is_score_min,
-            ):
+            if not removable_ok:
                 continue  # この設定を外しても解けない → スキップ
 
             solvable_alone.append(name)
@@ -2077,10 +2368,10 @@ class OnCallOptimizer:
                 })
                 continue
 
-            # Step 2: 最小変更値を探索
+            # 最小変更値: search_range の先頭から見て最初に解けた値
             found_value = setting.get("removed_override", {}).get(name)
-            for try_value in setting["search_range"]:
-                if try_solve_with({name: try_value}):
+            for try_value, ok in zip(setting["search_range"], search_results_by_name[name]):
+                if ok:
                     found_value = try_value
                     break
 
@@ -2107,27 +2398,90 @@ class OnCallOptimizer:
         # --- 組み合わせ探索（単独で解けなかった場合のみ） ---
         if not single_results:
             unsolved = [s for s in settings_to_try if s["name"] not in solvable_alone]
-            for i in range(len(unsolved)):
-                for j in range(i + 1, len(unsolved)):
-                    s1, s2 = unsolved[i], unsolved[j]
-                    is_smax_1 = s1.get("is_score_max", False)
-                    is_smax_2 = s2.get("is_score_max", False)
-                    is_smin_1 = s1.get("is_score_min", False)
-                    is_smin_2 = s2.get("is_score_min", False)
-                    combined_override = {}
-                    combined_override.update(s1["removed_override"])
-                    combined_override.update(s2["removed_override"])
-                    if try_solve_with(combined_override, remove_score_max=is_smax_1 or is_smax_2, remove_score_min=is_smin_1 or is_smin_2):
-                        single_results.append({
-                            "group_id": f"setting_combo_{s1['name']}_{s2['name']}",
-                            "category": "admin_setting",
-                            "doctor_name": None,
-                            "description_ja": f"{s1['label']}と{s2['label']}を両方調整すれば解ける可能性があります",
-                            "is_admin_setting": True,
-                        })
+            pairs = [
+                (unsolved[i], unsolved[j])
+                for i in range(len(unsolved)) for j in range(i + 1, len(unsolved))
+            ]
+            combo_specs = []
+            for s1, s2 in pairs:
+                combined_override = {}
+                combined_override.update(s1["removed_override"])
+                combined_override.update(s2["removed_override"])
+                combo_specs.append([(
+                    combined_override,
+                    s1.get("is_score_max", False) or s2.get("is_score_max", False),
+                    s1.get("is_score_min", False) or s2.get("is_score_min", False),
+                )])
+            for (s1, s2), (ok,) in zip(pairs, run_trials(combo_specs)):
+                if ok:
+                    single_results.append({
+                        "group_id": f"setting_combo_{s1['name']}_{s2['name']}",
+                        "category": "admin_setting",
+                        "doctor_name": None,
+                        "description_ja": f"{s1['label']}と{s2['label']}を両方調整すれば解ける可能性があります",
+                        "is_admin_setting": True,
+                    })
 
         return single_results
 
+    def _run_trials_in_parallel(
+        self,
+        groups: List[List[Any]],
+        run: Callable[[Any, cp_model.CpSolver, int], bool],
+        stop_at_first_feasible: bool = False,
+    ) -> List[List[bool]]:
+        """独立した試行ソルブ groups[i][k] をスレッドで並列に実行し、同じ形で可否を返す。
+
+        CP-SAT は求解中 GIL を手放すのでスレッドで並列になる。割り当てコアを試行数で分け、
+        合計が self.num_workers と実コア数を超えないようにする（制限時間は壁時計なので、
+        コアを取り合うと本来解ける試行が時間切れになる）。
+        stop_at_first_feasible=True のとき、各グループで「先頭から見て最初に解ける試行」が
+        確定した時点で、それより後ろの試行は打ち切る（逐次に先頭から試すのと同じ答えになる）。
+        """
+        num_trials = sum(len(g) for g in groups)
+        if num_trials == 0:
+            return [[] for _ in groups]
+        cpu_count = os.cpu_count() or 1
+        total_cores = max(1, min(self.num_workers or cpu_count, cpu_count))
+        parallelism = min(num_trials, total_cores)
+        trial_workers = max(1, total_cores // parallelism)
+
+        results: List[List[Optional[bool]]] = [[None] * len(g) for g in groups]
+        solvers = [[cp_model.CpSolver() for _ in g] for g in groups]
+        skipped = [[False] * len(g) for g in groups]
+
+        def run_one(gi: int, k: int) -> Tuple[int, int, bool]:
+            if skipped[gi][k]:
+                return gi, k, False
+            return gi, k, run(groups[gi][k], solvers[gi][k], trial_workers)
+
+        def settle(gi: int) -> None:
+            for k, ok in enumerate(results[gi]):
+                if ok is None:
+                    return
+                if ok:
+                    for later in range(k + 1, len(groups[gi])):
+                        skipped[gi][later] = True
+                        solvers[gi][later].StopSearch()
+                    return
+
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = [
+                executor.submit(run_one, gi, k)
+                for gi, group in enumerate(groups) for k in range(len(group))
+            ]
+            try:
+                for future in as_completed(futures):
+                    gi, k, ok = future.result()
+                    results[gi][k] = ok
+                    if stop_at_first_feasible:
+                        settle(gi)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return [[bool(ok) for ok in group] for group in results]
+
     def _diagnose_minimum_unavail_removals(
         self,
         conflict_groups: List[Dict[str, Any]],
@@ -2136,131 +2490,34 @@ class OnCallOptimizer:
     ) -> List[Dict[str, Any]]:
         """競合している不可日の中から、修正案を最大max_sets個検証して返す。
 
-        CP-SATで「残すか外すか」の変数を付け、外す数を最小化する。
-        1つ見つけたらその組み合わせを除外して再ソルブし、次の修正案を探す。
+        診断モデルで競合不可日のリテラルだけを仮定から外し（残すか外すかをソルバーに任せ）、
+        残す数を最大化する。1つ見つけたらその組み合わせを除外して再ソルブし、次の修正案を探す。
         """
-        # 1. conflict_groupsから不可日関連を抽出・パース
-        removable: List[Dict[str, Any]] = []
-        for g in conflict_groups:
-            gid = g["group_id"]
-            if gid.startswith("unavail_d"):
-                parts = gid.replace("unavail_d", "").split("_day")
-                if len(parts) != 2:
-                    continue
-                try:
-                    d_idx = int(parts[0])
-                    day = int(parts[1])
-                except ValueError:
-                    continue
-                shift = "all"
-                for item in self.unavailable.get(d_idx, []):
-                    norm = self._normalize_unavailable_entry(item)
-                    if norm and norm["date"] == day:
-                        shift = norm["target_shift"]
-                        break
-                removable.append({"type": "date", "d_idx": d_idx, "day": day, "shift": shift, "group": g})
-            elif gid.startswith("fixdow_d"):
-                parts = gid.replace("fixdow_d", "").split("_dow")
-                if len(parts) != 2:
-                    continue
-                try:
-                    d_idx = int(parts[0])
-                    dow = int(parts[1])
-                except ValueError:
-                    continue
-                shift = "all"
-                for item in self.fixed_unavailable_weekdays.get(d_idx, []):
-                    norm = self._normalize_fixed_weekday_entry(item)
-                    if norm and norm["day_of_week"] == dow:
-                        shift = norm["target_shift"]
-                        break
-                removable.append({"type": "dow", "d_idx": d_idx, "dow": dow, "shift": shift, "group": g})
+        engine = self._diagnosis_engine()
 
+        # 1. conflict_groupsから不可日（日付・固定曜日）を抽出
+        removable = [
+            g for g in conflict_groups
+            if g["group_id"] in engine.groups and engine.groups[g["group_id"]]["category"] == "unavailable"
+        ]
         if not removable:
             return []
 
-        # 2. 競合不可日を除いた unavailable / fixed_weekdays を作成
-        remove_dates: set = set()
-        remove_dows: set = set()
-        for entry in removable:
-            if entry["type"] == "date":
-                remove_dates.add((entry["d_idx"], entry["day"]))
-            else:
-                remove_dows.add((entry["d_idx"], entry["dow"]))
-
-        modified_unavail: Dict[int, list] = {}
-        for d, items in self.unavailable.items():
-            filtered = []
-            for item in items:
-                norm = self._normalize_unavailable_entry(item)
-                if norm is None:
-                    continue
-                if (d, norm["date"]) in remove_dates:
-                    continue
-                filtered.append(item)
-            modified_unavail[d] = filtered
-
-        modified_fixed: Dict[int, list] = {}
-        for d, items in self.fixed_unavailable_weekdays.items():
-            filtered = []
-            for item in items:
-                norm = self._normalize_fixed_weekday_entry(item)
-                if norm is None:
-                    continue
-                if (d, norm["day_of_week"]) in remove_dows:
-                    continue
-                filtered.append(item)
-            modified_fixed[d] = filtered
-
-        # 3. 競合不可日なしの試行モデルを構築
-        trial = OnCallOptimizer(
-            num_doctors=self.num_doctors,
-            year=self.year,
-            month=self.month,
-            holidays=self.holidays,
-            unavailable=modified_unavail,
-            fixed_unavailable_weekdays=modified_fixed,
-            prev_month_worked_days=self.prev_month_worked_days,
-            prev_month_last_day=self.prev_month_last_day,
-            previous_month_shifts=self.previous_month_shifts,
-            hard_constraints=dict(self.hard_constraints),
-            locked_shifts=self.locked_shifts,
-        )
-        trial.build_model()
-
-        # 4. 除いた不可日を「残す(keep=1) or 外す(keep=0)」の条件付きで追加
-        keep_vars: List[tuple] = []
-        for entry in removable:
-            keep = trial.model.NewBoolVar(f"keep_{entry['group']['group_id']}")
-            keep_vars.append((keep, entry))
-            d = entry["d_idx"]
-            shift = entry["shift"]
-
-            if entry["type"] == "date":
-                day = entry["day"]
-                if shift in ("night", "all"):
-                    trial.model.Add(trial.night_shifts[(d, day)] == 0).OnlyEnforceIf(keep)
-                if shift in ("day", "all"):
-                    trial.model.Add(trial.day_shifts[(d, day)] == 0).OnlyEnforceIf(keep)
-            elif entry["type"] == "dow":
-                dow = entry["dow"]
-                for day in range(1, self.num_days + 1):
-                    if self._matches_fixed_unavailable_weekday(day, dow):
-                        if shift in ("night", "all"):
-                            trial.model.Add(trial.night_shifts[(d, day)] == 0).OnlyEnforceIf(keep)
-                        if shift in ("day", "all"):
-                            trial.model.Add(trial.day_shifts[(d, day)] == 0).OnlyEnforceIf(keep)
-
-        # 5. 修正案を最大max_sets個探索（前の解を除外しながら繰り返す）
-        trial.model.Maximize(sum(k for k, _ in keep_vars))
+        # 2. 競合不可日以外は現在の設定のまま仮定し、競合不可日は keep=1 のときだけ有効にする
+        model = engine.model_with(engine.assumptions(exclude_groups=[g["group_id"] for g in removable]))
+        keep_vars: List[Tuple[cp_model.IntVar, Dict[str, Any]]] = []
+        for g in removable:
+            keep = model.NewBoolVar(f"keep_{g['group_id']}")
+            model.AddBoolAnd(engine.groups[g["group_id"]]["literals"]).OnlyEnforceIf(keep)
+            keep_vars.append((keep, g))
+
+        # 3. 修正案を最大max_sets個探索（前の解を除外しながら繰り返す）
+        model.Maximize(sum(k for k, _ in keep_vars))
 
         all_results: List[Dict[str, Any]] = []
-        excluded_sets: List[List[int]] = []  # 除外済みセットのインデックスリスト
 
         for set_num in range(1, max_sets + 1):
-            solver = cp_model.CpSolver()
-            solver.parameters.max_time_in_seconds = time_limit
-            status = solver.Solve(trial.model)
+            solver, status = self._run_solver(model, time_limit)
 
             if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
                 break
@@ -2276,8 +2533,7 @@ class OnCallOptimizer:
 
             set_size = len(removed_indices)
             for idx in removed_indices:
-                _, entry = keep_vars[idx]
-                g = entry["group"]
+                _, g = keep_vars[idx]
                 all_results.append({
                     "group_id": g["group_id"],
                     "category": "unavailable_verified",
@@ -2290,9 +2546,7 @@ class OnCallOptimizer:
 
             # この組み合わせを除外: 「このセットの全員がkeep=0」を禁止
             # = 少なくとも1人はkeep=1にする
-            excluded_keeps = [keep_vars[idx][0] for idx in removed_indices]
-            trial.model.Add(sum(excluded_keeps) >= 1)
-            excluded_sets.append(removed_indices)
+            model.Add(sum(keep_vars[idx][0] for idx in removed_indices) >= 1)
 
         return all_results
 
@@ -2322,7 +2576,7 @@ class OnCallOptimizer:
     def _build_human_insights(self) -> List[str]:
         """Build statistical observations that a human scheduler would notice."""
         insights: List[str] = []
-        days = range(1, self.num_days + 1)
+        days = self.calendar.days
         num_ext = len(self.external_doctor_indices)
         num_int = self.num_doctors - num_ext
 
@@ -2331,33 +2585,20 @@ class OnCallOptimizer:
             insights.append(f"外部枠: {num_ext}回/月（常勤{num_int}名が残り{self.num_days - num_ext}枠を担当）")
 
         # 1) Same-day unavailable concentration (deduplicate per doctor per day)
-        day_unavail_doctors: Dict[int, set] = {}
-        for d, items in self.unavailable.items():
-            name = self.doctor_names.get(d, f"医師{d+1}")
-            for item in items:
-                normalized = self._normalize_unavailable_entry(item)
-                if normalized is None or normalized["is_soft_penalty"]:
-                    continue
-                day_unavail_doctors.setdefault(normalized["date"], set()).add(name)
-        # Also include fixed weekday unavailable (expand to actual dates)
-        for d, items in self.fixed_unavailable_weekdays.items():
-            name = self.doctor_names.get(d, f"医師{d+1}")
-            for item in items:
-                normalized = self._normalize_fixed_weekday_entry(item)
-                if normalized is None or normalized["is_soft_penalty"]:
-                    continue
-                for day in days:
-                    if self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                        day_unavail_doctors.setdefault(day, set()).add(name)
+        # ハード不可（日付指定・固定不可曜日、日直/当直どちらか）のある医師×日 [医師, 日-1]
+        hard_unavail = self.availability.blocked[:, :, :, KIND_HARD].any(axis=2)
+        unavail_counts = hard_unavail.sum(axis=0)
 
         # Only show days where >60% of internal doctors are unavailable (truly critical), top 5
         threshold = max(2, num_int * 0.6)
         critical_days = []
-        for day in sorted(day_unavail_doctors.keys()):
-            names = sorted(day_unavail_doctors[day])
+        for day in days:
+            if unavail_counts[day - 1] < threshold:
+                continue
+            # 同名の医師は1人として数える
+            names = {self.doctor_names.get(int(d), f"医師{int(d)+1}") for d in np.flatnonzero(hard_unavail[:, day - 1])}
             if len(names) >= threshold:
-                date_obj = datetime.date(self.year, self.month, day)
-                weekday_ja = ["月", "火", "水", "木", "金", "土", "日"][date_obj.weekday()]
+                weekday_ja = self.calendar.weekday_ja(day)
                 holiday_tag = "・祝" if self.is_holiday(day) else ""
                 critical_days.append((len(names), day,
                     f"{self.month}/{day}（{weekday_ja}{holiday_tag}）に常勤{num_int}人中{len(names)}人が不可"
@@ -2369,20 +2610,7 @@ class OnCallOptimizer:
 
         # 2) Doctors with very high unavailable ratio (>60%), top 3
         high_unavail_doctors: List[Tuple[float, int, int]] = []
-        for d in range(self.num_doctors):
-            unavail_days: set = set()
-            for item in self.unavailable.get(d, []):
-                normalized = self._normalize_unavailable_entry(item)
-                if normalized and not normalized["is_soft_penalty"]:
-                    unavail_days.add(normalized["date"])
-            for item in self.fixed_unavailable_weekdays.get(d, []):
-                normalized = self._normalize_fixed_weekday_entry(item)
-                if normalized and not normalized["is_soft_penalty"]:
-                    for day in days:
-                        if self._matches_fixed_unavailable_weekday(day, normalized["day_of_week"]):
-                            unavail_days.add(day)
-
-            hard_count = len(unavail_days)
+        for d, hard_count in enumerate(hard_unavail.sum(axis=1).tolist()):
             ratio = hard_count / self.num_days if self.num_days > 0 else 0
             if ratio > 0.60:
                 high_unavail_doctors.append((ratio, d, hard_count))
@@ -2399,15 +2627,10 @@ class OnCallOptimizer:
             insights.append(f"祝日が{len(self.holidays)}日（通常月は1〜2日）")
 
         # 4) Weekend/holiday slot pressure
-        sunhol_days = [day for day in days if self.is_sunday_or_holiday(day)]
-        saturdays = [day for day in days if self.is_saturday(day)]
-        total_wh_slots = len(sunhol_days) * 2 + len(saturdays)  # day+night for sunhol, night for sat
-
-        max_wh = self._get_hard_constraint_value(
-            None, "max_weekend_holiday_works", "weekend_holiday_work_max", "weekend_hol_work_max",
-            "max_weekend_holiday_count", "weekend_holiday_total_max", "weekend_hol_total_max", "max_shifts",
-            flag_keys=("strict_weekend_hol_max",),
-        )
+        limits = self.hard_limits()
+        total_wh_slots = len(self.calendar.sunhol_days) * 2 + len(self.calendar.saturdays)  # day+night for sunhol, night for sat
+
+        max_wh = limits.max_weekend_holiday_works
         if max_wh is not None:
             capacity = max_wh * self.num_doctors
             if capacity < total_wh_slots:
@@ -2422,22 +2645,18 @@ class OnCallOptimizer:
             insights.append(f"スコア許容幅が{score_min}〜{score_max}（幅{score_max - score_min:.1f}点）と狭い")
 
         # 6) Fixed weekday unavailable concentration (deduplicate per doctor per weekday)
-        dow_doctors: Dict[int, set] = {}
-        for d, items in self.fixed_unavailable_weekdays.items():
-            name = self.doctor_names.get(d, f"医師{d+1}")
-            for item in items:
-                normalized = self._normalize_fixed_weekday_entry(item)
-                if normalized and not normalized["is_soft_penalty"]:
-                    dow_doctors.setdefault(normalized["day_of_week"], set()).add(name)
+        # ハード指定の固定不可曜日 [医師, 曜日]
+        hard_rules = self.availability.weekday_rules[:, :, :, KIND_HARD].any(axis=2)
         weekday_names = ["月曜", "火曜", "水曜", "木曜", "金曜", "土曜", "日曜"]
-        for dow, names in sorted(dow_doctors.items()):
-            if dow < 7 and len(names) > self.num_doctors * 0.5:
+        for dow in range(7):
+            names = {self.doctor_names.get(int(d), f"医師{int(d)+1}") for d in np.flatnonzero(hard_rules[:, dow])}
+            if len(names) > self.num_doctors * 0.5:
                 insights.append(
                     f"{weekday_names[dow]}の当直に{self.num_doctors}人中{len(names)}人が固定不可（外来日？）"
                 )
 
         # 7) Spacing vs doctor count margin
-        spacing_days = self._get_hard_constraint_value(4, "interval_days", "min_interval_days", "spacing_days", "min_gap_days", "work_interval_days")
+        spacing_days = limits.spacing_days
         if spacing_days is not None and spacing_days > 0:
             import math
             max_per_doc = math.ceil(self.num_days / (spacing_days + 1))
@@ -4,18 +4,20 @@ from datetime import date
 from typing import Dict, Iterable
 from uuid import UUID
 
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import uuid as _uuid
 
-from models.shift import ShiftAssignment
-from services.holiday_service import get_jp_holidays_for_year
-from services.settings_service import get_custom_holidays
-
-
-DAY_SHIFT_TYPES = {"day", "day_shift", "日直"}
-NIGHT_SHIFT_TYPES = {"night", "night_shift", "当直"}
+from services.holiday_service import load_holiday_calendar
+from services.score_summary import (
+    DAY_SHIFT_TYPES,
+    DEFAULT_SHIFT_SCORES,
+    NIGHT_SHIFT_TYPES,
+    MonthCounts,
+    load_month_summaries,
+    summary_score,
+    total_by_doctor,
+)
 
 
 def _shift_month(year: int, month: int, delta_months: int) -> tuple[int, int]:
@@ -23,23 +25,6 @@ def _shift_month(year: int, month: int, delta_months: int) -> tuple[int, int]:
     return absolute_month // 12, (absolute_month % 12) + 1
 
 
-def _parse_custom_dates(
-    values: Iterable[str],
-    *,
-    start_date: date,
-    end_date: date,
-) -> set[date]:
-    parsed: set[date] = set()
-    for raw in values:
-        try:
-            parsed_date = date.fromisoformat(str(raw))
-        except ValueError:
-            continue
-        if start_date <= parsed_date < end_date:
-            parsed.add(parsed_date)
-    return parsed
-
-
 async def build_holiday_dates(
     db: AsyncSession,
     *,
@@ -47,37 +32,8 @@ async def build_holiday_dates(
     start_date: date,
     end_date: date,
 ) -> set[date]:
-    holiday_dates: set[date] = set()
-    for year in range(start_date.year, end_date.year + 1):
-        holiday_dates.update(
-            item.date
-            for item in get_jp_holidays_for_year(year)
-            if start_date <= item.date < end_date
-        )
-
-        custom = await get_custom_holidays(db, hospital_id, year)
-        manual = _parse_custom_dates(
-            custom.get("manual_holidays", []),
-            start_date=start_date,
-            end_date=end_date,
-        )
-        ignored = _parse_custom_dates(
-            custom.get("ignored_holidays", []),
-            start_date=start_date,
-            end_date=end_date,
-        )
-        holiday_dates.update(manual)
-        holiday_dates.difference_update(ignored)
-
-    return holiday_dates
-
-
-DEFAULT_SHIFT_SCORES = {
-    "weekday_night": 1.0,
-    "saturday_night": 1.5,
-    "holiday_day": 0.5,
-    "holiday_night": 1.0,
-}
+    calendar = await load_holiday_calendar(db, hospital_id, start_date, end_date)
+    return calendar.holidays
 
 
 def score_historical_shift(
@@ -135,7 +91,7 @@ def apply_history_score_baseline(
     return corrected
 
 
-async def build_past_total_scores(
+async def load_history_totals(
     db: AsyncSession,
     *,
     hospital_id: _uuid.UUID,
@@ -143,64 +99,48 @@ async def build_past_total_scores(
     target_year: int,
     target_month: int,
     history_months: int = 2,
-    shift_scores: dict[str, float] | None = None,
-) -> Dict[UUID, float]:
+) -> Dict[UUID, MonthCounts]:
+    """対象月の直前 history_months か月分の回数を医師ごとに合計する（doctor_month_summaries を読む）"""
     doctor_id_list = list(dict.fromkeys(doctor_ids))
     if not doctor_id_list:
         return {}
 
-    start_year, start_month = _shift_month(target_year, target_month, -history_months)
-    history_start = date(start_year, start_month, 1)
-    target_month_start = date(target_year, target_month, 1)
-
-    holiday_dates = await build_holiday_dates(
+    summaries = await load_month_summaries(
         db,
-        hospital_id=hospital_id,
-        start_date=history_start,
-        end_date=target_month_start,
+        hospital_id,
+        _shift_month(target_year, target_month, -history_months),
+        (target_year, target_month),
+        doctor_ids=doctor_id_list,
     )
+    totals = total_by_doctor(summaries)
+    return {doctor_id: totals.get(doctor_id, MonthCounts()) for doctor_id in doctor_id_list}
+
+
+def past_total_scores_from_totals(
+    totals: Dict[UUID, MonthCounts],
+    shift_scores: dict[str, float] | None = None,
+) -> Dict[UUID, float]:
+    raw_scores = {doctor_id: summary_score(counts, shift_scores) for doctor_id, counts in totals.items()}
+    history_counts = {doctor_id: counts.shift_count for doctor_id, counts in totals.items()}
+    return apply_history_score_baseline(raw_scores, history_counts)
 
-    stmt = (
-        select(
-            ShiftAssignment.doctor_id,
-            ShiftAssignment.date,
-            ShiftAssignment.shift_type,
-        )
-        .where(
-            ShiftAssignment.doctor_id.in_(doctor_id_list),
-            ShiftAssignment.date >= history_start,
-            ShiftAssignment.date < target_month_start,
-        )
-        .order_by(ShiftAssignment.date, ShiftAssignment.doctor_id)
+
+async def build_past_total_scores(
+    db: AsyncSession,
+    *,
+    hospital_id: _uuid.UUID,
+    doctor_ids: Iterable[UUID],
+    target_year: int,
+    target_month: int,
+    history_months: int = 2,
+    shift_scores: dict[str, float] | None = None,
+) -> Dict[UUID, float]:
+    totals = await load_history_totals(
+        db,
+        hospital_id=hospital_id,
+        doctor_ids=doctor_ids,
+        target_year=target_year,
+        target_month=target_month,
+        history_months=history_months,
     )
-    result = await db.execute(stmt)
-
-    raw_scores: Dict[UUID, float] = {doctor_id: 0.0 for doctor_id in doctor_id_list}
-    history_counts: Dict[UUID, int] = {doctor_id: 0 for doctor_id in doctor_id_list}
-
-    # Collect all shifts, then detect combined holidays
-    all_shifts = result.all()
-
-    # Build a set of (doctor_id, date) that have day shifts
-    day_shift_keys: set[tuple[UUID, date]] = set()
-    for doctor_id, shift_date, shift_type in all_shifts:
-        normalized = str(shift_type).strip().lower()
-        if normalized in DAY_SHIFT_TYPES or shift_type in DAY_SHIFT_TYPES:
-            day_shift_keys.add((doctor_id, shift_date))
-
-    for doctor_id, shift_date, shift_type in all_shifts:
-        history_counts[doctor_id] += 1
-        # Detect combined: night on holiday without a day shift for same doctor/date
-        normalized = str(shift_type).strip().lower()
-        is_night = normalized in NIGHT_SHIFT_TYPES or shift_type in NIGHT_SHIFT_TYPES
-        is_sunhol = shift_date.weekday() == 6 or shift_date in holiday_dates
-        is_combined = is_night and is_sunhol and (doctor_id, shift_date) not in day_shift_keys
-        raw_scores[doctor_id] += score_historical_shift(
-            shift_date=shift_date,
-            shift_type=shift_type,
-            holiday_dates=holiday_dates,
-            shift_scores=shift_scores,
-            is_combined_holiday=is_combined,
-        )
-
-    return apply_history_score_baseline(raw_scores, history_counts)
\ No newline at end of file
+    return past_total_scores_from_totals(totals, shift_scores)
@@ -0,0 +1,158 @@
+"""大人数の当直表の初期解（貪欲法による構築）
+
+医師数が多いと CP-SAT は presolve と最初の実行可能解までに時間がかかる（150名で数秒〜十数秒）。
+大人数モードでは、先にここで全枠を貪欲に埋めた解を作り、CP-SAT にはその解から改善させる。
+
+枠は土日祝（土曜当直・日祝の日直/当直）を先に、平日の当直を後に、それぞれ候補の少ない枠から埋める。
+各枠には、ハード制約（不可日・勤務間隔・前月跨ぎ・回数上限・スコア上限・外部医師の確定日と月1回）を
+満たす医師のうち、ソフト不可でない・スコア下限に届いていない・その種類の勤務（過去分込み）が少ない・
+スコア（過去分込み）が低い順に選ぶ。スコア下限など貪欲に守れない制約は、構築後の CP-SAT で確かめる。
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from services.availability import KIND_SOFT, SHIFT_NAMES
+from services.constraint_builder import month_cross_blocks
+
+if TYPE_CHECKING:
+    from services.optimizer import OnCallOptimizer
+
+
+def _slot_weight(opt: "OnCallOptimizer", day: int, shift: str) -> int:
+    cal = opt.calendar
+    weights = opt.shift_weights
+    if cal.is_sunday_or_holiday(day):
+        if cal.combined_mode:
+            return weights.day_night
+        return weights.sunhol_day if shift == "day" else weights.sunhol_night
+    if cal.is_saturday(day):
+        return weights.sat_night
+    return weights.weekday_night
+
+
+def greedy_assignment(opt: "OnCallOptimizer") -> Dict[Tuple[str, int], int]:
+    """全枠を貪欲に埋めた割当（(shift, day) -> 医師番号）。候補のいない枠は含めない"""
+    cal = opt.calendar
+    limits = opt.hard_limits()
+    availability = opt.availability
+    spacing = limits.spacing_days
+    externals = opt.external_doctor_indices
+    prev_month_worked_days, prev_last = opt._build_previous_month_state()
+    cross_blocks = month_cross_blocks(prev_month_worked_days, prev_last, spacing, opt.num_days)
+
+    work_days: Dict[int, List[int]] = {d: [] for d in range(opt.num_doctors)}
+    score = [0] * opt.num_doctors
+    sat_nights = [0] * opt.num_doctors
+    sunhol_days = [0] * opt.num_doctors
+    sunhol_works = [0] * opt.num_doctors
+    bounds = [opt._score_bounds(d) for d in range(opt.num_doctors)]
+    past_score = [int(round(opt.past_total_scores.get(d, 0.0) * 10)) for d in range(opt.num_doctors)]
+
+    def ext_target(day: int, shift: str) -> bool:
+        target = opt.external_fixed_dates.get(day) if externals else None
+        return target in ("all", shift)
+
+    def weekend_count(d: int) -> int:
+        return sat_nights[d] + sunhol_works[d]
+
+    def assign(d: int, day: int, shift: str) -> None:
+        assignment[(shift, day)] = d
+        work_days[d].append(day)
+        score[d] += _slot_weight(opt, day, shift)
+        if cal.is_sunday_or_holiday(day):
+            sunhol_works[d] += 1
+            if shift == "day":
+                sunhol_days[d] += 1
+        elif cal.is_saturday(day) and shift == "night":
+            sat_nights[d] += 1
+
+    def allowed(d: int, day: int, shift: str) -> bool:
+        if d in externals:
+            if work_days[d]:
+                return False
+        elif ext_target(day, shift):
+            return False
+        if limits.respect_unavailable_days and availability.is_hard_blocked(d, day, shift):
+            return False
+        if day in cross_blocks.get(d, {}):
+            return False
+        if any(abs(day - other) <= (spacing or 0) for other in work_days[d]):
+            return False
+        if d not in externals and score[d] + _slot_weight(opt, day, shift) > bounds[d][1]:
+            return False
+        sunhol = cal.is_sunday_or_holiday(day)
+        saturday_night = cal.is_saturday(day) and shift == "night"
+        if saturday_night and limits.max_saturday_nights is not None and sat_nights[d] >= limits.max_saturday_nights:
+            return False
+        if sunhol and shift == "day" and limits.max_sunhol_days is not None and sunhol_days[d] >= limits.max_sunhol_days:
+            return False
+        if sunhol and limits.max_sunhol_works is not None and sunhol_works[d] >= limits.max_sunhol_works:
+            return False
+        if (sunhol or saturday_night) and limits.max_weekend_holiday_works is not None \
+                and weekend_count(d) >= limits.max_weekend_holiday_works:
+            return False
+        return True
+
+    def preference(d: int, day: int, shift: str, weekend: bool) -> Tuple[int, ...]:
+        soft = bool(availability.blocked[d, day - 1, SHIFT_NAMES.index(shift), KIND_SOFT])
+        if d in externals:
+            # 外部医師は月1回ちょうど。平日の枠で先に使い切り、土日祝は常勤がいなければ
+            return (soft, 2 if weekend else 0, 0, 0, 0, d)
+        below_min = max(0, bounds[d][0] - score[d])
+        if not weekend:
+            category = 0
+        elif cal.is_saturday(day) and shift == "night":
+            category = sat_nights[d] + opt._get_past(opt.past_sat_counts, d)
+        else:
+            category = sunhol_works[d] + opt._get_past(opt.past_sunhol_counts, d)
+        return (soft, 1, -below_min, category, score[d] + past_score[d], d)
+
+    assignment: Dict[Tuple[str, int], int] = {}
+    for d, day, shift in opt._iter_locked_shifts():
+        if cal.combined_mode and cal.is_sunday_or_holiday(day):
+            shift = "night"
+        if (shift, day) not in assignment:
+            assign(d, day, shift)
+    locked = set(assignment)
+
+    def candidates(slot: Tuple[int, str]) -> List[int]:
+        day, shift = slot
+        pool = externals if ext_target(day, shift) else range(opt.num_doctors)
+        return [d for d in pool if allowed(d, day, shift)]
+
+    slots = [(day, "night") for day in cal.days] + [(day, "day") for day in cal.days if cal.has_day_slot(day)]
+    weekend_slots = [s for s in slots if s[0] in cal.weekend_days]
+    weekday_slots = [s for s in slots if s[0] not in cal.weekend_days]
+    for group, weekend in ((weekend_slots, True), (weekday_slots, False)):
+        # 候補の少ない枠から（外部医師の確定日は外部医師だけなので先に埋まる）
+        pending = [s for s in group if (s[1], s[0]) not in assignment]
+        pending.sort(key=lambda s: (len(candidates(s)), s))
+        for day, shift in pending:
+            if (shift, day) in assignment:
+                continue
+            pool = candidates((day, shift))
+            if not pool:
+                continue
+            best = min(pool, key=lambda d: preference(d, day, shift, weekend))
+            assign(best, day, shift)
+
+    # 平日の枠で使い切れなかった外部医師は、内部医師の入っている平日の当直と入れ替える
+    for d in sorted(externals):
+        if work_days[d]:
+            continue
+        for day in sorted(cal.days, key=lambda day: day in cal.weekend_days):
+            current = assignment.get(("night", day))
+            if current is None or current in externals or ("night", day) in locked:
+                continue
+            if ext_target(day, "night") or not allowed(d, day, "night"):
+                continue
+            work_days[current].remove(day)
+            score[current] -= _slot_weight(opt, day, "night")
+            if cal.is_sunday_or_holiday(day):
+                sunhol_works[current] -= 1
+            elif cal.is_saturday(day):
+                sat_nights[current] -= 1
+            assign(d, day, "night")
+            break
+    return assignment
@@ -0,0 +1,104 @@
+"""確定シフト（shift_assignments）の一括書き込み
+
+月の保存は「全削除して1枠ずつ ORM で INSERT」ではなく、今の月の行との差分を取り、
+削除・更新・追加をそれぞれ1文（複数行の DELETE / UPDATE ... FROM (VALUES ...) / INSERT）で適用する。
+スケジュール保存・画像取り込み・データ引き継ぎはすべてここを通す。
+"""
+from __future__ import annotations
+
+import datetime
+import uuid
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import column, delete, insert, select, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.shift import ShiftAssignment
+
+# 日直として扱う shift_type（保存は "日直"、画像取り込みは "day"）。それ以外は当直
+DAY_SHIFT_VALUES = {"日直", "day", "day_shift"}
+
+# (日付, shift_type, 医師ID)
+AssignmentRow = Tuple[datetime.date, str, uuid.UUID]
+
+
+def _slot(date: datetime.date, shift_type: str) -> Tuple[datetime.date, str]:
+    return date, "day" if shift_type in DAY_SHIFT_VALUES else "night"
+
+
+async def bulk_insert_assignments(
+    db: AsyncSession, *, hospital_id: uuid.UUID, rows: Iterable[AssignmentRow]
+) -> int:
+    """シフトを1文の複数行 INSERT で追加する。追加した行数を返す"""
+    payload = [
+        {"id": uuid.uuid4(), "hospital_id": hospital_id, "date": date, "shift_type": shift_type, "doctor_id": doctor_id}
+        for date, shift_type, doctor_id in rows
+    ]
+    if payload:
+        await db.execute(insert(ShiftAssignment).values(payload))
+    return len(payload)
+
+
+async def replace_month_assignments(
+    db: AsyncSession,
+    *,
+    hospital_id: uuid.UUID,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    rows: Iterable[AssignmentRow],
+) -> Dict[str, int]:
+    """病院の [start_date, end_date] のシフトを rows に置き換える（差分だけ書く。コミットは呼び出し側）
+
+    枠は (日付, 日直/当直) で突き合わせ、医師が同じ枠はそのまま、違う枠は doctor_id を更新、
+    rows にない枠（と同じ枠の重複行）は削除、今ない枠は追加する。
+    戻り値は {"inserted", "updated", "deleted", "unchanged"} の行数。
+    """
+    desired: Dict[Tuple[datetime.date, str], AssignmentRow] = {}
+    for row in rows:
+        desired[_slot(row[0], row[1])] = row
+
+    existing = (
+        await db.execute(
+            select(ShiftAssignment.id, ShiftAssignment.date, ShiftAssignment.shift_type, ShiftAssignment.doctor_id)
+            .where(
+                ShiftAssignment.hospital_id == hospital_id,
+                ShiftAssignment.date >= start_date,
+                ShiftAssignment.date <= end_date,
+            )
+            .order_by(ShiftAssignment.date)
+        )
+    ).all()
+
+    matched: set = set()
+    to_delete: List[uuid.UUID] = []
+    to_update: List[Tuple[uuid.UUID, uuid.UUID]] = []
+    unchanged = 0
+    for current in existing:
+        slot = _slot(current.date, current.shift_type)
+        target = desired.get(slot)
+        if target is None or slot in matched:
+            to_delete.append(current.id)
+            continue
+        matched.add(slot)
+        if current.doctor_id == target[2]:
+            unchanged += 1
+        else:
+            to_update.append((current.id, target[2]))
+
+    if to_delete:
+        await db.execute(delete(ShiftAssignment).where(ShiftAssignment.id.in_(to_delete)))
+    if to_update:
+        changes = values(
+            column("id", UUID(as_uuid=True)), column("doctor_id", UUID(as_uuid=True)), name="changes",
+        ).data(to_update)
+        await db.execute(
+            update(ShiftAssignment)
+            .where(ShiftAssignment.id == changes.c.id)
+            .values(doctor_id=changes.c.doctor_id)
+            .execution_options(synchronize_session=False)
+        )
+    inserted = await bulk_insert_assignments(
+        db, hospital_id=hospital_id, rows=[row for slot, row in desired.items() if slot not in matched],
+    )
+    return {"inserted": inserted, "updated": len(to_update), "deleted": len(to_delete), "unchanged": unchanged}
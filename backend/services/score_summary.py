@@ -0,0 +1,243 @@
+"""医師×月の確定シフト集計（doctor_month_summaries）
+
+過去スコア・土曜当直回数・日祝回数・年間統計は、shift_assignments を毎回読み直して
+日当直の判定や祝日判定をやり直すのではなく、この集計表を読む。
+集計表は保存・画像取り込み・削除・データ引き継ぎ・手動祝日の変更で該当月だけ作り直し、
+全件の作り直しは backfill_score_summaries.py で行う。
+
+スコアは病院の shift_scores 設定で変わるため、表には種類ごとの回数だけを持ち、
+読むときに summary_score で掛け合わせる。
+"""
+from __future__ import annotations
+
+import datetime
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, fields
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.doctor_month_summary import DoctorMonthSummary
+from models.shift import ShiftAssignment
+from services.holiday_service import HolidayCalendar, load_holiday_calendar
+
+
+DAY_SHIFT_TYPES = {"day", "day_shift", "日直"}
+NIGHT_SHIFT_TYPES = {"night", "night_shift", "当直"}
+
+DEFAULT_SHIFT_SCORES = {
+    "weekday_night": 1.0,
+    "saturday_night": 1.5,
+    "holiday_day": 0.5,
+    "holiday_night": 1.0,
+}
+
+# (医師ID, 年, 月)
+SummaryKey = Tuple[uuid.UUID, int, int]
+
+
+@dataclass
+class MonthCounts:
+    """医師1人（1か月分、または複数月の合計）のシフト回数"""
+
+    weekday_nights: int = 0
+    saturday_nights: int = 0
+    sunhol_days: int = 0
+    sunhol_nights: int = 0
+    sunhol_combined: int = 0
+    shift_count: int = 0
+
+    @property
+    def sunhol_works(self) -> int:
+        """日祝の日直・当直の回数（日当直を1人で通した日は当直1回として数える）"""
+        return self.sunhol_days + self.sunhol_nights
+
+    def add(self, other: "MonthCounts") -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+    def as_dict(self) -> Dict[str, int]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+COUNT_FIELDS = tuple(f.name for f in fields(MonthCounts))
+
+
+def is_day_shift(shift_type: str) -> bool:
+    normalized = str(shift_type).strip()
+    return normalized in DAY_SHIFT_TYPES or normalized.lower() in DAY_SHIFT_TYPES
+
+
+def is_night_shift(shift_type: str) -> bool:
+    normalized = str(shift_type).strip()
+    return normalized in NIGHT_SHIFT_TYPES or normalized.lower() in NIGHT_SHIFT_TYPES
+
+
+def summarize_shifts(
+    rows: Iterable[Tuple[uuid.UUID, datetime.date, str]],
+    calendar: HolidayCalendar,
+) -> Dict[SummaryKey, MonthCounts]:
+    """(医師ID, 日付, shift_type) の行を医師×月の回数にまとめる
+
+    日祝の当直で同じ医師の日直がない日は、日当直を1人で通したもの（sunhol_combined）として数える。
+    """
+    rows = list(rows)
+    day_keys = {(doctor_id, shift_date) for doctor_id, shift_date, shift_type in rows if is_day_shift(shift_type)}
+
+    counts: Dict[SummaryKey, MonthCounts] = defaultdict(MonthCounts)
+    for doctor_id, shift_date, shift_type in rows:
+        c = counts[(doctor_id, shift_date.year, shift_date.month)]
+        c.shift_count += 1
+        sunhol = calendar.is_sunday_or_holiday(shift_date)
+        if is_day_shift(shift_type):
+            if sunhol:
+                c.sunhol_days += 1
+        elif is_night_shift(shift_type):
+            if sunhol:
+                c.sunhol_nights += 1
+                if (doctor_id, shift_date) not in day_keys:
+                    c.sunhol_combined += 1
+            elif shift_date.weekday() == 5:
+                c.saturday_nights += 1
+            else:
+                c.weekday_nights += 1
+    return dict(counts)
+
+
+def summary_score(counts: MonthCounts, shift_scores: Optional[dict] = None) -> float:
+    """回数から過去スコアを出す（score_historical_shift を1枠ずつ足したものと同じ値）"""
+    ss = shift_scores or DEFAULT_SHIFT_SCORES
+    holiday_day = ss.get("holiday_day", 0.5)
+    holiday_night = ss.get("holiday_night", 1.0)
+    return (
+        ss.get("weekday_night", 1.0) * counts.weekday_nights
+        + ss.get("saturday_night", 1.5) * counts.saturday_nights
+        + holiday_day * counts.sunhol_days
+        + holiday_night * (counts.sunhol_nights - counts.sunhol_combined)
+        + (holiday_day + holiday_night) * counts.sunhol_combined
+    )
+
+
+def _month_start(year: int, month: int) -> datetime.date:
+    return datetime.date(year, month, 1)
+
+
+def _next_month_start(year: int, month: int) -> datetime.date:
+    return datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+
+
+async def refresh_month_summaries(
+    db: AsyncSession,
+    hospital_id: uuid.UUID,
+    months: Iterable[Tuple[int, int]],
+) -> int:
+    """病院の指定月の集計を shift_assignments から作り直す（コミットは呼び出し側）
+
+    月ごとに旧行を消して1文の複数行 INSERT で入れ直す。書いた行数を返す。
+    """
+    month_list = sorted(set(months))
+    if not month_list:
+        return 0
+    start = _month_start(*month_list[0])
+    end = _next_month_start(*month_list[-1])
+
+    calendar = await load_holiday_calendar(db, hospital_id, start, end)
+    rows = (
+        await db.execute(
+            select(ShiftAssignment.doctor_id, ShiftAssignment.date, ShiftAssignment.shift_type)
+            .where(
+                ShiftAssignment.hospital_id == hospital_id,
+                ShiftAssignment.date >= start,
+                ShiftAssignment.date < end,
+            )
+        )
+    ).all()
+    wanted = set(month_list)
+    counts = {
+        key: value
+        for key, value in summarize_shifts(rows, calendar).items()
+        if (key[1], key[2]) in wanted
+    }
+
+    await db.execute(
+        delete(DoctorMonthSummary).where(
+            DoctorMonthSummary.hospital_id == hospital_id,
+            or_(*(
+                and_(DoctorMonthSummary.year == year, DoctorMonthSummary.month == month)
+                for year, month in month_list
+            )),
+        )
+    )
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = [
+        {
+            "id": uuid.uuid4(),
+            "hospital_id": hospital_id,
+            "doctor_id": doctor_id,
+            "year": year,
+            "month": month,
+            "updated_at": now,
+            **value.as_dict(),
+        }
+        for (doctor_id, year, month), value in counts.items()
+    ]
+    if payload:
+        await db.execute(insert(DoctorMonthSummary).values(payload))
+    return len(payload)
+
+
+async def refresh_all_summaries(db: AsyncSession, hospital_id: uuid.UUID) -> int:
+    """病院のシフトがあるすべての月の集計を作り直す（コミットは呼び出し側）"""
+    dates = (
+        await db.execute(
+            select(ShiftAssignment.date).where(ShiftAssignment.hospital_id == hospital_id).distinct()
+        )
+    ).scalars().all()
+    existing = (
+        await db.execute(
+            select(DoctorMonthSummary.year, DoctorMonthSummary.month)
+            .where(DoctorMonthSummary.hospital_id == hospital_id)
+            .distinct()
+        )
+    ).all()
+    months = {(d.year, d.month) for d in dates} | {(row.year, row.month) for row in existing}
+    return await refresh_month_summaries(db, hospital_id, months)
+
+
+async def load_month_summaries(
+    db: AsyncSession,
+    hospital_id: uuid.UUID,
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    doctor_ids: Optional[Sequence[uuid.UUID]] = None,
+) -> List[DoctorMonthSummary]:
+    """[start, end) の (年, 月) の集計行を読む"""
+    start_index = start[0] * 12 + start[1]
+    end_index = end[0] * 12 + end[1]
+    month_index = DoctorMonthSummary.year * 12 + DoctorMonthSummary.month
+    stmt = (
+        select(DoctorMonthSummary)
+        .where(
+            DoctorMonthSummary.hospital_id == hospital_id,
+            month_index >= start_index,
+            month_index < end_index,
+        )
+        .order_by(DoctorMonthSummary.year, DoctorMonthSummary.month)
+    )
+    if doctor_ids is not None:
+        stmt = stmt.where(DoctorMonthSummary.doctor_id.in_(list(doctor_ids)))
+    return list((await db.execute(stmt)).scalars().all())
+
+
+def counts_of(summary: DoctorMonthSummary) -> MonthCounts:
+    return MonthCounts(**{name: getattr(summary, name) or 0 for name in COUNT_FIELDS})
+
+
+def total_by_doctor(summaries: Iterable[DoctorMonthSummary]) -> Dict[uuid.UUID, MonthCounts]:
+    """集計行を医師ごとに合計する"""
+    totals: Dict[uuid.UUID, MonthCounts] = defaultdict(MonthCounts)
+    for summary in summaries:
+        totals[summary.doctor_id].add(counts_of(summary))
+    return dict(totals)
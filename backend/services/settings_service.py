@@ -1,14 +1,107 @@
 from __future__ import annotations
 
+import copy
+import time
 import uuid
+from collections import OrderedDict
 from datetime import date, datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from sqlalchemy import delete, select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import get_settings
 from models.system_setting import SystemSetting
+from services.optimize_cache import invalidate_hospital_results
+
+
+class SettingsCache:
+    """(hospital_id, key) -> system_settings.value（TTL + LRU。行がないことも覚える）
+
+    書き込みはすべてこのモジュールの upsert_* / delete_* か invalidate_hospital_settings を通すので、
+    同じプロセス内では保存直後から新しい値が返る。別プロセスの書き込みは TTL で追いつく。
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 300.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: "OrderedDict[Tuple[uuid.UUID, str], Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, hospital_id: uuid.UUID, key: str) -> Tuple[bool, Any]:
+        """(見つかったか, 値のコピー)"""
+        entry = self._entries.get((hospital_id, key))
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[(hospital_id, key)]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end((hospital_id, key))
+        self.hits += 1
+        # 呼び出し側は値を書き換えることがあるのでコピーを返す
+        return True, copy.deepcopy(entry[1])
+
+    def put(self, hospital_id: uuid.UUID, key: str, value: Any) -> None:
+        self._entries[(hospital_id, key)] = (time.monotonic(), copy.deepcopy(value))
+        self._entries.move_to_end((hospital_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, hospital_id: uuid.UUID, key: Optional[str] = None) -> None:
+        if key is not None:
+            self._entries.pop((hospital_id, key), None)
+            return
+        for stale in [k for k in self._entries if k[0] == hospital_id]:
+            del self._entries[stale]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
+
+
+_settings_cache: Optional[SettingsCache] = None
+
+
+def get_settings_cache() -> SettingsCache:
+    """アプリ全体で共有する設定キャッシュを返す"""
+    global _settings_cache
+    if _settings_cache is None:
+        settings = get_settings()
+        _settings_cache = SettingsCache(
+            max_entries=settings.settings_cache_max_entries,
+            ttl_seconds=settings.settings_cache_ttl_seconds,
+        )
+    return _settings_cache
+
+
+def invalidate_hospital_settings(hospital_id: uuid.UUID, key: Optional[str] = None) -> None:
+    """system_settings を直接書き換えたあと（コミット後）に呼ぶ。key を省略すると病院の全キー"""
+    get_settings_cache().invalidate(hospital_id, key)
+
+
+async def _get_setting_value(db: AsyncSession, hospital_id: uuid.UUID, key: str) -> Any:
+    """system_settings.value（行がなければ None）。キャッシュを先に引く"""
+    cache = get_settings_cache()
+    found, value = cache.lookup(hospital_id, key)
+    if found:
+        return value
+    stmt = select(SystemSetting.value).where(
+        SystemSetting.hospital_id == hospital_id,
+        SystemSetting.key == key,
+    )
+    value = (await db.execute(stmt)).scalar_one_or_none()
+    cache.put(hospital_id, key, value)
+    return copy.deepcopy(value)
 
 
 def _key_for_year(year: int) -> str:
@@ -31,33 +124,18 @@ def _normalize_holiday_values(values: Iterable[Any]) -> list[str]:
 
 
 async def get_custom_holidays(db: AsyncSession, hospital_id: uuid.UUID, year: int) -> Dict[str, Any]:
-    key = _key_for_year(year)
-    stmt = select(SystemSetting).where(
-        SystemSetting.hospital_id == hospital_id,
-        SystemSetting.key == key,
-    )
-    res = await db.execute(stmt)
-    row: Optional[SystemSetting] = res.scalar_one_or_none()
-
-    if row is None or row.value is None:
+    raw = await _get_setting_value(db, hospital_id, _key_for_year(year))
+    if raw is None:
         return _default_value()
 
-    value = dict(row.value)
+    value = dict(raw)
     value.setdefault("manual_holidays", [])
     value.setdefault("ignored_holidays", [])
     return value
 
 
 async def get_system_setting(db: AsyncSession, hospital_id: uuid.UUID, key: str) -> Any:
-    stmt = select(SystemSetting).where(
-        SystemSetting.hospital_id == hospital_id,
-        SystemSetting.key == key,
-    )
-    res = await db.execute(stmt)
-    row: Optional[SystemSetting] = res.scalar_one_or_none()
-    if row is None or row.value is None:
-        return None
-    return row.value
+    return await _get_setting_value(db, hospital_id, key)
 
 
 async def upsert_system_setting(
@@ -74,6 +152,9 @@ async def upsert_system_setting(
     )
     await db.execute(stmt)
     await db.commit()
+    invalidate_hospital_settings(hospital_id, key)
+    # 設定・ドラフト・祝日はどれも最適化入力になりうるので、保存のたびに結果キャッシュを捨てる
+    invalidate_hospital_results(hospital_id)
 
 
 OPTIMIZER_CONFIG_KEY = "optimizer_config"
@@ -95,16 +176,11 @@ def _default_optimizer_config() -> Dict[str, Any]:
 
 
 async def get_optimizer_config(db: AsyncSession, hospital_id: uuid.UUID) -> Dict[str, Any]:
-    stmt = select(SystemSetting).where(
-        SystemSetting.hospital_id == hospital_id,
-        SystemSetting.key == OPTIMIZER_CONFIG_KEY,
-    )
-    res = await db.execute(stmt)
-    row: Optional[SystemSetting] = res.scalar_one_or_none()
-    if row is None or row.value is None:
+    raw = await _get_setting_value(db, hospital_id, OPTIMIZER_CONFIG_KEY)
+    if raw is None:
         return _default_optimizer_config()
     result = _default_optimizer_config()
-    result.update(dict(row.value))
+    result.update(dict(raw))
     return result
 
 
@@ -120,6 +196,7 @@ async def upsert_optimizer_config(db: AsyncSession, hospital_id: uuid.UUID, valu
     )
     await db.execute(stmt)
     await db.commit()
+    invalidate_hospital_settings(hospital_id, OPTIMIZER_CONFIG_KEY)
 
 
 async def upsert_custom_holidays(
@@ -147,6 +224,7 @@ async def upsert_custom_holidays(
 
     await db.execute(stmt)
     await db.commit()
+    invalidate_hospital_settings(hospital_id, key)
 
 
 # ── Draft Schedule ──
@@ -194,6 +272,8 @@ async def delete_draft_schedule(
         )
     )
     await db.commit()
+    invalidate_hospital_settings(hospital_id, key)
+    invalidate_hospital_results(hospital_id)
 
 
 # ── Published Months ──
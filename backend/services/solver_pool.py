@@ -0,0 +1,464 @@
+"""CP-SAT ソルバー実行プール
+
+OnCallOptimizer の build_model / solve / diagnose はCPUを数秒〜数十秒占有するため、
+async ハンドラ内で直接呼ぶと同じ uvicorn ワーカーの全リクエスト（ヘルスチェック含む）が止まる。
+ここでは最適化入力を pickle 可能な SolverJob にまとめ、専用のプロセスプールで
+モデル構築〜求解までを実行して結果 dict だけを返す。
+
+- 同時実行数: SOLVER_MAX_WORKERS（0 ならプロセスを使わずスレッドで実行）
+- 待ち行列の上限: SOLVER_MAX_PENDING_JOBS（超えたら SolverBusyError）
+- ジョブ単位のタイムアウト: SOLVER_JOB_TIMEOUT_SECONDS（診断は SOLVER_DIAGNOSE_TIMEOUT_SECONDS）。
+  タイムアウトしたジョブはチャネル経由で探索を止め、応答しないワーカーだけを後から破棄する
+- ワーカーが異常終了した場合もプールを作り直し、API プロセス自体には影響させない
+- CP-SAT の num_workers はジョブごとに割り当てる: SOLVER_CORE_BUDGET をその時点の
+  実行中+待機中ジョブで分け合い、プラン別上限（SOLVER_*_PLAN_MAX_CORES）で頭打ちにする
+- SolverChannel を渡すと、実行中ジョブへのキャンセル要求と進捗イベントの受け取りができる
+  （プロセス実行時は multiprocessing.Manager 経由、スレッド実行時は threading/queue）
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND_SOLVE = "solve"
+JOB_KIND_DIAGNOSE = "diagnose"
+JOB_KIND_REPAIR = "repair"
+JOB_KIND_HORIZON = "horizon"
+
+# hospitals.plan の値。未知のプランは free と同じ扱いにする
+PLAN_FREE = "free"
+PLAN_PRO = "pro"
+
+
+class SolverJobError(Exception):
+    """ソルバージョブの実行に失敗した（status_code はルーターで HTTP ステータスに使う）"""
+
+    status_code = 500
+
+
+class SolverBusyError(SolverJobError):
+    """待ち行列が上限に達している"""
+
+    status_code = 503
+
+
+class SolverTimeoutError(SolverJobError):
+    """ジョブがタイムアウトした"""
+
+    status_code = 504
+
+
+class SolverCrashedError(SolverJobError):
+    """ワーカープロセスが異常終了した"""
+
+
+@dataclass
+class SolverChannel:
+    """実行中ジョブとのやり取り（キャンセル要求と進捗イベント）
+
+    stop_event / progress はプロセス実行時は Manager のプロキシなので pickle できる。
+    """
+
+    stop_event: Any
+    progress: Any
+
+    def request_stop(self) -> None:
+        self.stop_event.set()
+
+    def drain_progress(self) -> List[Dict[str, Any]]:
+        """溜まっている進捗イベントをすべて取り出す（ブロックしない）"""
+        events: List[Dict[str, Any]] = []
+        while True:
+            try:
+                events.append(self.progress.get_nowait())
+            except queue.Empty:
+                return events
+
+
+@dataclass
+class SolverJob:
+    """プロセス間で受け渡す最適化ジョブ（pickle 可能な値のみ保持する）"""
+
+    kind: str
+    optimizer_kwargs: Dict[str, Any]
+    time_limit_seconds: float = 5.0
+    random_seed: Optional[int] = None
+    run_pre_validate: bool = True
+    doctor_names: Dict[int, str] = field(default_factory=dict)
+    # True なら改善解ごとの schedule / scores も進捗イベントに載せる（ストリーミング生成用）
+    stream_solutions: bool = False
+    # プラン別の num_workers 上限（ルーターが設定）と、プールが実行時に割り当てた num_workers
+    max_num_workers: Optional[int] = None
+    num_workers: Optional[int] = None
+    # warm start 用の解のヒント（locked_shifts と同じ形）。repair では直す元の割り当て
+    solution_hints: List[Dict[str, Any]] = field(default_factory=list)
+    # 互いに十分違う代替案を何件まで返すか（solve のみ。1 なら最良解だけ）
+    num_alternatives: int = 1
+    channel: Optional[SolverChannel] = None
+
+
+def _watch_stop_event(stop_event: Any, optimizer: Any, done: threading.Event) -> None:
+    """停止要求が来たら optimizer.cancel() を呼び続ける（探索開始直前の取りこぼし対策）"""
+    while not done.is_set():
+        try:
+            stopped = stop_event.wait(0.2)
+        except Exception:
+            return
+        if stopped:
+            optimizer.cancel()
+            done.wait(0.2)
+
+
+def execute_job(job: SolverJob) -> Dict[str, Any]:
+    """ワーカー側のエントリポイント。モデル構築から求解までをここで完結させる。
+
+    solve / repair / horizon: pre_validate で問題があれば {"success": False, "pre_check_errors": [...]} を返す。
+    diagnose: {"diagnosis": optimizer.diagnose(...)} を返す。
+    キャンセルされた場合はどちらも {"cancelled": True} を返す。
+    horizon の optimizer_kwargs は {"months": [月ごとの OnCallOptimizer の引数, ...]}。
+    """
+    from services.horizon_optimizer import HorizonOptimizer
+    from services.optimizer import OnCallOptimizer, SolveCancelled
+
+    if job.kind == JOB_KIND_HORIZON:
+        optimizer = HorizonOptimizer(**job.optimizer_kwargs)
+    else:
+        optimizer = OnCallOptimizer(**job.optimizer_kwargs)
+    optimizer.num_workers = job.num_workers
+
+    channel = job.channel
+    done = threading.Event()
+    if channel is not None:
+        optimizer.progress_callback = channel.progress.put
+        threading.Thread(
+            target=_watch_stop_event,
+            args=(channel.stop_event, optimizer, done),
+            daemon=True,
+        ).start()
+
+    try:
+        return _execute(job, optimizer)
+    except SolveCancelled:
+        return {"cancelled": True}
+    finally:
+        done.set()
+
+
+# solver_params のうち利用ログ（usage_events.metadata.solver）に残す計測値
+TELEMETRY_SOLVER_KEYS = (
+    "status", "objective", "best_bound", "wall_time_seconds", "termination_reason",
+    "num_conflicts", "num_branches", "num_variables", "num_constraints", "num_workers", "random_seed",
+)
+
+
+def _execute(job: SolverJob, optimizer: Any) -> Dict[str, Any]:
+    """ジョブを実行し、段階ごとの所要時間とソルバーの計測値を result["telemetry"] に付ける"""
+    telemetry: Dict[str, Any] = {"kind": job.kind, "time_limit_seconds": float(job.time_limit_seconds)}
+    result = _execute_timed(job, optimizer, telemetry)
+    solver_params = result.get("solver_params") or {}
+    telemetry.update({key: solver_params[key] for key in TELEMETRY_SOLVER_KEYS if key in solver_params})
+    diagnosis = result.get("diagnosis")
+    if diagnosis is not None:
+        telemetry.update(diagnosis.pop("telemetry", {}))
+    telemetry.setdefault("num_workers", job.num_workers)
+    result["telemetry"] = telemetry
+    return result
+
+
+def _timed(telemetry: Dict[str, Any], key: str, run: Callable[[], Any]) -> Any:
+    started = time.perf_counter()
+    try:
+        return run()
+    finally:
+        telemetry[key] = round(time.perf_counter() - started, 3)
+
+
+def _execute_timed(job: SolverJob, optimizer: Any, telemetry: Dict[str, Any]) -> Dict[str, Any]:
+    if job.kind == JOB_KIND_DIAGNOSE:
+        diagnosis = _timed(
+            telemetry, "diagnose_seconds", lambda: optimizer.diagnose(doctor_names=job.doctor_names or None),
+        )
+        return {"diagnosis": diagnosis}
+
+    if job.kind not in (JOB_KIND_SOLVE, JOB_KIND_REPAIR, JOB_KIND_HORIZON):
+        raise ValueError(f"unknown solver job kind: {job.kind}")
+
+    if job.run_pre_validate:
+        pre_errors = _timed(telemetry, "pre_validate_seconds", optimizer.pre_validate)
+        if pre_errors:
+            return {"success": False, "pre_check_errors": pre_errors}
+
+    if job.kind == JOB_KIND_HORIZON:
+        _timed(telemetry, "build_seconds", optimizer.build_model)
+        return _timed(
+            telemetry, "solve_seconds",
+            lambda: optimizer.solve(time_limit_seconds=job.time_limit_seconds, random_seed=job.random_seed),
+        )
+
+    if job.kind == JOB_KIND_REPAIR:
+        # solution_hints は直す元の割り当て（保存済みシフト）。build_model は repair の中で呼ぶ
+        return _timed(telemetry, "solve_seconds", lambda: optimizer.repair(
+            job.solution_hints,
+            time_limit_seconds=job.time_limit_seconds,
+            random_seed=job.random_seed,
+        ))
+
+    _timed(telemetry, "build_seconds", optimizer.build_model)
+    if job.solution_hints:
+        optimizer.add_solution_hints(job.solution_hints)
+    return _timed(telemetry, "solve_seconds", lambda: optimizer.solve(
+        time_limit_seconds=job.time_limit_seconds,
+        random_seed=job.random_seed,
+        stream_solutions=job.stream_solutions,
+        num_alternatives=job.num_alternatives,
+    ))
+
+
+class SolverPool:
+    """上限付きのソルバー実行プール（イベントループごとではなくプロセス全体で共有）
+
+    タイムアウトしたジョブはまずチャネル経由で探索を止めさせる。猶予内に戻らない
+    （CP-SAT の外でハングした）場合だけ、そのプールを新規ジョブから切り離し、
+    同じプールで実行中の他ジョブが終わってからワーカーを停止する。
+    """
+
+    # タイムアウト後、停止要求に応じてワーカーが戻ってくるのを待つ秒数
+    STOP_GRACE_SECONDS = 5.0
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_pending_jobs: int,
+        job_timeout_seconds: float,
+        diagnose_timeout_seconds: Optional[float] = None,
+        core_budget: Optional[int] = None,
+        plan_max_cores: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.max_workers = max(0, int(max_workers))
+        self.max_pending_jobs = max(1, int(max_pending_jobs))
+        self.job_timeout_seconds = float(job_timeout_seconds)
+        self.diagnose_timeout_seconds = float(
+            diagnose_timeout_seconds if diagnose_timeout_seconds is not None else job_timeout_seconds
+        )
+        self.core_budget = max(1, int(core_budget or multiprocessing.cpu_count()))
+        self.plan_max_cores = dict(plan_max_cores or {})
+        self._cores_in_use = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[ProcessPoolExecutor, Set[asyncio.Future]] = {}
+        self._manager: Optional[Any] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+
+    @property
+    def pending_jobs(self) -> int:
+        return self._pending
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, self.max_workers))
+        return self._slots
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # OR-Tools は内部スレッドを持つため fork ではなく spawn で起動する
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._inflight[self._executor] = set()
+        return self._executor
+
+    def start(self) -> None:
+        """チャネル用の Manager プロセスを起動する（起動時にスレッドから呼ぶ。ブロックする）"""
+        if self.max_workers > 0 and self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+
+    def open_channel(self) -> SolverChannel:
+        """ジョブに渡すキャンセル・進捗用のチャネルを作る（Manager との IPC でブロックする）"""
+        if self.max_workers == 0:
+            return SolverChannel(stop_event=threading.Event(), progress=queue.Queue())
+        self.start()
+        return SolverChannel(stop_event=self._manager.Event(), progress=self._manager.Queue())
+
+    @property
+    def cores_in_use(self) -> int:
+        return self._cores_in_use
+
+    def max_cores_for_plan(self, plan: Optional[str]) -> int:
+        """プランの1ジョブあたり num_workers 上限（設定がなければコア予算いっぱい）"""
+        cap = self.plan_max_cores.get(plan or PLAN_FREE, self.plan_max_cores.get(PLAN_FREE))
+        return max(1, min(int(cap), self.core_budget)) if cap else self.core_budget
+
+    def _allocate_cores(self, job: SolverJob) -> int:
+        """実行開始時の負荷から num_workers を決める（最低1）
+
+        コア予算を実行中+待機中のジョブ数で等分した値・残りコア数・プラン上限の最小値。
+        混雑時は1ジョブあたりのコアを絞り、CPU の過剰割り当てで全体の所要時間が伸びるのを防ぐ。
+        """
+        cap = job.max_num_workers or self.core_budget
+        fair_share = self.core_budget // max(1, self._pending)
+        free = self.core_budget - self._cores_in_use
+        return max(1, min(cap, fair_share, free))
+
+    def timeout_for(self, job: SolverJob) -> float:
+        if job.kind == JOB_KIND_DIAGNOSE:
+            return self.diagnose_timeout_seconds
+        return self.job_timeout_seconds
+
+    async def run(
+        self,
+        job: SolverJob,
+        timeout: Optional[float] = None,
+        wait_for_capacity: bool = False,
+    ) -> Dict[str, Any]:
+        """ジョブを実行して結果 dict を返す。待ち時間はタイムアウトに含めない。
+
+        wait_for_capacity=False（同期エンドポイント）では待ち行列が上限なら SolverBusyError、
+        True（非同期ジョブ）では空きが出るまで待つ。
+        """
+        if self._pending >= self.max_pending_jobs:
+            if not wait_for_capacity:
+                raise SolverBusyError("ソルバーが混雑しています。しばらくしてから再度お試しください")
+            while self._pending >= self.max_pending_jobs:
+                await asyncio.sleep(0.5)
+
+        timeout = self.timeout_for(job) if timeout is None else timeout
+        self._pending += 1
+        try:
+            # タイムアウト時に探索を止められるよう、必ずチャネルを付ける
+            if job.channel is None:
+                job.channel = await asyncio.to_thread(self.open_channel)
+            async with self._get_slots():
+                cores = self._allocate_cores(job)
+                job.num_workers = cores
+                self._cores_in_use += cores
+                try:
+                    if self.max_workers == 0:
+                        return await self._run_in_thread(job, timeout)
+                    return await self._run_in_process(job, timeout)
+                finally:
+                    self._cores_in_use -= cores
+        except asyncio.CancelledError:
+            # 呼び出し側が待つのをやめたら、ワーカー側の探索も止める
+            if job.channel is not None:
+                await asyncio.to_thread(job.channel.request_stop)
+            raise
+        finally:
+            self._pending -= 1
+
+    async def _stop_and_wait(self, job: SolverJob, future: asyncio.Future) -> bool:
+        """停止要求を送り、猶予内にワーカーが戻ったら True"""
+        await asyncio.to_thread(job.channel.request_stop)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.STOP_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            return False
+        except Exception:
+            pass
+        return True
+
+    async def _run_in_thread(self, job: SolverJob, timeout: float) -> Dict[str, Any]:
+        future = asyncio.ensure_future(asyncio.to_thread(execute_job, job))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError as e:
+            logger.warning("solver job timed out after %.1fs (kind=%s)", timeout, job.kind)
+            # スレッドは強制終了できないため、停止要求に応じて戻るまでスロットを返さない
+            if not await self._stop_and_wait(job, future):
+                logger.error("solver thread did not stop after timeout (kind=%s)", job.kind)
+            raise SolverTimeoutError("ソルバーの実行がタイムアウトしました") from e
+
+    async def _run_in_process(self, job: SolverJob, timeout: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        future = loop.run_in_executor(executor, execute_job, job)
+        inflight = self._inflight.setdefault(executor, set())
+        inflight.add(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError as e:
+            logger.warning("solver job timed out after %.1fs (kind=%s)", timeout, job.kind)
+            if not await self._stop_and_wait(job, future):
+                logger.error("solver worker did not stop after timeout (kind=%s)", job.kind)
+                self._retire_executor(executor, future)
+            raise SolverTimeoutError("ソルバーの実行がタイムアウトしました") from e
+        except BrokenProcessPool as e:
+            logger.error("solver worker crashed (kind=%s)", job.kind)
+            self._discard_executor(executor)
+            raise SolverCrashedError("ソルバープロセスが異常終了しました") from e
+        finally:
+            inflight.discard(future)
+
+    def _retire_executor(self, executor: ProcessPoolExecutor, hung: asyncio.Future) -> None:
+        """ハングしたワーカーを含むプールを新規ジョブから切り離し、他ジョブの完了後に停止する"""
+        if self._executor is executor:
+            self._executor = None
+
+        async def _reap() -> None:
+            others = [f for f in self._inflight.get(executor, set()) if f is not hung]
+            if others:
+                await asyncio.gather(*others, return_exceptions=True)
+            self._discard_executor(executor)
+
+        asyncio.get_running_loop().create_task(_reap())
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """ハング・クラッシュしたプールを破棄する（次のジョブで作り直す）"""
+        if self._executor is executor:
+            self._executor = None
+        self._inflight.pop(executor, None)
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._inflight.clear()
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+_pool: Optional[SolverPool] = None
+
+
+def get_solver_pool() -> SolverPool:
+    """アプリ全体で共有するソルバープールを返す"""
+    global _pool
+    if _pool is None:
+        settings = get_settings()
+        _pool = SolverPool(
+            max_workers=settings.solver_max_workers,
+            max_pending_jobs=settings.solver_max_pending_jobs,
+            job_timeout_seconds=settings.solver_job_timeout_seconds,
+            diagnose_timeout_seconds=settings.solver_diagnose_timeout_seconds,
+            core_budget=settings.solver_core_budget,
+            plan_max_cores={
+                PLAN_FREE: settings.solver_free_plan_max_cores,
+                PLAN_PRO: settings.solver_pro_plan_max_cores,
+            },
+        )
+    return _pool
+
+
+def shutdown_solver_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import logging
+import statistics
 import uuid
 from datetime import datetime, timezone
 
@@ -30,3 +31,61 @@ async def log_event(
         await db.flush()
     except Exception:
         logger.warning("Failed to log usage event: %s", event_type, exc_info=True)
+
+
+# ソルバーを使う利用イベント（metadata.solver にソルバージョブの計測値が入る）
+SOLVER_EVENT_TYPES = ("generate", "repair", "generate_horizon", "diagnose")
+_TELEMETRY_SECONDS_KEYS = ("pre_validate_seconds", "build_seconds", "solve_seconds", "diagnose_seconds")
+
+
+def job_seconds(telemetry: dict) -> float:
+    """ソルバージョブの所要時間（事前チェック・モデル構築・求解または診断の合計）"""
+    return round(sum(float(telemetry.get(key) or 0.0) for key in _TELEMETRY_SECONDS_KEYS), 3)
+
+
+def summarize_solver_telemetry(events: list[dict], slowest: int = 20) -> dict:
+    """利用イベント（hospital_id / hospital_name / event_type / created_at / solver）を病院別に集計する
+
+    by_hospital は所要時間の中央値・最大、制限時間切れ・解なしの件数、最大の変数数。
+    slowest は所要時間の長い順のイベント。
+    """
+    by_hospital: dict[str, dict] = {}
+    timed: list[tuple[float, dict]] = []
+    for event in events:
+        telemetry = event.get("solver")
+        if not isinstance(telemetry, dict):
+            continue
+        seconds = job_seconds(telemetry)
+        timed.append((seconds, event))
+        entry = by_hospital.setdefault(str(event["hospital_id"]), {
+            "hospital_id": str(event["hospital_id"]),
+            "hospital_name": event.get("hospital_name"),
+            "count": 0,
+            "seconds": [],
+            "time_limit_count": 0,
+            "infeasible_count": 0,
+            "max_variables": None,
+        })
+        entry["count"] += 1
+        entry["seconds"].append(seconds)
+        if telemetry.get("termination_reason") == "time_limit":
+            entry["time_limit_count"] += 1
+        if telemetry.get("status") == "INFEASIBLE" or telemetry.get("termination_reason") == "infeasible":
+            entry["infeasible_count"] += 1
+        variables = telemetry.get("num_variables")
+        if variables is not None:
+            entry["max_variables"] = max(entry["max_variables"] or 0, int(variables))
+
+    hospitals = []
+    for entry in by_hospital.values():
+        seconds = entry.pop("seconds")
+        entry["median_seconds"] = round(statistics.median(seconds), 3)
+        entry["max_seconds"] = max(seconds)
+        hospitals.append(entry)
+    hospitals.sort(key=lambda e: e["max_seconds"], reverse=True)
+
+    timed.sort(key=lambda item: item[0], reverse=True)
+    return {
+        "by_hospital": hospitals,
+        "slowest": [{**event, "seconds": seconds} for seconds, event in timed[:slowest]],
+    }
@@ -0,0 +1,45 @@
+from services.availability import KIND_HARD, KIND_SOFT, SHIFT_DAY, SHIFT_NIGHT
+from services.optimizer import OnCallOptimizer
+
+
+def test_availability_normalizes_dates_and_weekdays_once():
+    opt = OnCallOptimizer(
+        num_doctors=3, year=2024, month=4, holidays=[29],
+        unavailable={
+            0: [5, {"date": "2024-04-06", "target_shift": "night", "is_soft_penalty": True}, {"date": 40}],
+            1: [{"date": 7, "target_shift": "day"}],
+            9: [1],  # 範囲外の医師は無視
+        },
+        fixed_unavailable_weekdays={2: [{"day_of_week": 7, "target_shift": "all"}, 0]},
+    )
+    av = opt.availability
+
+    assert av.blocked.shape == (3, 30, 2, 2)
+    assert av.by_date[0, 4, :, KIND_HARD].all()
+    assert av.by_date[0, 5, SHIFT_NIGHT, KIND_SOFT] and not av.by_date[0, 5, SHIFT_DAY].any()
+    # 7 は日曜以外の祝日（29日・月曜）、0 は月曜
+    assert sorted(d + 1 for d in av.by_weekday[2, :, SHIFT_NIGHT, KIND_HARD].nonzero()[0]) == [1, 8, 15, 22, 29]
+    assert list(av.hard_weekday_rules()) == [(2, 0, "all"), (2, 7, "all")]
+    assert list(av.hard_date_entries()) == [(0, 5, "all"), (1, 7, "day")]
+    assert int(av.available_counts(SHIFT_DAY)[6]) == 2
+    assert opt._is_doctor_unavailable_on_day(1, 7, "day")
+    assert not opt._is_doctor_unavailable_on_day(1, 7, "night")
+    assert opt.availability is av
+
+
+def test_soft_penalty_is_one_per_slot():
+    opt = OnCallOptimizer(
+        num_doctors=4, year=2024, month=4,
+        unavailable={0: [
+            {"date": 1, "target_shift": "all", "is_soft_penalty": True},
+            {"date": 1, "target_shift": "night", "is_soft_penalty": True},
+        ]},
+        fixed_unavailable_weekdays={0: [{"day_of_week": 0, "target_shift": "night", "is_soft_penalty": True}]},
+    )
+    opt.build_model()
+
+    meta = [(d, day, shift) for d, day, shift, _ in opt._soft_unavail_vars_meta]
+    # 4/1（月）は日付指定2件と月曜の固定不可が重なるが、当直・日直の枠ごとに1つ
+    assert meta.count((0, 1, "night")) == 1
+    assert meta.count((0, 1, "day")) == 1
+    assert {day for _, day, shift in meta if shift == "night"} == {1, 8, 15, 22, 29}
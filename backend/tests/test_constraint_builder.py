@@ -0,0 +1,89 @@
+import pytest
+from ortools.sat.python import cp_model
+
+from services.constraint_builder import (
+    SPACING_WINDOW,
+    ShiftVars,
+    add_spacing_windows,
+    calendar_template,
+    month_cross_blocks,
+)
+from services.optimizer import OnCallOptimizer
+
+
+def test_calendar_template_facts_and_cache():
+    cal = calendar_template(2024, 4, (29,), False)
+
+    assert cal.num_days == 30
+    assert cal.saturdays == (6, 13, 20, 27)
+    assert cal.sunhol_days == (7, 14, 21, 28, 29)
+    assert cal.weekend_days == (6, 7, 13, 14, 20, 21, 27, 28, 29)
+    assert cal.day_slot_days == cal.sunhol_days
+    # 7 は日曜以外の祝日、0 は月曜
+    assert cal.fixed_weekday_days[7] == frozenset({29})
+    assert cal.fixed_weekday_days[0] == frozenset({1, 8, 15, 22, 29})
+    assert cal.weekday_ja(29) == "月"
+
+    assert calendar_template(2024, 4, (29,), False) is cal
+    assert calendar_template(2024, 4, (29,), True).day_slot_days == ()
+
+
+def test_optimizer_shares_template_and_tracks_mode():
+    a = OnCallOptimizer(num_doctors=6, year=2024, month=4, holidays=[29, "x"])
+    b = OnCallOptimizer(num_doctors=8, year=2024, month=4, holidays=[29])
+    assert a.calendar is b.calendar
+
+    b.hard_constraints["holiday_shift_mode"] = "combined"
+    assert b.calendar.combined_mode is True
+    assert b.hard_limits().prevent_sunhol_consecutive is False
+
+
+def test_month_cross_blocks_records_minimal_interval():
+    # 前月30日・29日勤務、間隔4日: 30日 -> 1〜4日、29日 -> 1〜3日
+    blocks = month_cross_blocks({0: [29, 30]}, 30, 4, 30)
+
+    assert blocks == {0: {1: 1, 2: 2, 3: 3, 4: 4}}
+    assert month_cross_blocks({0: [30]}, 30, None, 30) == {}
+
+
+def test_spacing_windows_forbid_the_same_pairs_as_pairwise_gaps():
+    cal = calendar_template(2024, 4, (), False)
+
+    def feasible(first: int, second: int) -> bool:
+        model = cp_model.CpModel()
+        work = {(0, day): model.NewBoolVar(f"w{day}") for day in cal.days}
+        add_spacing_windows(model, cal, ShiftVars(night={}, day={}, work=work), 1, 4)
+        model.Add(work[(0, first)] == 1)
+        model.Add(work[(0, second)] == 1)
+        return cp_model.CpSolver().Solve(model) == cp_model.OPTIMAL
+
+    # 月初・月中・月末（最後の窓は月末で止まる）のどこでも間隔4日以下だけが塞がる
+    for start in (1, 13, 26):
+        for k in range(1, 5):
+            if start + k <= 30:
+                assert not feasible(start, start + k)
+    assert feasible(1, 6) and feasible(25, 30)
+
+
+def test_window_formulation_is_smaller_and_keeps_spacing():
+    kwargs = dict(num_doctors=12, year=2024, month=4, holidays=[29])
+    pairwise = OnCallOptimizer(spacing_formulation="pairwise", **kwargs)
+    window = OnCallOptimizer(spacing_formulation=SPACING_WINDOW, **kwargs)
+    pairwise.build_model()
+    window.build_model()
+
+    assert len(window.model.Proto().variables) < len(pairwise.model.Proto().variables)
+    assert len(window.model.Proto().constraints) < len(pairwise.model.Proto().constraints)
+
+    res = window.solve(time_limit_seconds=5.0, random_seed=42)
+    assert res["success"] is True
+    worked: dict = {}
+    for row in res["schedule"]:
+        for key in ("day_shift", "night_shift"):
+            if row[key] is not None:
+                worked.setdefault(row[key], []).append(row["day"])
+    for days in worked.values():
+        assert all(b - a >= 5 for a, b in zip(days, days[1:]))
+
+    with pytest.raises(ValueError):
+        OnCallOptimizer(spacing_formulation="dense", **kwargs)
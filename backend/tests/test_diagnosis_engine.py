@@ -0,0 +1,43 @@
+from ortools.sat.python import cp_model
+
+from services.optimizer import OnCallOptimizer
+
+
+def _feasible(opt, engine, assumptions, time_limit=5.0):
+    _, status = opt._run_solver(engine.model_with(assumptions), time_limit)
+    return status in (cp_model.FEASIBLE, cp_model.OPTIMAL)
+
+
+def test_setting_queries_reuse_one_model():
+    opt = OnCallOptimizer(
+        num_doctors=8, year=2024, month=4, holidays=[29], score_max=10.0,
+        hard_constraints={"interval_days": 9},
+    )
+    engine = opt._diagnosis_engine()
+    num_vars = len(engine.model.Proto().variables)
+    num_constraints = len(engine.model.Proto().constraints)
+
+    assert not _feasible(opt, engine, engine.assumptions(), time_limit=2.0)
+    assert _feasible(opt, engine, engine.assumptions({"interval_days": 5}))
+    assert _feasible(opt, engine, engine.assumptions({"interval_days": 0}))
+    # 問い合わせは複製に仮定を付けるだけで、元のモデルは変わらない
+    assert opt._diagnosis_engine() is engine
+    assert len(engine.model.Proto().variables) == num_vars
+    assert len(engine.model.Proto().constraints) == num_constraints
+    assert not engine.model.Proto().assumptions
+
+
+def test_unavailable_entries_are_relaxed_one_by_one():
+    everyone_off = {d: [{"date": 1, "target_shift": "all"}] for d in range(4)}
+    opt = OnCallOptimizer(
+        num_doctors=4, year=2024, month=4, score_max=20.0,
+        unavailable=everyone_off, hard_constraints={"interval_days": 0},
+    )
+
+    conflict_groups, _, _ = opt._diagnose_phase1()
+    removals = opt._diagnose_minimum_unavail_removals(conflict_groups, time_limit=5.0)
+
+    assert sorted(g["group_id"] for g in conflict_groups) == [f"unavail_d{d}_day1" for d in range(4)]
+    # 誰か1人の不可日を外せば解ける（別の医師で3案）
+    assert [r["set_size"] for r in removals] == [1, 1, 1]
+    assert len({r["group_id"] for r in removals}) == 3
@@ -0,0 +1,46 @@
+import asyncio
+import datetime
+import uuid
+
+import jpholiday
+
+import services.holiday_service as holiday_service
+from services.holiday_service import HolidayCalendar, load_holiday_calendar, national_holiday_calendar
+
+
+def test_national_calendar_matches_jpholiday_for_every_day():
+    start, end = datetime.date(2025, 1, 1), datetime.date(2026, 1, 1)
+    cal = national_holiday_calendar(start, end)
+
+    day = start
+    while day < end:
+        is_holiday = bool(jpholiday.is_holiday(day))
+        assert cal.is_holiday(day) is is_holiday
+        assert cal.is_sunday_or_holiday(day) is (is_holiday or day.weekday() == 6)
+        day += datetime.timedelta(days=1)
+
+
+def test_month_bitmaps_and_days():
+    # 2026年5月: 3〜6日が祝日、日曜は 3, 10, 17, 24, 31 日
+    cal = HolidayCalendar(datetime.date(2026, 5, 1), datetime.date(2026, 6, 1), [
+        datetime.date(2026, 5, day) for day in (3, 4, 5, 6)
+    ])
+
+    assert cal.month_holidays(2026, 5) == [3, 4, 5, 6]
+    sunhol = cal.month_sunhol_bitmap(2026, 5)
+    assert [day for day in range(1, 32) if sunhol >> (day - 1) & 1] == [3, 4, 5, 6, 10, 17, 24, 31]
+    assert cal.month_holiday_bitmap(2026, 7) == 0
+
+
+def test_hospital_calendar_adds_manual_and_drops_ignored_holidays(monkeypatch):
+    async def fake_get_custom_holidays(_db, _hospital_id, year):
+        assert year == 2026
+        return {"manual_holidays": ["2026-05-07"], "ignored_holidays": ["2026-05-06"]}
+
+    monkeypatch.setattr(holiday_service, "get_custom_holidays", fake_get_custom_holidays)
+
+    cal = asyncio.run(load_holiday_calendar(None, uuid.uuid4(), datetime.date(2026, 5, 1), datetime.date(2026, 6, 1)))
+
+    assert cal.month_holidays(2026, 5) == [3, 4, 5, 7]
+    assert not cal.is_sunday_or_holiday(datetime.date(2026, 5, 6))
+    assert cal.holidays == {datetime.date(2026, 5, day) for day in (3, 4, 5, 7)}
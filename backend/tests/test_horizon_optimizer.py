@@ -0,0 +1,54 @@
+import pytest
+
+from services.horizon_optimizer import HorizonOptimizer
+
+
+def _months(n, **overrides):
+    months = []
+    year, month = 2024, 11
+    for _ in range(n):
+        months.append(dict(num_doctors=10, year=year, month=month, **overrides))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def test_horizon_keeps_spacing_across_month_boundaries():
+    months = _months(3, past_total_scores={0: 5.0})
+    # 11/30 に医師0をロックすると、12/1〜12/4 は間隔4日で入れない
+    months[0]["locked_shifts"] = [{"date": "2024-11-30", "shift_type": "night", "doctor_idx": 0}]
+    horizon = HorizonOptimizer(months)
+    horizon.build_model()
+
+    res = horizon.solve(time_limit_seconds=6.0, random_seed=42)
+
+    assert res["success"] is True
+    assert [(m["year"], m["month"]) for m in res["months"]] == [(2024, 11), (2024, 12), (2025, 1)]
+    assert [len(m["schedule"]) for m in res["months"]] == [30, 31, 31]
+    assert res["solver_params"]["hinted_months"] == 3
+
+    worked: dict = {}
+    offset = 0
+    for month in res["months"]:
+        for row in month["schedule"]:
+            for key in ("day_shift", "night_shift"):
+                if row[key] is not None:
+                    worked.setdefault(row[key], set()).add(offset + row["day"])
+        offset += len(month["schedule"])
+    for days in worked.values():
+        ordered = sorted(days)
+        assert all(b - a >= 5 for a, b in zip(ordered, ordered[1:]))
+
+    for d in range(10):
+        month_total = sum(m["scores"][d] for m in res["months"])
+        assert res["cumulative_scores"][d] == pytest.approx(month_total + (5.0 if d == 0 else 0.0))
+    assert set(res["objective_breakdown"]) >= {"past_sat_gap", "past_sunhol_gap", "score_balance"}
+    assert all("score_balance" not in m["objective_breakdown"] for m in res["months"])
+
+
+def test_horizon_rejects_non_consecutive_months():
+    months = _months(2)
+    months[1]["month"] = 2
+    with pytest.raises(ValueError):
+        HorizonOptimizer(months)
+    with pytest.raises(ValueError):
+        HorizonOptimizer(_months(1))
@@ -0,0 +1,84 @@
+import asyncio
+import uuid
+
+from services.optimize_cache import OptimizeResultCache, fingerprint_seed, optimization_fingerprint
+
+
+def test_fingerprint_ignores_ordering_but_not_values():
+    hospital_id = uuid.uuid4()
+    a = optimization_fingerprint(
+        hospital_id,
+        optimizer_kwargs={"unavailable": {1: [3, 4], 0: [2]}, "external_doctor_indices": {5, 4}},
+        idx_to_uuid={0: "a", 1: "b"},
+    )
+    b = optimization_fingerprint(
+        hospital_id,
+        idx_to_uuid={1: "b", 0: "a"},
+        optimizer_kwargs={"external_doctor_indices": {4, 5}, "unavailable": {0: [2], 1: [3, 4]}},
+    )
+    changed = optimization_fingerprint(
+        hospital_id,
+        optimizer_kwargs={"unavailable": {1: [3], 0: [2]}, "external_doctor_indices": {5, 4}},
+        idx_to_uuid={0: "a", 1: "b"},
+    )
+
+    assert a == b
+    assert a != changed
+    assert a != optimization_fingerprint(uuid.uuid4(), optimizer_kwargs={}, idx_to_uuid={})
+    assert 1 <= fingerprint_seed(a) < 2**31
+
+
+def test_cache_evicts_least_recently_used_and_invalidates_by_hospital():
+    cache = OptimizeResultCache(max_entries=2, ttl_seconds=60)
+    hospital_id = uuid.uuid4()
+    other_hospital_id = uuid.uuid4()
+
+    cache.put(hospital_id, "a", {"success": True})
+    cache.put(hospital_id, "b", {"success": True})
+    assert cache.get("a") is not None
+    cache.put(other_hospital_id, "c", {"success": True})
+
+    assert cache.get("b") is None
+    cache.invalidate_hospital(hospital_id)
+    assert cache.get("a") is None
+    assert cache.get("c") == {"success": True}
+
+
+def test_cache_entries_expire():
+    cache = OptimizeResultCache(max_entries=2, ttl_seconds=0)
+    cache.put(uuid.uuid4(), "a", {"success": True})
+
+    assert cache.get("a") is None
+
+
+def test_concurrent_identical_requests_share_one_solve_and_failures_are_not_cached():
+    cache = OptimizeResultCache()
+    hospital_id = uuid.uuid4()
+    calls = []
+
+    async def solve():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"success": True, "schedule": [{"day": 1}]}
+
+    async def infeasible():
+        calls.append(1)
+        return {"success": False}
+
+    async def _run():
+        first, second = await asyncio.gather(
+            cache.get_or_compute(hospital_id, "fp", solve),
+            cache.get_or_compute(hospital_id, "fp", solve),
+        )
+        # 返した結果を書き換えてもキャッシュには影響しない
+        first[0]["schedule"][0]["day"] = 99
+        third = await cache.get_or_compute(hospital_id, "fp", solve)
+        await cache.get_or_compute(hospital_id, "bad", infeasible)
+        await cache.get_or_compute(hospital_id, "bad", infeasible)
+        return first, second, third
+
+    first, second, third = asyncio.run(_run())
+
+    assert [first[1], second[1], third[1]] == [False, True, True]
+    assert third[0]["schedule"][0]["day"] == 1
+    assert len(calls) == 3
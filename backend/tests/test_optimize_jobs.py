@@ -0,0 +1,148 @@
+import asyncio
+import uuid
+
+import pytest
+
+from services.optimize_jobs import (
+    JOB_STATUS_CANCELLED,
+    JOB_STATUS_SUCCEEDED,
+    LocalJobQueue,
+    OptimizeJobLimitError,
+    OptimizeJobNotFound,
+)
+from services.solver_pool import JOB_KIND_DIAGNOSE, JOB_KIND_SOLVE, SolverJob, SolverPool
+
+
+def _job(kind=JOB_KIND_SOLVE, time_limit_seconds=2.0, **overrides):
+    kwargs = dict(num_doctors=8, year=2024, month=4)
+    kwargs.update(overrides)
+    return SolverJob(kind=kind, optimizer_kwargs=kwargs, time_limit_seconds=time_limit_seconds, random_seed=1)
+
+
+async def _passthrough(raw):
+    return raw
+
+
+async def _wait_finished(queue, hospital_id, job_id, timeout=60.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        record = queue.get(hospital_id, job_id)
+        if record.is_finished:
+            return record
+        await asyncio.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def _queue(**kwargs):
+    pool = SolverPool(max_workers=0, max_pending_jobs=8, job_timeout_seconds=60)
+    return LocalJobQueue(pool=pool, **kwargs)
+
+
+def test_job_runs_in_background_and_returns_finalized_result():
+    queue = _queue()
+    hospital_id = uuid.uuid4()
+
+    async def finalize(raw):
+        return {"success": raw["success"], "days": len(raw["schedule"])}
+
+    async def _run():
+        record = await queue.submit(hospital_id, _job(), finalize)
+        assert record.status in ("queued", "running")
+        return await _wait_finished(queue, hospital_id, record.id)
+
+    record = asyncio.run(_run())
+
+    assert record.status == JOB_STATUS_SUCCEEDED
+    assert record.result == {"success": True, "days": 30}
+    assert record.progress["stage"] in ("solving", "solution")
+    assert record.partial_result["solution_count"] >= 1
+    assert {"objective", "best_bound", "elapsed_seconds"} <= set(record.partial_result)
+
+
+def test_diagnose_job_reports_phase_progress():
+    queue = _queue()
+    hospital_id = uuid.uuid4()
+
+    async def _run():
+        record = await queue.submit(hospital_id, _job(kind=JOB_KIND_DIAGNOSE), _passthrough)
+        return await _wait_finished(queue, hospital_id, record.id)
+
+    record = asyncio.run(_run())
+
+    assert record.status == JOB_STATUS_SUCCEEDED
+    assert "conflict_groups" in record.partial_result
+    assert "diagnosis" in record.result
+
+
+def test_cancel_stops_running_search():
+    queue = _queue()
+    hospital_id = uuid.uuid4()
+
+    async def _run():
+        # 30日・16人の求解は制限時間いっぱいまで探索が続く
+        record = await queue.submit(hospital_id, _job(num_doctors=16, time_limit_seconds=30.0), _passthrough)
+        while queue.get(hospital_id, record.id).progress.get("stage") not in ("solving", "solution"):
+            await asyncio.sleep(0.05)
+        started = asyncio.get_running_loop().time()
+        await queue.cancel(hospital_id, record.id)
+        finished = await _wait_finished(queue, hospital_id, record.id, timeout=10.0)
+        return finished, asyncio.get_running_loop().time() - started
+
+    record, elapsed = asyncio.run(_run())
+
+    assert record.status == JOB_STATUS_CANCELLED
+    assert record.result is None
+    assert elapsed < 10.0
+
+
+def test_per_hospital_limit_and_isolation():
+    queue = _queue(max_concurrent_per_hospital=1, max_active_per_hospital=1)
+    hospital_id = uuid.uuid4()
+    other_hospital_id = uuid.uuid4()
+
+    async def _run():
+        first = await queue.submit(hospital_id, _job(), _passthrough)
+        with pytest.raises(OptimizeJobLimitError):
+            await queue.submit(hospital_id, _job(), _passthrough)
+        with pytest.raises(OptimizeJobNotFound):
+            queue.get(other_hospital_id, first.id)
+        # 他病院は別枠
+        other = await queue.submit(other_hospital_id, _job(), _passthrough)
+        await _wait_finished(queue, hospital_id, first.id)
+        await _wait_finished(queue, other_hospital_id, other.id)
+
+    asyncio.run(_run())
+
+
+def test_cancel_queued_job_marks_it_cancelled():
+    queue = _queue(max_concurrent_per_hospital=1)
+    hospital_id = uuid.uuid4()
+
+    async def _run():
+        running = await queue.submit(hospital_id, _job(num_doctors=16, time_limit_seconds=30.0), _passthrough)
+        waiting = await queue.submit(hospital_id, _job(), _passthrough)
+        # 最初のステップに入る前に取り消す
+        cancelled = await queue.cancel(hospital_id, waiting.id)
+        await queue.cancel(hospital_id, running.id)
+        await _wait_finished(queue, hospital_id, running.id, timeout=10.0)
+        return cancelled
+
+    record = asyncio.run(_run())
+
+    assert record.status == JOB_STATUS_CANCELLED
+    assert record.finished_at is not None
+    assert record.started_at is None
+
+
+def test_jobs_wait_for_pool_capacity_instead_of_failing():
+    pool = SolverPool(max_workers=0, max_pending_jobs=1, job_timeout_seconds=60)
+    queue = LocalJobQueue(pool=pool)
+
+    async def _run():
+        records = [await queue.submit(uuid.uuid4(), _job(), _passthrough) for _ in range(2)]
+        return [await _wait_finished(queue, r.hospital_id, r.id) for r in records]
+
+    records = asyncio.run(_run())
+
+    assert [r.status for r in records] == [JOB_STATUS_SUCCEEDED, JOB_STATUS_SUCCEEDED]
@@ -441,3 +441,223 @@ def test_fixed_unavailable_weekday_numeric_shift_code_blocks_matching_night_shif
 
     row = next(r for r in res["schedule"] if r["day"] == 29)
     assert row["night_shift"] != 0
+
+
+def test_solution_hints_from_previous_schedule_are_reported():
+    first = OnCallOptimizer(num_doctors=8, year=2024, month=4, holidays=[29])
+    first.build_model()
+    previous = first.solve(time_limit_seconds=2.0, random_seed=SEED)
+    hints = [
+        {"date": row["day"], "shift_type": shift_type, "doctor_idx": row[key]}
+        for row in previous["schedule"]
+        for key, shift_type in (("day_shift", "day"), ("night_shift", "night"))
+        if row[key] is not None
+    ]
+    # 範囲外の医師は読み飛ばす
+    hints.append({"date": 1, "shift_type": "night", "doctor_idx": 99})
+
+    opt = OnCallOptimizer(num_doctors=8, year=2024, month=4, holidays=[29])
+    opt.build_model()
+    opt.add_solution_hints(hints)
+    res = opt.solve(time_limit_seconds=2.0, random_seed=SEED + 1)
+
+    assert res["success"] is True
+    report = res["warm_start"]
+    assert report["hinted"] == len(hints)
+    assert report["applied"] == len(hints) - 1
+    assert 0 < report["kept"] <= report["applied"]
+    assert res["solver_params"]["random_seed"] == SEED + 1
+
+
+def test_parallel_setting_trials_match_sequential_first_feasible(monkeypatch):
+    import os
+    import threading
+    import time
+
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    opt = OnCallOptimizer(num_doctors=6, year=2024, month=4)
+    opt.num_workers = 4
+    seen_workers = set()
+    lock = threading.Lock()
+
+    def run(spec, solver, workers):
+        value, feasible = spec
+        with lock:
+            seen_workers.add(workers)
+        # 前の値ほど遅く終わっても、答えは「先頭から見て最初に解ける値」
+        time.sleep(0.05 * (5 - value))
+        return feasible
+
+    groups = [
+        [(1, False), (2, False), (3, True), (4, True), (5, True)],
+        [(1, False), (2, False)],
+    ]
+    results = opt._run_trials_in_parallel(groups, run, stop_at_first_feasible=True)
+
+    assert results[0][:3] == [False, False, True]
+    assert results[1] == [False, False]
+    # 4コアを4並列で分けるので1試行1ワーカー
+    assert seen_workers == {1}
+
+
+def test_diagnose_try_settings_finds_minimal_interval():
+    opt = OnCallOptimizer(
+        num_doctors=8, year=2024, month=4, holidays=[29], score_max=10.0,
+        hard_constraints={"interval_days": 9},
+    )
+
+    res = opt._diagnose_try_settings(time_limit_per_try=2.0)
+
+    assert [r["group_id"] for r in res] == ["setting_interval_days"]
+    assert res[0]["description_ja"] == "勤務間隔を9日→5日に下げれば解けます"
+
+
+def test_interchangeable_doctor_classes_group_externals_and_identical_internals():
+    opt = OnCallOptimizer(
+        num_doctors=7, year=2024, month=4,
+        unavailable={0: [3]},
+        past_sat_counts=[0, 0, 0, 1],
+        locked_shifts=[{"date": 2, "shift_type": "night", "doctor_idx": 2}],
+        external_doctor_indices={4, 5, 6},
+    )
+
+    # 0 は不可日・2 はロック・3 は過去実績が違うので、同じ設定の常勤は1人だけで組にならない
+    assert opt._interchangeable_doctor_classes() == [[4, 5, 6]]
+
+
+def test_symmetry_breaking_keeps_hinted_externals_on_output():
+    fixed = [{"date": f"2024-04-{day:02d}", "target_shift": "night"} for day in (2, 9, 16)]
+    kwargs = dict(
+        num_doctors=11, year=2024, month=4, holidays=[29], score_max=10.0,
+        external_doctor_indices={8, 9, 10}, external_fixed_dates=fixed,
+    )
+
+    first = OnCallOptimizer(symmetry_breaking=True, **kwargs)
+    first.build_model()
+    res = first.solve(time_limit_seconds=3.0, random_seed=SEED)
+    assert res["success"] is True
+    # 外部医師は確定日の早い順に番号順で並ぶ
+    assert [next(r["night_shift"] for r in res["schedule"] if r["day"] == day) for day in (2, 9, 16)] == [8, 9, 10]
+
+    # 外部医師を逆順に割り当てたヒントは、並べ替えずにそのままの医師で返る
+    swap = {8: 10, 10: 8}
+    hints = [
+        {"date": row["day"], "shift_type": shift_type, "doctor_idx": swap.get(row[key], row[key])}
+        for row in res["schedule"]
+        for key, shift_type in (("day_shift", "day"), ("night_shift", "night"))
+        if row[key] is not None
+    ]
+    opt = OnCallOptimizer(symmetry_breaking=True, **kwargs)
+    opt.build_model()
+    opt.add_solution_hints(hints)
+    again = opt.solve(time_limit_seconds=3.0, random_seed=SEED)
+
+    assert again["success"] is True
+    assert [next(r["night_shift"] for r in again["schedule"] if r["day"] == day) for day in (2, 9, 16)] == [10, 9, 8]
+    assert again["warm_start"]["applied"] == len(hints)
+
+
+def test_alternatives_are_distinct_and_carry_objective_breakdown():
+    opt = OnCallOptimizer(num_doctors=10, year=2024, month=4, holidays=[29], external_doctor_indices={8, 9})
+    opt.build_model()
+
+    res = opt.solve(time_limit_seconds=6.0, random_seed=SEED, num_alternatives=3)
+
+    assert res["success"] is True
+    alternatives = res["alternatives"]
+    assert [a["rank"] for a in alternatives] == [1, 2, 3]
+    assert alternatives[0]["schedule"] == res["schedule"]
+    assert alternatives[0]["diff_slots"] == 0
+    # 埋まる枠 35（当直30 + 日祝の日直5）の 15% = 6 枠以上違う
+    assert all(a["diff_slots"] >= 6 for a in alternatives[1:])
+    schedules = [[(r["day_shift"], r["night_shift"]) for r in a["schedule"]] for a in alternatives]
+    assert len({tuple(s) for s in schedules}) == 3
+    for a in alternatives:
+        assert sum(term["penalty"] for term in a["objective_breakdown"].values()) == a["objective"]
+        assert all(term["penalty"] == term["weight"] * term["value"] for term in a["objective_breakdown"].values())
+
+
+def test_repair_changes_only_the_newly_unavailable_slot_neighborhood():
+    kwargs = dict(num_doctors=10, year=2024, month=4, holidays=[29])
+    opt = OnCallOptimizer(**kwargs)
+    opt.build_model()
+    res = opt.solve(time_limit_seconds=3.0, random_seed=SEED)
+    assert res["success"] is True
+    baseline = [
+        {"date": row["day"], "shift_type": shift_type, "doctor_idx": row[key]}
+        for row in res["schedule"]
+        for key, shift_type in (("day_shift", "day"), ("night_shift", "night"))
+        if row[key] is not None
+    ]
+    doctor = next(row["night_shift"] for row in res["schedule"] if row["day"] == 12)
+
+    repaired = OnCallOptimizer(unavailable={doctor: [12]}, **kwargs).repair(baseline, random_seed=SEED)
+
+    assert repaired["success"] is True
+    info = repaired["repair"]
+    assert info["affected_days"] == [12]
+    assert info["num_changed"] >= 1
+    assert {"day": 12, "shift_type": "night", "before": doctor} in [
+        {k: c[k] for k in ("day", "shift_type", "before")} for c in info["changed"]
+    ]
+    # 近傍（12日 ± 勤務間隔4日）の外は元のまま
+    assert all(8 <= c["day"] <= 16 for c in info["changed"])
+    assert next(row["night_shift"] for row in repaired["schedule"] if row["day"] == 12) != doctor
+
+    unchanged = OnCallOptimizer(**kwargs).repair(baseline, random_seed=SEED)
+    assert unchanged["repair"]["num_changed"] == 0
+    assert unchanged["schedule"] == res["schedule"]
+
+
+def test_large_roster_starts_from_a_complete_greedy_solution():
+    kwargs = dict(
+        num_doctors=24, year=2024, month=5, holidays=[3, 4, 6], score_min=0.0, score_max=3.0,
+        unavailable={0: [1, 2, 3], 1: [{"date": 4, "target_shift": "day"}]},
+        locked_shifts=[{"doctor_idx": 2, "date": "2024-05-10", "shift_type": "night"}],
+        external_doctor_indices={20, 21, 22, 23},
+        external_fixed_dates=[{"date": "2024-05-15", "target_shift": "night"}],
+    )
+    opt = OnCallOptimizer(large_roster=True, **kwargs)
+    assert opt.spacing_formulation == "window"
+    assert OnCallOptimizer(**kwargs).large_roster is False
+
+    opt.build_model()
+    res = opt.solve(time_limit_seconds=5.0, random_seed=SEED)
+
+    assert res["success"] is True
+    info = res["solver_params"]["large_roster"]
+    # 5月: 当直31 + 日祝の日直（日曜4 + 祝日3）
+    assert info["filled_slots"] == info["total_slots"] == 38
+    assert info["complete_hint"] is True
+    assignments = _collect_assignments(res["schedule"])
+    assert (2, 10) in assignments
+    assert next(row["night_shift"] for row in res["schedule"] if row["day"] == 15) in {20, 21, 22, 23}
+    assert not any(d == 0 and day in (1, 2, 3) for d, day in assignments)
+    by_doctor: dict = {}
+    for d, day in assignments:
+        by_doctor.setdefault(d, []).append(day)
+    for d, days in by_doctor.items():
+        days.sort()
+        assert all(b - a >= 5 for a, b in zip(days, days[1:]))
+        if d >= 20:
+            assert len(days) == 1
+
+
+def test_solve_reports_termination_reason_and_stops_at_gap_limit():
+    opt = OnCallOptimizer(num_doctors=6, year=2024, month=4, holidays=[], score_max=100.0)
+    opt.build_model()
+    res = opt.solve(time_limit_seconds=10.0, random_seed=SEED)
+    assert res["status"] == "OPTIMAL"
+    assert res["solver_params"]["termination_reason"] == "optimal"
+    # 最小の重み（score_balance=30）未満の差は画面に出ない
+    assert res["solver_params"]["absolute_gap_limit"] == 29
+
+    loose = OnCallOptimizer(num_doctors=8, year=2024, month=4, holidays=[29])
+    # 下界との差をいくらでも許す＝最初の解で止まる
+    loose.absolute_gap_limit = 1e9
+    loose.build_model()
+    res = loose.solve(time_limit_seconds=10.0, random_seed=SEED)
+    assert res["success"] is True
+    assert res["status"] == "FEASIBLE"
+    assert res["solver_params"]["termination_reason"] == "gap_limit"
+    assert res["solver_params"]["wall_time_seconds"] < 5.0
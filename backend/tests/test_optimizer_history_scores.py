@@ -3,6 +3,7 @@ import datetime
 import uuid
 
 import services.optimizer_history as optimizer_history
+from services.holiday_service import HolidayCalendar
 
 
 class DummyResult:
@@ -65,15 +66,15 @@ def test_build_past_total_scores_applies_baseline_to_new_doctor(monkeypatch):
         (doc2, datetime.date(2026, 1, 3), night_shift),
     ]
 
-    async def fake_get_custom_holidays(_db, _year):
-        return {"manual_holidays": [], "ignored_holidays": []}
+    async def fake_load_holiday_calendar(_db, _hospital_id, start_date, end_date):
+        return HolidayCalendar(start_date, end_date, [])
 
-    monkeypatch.setattr(optimizer_history, "get_custom_holidays", fake_get_custom_holidays)
-    monkeypatch.setattr(optimizer_history, "get_jp_holidays_for_year", lambda _year: [])
+    monkeypatch.setattr(optimizer_history, "load_holiday_calendar", fake_load_holiday_calendar)
 
     scores = asyncio.run(
         optimizer_history.build_past_total_scores(
             DummySession(rows),
+            hospital_id=uuid.uuid4(),
             doctor_ids=[doc1, doc2, doc3],
             target_year=2026,
             target_month=3,
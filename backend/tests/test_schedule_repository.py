@@ -0,0 +1,58 @@
+import asyncio
+import datetime
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from services.schedule_repository import replace_month_assignments
+
+
+class DummyResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+def _existing(date, shift_type, doctor_id):
+    return SimpleNamespace(id=uuid.uuid4(), date=date, shift_type=shift_type, doctor_id=doctor_id)
+
+
+def test_replace_month_assignments_writes_only_the_diff_in_one_statement_each():
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    d1, d2, d3 = (datetime.date(2024, 4, day) for day in (1, 2, 3))
+    existing = [
+        _existing(d1, "日直", a),    # 同じ医師 → そのまま
+        _existing(d1, "当直", a),    # 医師が変わる → 更新
+        _existing(d2, "当直", b),    # 新しい表にない → 削除
+        _existing(d2, "night", c),   # 同じ枠の重複 → 削除
+    ]
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[DummyResult(existing), None, None, None])
+
+    counts = asyncio.run(replace_month_assignments(
+        db,
+        hospital_id=uuid.uuid4(),
+        start_date=d1,
+        end_date=datetime.date(2024, 4, 30),
+        rows=[(d1, "day", a), (d1, "night", b), (d3, "当直", c)],
+    ))
+
+    assert counts == {"inserted": 1, "updated": 1, "deleted": 2, "unchanged": 1}
+    statements = [call.args[0].__visit_name__ for call in db.execute.await_args_list]
+    assert statements == ["select", "delete", "update", "insert"]
+
+
+def test_replace_month_assignments_skips_statements_when_nothing_changed():
+    a = uuid.uuid4()
+    day = datetime.date(2024, 4, 1)
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=DummyResult([_existing(day, "当直", a)]))
+
+    counts = asyncio.run(replace_month_assignments(
+        db, hospital_id=uuid.uuid4(), start_date=day, end_date=day, rows=[(day, "night", a)],
+    ))
+
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 1}
+    assert db.execute.await_count == 1
@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+import services.settings_service as settings_service
+from services.settings_service import (
+    SettingsCache,
+    get_optimizer_config,
+    get_published_months,
+    upsert_system_setting,
+)
+
+
+class DummyResult:
+    def __init__(self, value):
+        self._value = value
+
+    def scalar_one_or_none(self):
+        return self._value
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SettingsCache(max_entries=2, ttl_seconds=60)
+    monkeypatch.setattr(settings_service, "_settings_cache", cache)
+    return cache
+
+
+def test_settings_are_read_once_per_hospital_and_key(cache):
+    hospital_id = uuid.uuid4()
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=DummyResult({"score_max": 5.0}))
+
+    first = asyncio.run(get_optimizer_config(db, hospital_id))
+    first["score_max"] = 0.0  # 呼び出し側の書き換えはキャッシュに残らない
+    second = asyncio.run(get_optimizer_config(db, hospital_id))
+
+    assert second["score_max"] == 5.0
+    assert db.execute.await_count == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_missing_settings_are_cached_and_writes_invalidate_them(cache, monkeypatch):
+    monkeypatch.setattr(settings_service, "invalidate_hospital_results", lambda hospital_id: None)
+    hospital_id = uuid.uuid4()
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=DummyResult(None))
+
+    assert asyncio.run(get_published_months(db, hospital_id)) == []
+    assert asyncio.run(get_published_months(db, hospital_id)) == []
+    assert db.execute.await_count == 1
+
+    asyncio.run(upsert_system_setting(db, hospital_id, "published_months", ["2024-04"]))
+    db.execute = AsyncMock(return_value=DummyResult(["2024-04"]))
+
+    assert asyncio.run(get_published_months(db, hospital_id)) == ["2024-04"]
+    assert db.execute.await_count == 1
+
+
+def test_settings_cache_evicts_least_recently_used_and_expired_entries(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(settings_service.time, "monotonic", lambda: now[0])
+    cache = SettingsCache(max_entries=2, ttl_seconds=10)
+    a, b = uuid.uuid4(), uuid.uuid4()
+
+    cache.put(a, "x", 1)
+    cache.put(b, "x", 2)
+    cache.lookup(a, "x")
+    cache.put(a, "y", 3)  # b は最も長く使われていない
+
+    assert cache.lookup(b, "x") == (False, None)
+    assert cache.lookup(a, "x") == (True, 1)
+    now[0] = 11.0
+    assert cache.lookup(a, "y") == (False, None)
+    assert len(cache) == 1
@@ -0,0 +1,260 @@
+import asyncio
+
+import pytest
+
+from services.solver_pool import (
+    JOB_KIND_DIAGNOSE,
+    JOB_KIND_HORIZON,
+    JOB_KIND_REPAIR,
+    JOB_KIND_SOLVE,
+    SolverBusyError,
+    SolverJob,
+    SolverPool,
+    SolverTimeoutError,
+    execute_job,
+)
+
+
+def _job(**overrides):
+    kwargs = dict(num_doctors=8, year=2024, month=4)
+    kwargs.update(overrides)
+    return SolverJob(kind=JOB_KIND_SOLVE, optimizer_kwargs=kwargs, time_limit_seconds=2.0, random_seed=1)
+
+
+def test_execute_job_solves_model():
+    res = execute_job(_job())
+
+    assert res["success"] is True
+    assert len(res["schedule"]) == 30
+
+
+def test_execute_job_repairs_saved_assignments():
+    solved = execute_job(_job())
+    baseline = [
+        {"date": row["day"], "shift_type": "night", "doctor_idx": row["night_shift"]}
+        for row in solved["schedule"]
+    ] + [
+        {"date": row["day"], "shift_type": "day", "doctor_idx": row["day_shift"]}
+        for row in solved["schedule"]
+        if row["day_shift"] is not None
+    ]
+    job = _job()
+    job.kind = JOB_KIND_REPAIR
+    job.solution_hints = baseline
+
+    res = execute_job(job)
+
+    assert res["success"] is True
+    assert res["repair"]["num_changed"] == 0
+    assert res["schedule"] == solved["schedule"]
+
+
+def test_execute_job_solves_horizon():
+    months = [dict(num_doctors=8, year=2024, month=m) for m in (4, 5)]
+    job = SolverJob(kind=JOB_KIND_HORIZON, optimizer_kwargs={"months": months}, time_limit_seconds=3.0, random_seed=1)
+
+    res = execute_job(job)
+
+    assert res["success"] is True
+    assert [len(m["schedule"]) for m in res["months"]] == [30, 31]
+
+
+def test_execute_job_returns_pre_check_errors_without_solving():
+    # 2人では間隔4日を満たせない
+    res = execute_job(_job(num_doctors=2))
+
+    assert res["success"] is False
+    assert res["pre_check_errors"]
+
+
+def test_execute_job_reports_stage_timings_and_solver_telemetry():
+    solved = execute_job(_job())
+    diagnosed = execute_job(
+        SolverJob(kind=JOB_KIND_DIAGNOSE, optimizer_kwargs={"num_doctors": 8, "year": 2024, "month": 4})
+    )
+
+    telemetry = solved["telemetry"]
+    assert telemetry["kind"] == JOB_KIND_SOLVE
+    assert telemetry["status"] in ("OPTIMAL", "FEASIBLE")
+    assert telemetry["termination_reason"] == solved["solver_params"]["termination_reason"]
+    assert telemetry["num_variables"] > 0 and telemetry["num_constraints"] > 0
+    assert telemetry["num_branches"] >= 0 and telemetry["num_conflicts"] >= 0
+    assert telemetry["random_seed"] == 1
+    assert {"pre_validate_seconds", "build_seconds", "solve_seconds"} <= set(telemetry)
+
+    telemetry = diagnosed["telemetry"]
+    assert telemetry["diagnose_seconds"] > 0
+    assert telemetry["phases"]["phase1"]["trials"] >= 1
+    assert "try_settings" in telemetry["phases"]
+    assert "telemetry" not in diagnosed["diagnosis"]
+
+
+def test_process_pool_runs_solve_and_diagnose():
+    pool = SolverPool(max_workers=1, max_pending_jobs=4, job_timeout_seconds=60)
+
+    async def _run():
+        solved = await pool.run(_job())
+        diagnosed = await pool.run(
+            SolverJob(kind=JOB_KIND_DIAGNOSE, optimizer_kwargs={"num_doctors": 8, "year": 2024, "month": 4})
+        )
+        return solved, diagnosed
+
+    try:
+        solved, diagnosed = asyncio.run(_run())
+    finally:
+        pool.shutdown()
+
+    assert solved["success"] is True
+    assert "conflict_groups" in diagnosed["diagnosis"]
+
+
+def test_process_pool_timeout_discards_worker_and_recovers():
+    pool = SolverPool(max_workers=1, max_pending_jobs=4, job_timeout_seconds=60)
+
+    async def _run():
+        with pytest.raises(SolverTimeoutError):
+            await pool.run(_job(), timeout=0.01)
+        return await pool.run(_job())
+
+    try:
+        res = asyncio.run(_run())
+    finally:
+        pool.shutdown()
+
+    assert res["success"] is True
+
+
+def test_process_pool_timeout_does_not_kill_concurrent_job():
+    pool = SolverPool(max_workers=2, max_pending_jobs=4, job_timeout_seconds=60)
+
+    async def _run():
+        slow = _job(num_doctors=16)
+        slow.time_limit_seconds = 30.0
+        sibling = asyncio.create_task(pool.run(_job()))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(SolverTimeoutError):
+            await pool.run(slow, timeout=3.0)
+        # 探索は停止要求で止まり、猶予を待たずに戻る
+        assert loop.time() - started < 3.0 + pool.STOP_GRACE_SECONDS
+        return await sibling
+
+    try:
+        res = asyncio.run(_run())
+    finally:
+        pool.shutdown()
+
+    assert res["success"] is True
+
+
+def test_thread_pool_timeout_stops_search_before_releasing_slot():
+    pool = SolverPool(max_workers=0, max_pending_jobs=4, job_timeout_seconds=60)
+
+    async def _run():
+        job = _job(num_doctors=16)
+        job.time_limit_seconds = 30.0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(SolverTimeoutError):
+            await pool.run(job, timeout=1.0)
+        return loop.time() - started, job.channel
+
+    elapsed, channel = asyncio.run(_run())
+
+    assert channel is not None and channel.stop_event.is_set()
+    assert elapsed < 1.0 + pool.STOP_GRACE_SECONDS
+
+
+def test_diagnose_jobs_use_their_own_timeout():
+    pool = SolverPool(max_workers=0, max_pending_jobs=4, job_timeout_seconds=60, diagnose_timeout_seconds=600)
+
+    assert pool.timeout_for(_job()) == 60
+    assert pool.timeout_for(SolverJob(kind=JOB_KIND_DIAGNOSE, optimizer_kwargs={})) == 600
+
+
+def test_pool_rejects_jobs_beyond_pending_limit():
+    pool = SolverPool(max_workers=0, max_pending_jobs=1, job_timeout_seconds=60)
+
+    async def _run():
+        first = asyncio.create_task(pool.run(_job()))
+        await asyncio.sleep(0)
+        with pytest.raises(SolverBusyError):
+            await pool.run(_job())
+        return await first
+
+    res = asyncio.run(_run())
+
+    assert res["success"] is True
+
+
+def test_process_pool_job_can_be_stopped_through_channel():
+    pool = SolverPool(max_workers=1, max_pending_jobs=4, job_timeout_seconds=60)
+
+    async def _run():
+        job = _job(num_doctors=16)
+        job.time_limit_seconds = 30.0
+        job.channel = pool.open_channel()
+        task = asyncio.create_task(pool.run(job))
+        events = []
+        while not any(e["stage"] == "solving" for e in events):
+            await asyncio.sleep(0.1)
+            events.extend(job.channel.drain_progress())
+        job.channel.request_stop()
+        return await asyncio.wait_for(task, 10)
+
+    try:
+        res = asyncio.run(_run())
+    finally:
+        pool.shutdown()
+
+    assert res == {"cancelled": True}
+
+
+def test_streaming_job_reports_each_improving_schedule():
+    pool = SolverPool(max_workers=0, max_pending_jobs=4, job_timeout_seconds=60)
+    job = _job()
+    job.stream_solutions = True
+    job.channel = pool.open_channel()
+
+    res = execute_job(job)
+    solutions = [e for e in job.channel.drain_progress() if e["stage"] == "solution"]
+
+    assert res["success"] is True
+    assert solutions
+    assert all(len(e["schedule"]) == 30 and len(e["scores"]) == 8 for e in solutions)
+    objectives = [e["objective"] for e in solutions]
+    assert objectives == sorted(objectives, reverse=True)
+    assert all(e["best_bound"] <= e["objective"] for e in solutions)
+
+
+def test_cores_are_shared_by_load_and_capped_by_plan():
+    pool = SolverPool(
+        max_workers=0, max_pending_jobs=8, job_timeout_seconds=60,
+        core_budget=8, plan_max_cores={"free": 2, "pro": 8},
+    )
+
+    assert pool.max_cores_for_plan("free") == 2
+    assert pool.max_cores_for_plan("pro") == 8
+    assert pool.max_cores_for_plan("unknown") == 2
+
+    pool._pending = 1
+    assert pool._allocate_cores(SolverJob(kind=JOB_KIND_SOLVE, optimizer_kwargs={}, max_num_workers=8)) == 8
+    assert pool._allocate_cores(SolverJob(kind=JOB_KIND_SOLVE, optimizer_kwargs={}, max_num_workers=2)) == 2
+    # 4ジョブが並んでいれば予算を等分する
+    pool._pending = 4
+    assert pool._allocate_cores(SolverJob(kind=JOB_KIND_SOLVE, optimizer_kwargs={}, max_num_workers=8)) == 2
+    # 予算を使い切っていても最低1
+    pool._cores_in_use = 8
+    assert pool._allocate_cores(SolverJob(kind=JOB_KIND_SOLVE, optimizer_kwargs={}, max_num_workers=8)) == 1
+
+
+def test_run_reports_allocated_workers_and_releases_cores():
+    pool = SolverPool(max_workers=0, max_pending_jobs=4, job_timeout_seconds=60, core_budget=3)
+    job = _job()
+    job.max_num_workers = 2
+
+    res = asyncio.run(pool.run(job))
+
+    assert res["solver_params"]["num_workers"] == 2
+    assert res["solver_params"]["random_seed"] == 1
+    assert pool.cores_in_use == 0
@@ -0,0 +1,40 @@
+from services.usage_service import job_seconds, summarize_solver_telemetry
+
+
+def _event(hospital_id, solve_seconds, **solver):
+    return {
+        "hospital_id": hospital_id,
+        "hospital_name": f"病院{hospital_id}",
+        "event_type": "generate",
+        "created_at": "2024-04-01T00:00:00+00:00",
+        "solver": {"build_seconds": 0.5, "solve_seconds": solve_seconds, **solver},
+    }
+
+
+def test_summarize_solver_telemetry_groups_by_hospital_and_lists_slowest():
+    events = [
+        _event("a", 1.0, termination_reason="optimal", num_variables=100),
+        _event("a", 5.0, termination_reason="time_limit", num_variables=300),
+        _event("a", 2.0, termination_reason="infeasible", status="INFEASIBLE"),
+        _event("b", 9.0, termination_reason="gap_limit", num_variables=50),
+        # 計測値のない古いイベントは数えない
+        {**_event("b", 0.0), "solver": None},
+    ]
+
+    summary = summarize_solver_telemetry(events, slowest=2)
+
+    by_id = {h["hospital_id"]: h for h in summary["by_hospital"]}
+    assert [h["hospital_id"] for h in summary["by_hospital"]] == ["b", "a"]
+    assert by_id["a"]["count"] == 3
+    assert by_id["a"]["median_seconds"] == 2.5
+    assert by_id["a"]["max_seconds"] == 5.5
+    assert by_id["a"]["time_limit_count"] == 1
+    assert by_id["a"]["infeasible_count"] == 1
+    assert by_id["a"]["max_variables"] == 300
+    assert by_id["b"]["count"] == 1
+    assert [e["seconds"] for e in summary["slowest"]] == [9.5, 5.5]
+
+
+def test_job_seconds_adds_up_stage_timings():
+    assert job_seconds({"pre_validate_seconds": 0.1, "build_seconds": 0.2, "solve_seconds": 1.0}) == 1.3
+    assert job_seconds({"diagnose_seconds": 2.5}) == 2.5
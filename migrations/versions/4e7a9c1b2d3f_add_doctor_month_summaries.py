@@ -0,0 +1,60 @@
+"""add doctor_month_summaries table (per-doctor monthly shift counts)
+
+Revision ID: 4e7a9c1b2d3f
+Revises: cddc3505f319
+Create Date: 2026-10-17
+
+既存のシフトからの集計は手動祝日の設定を読む必要があるため、ここでは表だけを作り、
+中身は `python backfill_score_summaries.py` で作る。
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "4e7a9c1b2d3f"
+down_revision = "cddc3505f319"
+branch_labels = None
+depends_on = None
+
+COUNT_COLUMNS = (
+    "weekday_nights",
+    "saturday_nights",
+    "sunhol_days",
+    "sunhol_nights",
+    "sunhol_combined",
+    "shift_count",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "doctor_month_summaries",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("hospital_id", sa.UUID(), nullable=False),
+        sa.Column("doctor_id", sa.UUID(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        *(sa.Column(name, sa.Integer(), nullable=False) for name in COUNT_COLUMNS),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["hospital_id"], ["hospitals.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["doctor_id"], ["doctors.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "doctor_id", "year", "month", name="uq_doctor_month_summaries_doctor_month"
+        ),
+    )
+    op.create_index(
+        "ix_doctor_month_summaries_hospital_month",
+        "doctor_month_summaries",
+        ["hospital_id", "year", "month"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_doctor_month_summaries_hospital_month", table_name="doctor_month_summaries")
+    op.drop_table("doctor_month_summaries")
@@ -0,0 +1,59 @@
+"""add hospital_id to shift_assignments + (hospital_id, date) / (doctor_id, date) indexes
+
+Revision ID: cddc3505f319
+Revises: b3f1a2c4d5e6
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "cddc3505f319"
+down_revision = "b3f1a2c4d5e6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # --- shift_assignments: hospital_id（doctors.hospital_id から埋める） ---
+    op.add_column(
+        "shift_assignments",
+        sa.Column("hospital_id", sa.UUID(), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE shift_assignments AS sa
+        SET hospital_id = d.hospital_id
+        FROM doctors AS d
+        WHERE sa.doctor_id = d.id
+        """
+    )
+    op.alter_column("shift_assignments", "hospital_id", nullable=False)
+    op.create_foreign_key(
+        "shift_assignments_hospital_id_fkey",
+        "shift_assignments",
+        "hospitals",
+        ["hospital_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+
+    # --- indexes ---
+    op.create_index(
+        "ix_shift_assignments_hospital_date",
+        "shift_assignments",
+        ["hospital_id", "date"],
+    )
+    op.create_index(
+        "ix_shift_assignments_doctor_date",
+        "shift_assignments",
+        ["doctor_id", "date"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_shift_assignments_doctor_date", table_name="shift_assignments")
+    op.drop_index("ix_shift_assignments_hospital_date", table_name="shift_assignments")
+    op.drop_constraint("shift_assignments_hospital_id_fkey", "shift_assignments", type_="foreignkey")
+    op.drop_column("shift_assignments", "hospital_id")